@@ -1,10 +1,14 @@
 from django.contrib import admin
-from .models import Product, Category, Supplier, StockMovement, WhatsAppOrder
+from .models import (
+    Product, Category, Supplier, StockMovement, WhatsAppOrder, ScanSession, ScanSessionItem, ApiToken, StockSnapshot,
+    MonthlyClosing, ProductCostHistory, ArchivedStockMovement, StockCount,
+    SupplierProductAlias, ImportedInvoice
+)
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['nome', 'descricao', 'created_at']
+    list_display = ['nome', 'descricao', 'estoque_critico', 'created_at']
     search_fields = ['nome', 'descricao']
     ordering = ['nome']
 
@@ -12,29 +16,48 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
     list_display = ['nome', 'cnpj', 'telefone', 'email']
-    search_fields = ['nome', 'cnpj']
+    search_fields = ['nome', 'cnpj', 'cnpj_digitos']
     ordering = ['nome']
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['codigo', 'nome', 'categoria', 'unidade', 'quantidade_estoque', 'custo_unitario']
-    list_filter = ['categoria', 'unidade']
+    list_display = ['codigo', 'nome', 'categoria', 'unidade', 'quantidade_estoque', 'custo_unitario', 'status', 'classe_abc']
+    list_filter = ['arquivado', 'status', 'classe_abc', 'categoria', 'unidade']
     search_fields = ['codigo', 'nome', 'ncm', 'ean']
     ordering = ['nome']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'ultima_entrada_em', 'ultima_saida_em', 'arquivado_em']
 
 
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
-    list_display = ['tipo', 'produto', 'quantidade', 'custo_unitario', 'created_at', 'usuario']
+    list_display = ['tipo', 'produto', 'quantidade', 'custo_unitario', 'saldo_apos', 'created_at', 'usuario']
     list_filter = ['tipo', 'created_at', 'fornecedor']
-    search_fields = ['produto__nome', 'produto__codigo', 'observacao']
+    search_fields = ['produto__nome', 'produto__codigo', 'observacao', 'chave_idempotencia']
     ordering = ['-created_at']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'data_movimento', 'saldo_apos', 'custo_medio_apos', 'chave_idempotencia']
     date_hierarchy = 'created_at'
 
 
+@admin.register(ArchivedStockMovement)
+class ArchivedStockMovementAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'produto', 'quantidade', 'custo_unitario', 'saldo_apos', 'created_at', 'ano']
+    list_filter = ['ano', 'tipo']
+    search_fields = ['produto__nome', 'produto__codigo', 'observacao', 'chave_idempotencia']
+    list_select_related = ['produto']
+    ordering = ['-created_at']
+
+    # Período fechado e arquivado: só consulta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(WhatsAppOrder)
 class WhatsAppOrderAdmin(admin.ModelAdmin):
     list_display = ['valor_total', 'total_itens', 'usuario', 'created_at']
@@ -43,3 +66,100 @@ class WhatsAppOrderAdmin(admin.ModelAdmin):
     ordering = ['-created_at']
     readonly_fields = ['created_at', 'mensagem']
     date_hierarchy = 'created_at'
+
+
+class ScanSessionItemInline(admin.TabularInline):
+    model = ScanSessionItem
+    extra = 0
+    raw_id_fields = ['produto']
+    readonly_fields = ['produto', 'quantidade']
+    can_delete = False
+
+
+@admin.register(ScanSession)
+class ScanSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'status', 'usuario', 'created_at', 'confirmada_em']
+    list_filter = ['tipo', 'status']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'confirmada_em']
+    inlines = [ScanSessionItemInline]
+
+
+@admin.register(StockCount)
+class StockCountAdmin(admin.ModelAdmin):
+    list_display = ['id', 'categoria', 'status', 'usuario', 'total_itens', 'total_ajustes', 'created_at', 'fechada_em']
+    list_filter = ['status', 'categoria']
+    ordering = ['-created_at']
+    readonly_fields = ['status', 'total_itens', 'total_ajustes', 'created_at', 'fechada_em']
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ['nome', 'usuario', 'ativo', 'created_at', 'ultimo_uso']
+    list_filter = ['ativo']
+    search_fields = ['nome', 'usuario__username']
+    ordering = ['nome']
+    readonly_fields = ['created_at', 'ultimo_uso']
+
+    def has_add_permission(self, request):
+        # Tokens são criados com "manage.py criar_token_api" (a chave só é exibida uma vez)
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['data', 'total_produtos', 'valor_total', 'created_at']
+    ordering = ['-data']
+    readonly_fields = ['data', 'total_produtos', 'valor_total', 'created_at']
+
+
+@admin.register(MonthlyClosing)
+class MonthlyClosingAdmin(admin.ModelAdmin):
+    list_display = ['mes', 'total_entradas', 'total_saidas', 'valor_final', 'usuario', 'created_at']
+    ordering = ['-mes']
+
+    # Fechamentos são imutáveis: só consulta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductCostHistory)
+class ProductCostHistoryAdmin(admin.ModelAdmin):
+    list_display = ['produto', 'fornecedor', 'quantidade', 'custo_entrada', 'custo_anterior', 'custo_novo', 'created_at']
+    list_filter = ['fornecedor']
+    search_fields = ['produto__codigo', 'produto__nome']
+    list_select_related = ['produto', 'fornecedor']
+    ordering = ['-created_at']
+
+    # Histórico somente de inclusão: só consulta
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SupplierProductAlias)
+class SupplierProductAliasAdmin(admin.ModelAdmin):
+    list_display = ['fornecedor', 'codigo_fornecedor', 'produto', 'updated_at']
+    list_filter = ['fornecedor']
+    search_fields = ['codigo_fornecedor', 'produto__nome', 'produto__codigo']
+    raw_id_fields = ['produto']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(ImportedInvoice)
+class ImportedInvoiceAdmin(admin.ModelAdmin):
+    list_display = ['chave', 'fornecedor', 'itens', 'tamanho', 'usuario', 'created_at']
+    list_filter = ['fornecedor']
+    search_fields = ['chave', 'hash_conteudo']
+    readonly_fields = ['chave', 'hash_conteudo', 'arquivo', 'tamanho', 'fornecedor', 'usuario', 'itens', 'created_at']
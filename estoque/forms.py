@@ -1,5 +1,7 @@
 from django import forms
+from django.db.models import Q
 from .models import Product, Category, Supplier, StockMovement
+from .utils.movimentacoes import validar_quantidade
 
 
 class ProductForm(forms.ModelForm):
@@ -57,7 +59,7 @@ class CategoryForm(forms.ModelForm):
     """Formulário para cadastro/edição de categorias"""
     class Meta:
         model = Category
-        fields = ['nome', 'descricao']
+        fields = ['nome', 'descricao', 'estoque_critico']
         widgets = {
             'nome': forms.TextInput(attrs={
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500'
@@ -66,8 +68,23 @@ class CategoryForm(forms.ModelForm):
                 'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500',
                 'rows': 3
             }),
+            'estoque_critico': forms.NumberInput(attrs={
+                'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500',
+                'step': '0.01'
+            }),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Opcional: em branco mantém o limite padrão do modelo
+        self.fields['estoque_critico'].required = False
+
+    def clean_estoque_critico(self):
+        estoque_critico = self.cleaned_data.get('estoque_critico')
+        if estoque_critico is None:
+            return Category._meta.get_field('estoque_critico').get_default()
+        return estoque_critico
+
 
 class SupplierForm(forms.ModelForm):
     """Formulário para cadastro/edição de fornecedores"""
@@ -116,6 +133,10 @@ class SupplierForm(forms.ModelForm):
             if not self._validar_cnpj(cnpj_limpo):
                 raise forms.ValidationError('CNPJ inválido. Verifique os dígitos.')
             
+            # O mesmo CNPJ com outra pontuação também é duplicado
+            if Supplier.objects.filter(cnpj_digitos=cnpj_limpo).exclude(pk=self.instance.pk).exists():
+                raise forms.ValidationError('Já existe um fornecedor com este CNPJ.')
+            
             # Retorna formatado
             return cnpj
         
@@ -206,7 +227,7 @@ class EntradaManualForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['produto'].queryset = Product.objects.all().order_by('nome')
+        self.fields['produto'].queryset = Product.objects.filter(arquivado=False).order_by('nome')
         self.fields['fornecedor'].required = False
         self.fields['observacao'].required = False
 
@@ -243,7 +264,7 @@ class SaidaForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['produto'].queryset = Product.objects.filter(
-            quantidade_estoque__gt=0
+            quantidade_estoque__gt=0, arquivado=False
         ).order_by('nome')
         self.fields['observacao'].required = False
 
@@ -377,3 +398,88 @@ class XMLUploadForm(forms.Form):
         except Exception as e:
             raise forms.ValidationError(f'O arquivo não parece ser um XML válido: {str(e)}')
 
+
+
+class SaidaLoteForm(forms.Form):
+    """Formulário para saída de vários produtos de uma vez (lista de separação)"""
+    itens = forms.CharField(
+        label='Itens',
+        help_text='Um item por linha: SKU ou EAN seguido da quantidade (ex.: PROD-0001 3)',
+        widget=forms.Textarea(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 font-mono',
+            'rows': 12,
+            'placeholder': 'PROD-0001 3\n7891234567890 10'
+        })
+    )
+    observacao = forms.CharField(
+        label='Observação',
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500',
+            'rows': 3
+        })
+    )
+
+    def clean_itens(self):
+        """Converte as linhas em pares (produto, quantidade) com uma única consulta"""
+        linhas = []
+        erros = []
+        for numero, linha in enumerate(self.cleaned_data['itens'].splitlines(), 1):
+            partes = linha.replace(';', ' ').replace(',', ' ').replace('\t', ' ').split()
+            if not partes:
+                continue
+            if len(partes) != 2:
+                erros.append(f'Linha {numero}: informe o código e a quantidade.')
+                continue
+            try:
+                quantidade = validar_quantidade(partes[1])
+            except forms.ValidationError as erro:
+                erros.append(f'Linha {numero}: quantidade inválida "{partes[1]}" ({" ".join(erro.messages)})')
+                continue
+            linhas.append((numero, partes[0], quantidade))
+
+        codigos = {codigo for _, codigo, _ in linhas}
+        produtos = {}
+        for produto in Product.objects.filter(Q(codigo__in=codigos) | Q(ean__in=codigos), arquivado=False):
+            if produto.ean:
+                produtos.setdefault(produto.ean, produto)
+            produtos[produto.codigo] = produto
+
+        itens = []
+        for numero, codigo, quantidade in linhas:
+            produto = produtos.get(codigo)
+            if produto is None:
+                erros.append(f'Linha {numero}: produto "{codigo}" não encontrado.')
+                continue
+            itens.append((produto, quantidade))
+
+        if erros:
+            raise forms.ValidationError(erros)
+        if not itens:
+            raise forms.ValidationError('Informe pelo menos um item.')
+        return itens
+
+
+class ImportarCatalogoForm(forms.Form):
+    """Formulário para importar o catálogo de produtos de uma planilha"""
+    arquivo = forms.FileField(
+        label='Planilha (CSV ou XLSX)',
+        widget=forms.FileInput(attrs={
+            'class': 'w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-blue-500 focus:border-blue-500 cursor-pointer',
+            'accept': '.csv,.xlsx',
+        })
+    )
+    criar_categorias = forms.BooleanField(
+        label='Criar categorias que não existem',
+        required=False,
+        initial=True,
+    )
+
+    def clean_arquivo(self):
+        arquivo = self.cleaned_data['arquivo']
+        if not arquivo.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError('O arquivo deve ter extensão .csv ou .xlsx')
+        # Máximo de 50MB (~500 mil linhas em CSV)
+        if arquivo.size > 50 * 1024 * 1024:
+            raise forms.ValidationError('O arquivo é muito grande. Tamanho máximo: 50MB')
+        return arquivo
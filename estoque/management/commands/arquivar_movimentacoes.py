@@ -0,0 +1,47 @@
+"""
+Comando para arquivar as movimentações de meses fechados, tirando-as da
+tabela ativa sem perder o histórico.
+
+Uso:
+    python manage.py arquivar_movimentacoes                   # mantém 12 meses fechados na tabela ativa
+    python manage.py arquivar_movimentacoes --ate 2024-12-31 [--lote 5000]
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.utils.arquivamento import arquivar_movimentacoes
+
+
+class Command(BaseCommand):
+    help = 'Move as movimentações de meses fechados para o arquivo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ate', help='Último dia arquivado (AAAA-MM-DD), em um mês fechado')
+        parser.add_argument('--manter-meses', type=int, default=12,
+                            help='Meses fechados mantidos na tabela ativa quando --ate não é informado')
+        parser.add_argument('--lote', type=int, default=5000, help='Movimentações movidas por transação')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['manter_meses'] < 0:
+            raise CommandError('--lote deve ser maior que zero e --manter-meses não pode ser negativo.')
+
+        ate = None
+        if options['ate']:
+            try:
+                ate = datetime.strptime(options['ate'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--ate deve estar no formato AAAA-MM-DD.')
+
+        inicio = time.perf_counter()
+        try:
+            arquivadas = arquivar_movimentacoes(ate, manter_meses=options['manter_meses'], lote=options['lote'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for ano, quantidade in arquivadas.items():
+            self.stdout.write(f'{ano}: {quantidade} movimentação(ões)')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(arquivadas.values())} movimentação(ões) arquivada(s) em {time.perf_counter() - inicio:.2f}s.'
+        ))
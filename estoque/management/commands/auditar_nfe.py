@@ -0,0 +1,44 @@
+"""
+Comando para auditar as NF-e importadas: relê o XML original guardado no
+arquivo, confere o hash e refaz o parsing.
+
+Uso:
+    python manage.py auditar_nfe                 # confere todas as notas
+    python manage.py auditar_nfe --chave 3524... # lista os itens de uma nota
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.models import ImportedInvoice
+from estoque.utils.arquivo_nfe import reler_nota
+
+
+class Command(BaseCommand):
+    help = 'Relê os XMLs arquivados das NF-e importadas e confere o hash'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chave', help='Chave de acesso de uma nota (lista os itens dela)')
+
+    def handle(self, *args, **options):
+        notas = ImportedInvoice.objects.order_by('created_at')
+        if options['chave']:
+            notas = notas.filter(chave=options['chave'])
+            if not notas.exists():
+                raise CommandError(f"Nenhuma NF-e importada com a chave {options['chave']}.")
+
+        conferidas = 0
+        problemas = 0
+        for nota in notas.iterator():
+            try:
+                dados = reler_nota(nota)
+            except (OSError, ValueError) as e:
+                problemas += 1
+                self.stdout.write(self.style.ERROR(f'{nota}: {e}'))
+                continue
+            conferidas += 1
+            if options['chave']:
+                for produto in dados['produtos']:
+                    self.stdout.write(
+                        f"{produto['codigo']}\t{produto['nome']}\t{produto['quantidade']}\t{produto['valor_unitario']}"
+                    )
+
+        self.stdout.write(self.style.SUCCESS(f'{conferidas} nota(s) conferida(s), {problemas} com problema.'))
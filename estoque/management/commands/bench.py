@@ -0,0 +1,267 @@
+"""
+Comando de benchmark: mede o tempo de todas as views de estoque/urls.py,
+das exportações XLSX e do parser de NF-e em diferentes volumes de dados.
+
+Uso:
+    python manage.py bench --escalas 10000,100000,1000000 --saida bench.json
+
+Por padrão o benchmark roda em um banco de teste descartável (como o
+`manage.py test`), então os dados reais não são afetados.
+"""
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from datetime import timedelta
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from estoque import urls as estoque_urls
+from estoque.models import Category, Supplier, Product, StockMovement, ScanSession, StockCount
+from estoque.utils.cache_nfe import ler_nfe_com_cache
+from estoque.utils.dados_sinteticos import gerar_dados_sinteticos, gerar_nfe_xml, limpar_dados
+from estoque.utils.export_xlsx import exportar_produtos_para_xlsx, exportar_relatorio_para_xlsx
+from estoque.utils.xml_parser import parse_nfe_xml
+
+
+FORMATO_RELATORIO = 1
+
+# Tamanhos de NF-e (número de itens) usados no benchmark do parser
+TAMANHOS_NFE = [10, 100, 1000]
+
+
+class Command(BaseCommand):
+    help = 'Mede o desempenho das views, exportações XLSX e parser de NF-e em várias escalas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas',
+            default='10000',
+            help='Quantidades de movimentações separadas por vírgula (ex.: 10000,100000,1000000)',
+        )
+        parser.add_argument('--produtos', type=int, default=2000)
+        parser.add_argument('--categorias', type=int, default=20)
+        parser.add_argument('--fornecedores', type=int, default=50)
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--saida', default='bench.json', help='Arquivo JSON do relatório ("-" para stdout)')
+        parser.add_argument(
+            '--banco-atual',
+            action='store_true',
+            help='Usa o banco configurado em vez de um banco de teste (APAGA os dados existentes)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            escalas = [int(e) for e in options['escalas'].split(',') if e.strip()]
+        except ValueError:
+            raise CommandError('--escalas deve ser uma lista de inteiros separados por vírgula.')
+        if not escalas or options['repeticoes'] < 1:
+            raise CommandError('Informe ao menos uma escala e uma repetição.')
+
+        nome_banco_original = None
+        if not options['banco_atual']:
+            nome_banco_original = connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False
+            )
+
+        try:
+            resultados = [self._medir_escala(escala, options) for escala in escalas]
+        finally:
+            if nome_banco_original is not None:
+                connection.creation.destroy_test_db(nome_banco_original, verbosity=0)
+
+        relatorio = {
+            'formato': FORMATO_RELATORIO,
+            'gerado_em': timezone.now().isoformat(),
+            'commit': self._commit_atual(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'banco': connection.vendor,
+            'parametros': {
+                'produtos': options['produtos'],
+                'categorias': options['categorias'],
+                'fornecedores': options['fornecedores'],
+                'repeticoes': options['repeticoes'],
+                'seed': options['seed'],
+            },
+            'escalas': resultados,
+        }
+
+        conteudo = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if options['saida'] == '-':
+            self.stdout.write(conteudo)
+        else:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(conteudo)
+            self.stdout.write(self.style.SUCCESS(f"Relatório salvo em {options['saida']}"))
+
+    def _medir_escala(self, movimentacoes, options):
+        """Gera os dados de uma escala e mede todos os casos"""
+        # Progresso vai para stderr para não misturar com o JSON em --saida -
+        self.stderr.write(f'Escala: {movimentacoes} movimentações')
+        limpar_dados()
+        inicio = time.perf_counter()
+        gerar_dados_sinteticos(
+            categorias=options['categorias'],
+            fornecedores=options['fornecedores'],
+            produtos=options['produtos'],
+            movimentacoes=movimentacoes,
+            seed=options['seed'],
+        )
+        tempo_seed = time.perf_counter() - inicio
+
+        usuario, _ = User.objects.get_or_create(username='bench', defaults={'is_staff': True})
+        client = Client()
+        client.force_login(usuario)
+        repeticoes = options['repeticoes']
+
+        casos = []
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for nome, url in self._urls_views():
+                def executar(url=url, nome=nome):
+                    resposta = client.get(url)
+                    if nome == 'logout':
+                        client.force_login(usuario)
+                    return resposta.status_code
+                casos.append(self._medir(f'view:{nome}', executar, repeticoes, url=url))
+
+        produtos = Product.objects.select_related('categoria')
+        casos.append(self._medir(
+            'xlsx:produtos',
+            lambda: exportar_produtos_para_xlsx(produtos.all()).status_code,
+            repeticoes,
+        ))
+        movimentacoes_periodo = StockMovement.objects.filter(
+            data_movimento__gte=timezone.localdate() - timedelta(days=90)
+        ).select_related('produto', 'usuario')
+        resumo = {'entradas': 0, 'saidas': 0, 'saldo_final': 0}
+        casos.append(self._medir(
+            'xlsx:relatorio_90_dias',
+            lambda: exportar_relatorio_para_xlsx(movimentacoes_periodo.all(), resumo).status_code,
+            repeticoes,
+        ))
+
+        for itens in TAMANHOS_NFE:
+            conteudo = gerar_nfe_xml(itens=itens, seed=options['seed'])
+            casos.append(self._medir(
+                f'nfe:parse_{itens}_itens',
+                lambda conteudo=conteudo: len(parse_nfe_xml(BytesIO(conteudo))),
+                repeticoes,
+            ))
+            # Reenvio do mesmo arquivo: o resultado vem do cache de parsing
+            ler_nfe_com_cache(conteudo)
+            casos.append(self._medir(
+                f'nfe:cache_{itens}_itens',
+                lambda conteudo=conteudo: len(ler_nfe_com_cache(conteudo)['produtos']),
+                repeticoes,
+            ))
+
+        return {
+            'movimentacoes': movimentacoes,
+            'seed_segundos': round(tempo_seed, 3),
+            'casos': casos,
+        }
+
+    def _urls_views(self):
+        """Monta uma URL concreta para cada rota de estoque/urls.py"""
+        mais_movimentado = StockMovement.objects.values('produto').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        usuario = User.objects.get(username='bench')
+        sessao = ScanSession.objects.create(tipo='SAIDA', usuario=usuario)
+        contagem = StockCount.objects.create(usuario=usuario)
+        # Entidade usada no parâmetro <pk> de acordo com um trecho do nome da rota
+        ids = {
+            'produto': mais_movimentado['produto'] if mais_movimentado else Product.objects.values_list('pk', flat=True).first(),
+            'categoria': Category.objects.values_list('pk', flat=True).first(),
+            'fornecedor': Supplier.objects.values_list('pk', flat=True).first(),
+            'leitura': sessao.pk,
+            'contagem': contagem.pk,
+        }
+
+        urls = []
+        sem_url = []
+        for padrao in estoque_urls.urlpatterns:
+            kwargs = {}
+            for parametro in padrao.pattern.converters:
+                if parametro == 'produto_id':
+                    kwargs[parametro] = ids['produto']
+                else:
+                    kwargs[parametro] = next(
+                        (pk for trecho, pk in ids.items() if trecho in padrao.name), None
+                    )
+            if any(valor is None for valor in kwargs.values()):
+                sem_url.append(padrao.name)
+                continue
+            urls.append((padrao.name, reverse(f'estoque:{padrao.name}', kwargs=kwargs)))
+        # O relatório cobre todas as rotas: uma rota nova sem entidade conhecida
+        # para os parâmetros precisa entrar em `ids`, em vez de sumir do benchmark
+        if sem_url:
+            raise CommandError(
+                'Rotas sem URL montável para o benchmark (parâmetros sem entidade em _urls_views): '
+                + ', '.join(sem_url)
+            )
+
+        # Variações relevantes (busca, período longo e exportações via view)
+        urls.append(('produto_lista_busca', reverse('estoque:produto_lista') + '?busca=Parafuso'))
+        urls.append(('produto_lista_xlsx', reverse('estoque:produto_lista') + '?exportar=xlsx'))
+        um_ano_atras = (timezone.localdate() - timedelta(days=365)).isoformat()
+        urls.append(('relatorio_index_1_ano', reverse('estoque:relatorio_index') + f'?data_inicio={um_ano_atras}'))
+        urls.append(('relatorio_index_xlsx', reverse('estoque:relatorio_index') + '?exportar=xlsx'))
+        return urls
+
+    @staticmethod
+    def _medir(caso, funcao, repeticoes, **extra):
+        """Executa `funcao` (1 aquecimento + N repetições) e retorna as estatísticas"""
+        # execute_wrapper em vez de CaptureQueriesContext: o sinal request_started
+        # zera connection.queries a cada requisição do Client
+        consultas = []
+
+        def contar(execute, sql, params, many, context):
+            consultas.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            resultado = funcao()
+
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        tempos.sort()
+
+        return {
+            'caso': caso,
+            **extra,
+            'resultado': resultado,
+            'consultas': len(consultas),
+            'repeticoes': repeticoes,
+            'min_ms': round(tempos[0], 3),
+            'mediana_ms': round(statistics.median(tempos), 3),
+            'p95_ms': round(tempos[min(len(tempos) - 1, math.ceil(0.95 * len(tempos)) - 1)], 3),
+            'max_ms': round(tempos[-1], 3),
+        }
+
+    @staticmethod
+    def _commit_atual():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,35 @@
+"""
+Comando para gravar a classe ABC dos produtos pelo valor das saídas.
+
+Uso:
+    python manage.py classificar_abc               # últimos 12 meses
+    python manage.py classificar_abc --dias 90
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from estoque.utils.curva_abc import classificar_abc
+
+
+class Command(BaseCommand):
+    help = 'Grava a classe ABC de cada produto pelo valor das saídas no período'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=365, help='Período analisado, terminando hoje')
+
+    def handle(self, *args, **options):
+        if options['dias'] < 1:
+            raise CommandError('--dias deve ser maior que zero.')
+
+        data_fim = timezone.localdate()
+        data_inicio = data_fim - timedelta(days=options['dias'] - 1)
+
+        inicio = time.perf_counter()
+        contagem = classificar_abc(data_inicio, data_fim)
+        self.stdout.write(self.style.SUCCESS(
+            f"{data_inicio:%d/%m/%Y} a {data_fim:%d/%m/%Y}: {contagem['A']} produto(s) A, "
+            f"{contagem['B']} B e {contagem['C']} C ({time.perf_counter() - inicio:.2f}s)."
+        ))
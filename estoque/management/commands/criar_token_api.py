@@ -0,0 +1,28 @@
+"""
+Comando para criar um token de acesso às APIs de sincronização.
+
+Uso:
+    python manage.py criar_token_api <usuario> --nome "Coletor 01"
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = 'Cria um token de API para um coletor de dados (a chave é exibida uma única vez)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Usuário dono do token')
+        parser.add_argument('--nome', required=True, help='Nome do dispositivo')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário \"{options['usuario']}\" não encontrado.")
+
+        token, chave = ApiToken.criar(usuario, options['nome'])
+        self.stdout.write(self.style.SUCCESS(f'Token criado para "{token.nome}":'))
+        self.stdout.write(chave)
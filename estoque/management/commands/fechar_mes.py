@@ -0,0 +1,42 @@
+"""
+Comando para o fechamento mensal do estoque. Um mês fechado não aceita
+novas movimentações e seus resumos passam a vir do fechamento.
+
+Uso:
+    python manage.py fechar_mes                 # todos os meses encerrados pendentes
+    python manage.py fechar_mes --mes 2025-12
+"""
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.utils.fechamento import fechar_mes, meses_a_fechar
+
+
+class Command(BaseCommand):
+    help = 'Fecha um mês (ou todos os meses encerrados pendentes) do estoque'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mês a fechar (AAAA-MM)')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                meses = [datetime.strptime(options['mes'], '%Y-%m').date()]
+            except ValueError:
+                raise CommandError('--mes deve estar no formato AAAA-MM.')
+        else:
+            meses = meses_a_fechar()
+
+        for mes in meses:
+            inicio = time.perf_counter()
+            try:
+                fechamento = fechar_mes(mes)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                f'{mes:%m/%Y}: entradas {fechamento.total_entradas}, saídas {fechamento.total_saidas}, '
+                f'R$ {fechamento.valor_final:.2f} ({time.perf_counter() - inicio:.2f}s)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(meses)} mês(es) fechado(s).'))
@@ -0,0 +1,50 @@
+"""
+Comando para importar o catálogo de produtos de uma planilha CSV ou XLSX,
+criando ou atualizando os produtos pelo código (SKU).
+
+Uso:
+    python manage.py importar_catalogo catalogo.xlsx [--lote 1000] [--sem-criar-categorias]
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.utils.importacao_catalogo import importar_catalogo
+
+
+class Command(BaseCommand):
+    help = 'Importa produtos de uma planilha CSV/XLSX (upsert pelo código)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Planilha .csv ou .xlsx')
+        parser.add_argument('--lote', type=int, default=1000, help='Linhas gravadas por transação')
+        parser.add_argument('--sem-criar-categorias', action='store_true',
+                            help='Rejeita as linhas de categorias que não existem em vez de criá-las')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser maior que zero.')
+
+        caminho = Path(options['arquivo'])
+        if not caminho.is_file():
+            raise CommandError(f'Arquivo não encontrado: {caminho}')
+
+        try:
+            with caminho.open('rb') as arquivo:
+                resultado = importar_catalogo(
+                    arquivo, caminho.name, lote=options['lote'],
+                    criar_categorias=not options['sem_criar_categorias'],
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for erro in resultado['erros']:
+            self.stdout.write(self.style.WARNING(f"Linha {erro['linha']}: {erro['erro']}"))
+        self.stdout.write(
+            f"{resultado['linhas']} linha(s) lida(s) em {resultado['segundos']:.2f}s "
+            f"({resultado['linhas_por_segundo']:.0f} linhas/s)."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['criados']} produto(s) criado(s), {resultado['atualizados']} atualizado(s), "
+            f"{resultado['total_erros']} linha(s) com erro."
+        ))
@@ -0,0 +1,51 @@
+"""
+Comando para recalcular o razão (saldo_apos/custo_medio_apos) e o custo
+médio dos produtos a partir do histórico completo de movimentações.
+
+Uso:
+    python manage.py recalcular_custos [--produto ID] [--lote 1000] [--workers 4]
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.models import Product
+from estoque.utils.recalculo import recalcular_custos
+
+
+class Command(BaseCommand):
+    help = 'Refaz o custo médio ponderado e o razão de estoque a partir das movimentações'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produto', type=int, action='append',
+                            help='Recalcula apenas este produto (pode ser repetido)')
+        parser.add_argument('--lote', type=int, default=1000, help='Produtos por faixa')
+        parser.add_argument('--workers', type=int, default=1, help='Processos calculando em paralelo')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['workers'] < 1:
+            raise CommandError('--lote e --workers devem ser maiores que zero.')
+
+        produtos = None
+        if options['produto']:
+            produtos = Product.objects.filter(pk__in=options['produto'])
+            if produtos.count() != len(set(options['produto'])):
+                raise CommandError('Produto não encontrado.')
+
+        inicio = time.perf_counter()
+        resultado = recalcular_custos(produtos, lote=options['lote'], workers=options['workers'])
+
+        self.stdout.write(
+            f"{resultado['movimentacoes']} movimentação(ões) de {resultado['produtos']} produto(s) "
+            f"recalculadas em {time.perf_counter() - inicio:.2f}s."
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['movimentacoes_corrigidas']} linha(s) do razão e "
+            f"{resultado['produtos_corrigidos']} produto(s) corrigido(s)."
+        ))
+        if resultado['faixas_descartadas']:
+            faixas = ', '.join(f'{inicio}-{fim}' for inicio, fim in resultado['faixas_descartadas'])
+            self.stdout.write(self.style.WARNING(
+                f"Produtos movimentados durante o recálculo ficaram de fora (faixas de id {faixas}); "
+                'execute o comando novamente.'
+            ))
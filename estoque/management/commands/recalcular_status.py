@@ -0,0 +1,34 @@
+"""
+Comando para recalcular em lote o status de estoque (OK/BAIXO/CRITICO)
+dos produtos, ex.: após importações diretas no banco.
+
+Uso:
+    python manage.py recalcular_status [--categoria ID]
+"""
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from estoque.models import Category, Product
+from estoque.utils.status_estoque import recalcular_status
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o status de estoque dos produtos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categoria', type=int, help='Recalcula apenas os produtos desta categoria')
+
+    def handle(self, *args, **options):
+        produtos = Product.objects.all()
+        if options['categoria'] is not None:
+            if not Category.objects.filter(pk=options['categoria']).exists():
+                raise CommandError(f"Categoria {options['categoria']} não encontrada.")
+            produtos = produtos.filter(categoria_id=options['categoria'])
+
+        alterados = recalcular_status(produtos)
+        cache.delete('dashboard_stats')
+
+        self.stdout.write(self.style.SUCCESS(f'{alterados} produto(s) com status alterado.'))
+        for linha in produtos.order_by('status').values('status').annotate(total=Count('id')):
+            self.stdout.write(f"  {linha['status']}: {linha['total']}")
@@ -0,0 +1,72 @@
+"""
+Comando para reconciliar o estoque gravado nos produtos com o histórico
+de movimentações.
+
+Uso:
+    python manage.py reconciliar_estoque [--lote 5000] [--workers 4]
+    python manage.py reconciliar_estoque --relatorio divergencias.csv
+    python manage.py reconciliar_estoque --corrigir   # grava movimentações de ajuste
+"""
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.utils.reconciliacao import COLUNAS_RELATORIO, reconciliar_estoque
+
+
+class Command(BaseCommand):
+    help = 'Confere o estoque dos produtos contra a soma das movimentações'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Produtos conferidos por consulta')
+        parser.add_argument('--workers', type=int, default=1, help='Lotes conferidos em paralelo')
+        parser.add_argument('--relatorio', help='Arquivo CSV com todas as divergências')
+        parser.add_argument('--corrigir', action='store_true',
+                            help='Grava movimentações de ajuste para as divergências')
+        parser.add_argument('--limite', type=int, default=50, help='Máximo de divergências exibidas')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1 or options['workers'] < 1:
+            raise CommandError('--lote e --workers devem ser maiores que zero.')
+
+        arquivo = None
+        relatorio = None
+        if options['relatorio']:
+            arquivo = open(options['relatorio'], 'w', newline='', encoding='utf-8')
+            relatorio = csv.writer(arquivo)
+            relatorio.writerow(COLUNAS_RELATORIO)
+
+        inicio = time.perf_counter()
+        try:
+            resultado = reconciliar_estoque(
+                lote=options['lote'],
+                workers=options['workers'],
+                corrigir=options['corrigir'],
+                relatorio=relatorio,
+                limite_divergencias=options['limite'],
+            )
+        finally:
+            if arquivo is not None:
+                arquivo.close()
+
+        self.stdout.write(
+            f"{resultado['produtos']} produto(s) conferido(s) em {time.perf_counter() - inicio:.2f}s."
+        )
+        if not resultado['total_divergencias']:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+            return
+
+        self.stdout.write(self.style.WARNING(
+            f"{resultado['total_divergencias']} produto(s) divergente(s), "
+            f"diferença total {resultado['diferenca_total']}:"
+        ))
+        for item in resultado['divergencias']:
+            self.stdout.write(
+                f"  produto {item['produto_id']} ({item['nome']}): gravado {item['saldo_gravado']}, "
+                f"movimentações {item['saldo_movimentacoes']}, diferença {item['diferenca']}"
+            )
+        if options['relatorio']:
+            self.stdout.write(f"Relatório gravado em {options['relatorio']}.")
+        if options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f"{resultado['ajustes']} movimentação(ões) de ajuste gravada(s)."))
@@ -0,0 +1,55 @@
+"""
+Comando para popular o banco com dados sintéticos de benchmark.
+
+Uso:
+    python manage.py seed_bench --produtos 5000 --movimentacoes 100000 --seed 42
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.utils.dados_sinteticos import gerar_dados_sinteticos, limpar_dados
+
+
+class Command(BaseCommand):
+    help = 'Gera categorias, fornecedores, produtos e movimentações sintéticas para benchmark'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=20)
+        parser.add_argument('--fornecedores', type=int, default=50)
+        parser.add_argument('--produtos', type=int, default=2000)
+        parser.add_argument('--movimentacoes', type=int, default=10000)
+        parser.add_argument('--anos', type=int, default=3, help='Período coberto pelas movimentações')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help='Tamanho dos lotes de bulk_create')
+        parser.add_argument(
+            '--limpar',
+            action='store_true',
+            help='Apaga TODOS os dados do estoque antes de gerar (irreversível)',
+        )
+
+    def handle(self, *args, **options):
+        if options['categorias'] < 1 or options['produtos'] < 1:
+            raise CommandError('É necessário gerar pelo menos uma categoria e um produto.')
+
+        if options['limpar']:
+            self.stdout.write('Apagando dados existentes...')
+            limpar_dados()
+
+        inicio = time.perf_counter()
+        resumo = gerar_dados_sinteticos(
+            categorias=options['categorias'],
+            fornecedores=options['fornecedores'],
+            produtos=options['produtos'],
+            movimentacoes=options['movimentacoes'],
+            anos=options['anos'],
+            seed=options['seed'],
+            lote=options['lote'],
+        )
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['categorias']} categorias, {resumo['fornecedores']} fornecedores, "
+            f"{resumo['produtos']} produtos e {resumo['movimentacoes']} movimentações "
+            f"({resumo['entradas']} entradas / {resumo['saidas']} saídas) geradas em {duracao:.1f}s"
+        ))
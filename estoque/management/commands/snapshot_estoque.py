@@ -0,0 +1,52 @@
+"""
+Comando para gravar snapshots da posição do estoque, usados como ponto de
+partida pela avaliação em data passada (relatório de avaliação).
+
+Uso:
+    python manage.py snapshot_estoque                  # fim do mês anterior
+    python manage.py snapshot_estoque --data 2025-12-31
+    python manage.py snapshot_estoque --meses 12       # fins dos últimos 12 meses
+"""
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from estoque.utils.avaliacao import criar_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Grava snapshots do estoque ao final de uma data ou dos últimos meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data', help='Data do snapshot (AAAA-MM-DD)')
+        parser.add_argument('--meses', type=int, help='Grava o último dia de cada um dos N meses anteriores')
+
+    def handle(self, *args, **options):
+        if options['data'] and options['meses']:
+            raise CommandError('Use --data ou --meses, não ambos.')
+
+        if options['data']:
+            try:
+                datas = [datetime.strptime(options['data'], '%Y-%m-%d').date()]
+            except ValueError:
+                raise CommandError('--data deve estar no formato AAAA-MM-DD.')
+        else:
+            # Último dia de cada mês fechado, do mais antigo para o mais recente,
+            # para que cada snapshot parta do anterior
+            datas = []
+            fim_mes = timezone.localdate().replace(day=1) - timedelta(days=1)
+            for _ in range(options['meses'] or 1):
+                datas.append(fim_mes)
+                fim_mes = fim_mes.replace(day=1) - timedelta(days=1)
+            datas.reverse()
+
+        for data in datas:
+            inicio = time.perf_counter()
+            snapshot = criar_snapshot(data)
+            self.stdout.write(
+                f'{data:%d/%m/%Y}: {snapshot.total_produtos} produto(s), '
+                f'R$ {snapshot.valor_total:.2f} ({time.perf_counter() - inicio:.2f}s)'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(datas)} snapshot(s) gravado(s).'))
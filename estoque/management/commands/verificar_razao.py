@@ -0,0 +1,48 @@
+"""
+Comando para verificar a consistência do razão de estoque
+(saldo_apos/custo_medio_apos de cada movimentação).
+
+Uso:
+    python manage.py verificar_razao [--produto ID] [--lote 5000]
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from estoque.models import Product
+from estoque.utils.razao import verificar_razao
+
+
+class Command(BaseCommand):
+    help = 'Percorre o razão de estoque em lotes e relata divergências'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--produto', type=int, help='Verifica apenas este produto')
+        parser.add_argument('--lote', type=int, default=5000, help='Linhas lidas por vez')
+        parser.add_argument('--limite', type=int, default=50, help='Máximo de divergências exibidas')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote deve ser maior que zero.')
+
+        produtos = None
+        if options['produto'] is not None:
+            produtos = Product.objects.filter(pk=options['produto'])
+            if not produtos.exists():
+                raise CommandError(f"Produto {options['produto']} não encontrado.")
+
+        resultado = verificar_razao(
+            produtos, lote=options['lote'], limite_divergencias=options['limite']
+        )
+
+        self.stdout.write(
+            f"{resultado['movimentacoes']} movimentação(ões) de {resultado['produtos']} produto(s) verificadas."
+        )
+        if not resultado['total_divergencias']:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência encontrada.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f"{resultado['total_divergencias']} divergência(s):"))
+        for item in resultado['divergencias']:
+            self.stdout.write(
+                f"  produto {item['produto_id']}, movimentação {item['movimentacao_id']}: "
+                f"{item['campo']} esperado {item['esperado']}, gravado {item['gravado']}"
+            )
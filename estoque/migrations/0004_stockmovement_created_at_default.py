@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0003_product_estoque_minimo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='WhatsAppOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mensagem', models.TextField(verbose_name='Mensagem do Pedido')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Valor Total')),
+                ('total_itens', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10, verbose_name='Total de Itens')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pedidos_whatsapp', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pedido WhatsApp',
+                'verbose_name_plural': 'Pedidos WhatsApp',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
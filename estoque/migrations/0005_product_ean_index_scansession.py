@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0004_stockmovement_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='ean',
+            field=models.CharField(blank=True, db_index=True, max_length=13, null=True, verbose_name='EAN'),
+        ),
+        migrations.CreateModel(
+            name='ScanSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SAIDA', 'Saída')], max_length=7)),
+                ('status', models.CharField(choices=[('ABERTA', 'Aberta'), ('CONFIRMADA', 'Confirmada'), ('CANCELADA', 'Cancelada')], default='ABERTA', max_length=10)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('confirmada_em', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessoes_leitura', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Sessão de Leitura',
+                'verbose_name_plural': 'Sessões de Leitura',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
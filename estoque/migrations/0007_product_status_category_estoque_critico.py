@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:33
+
+import django.core.validators
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import F, Q
+
+
+def preencher_status(apps, schema_editor):
+    """Calcula o status inicial de todos os produtos (limite crítico padrão: 5)"""
+    Category = apps.get_model('estoque', 'Category')
+    Product = apps.get_model('estoque', 'Product')
+    abaixo_minimo = Q(estoque_minimo__gt=0, quantidade_estoque__lte=F('estoque_minimo'))
+    for categoria_id, limite in Category.objects.values_list('pk', 'estoque_critico'):
+        produtos = Product.objects.filter(categoria_id=categoria_id)
+        produtos.filter(quantidade_estoque__lte=limite).update(status='CRITICO')
+        produtos.filter(abaixo_minimo, quantidade_estoque__gt=limite).update(status='BAIXO')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0006_stockmovement_chave_idempotencia_apitoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='estoque_critico',
+            field=models.DecimalField(decimal_places=2, default=Decimal('5.00'), help_text='Produtos desta categoria com quantidade igual ou menor ficam em estado crítico', max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.00'))], verbose_name='Estoque Crítico'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='status',
+            field=models.CharField(choices=[('OK', 'OK'), ('BAIXO', 'Abaixo do mínimo'), ('CRITICO', 'Crítico')], default='OK', editable=False, max_length=7, verbose_name='Status do Estoque'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'OK'), _negated=True), fields=['status', 'quantidade_estoque'], name='produto_status_alerta_idx'),
+        ),
+        migrations.RunPython(preencher_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:02
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def preencher_data_movimento(apps, schema_editor):
+    """Preenche data_movimento com o dia de created_at no fuso TIME_ZONE"""
+    StockMovement = apps.get_model('estoque', 'StockMovement')
+    StockMovement.objects.update(data_movimento=TruncDate('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0007_product_status_category_estoque_critico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='data_movimento',
+            field=models.DateField(editable=False, null=True, verbose_name='Data do Movimento'),
+        ),
+        migrations.RunPython(preencher_data_movimento, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='data_movimento',
+            field=models.DateField(db_index=True, editable=False, verbose_name='Data do Movimento'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['produto', 'data_movimento'], name='movimentacao_produto_data_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+from estoque.utils.movimentacoes import custo_medio_ponderado
+
+
+LOTE = 2000
+
+
+def preencher_razao(apps, schema_editor):
+    """
+    Preenche o razão das movimentações existentes, produto a produto.
+
+    As quantidades são ancoradas no estoque atual (percorrendo o histórico
+    de trás para frente), pois produtos podem ter sido cadastrados com saldo
+    inicial sem movimentação. O custo médio é refeito do início, partindo do
+    custo atual quando há saldo inicial.
+    """
+    Product = apps.get_model('estoque', 'Product')
+    StockMovement = apps.get_model('estoque', 'StockMovement')
+
+    estado_atual = {
+        pk: (quantidade, custo)
+        for pk, quantidade, custo in Product.objects.values_list(
+            'pk', 'quantidade_estoque', 'custo_unitario'
+        )
+    }
+    pendentes = []
+
+    def preencher_produto(produto_id, linhas):
+        quantidade_final, custo_atual = estado_atual[produto_id]
+        liquido = sum(
+            (q if tipo == 'ENTRADA' else -q for _, tipo, q, _ in linhas), Decimal('0.00')
+        )
+        saldo = quantidade_final - liquido
+        custo = custo_atual if saldo > 0 else Decimal('0.00')
+        for pk, tipo, quantidade, custo_unitario in linhas:
+            if tipo == 'ENTRADA':
+                custo = custo_medio_ponderado(saldo, custo, quantidade, custo_unitario)
+                saldo += quantidade
+            else:
+                saldo -= quantidade
+            pendentes.append(StockMovement(pk=pk, saldo_apos=saldo, custo_medio_apos=custo))
+        if len(pendentes) >= LOTE:
+            StockMovement.objects.bulk_update(pendentes, ['saldo_apos', 'custo_medio_apos'])
+            pendentes.clear()
+
+    produto_atual = None
+    linhas = []
+    for pk, produto_id, tipo, quantidade, custo_unitario in StockMovement.objects.order_by(
+        'produto_id', 'pk'
+    ).values_list('pk', 'produto_id', 'tipo', 'quantidade', 'custo_unitario').iterator(chunk_size=LOTE):
+        if produto_id != produto_atual:
+            if linhas:
+                preencher_produto(produto_atual, linhas)
+            produto_atual, linhas = produto_id, []
+        linhas.append((pk, tipo, quantidade, custo_unitario))
+    if linhas:
+        preencher_produto(produto_atual, linhas)
+    if pendentes:
+        StockMovement.objects.bulk_update(pendentes, ['saldo_apos', 'custo_medio_apos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0008_stockmovement_data_movimento'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='saldo_apos',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Saldo Após'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='custo_medio_apos',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Custo Médio Após'),
+        ),
+        migrations.RunPython(preencher_razao, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='saldo_apos',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, verbose_name='Saldo Após'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='custo_medio_apos',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, verbose_name='Custo Médio Após'),
+        ),
+    ]
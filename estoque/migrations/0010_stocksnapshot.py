@@ -0,0 +1,45 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:41
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0009_stockmovement_saldo_apos_custo_medio_apos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('total_produtos', models.PositiveIntegerField(default=0, verbose_name='Produtos com Saldo')),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Valor Total')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Estoque',
+                'verbose_name_plural': 'Snapshots de Estoque',
+                'ordering': ['-data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshotItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_medio', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='estoque.product')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='estoque.stocksnapshot')),
+            ],
+            options={
+                'verbose_name': 'Item de Snapshot',
+                'verbose_name_plural': 'Itens de Snapshot',
+                'unique_together': {('snapshot', 'produto')},
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-19 15:47
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0010_stocksnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyClosing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês fechado', unique=True, verbose_name='Mês')),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('total_saidas', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('valor_final', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14, verbose_name='Valor Final')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fechamentos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Fechamento Mensal',
+                'verbose_name_plural': 'Fechamentos Mensais',
+                'ordering': ['-mes'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyClosingItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('produto_nome', models.CharField(max_length=200)),
+                ('saldo_inicial', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('entradas', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('saidas', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('saldo_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_medio_final', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valor_final', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('fechamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='estoque.monthlyclosing')),
+                ('produto', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fechamentos', to='estoque.product')),
+            ],
+            options={
+                'verbose_name': 'Item de Fechamento',
+                'verbose_name_plural': 'Itens de Fechamento',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:05
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+
+def preencher_valor_saidas(apps, schema_editor):
+    """Preenche o valor das saídas dos fechamentos já gravados"""
+    MonthlyClosing = apps.get_model('estoque', 'MonthlyClosing')
+    MonthlyClosingItem = apps.get_model('estoque', 'MonthlyClosingItem')
+    StockMovement = apps.get_model('estoque', 'StockMovement')
+
+    valor = ExpressionWrapper(
+        F('quantidade') * F('custo_medio_apos'), output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    for fechamento in MonthlyClosing.objects.all():
+        fim = (fechamento.mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+        valores = dict(
+            StockMovement.objects.filter(
+                tipo='SAIDA', data_movimento__gte=fechamento.mes, data_movimento__lt=fim
+            ).values('produto_id').annotate(valor=Sum(valor)).order_by().values_list('produto_id', 'valor')
+        )
+        itens = list(MonthlyClosingItem.objects.filter(fechamento=fechamento, produto_id__in=valores))
+        for item in itens:
+            item.valor_saidas = Decimal(valores[item.produto_id]).quantize(Decimal('0.01'))
+        MonthlyClosingItem.objects.bulk_update(itens, ['valor_saidas'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0011_monthlyclosing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monthlyclosingitem',
+            name='valor_saidas',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='classe_abc',
+            field=models.CharField(choices=[('A', 'A'), ('B', 'B'), ('C', 'C')], db_index=True, default='C', editable=False, max_length=1, verbose_name='Classe ABC'),
+        ),
+        migrations.RunPython(preencher_valor_saidas, migrations.RunPython.noop),
+    ]
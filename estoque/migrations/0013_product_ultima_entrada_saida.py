@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-19 19:20
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def preencher_ultimas_movimentacoes(apps, schema_editor):
+    """Preenche a última entrada e a última saída de cada produto em um UPDATE por campo"""
+    Product = apps.get_model('estoque', 'Product')
+    StockMovement = apps.get_model('estoque', 'StockMovement')
+
+    for campo, tipo in (('ultima_entrada_em', 'ENTRADA'), ('ultima_saida_em', 'SAIDA')):
+        ultima = StockMovement.objects.filter(
+            produto=OuterRef('pk'), tipo=tipo
+        ).order_by().values('produto').annotate(ultima=Max('created_at')).values('ultima')
+        Product.objects.update(**{campo: Subquery(ultima)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0012_classe_abc_valor_saidas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ultima_entrada_em',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Última Entrada'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='ultima_saida_em',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='Última Saída'),
+        ),
+        migrations.RunPython(preencher_ultimas_movimentacoes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.0.2 on 2026-10-19 20:05
+
+from decimal import Decimal, ROUND_HALF_EVEN
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Window
+from django.db.models.functions import Lag
+
+
+CENTAVO = Decimal('0.01')
+
+
+def preencher_historico_custo(apps, schema_editor):
+    """
+    Monta o histórico a partir do razão: o custo anterior de cada entrada é
+    o custo_medio_apos da movimentação anterior do produto (LAG em ordem de
+    gravação), então não é preciso refazer o custo médio.
+
+    O LAG percorre todas as movimentações do produto (saídas inclusive, que
+    carregam o custo vigente, inclusive o alterado no cadastro entre duas
+    entradas) e só depois as entradas são separadas, como faz
+    registrar_historico_custo. Na primeira movimentação do produto não há
+    linha anterior: o custo de antes sai do próprio razão da entrada.
+    """
+    StockMovement = apps.get_model('estoque', 'StockMovement')
+    ProductCostHistory = apps.get_model('estoque', 'ProductCostHistory')
+
+    movimentacoes = StockMovement.objects.annotate(
+        custo_anterior=Window(Lag('custo_medio_apos'), partition_by=['produto_id'], order_by=['pk']),
+    ).order_by('pk').values_list(
+        'pk', 'tipo', 'produto_id', 'fornecedor_id', 'quantidade', 'custo_unitario',
+        'custo_anterior', 'saldo_apos', 'custo_medio_apos', 'created_at',
+    )
+
+    lote = []
+    for (pk, tipo, produto_id, fornecedor_id, quantidade, custo, anterior,
+         saldo_apos, novo, created_at) in movimentacoes.iterator(chunk_size=5000):
+        if tipo != 'ENTRADA':
+            continue
+        if anterior is None:
+            anterior = _custo_antes_da_primeira(quantidade, custo, saldo_apos, novo)
+        lote.append(ProductCostHistory(
+            produto_id=produto_id,
+            movimentacao_id=pk,
+            fornecedor_id=fornecedor_id,
+            quantidade=quantidade,
+            custo_entrada=custo,
+            custo_anterior=Decimal(anterior).quantize(CENTAVO, rounding=ROUND_HALF_EVEN),
+            custo_novo=novo,
+            created_at=created_at,
+        ))
+        if len(lote) >= 5000:
+            ProductCostHistory.objects.bulk_create(lote)
+            lote = []
+    ProductCostHistory.objects.bulk_create(lote)
+
+
+def _custo_antes_da_primeira(quantidade, custo, saldo_apos, custo_apos):
+    """
+    Custo do produto antes da sua primeira movimentação (uma entrada),
+    invertendo a média ponderada gravada no razão dela
+    """
+    saldo_antes = saldo_apos - quantidade
+    if custo <= 0:
+        # Entrada sem custo não altera o custo médio
+        return custo_apos
+    if saldo_antes <= 0:
+        # Sem estoque antes, o custo anterior não entra na média
+        return Decimal('0.00')
+    return (custo_apos * saldo_apos - quantidade * custo) / saldo_antes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0013_product_ultima_entrada_saida'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCostHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_entrada', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo da Entrada')),
+                ('custo_anterior', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo Médio Anterior')),
+                ('custo_novo', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo Médio Novo')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('fornecedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historico_custos', to='estoque.supplier')),
+                ('movimentacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='historico_custos', to='estoque.stockmovement')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_custos', to='estoque.product')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Custo',
+                'verbose_name_plural': 'Históricos de Custo',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['produto', 'created_at'], name='historico_custo_produto_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_historico_custo, migrations.RunPython.noop),
+    ]
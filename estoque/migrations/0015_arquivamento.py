@@ -0,0 +1,51 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0014_productcosthistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='arquivado',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Arquivado'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='arquivado_em',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Arquivado em'),
+        ),
+        migrations.CreateModel(
+            name='ArchivedStockMovement',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('ano', models.PositiveSmallIntegerField(db_index=True)),
+                ('tipo', models.CharField(choices=[('ENTRADA', 'Entrada'), ('SAIDA', 'Saída')], max_length=7)),
+                ('quantidade', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('custo_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('data_movimento', models.DateField(verbose_name='Data do Movimento')),
+                ('saldo_apos', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Saldo Após')),
+                ('custo_medio_apos', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Custo Médio Após')),
+                ('chave_idempotencia', models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Chave de Idempotência')),
+                ('fornecedor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='estoque.supplier')),
+                ('produto', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimentacoes_arquivadas', to='estoque.product')),
+                ('usuario', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimentação Arquivada',
+                'verbose_name_plural': 'Movimentações Arquivadas',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['produto', 'data_movimento'], name='arquivo_produto_data_idx')],
+            },
+        ),
+    ]
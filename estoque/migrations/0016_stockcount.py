@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-19 16:59
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0015_arquivamento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('ABERTA', 'Aberta'), ('FECHADA', 'Fechada'), ('CANCELADA', 'Cancelada')], default='ABERTA', max_length=10)),
+                ('observacao', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('fechada_em', models.DateTimeField(blank=True, null=True)),
+                ('total_itens', models.PositiveIntegerField(default=0, verbose_name='Produtos no Escopo')),
+                ('total_ajustes', models.PositiveIntegerField(default=0, verbose_name='Ajustes Gerados')),
+                ('categoria', models.ForeignKey(blank=True, help_text='Vazio para contar todos os produtos', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='contagens', to='estoque.category')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='contagens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Contagem de Inventário',
+                'verbose_name_plural': 'Contagens de Inventário',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCountItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade_sistema', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('movimentado', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('quantidade_contada', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('diferenca', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('contagem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='estoque.stockcount')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contagens', to='estoque.product')),
+            ],
+            options={
+                'verbose_name': 'Item de Contagem',
+                'verbose_name_plural': 'Itens de Contagem',
+                'unique_together': {('contagem', 'produto')},
+            },
+        ),
+    ]
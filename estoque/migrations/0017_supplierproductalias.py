@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0016_stockcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SupplierProductAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_fornecedor', models.CharField(max_length=60, verbose_name='Código no Fornecedor')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('fornecedor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codigos_produtos', to='estoque.supplier')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codigos_fornecedores', to='estoque.product')),
+            ],
+            options={
+                'verbose_name': 'Código de Produto no Fornecedor',
+                'verbose_name_plural': 'Códigos de Produtos nos Fornecedores',
+                'unique_together': {('fornecedor', 'codigo_fornecedor')},
+            },
+        ),
+    ]
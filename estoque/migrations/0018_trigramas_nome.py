@@ -0,0 +1,43 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+from estoque.utils.busca_nomes import empacotar, montar_indice
+
+
+def indexar_nomes_existentes(apps, schema_editor):
+    """Monta o índice da busca por nome com os produtos ativos existentes"""
+    Product = apps.get_model('estoque', 'Product')
+    ProductNameTrigram = apps.get_model('estoque', 'ProductNameTrigram')
+
+    listas = montar_indice(Product.objects.filter(arquivado=False).values_list('pk', 'nome'))
+    ProductNameTrigram.objects.bulk_create(
+        [
+            ProductNameTrigram(trigrama=trigrama, produtos=len(ids), ids=empacotar(ids))
+            for trigrama, ids in listas.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0017_supplierproductalias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductNameTrigram',
+            fields=[
+                ('trigrama', models.CharField(max_length=3, primary_key=True, serialize=False)),
+                ('produtos', models.PositiveIntegerField(default=0, help_text='Quantidade de ids na lista')),
+                ('ids', models.BinaryField(default=bytes)),
+            ],
+            options={
+                'verbose_name': 'Trigrama de Nome',
+                'verbose_name_plural': 'Trigramas de Nomes',
+            },
+        ),
+        migrations.RunPython(indexar_nomes_existentes, migrations.RunPython.noop),
+    ]
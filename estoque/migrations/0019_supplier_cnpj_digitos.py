@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:26
+
+from django.db import migrations, models
+
+from estoque.utils.fornecedores import normalizar_cnpj
+
+
+def preencher_cnpj_digitos(apps, schema_editor):
+    """
+    Normaliza o CNPJ dos fornecedores existentes. Se dois cadastros têm o
+    mesmo CNPJ com pontuação diferente, só o mais antigo é encontrado pelo
+    emitente da NF-e.
+    """
+    Supplier = apps.get_model('estoque', 'Supplier')
+
+    vistos = set()
+    alterados = []
+    for fornecedor in Supplier.objects.exclude(cnpj__isnull=True).exclude(cnpj='').order_by('pk'):
+        digitos = normalizar_cnpj(fornecedor.cnpj)
+        if digitos and digitos not in vistos:
+            vistos.add(digitos)
+            fornecedor.cnpj_digitos = digitos
+            alterados.append(fornecedor)
+    Supplier.objects.bulk_update(alterados, ['cnpj_digitos'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0018_trigramas_nome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='cnpj_digitos',
+            field=models.CharField(blank=True, editable=False, help_text='Só os dígitos do CNPJ (busca pelo emitente da NF-e)', max_length=14, null=True, unique=True),
+        ),
+        migrations.RunPython(preencher_cnpj_digitos, migrations.RunPython.noop),
+    ]
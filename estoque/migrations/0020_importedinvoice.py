@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0019_supplier_cnpj_digitos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(blank=True, max_length=44, null=True, unique=True, verbose_name='Chave de Acesso')),
+                ('hash_conteudo', models.CharField(max_length=64, unique=True, verbose_name='SHA-256 do XML')),
+                ('arquivo', models.CharField(help_text='XML comprimido, relativo a MEDIA_ROOT', max_length=120)),
+                ('tamanho', models.PositiveIntegerField(default=0, help_text='Tamanho do XML original em bytes')),
+                ('itens', models.PositiveIntegerField(default=0, help_text='Entradas registradas')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('fornecedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notas_importadas', to='estoque.supplier')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notas_importadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'NF-e Importada',
+                'verbose_name_plural': 'NF-e Importadas',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
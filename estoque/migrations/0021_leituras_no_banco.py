@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-19 17:44
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def criar_versao_indice(apps, schema_editor):
+    """Versão inicial do índice de códigos (leituras de código de barras)"""
+    CacheVersion = apps.get_model('estoque', 'CacheVersion')
+    CacheVersion.objects.get_or_create(nome='indice_codigos')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0020_importedinvoice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('nome', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão de Cache',
+                'verbose_name_plural': 'Versões de Cache',
+            },
+        ),
+        migrations.CreateModel(
+            name='ScanSessionItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leituras', to='estoque.product')),
+                ('sessao', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens', to='estoque.scansession')),
+            ],
+            options={
+                'verbose_name': 'Item de Sessão de Leitura',
+                'verbose_name_plural': 'Itens de Sessão de Leitura',
+                'unique_together': {('sessao', 'produto')},
+            },
+        ),
+        migrations.RunPython(criar_versao_indice, migrations.RunPython.noop),
+    ]
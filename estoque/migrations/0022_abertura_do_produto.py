@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-19 18:07
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+
+CENTAVO = Decimal('0.01')
+
+
+def preencher_abertura(apps, schema_editor):
+    """
+    Abertura dos produtos existentes: o estoque atual menos o efeito de
+    todas as movimentações (inclusive as arquivadas) e, como custo, o custo
+    anterior da primeira entrada do histórico de custo (ou o custo atual,
+    se o custo nunca mudou).
+    """
+    Product = apps.get_model('estoque', 'Product')
+    ProductCostHistory = apps.get_model('estoque', 'ProductCostHistory')
+
+    liquidos = {}
+    for nome in ('StockMovement', 'ArchivedStockMovement'):
+        for produto_id, saldo in apps.get_model('estoque', nome).objects.values('produto_id').annotate(
+            saldo=Sum(Case(
+                When(tipo='ENTRADA', then=F('quantidade')),
+                default=-F('quantidade'),
+            ), output_field=DecimalField())
+        ).order_by().values_list('produto_id', 'saldo'):
+            liquidos[produto_id] = liquidos.get(produto_id, Decimal('0.00')) + saldo
+
+    primeiro_custo = ProductCostHistory.objects.filter(
+        produto=OuterRef('pk')
+    ).order_by('pk').values('custo_anterior')[:1]
+    alterados = []
+    for pk, quantidade, custo in Product.objects.annotate(
+        custo_inicial=Coalesce(Subquery(primeiro_custo), F('custo_unitario'))
+    ).values_list('pk', 'quantidade_estoque', 'custo_inicial').iterator(chunk_size=5000):
+        alterados.append(Product(
+            pk=pk,
+            estoque_abertura=(quantidade - liquidos.get(pk, Decimal('0.00'))).quantize(CENTAVO),
+            custo_abertura=custo,
+        ))
+        if len(alterados) >= 5000:
+            Product.objects.bulk_update(alterados, ['estoque_abertura', 'custo_abertura'])
+            alterados = []
+    Product.objects.bulk_update(alterados, ['estoque_abertura', 'custo_abertura'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('estoque', '0021_leituras_no_banco'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='custo_abertura',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='Custo de Abertura'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='estoque_abertura',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='Estoque de Abertura'),
+        ),
+        migrations.RunPython(preencher_abertura, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,32 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.core.validators import MinValueValidator
 from django.core.cache import cache
+from django.utils import timezone
 from decimal import Decimal
+import hashlib
+import itertools
+import secrets
+
+from .utils.busca_nomes import indexar_nomes
+from .utils.fornecedores import normalizar_cnpj
+from .utils.indice_codigos import invalidar_indice_codigos
+from .utils.status_estoque import CAMPOS_DO_STATUS, calcular_status, recalcular_status
 
 
 class Category(models.Model):
     """Categoria de produtos"""
     nome = models.CharField(max_length=100, unique=True)
     descricao = models.TextField(blank=True, null=True)
+    estoque_critico = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('5.00'),
+        validators=[MinValueValidator(Decimal('0.00'))],
+        verbose_name='Estoque Crítico',
+        help_text='Produtos desta categoria com quantidade igual ou menor ficam em estado crítico'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,11 +38,28 @@ class Category(models.Model):
     def __str__(self):
         return self.nome
 
+    def save(self, *args, **kwargs):
+        """Recalcula o status dos produtos quando o limite crítico muda"""
+        limite_anterior = None
+        if self.pk:
+            limite_anterior = Category.objects.filter(pk=self.pk).values_list(
+                'estoque_critico', flat=True
+            ).first()
+        super().save(*args, **kwargs)
+
+        if limite_anterior is not None and limite_anterior != self.estoque_critico:
+            recalcular_status(Product.objects.filter(categoria=self))
+            cache.delete('dashboard_stats')
+
 
 class Supplier(models.Model):
     """Fornecedor"""
     nome = models.CharField(max_length=200)
     cnpj = models.CharField(max_length=18, blank=True, null=True, unique=True)
+    cnpj_digitos = models.CharField(
+        max_length=14, blank=True, null=True, unique=True, editable=False,
+        help_text='Só os dígitos do CNPJ (busca pelo emitente da NF-e)'
+    )
     telefone = models.CharField(max_length=20, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
     endereco = models.TextField(blank=True, null=True)
@@ -40,6 +74,14 @@ class Supplier(models.Model):
     def __str__(self):
         return self.nome
 
+    def save(self, *args, **kwargs):
+        """Mantém o CNPJ normalizado para a busca por CNPJ"""
+        self.cnpj_digitos = normalizar_cnpj(self.cnpj)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'cnpj' in update_fields and 'cnpj_digitos' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['cnpj_digitos']
+        super().save(*args, **kwargs)
+
 
 class Product(models.Model):
     """Produto do estoque"""
@@ -52,6 +94,20 @@ class Product(models.Model):
         ('PC', 'Peça'),
     ]
 
+    STATUS_OK = 'OK'
+    STATUS_BAIXO = 'BAIXO'
+    STATUS_CRITICO = 'CRITICO'
+    STATUS_CHOICES = [
+        (STATUS_OK, 'OK'),
+        (STATUS_BAIXO, 'Abaixo do mínimo'),
+        (STATUS_CRITICO, 'Crítico'),
+    ]
+    CLASSE_ABC_CHOICES = [
+        ('A', 'A'),
+        ('B', 'B'),
+        ('C', 'C'),
+    ]
+
     codigo = models.CharField(max_length=50, unique=True, verbose_name='Código (SKU)', blank=True, null=True)
     nome = models.CharField(max_length=200)
     categoria = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='produtos')
@@ -78,8 +134,38 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal('0.00'))],
         verbose_name='Custo Unitário'
     )
+    # Saldo e custo de abertura (estoque digitado no cadastro, sem movimentação),
+    # gravados na inclusão: ponto de partida do recálculo e da avaliação (ver utils/razao.py)
+    estoque_abertura = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False,
+        verbose_name='Estoque de Abertura'
+    )
+    custo_abertura = models.DecimalField(
+        max_digits=10, decimal_places=2, default=Decimal('0.00'), editable=False,
+        verbose_name='Custo de Abertura'
+    )
     ncm = models.CharField(max_length=10, blank=True, null=True, verbose_name='NCM')
-    ean = models.CharField(max_length=13, blank=True, null=True, verbose_name='EAN')
+    ean = models.CharField(max_length=13, blank=True, null=True, db_index=True, verbose_name='EAN')
+    # Mantido a cada alteração de estoque (ver utils/status_estoque.py)
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default=STATUS_OK, editable=False,
+        verbose_name='Status do Estoque'
+    )
+    # Última entrada e última saída, mantidas a cada movimentação (ver utils/movimentacoes.py)
+    ultima_entrada_em = models.DateTimeField(
+        null=True, blank=True, editable=False, db_index=True, verbose_name='Última Entrada'
+    )
+    ultima_saida_em = models.DateTimeField(
+        null=True, blank=True, editable=False, db_index=True, verbose_name='Última Saída'
+    )
+    # Curva ABC pelo valor das saídas (ver utils/curva_abc.py)
+    classe_abc = models.CharField(
+        max_length=1, choices=CLASSE_ABC_CHOICES, default='C', editable=False, db_index=True,
+        verbose_name='Classe ABC'
+    )
+    # Exclusão de produto é um arquivamento: o histórico de movimentações é mantido
+    arquivado = models.BooleanField(default=False, editable=False, db_index=True, verbose_name='Arquivado')
+    arquivado_em = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Arquivado em')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -87,6 +173,14 @@ class Product(models.Model):
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
         ordering = ['nome']
+        indexes = [
+            # Índice parcial: só os produtos em alerta (minoria) entram no índice
+            models.Index(
+                fields=['status', 'quantidade_estoque'],
+                name='produto_status_alerta_idx',
+                condition=~models.Q(status='OK'),
+            ),
+        ]
 
     def __str__(self):
         codigo = self.codigo if self.codigo else 'Sem SKU'
@@ -109,8 +203,8 @@ class Product(models.Model):
     
     @property
     def estoque_critico(self):
-        """Verifica se o estoque está crítico (menor ou igual a 5, padrão)"""
-        return self.quantidade_estoque <= 5
+        """Verifica se o estoque está crítico (limite definido na categoria)"""
+        return self.status == self.STATUS_CRITICO
     
     @staticmethod
     def generate_sku():
@@ -141,6 +235,18 @@ class Product(models.Model):
         # Formata com zeros à esquerda (4 dígitos)
         return f"PROD-{next_number:04d}"
     
+    @staticmethod
+    def reservar_skus():
+        """
+        Gerador de SKUs livres consecutivos (PROD-XXXX) a partir do maior já
+        usado, lido uma única vez: importações em lote reservam uma faixa sem
+        uma consulta por produto
+        """
+        codigos = Product.objects.filter(codigo__regex=r'^PROD-[0-9]+$').values_list('codigo', flat=True)
+        maior = max((int(codigo.split('-')[1]) for codigo in codigos), default=0)
+        for numero in itertools.count(maior + 1):
+            yield f"PROD-{numero:04d}"
+    
     def save(self, *args, **kwargs):
         """Gera SKU automaticamente se não for fornecido"""
         # Verifica se o código está vazio ou None
@@ -167,15 +273,74 @@ class Product(models.Model):
                     self.codigo = f"PROD-{int(time.time())}"
                     break
         
+        if self._state.adding:
+            # O estoque digitado no cadastro não tem movimentação: fica como abertura
+            self.estoque_abertura = self.quantidade_estoque
+            self.custo_abertura = self.custo_unitario
+
+        # Gravações parciais que não mexem no estoque nem nos limites (ex.: arquivar) mantêm o status
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & CAMPOS_DO_STATUS:
+            self.status = calcular_status(
+                self.quantidade_estoque, self.estoque_minimo, self.categoria.estoque_critico
+            )
+            if update_fields is not None and 'status' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['status']
+
+        # Nome indexado antes da gravação, para a atualização incremental do índice de nomes
+        reindexar_nome = update_fields is None or bool({'nome', 'arquivado'} & set(update_fields))
+        nome_anterior = self._nome_indexado() if reindexar_nome and not self._state.adding else None
+
         super().save(*args, **kwargs)
         
-        # Invalida o cache do dashboard após salvar/atualizar produto
+        # Invalida o cache do dashboard e o índice de códigos após salvar/atualizar produto
         cache.delete('dashboard_stats')
+        invalidar_indice_codigos()
+        if reindexar_nome:
+            indexar_nomes([(self.pk, nome_anterior, None if self.arquivado else self.nome)])
     
     def delete(self, *args, **kwargs):
         """Invalida cache ao deletar produto"""
         cache.delete('dashboard_stats')
+        indexar_nomes([(self.pk, self._nome_indexado(), None)])
         super().delete(*args, **kwargs)
+        invalidar_indice_codigos()
+
+    def _nome_indexado(self):
+        """Nome gravado no banco, se o produto está no índice de nomes (ativo)"""
+        if self.pk is None:
+            return None
+        return Product.objects.filter(pk=self.pk, arquivado=False).values_list('nome', flat=True).first()
+
+    def arquivar(self):
+        """
+        Tira o produto das listagens, buscas e importações sem apagar o
+        histórico (movimentações, histórico de custo e arquivo continuam).
+        """
+        self.arquivado = True
+        self.arquivado_em = timezone.now()
+        self.save(update_fields=['arquivado', 'arquivado_em'])
+
+    def restaurar(self):
+        """Volta um produto arquivado para o cadastro ativo"""
+        self.arquivado = False
+        self.arquivado_em = None
+        self.save(update_fields=['arquivado', 'arquivado_em'])
+
+
+class ProductNameTrigram(models.Model):
+    """
+    Lista invertida de um trigrama dos nomes dos produtos ativos (índice
+    da busca aproximada, ver utils/busca_nomes.py): os ids dos produtos
+    cujo nome tem o trigrama, ordenados e empacotados.
+    """
+    trigrama = models.CharField(max_length=3, primary_key=True)
+    produtos = models.PositiveIntegerField(default=0, help_text='Quantidade de ids na lista')
+    ids = models.BinaryField(default=bytes)
+
+    class Meta:
+        verbose_name = 'Trigrama de Nome'
+        verbose_name_plural = 'Trigramas de Nomes'
 
 
 class StockMovement(models.Model):
@@ -201,46 +366,207 @@ class StockMovement(models.Model):
     fornecedor = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
     observacao = models.TextField(blank=True, null=True)
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Default em vez de auto_now_add para permitir movimentações retroativas
+    # (dados sintéticos, importações e sincronização de coletores offline)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Dia local (TIME_ZONE) de created_at: filtros por dia viram comparações
+    # diretas no índice em vez de converter o fuso de cada linha
+    data_movimento = models.DateField(editable=False, db_index=True, verbose_name='Data do Movimento')
+    # Razão (ledger): saldo e custo médio do produto logo após aplicar esta
+    # movimentação, gravados na mesma transação do UPDATE de estoque
+    saldo_apos = models.DecimalField(
+        max_digits=10, decimal_places=2, editable=False, verbose_name='Saldo Após'
+    )
+    custo_medio_apos = models.DecimalField(
+        max_digits=10, decimal_places=2, editable=False, verbose_name='Custo Médio Após'
+    )
+    # Chave gerada pelo cliente (coletor offline) para deduplicar reenvios
+    chave_idempotencia = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False,
+        verbose_name='Chave de Idempotência'
+    )
 
     class Meta:
         verbose_name = 'Movimentação de Estoque'
         verbose_name_plural = 'Movimentações de Estoque'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['produto', 'data_movimento'], name='movimentacao_produto_data_idx'),
+        ]
 
     def __str__(self):
         tipo_label = 'Entrada' if self.tipo == 'ENTRADA' else 'Saída'
         return f"{tipo_label} - {self.produto.nome} - {self.quantidade} {self.produto.unidade}"
 
+    def definir_data_movimento(self):
+        """Preenche data_movimento com o dia local de created_at"""
+        if self.data_movimento is None:
+            self.data_movimento = timezone.localdate(self.created_at)
+
     def save(self, *args, **kwargs):
-        """Atualiza o estoque automaticamente ao salvar a movimentação"""
-        super().save(*args, **kwargs)
-        
-        # Atualiza quantidade em estoque
-        if self.tipo == 'ENTRADA':
-            self.produto.quantidade_estoque += self.quantidade
-        else:  # SAIDA
-            self.produto.quantidade_estoque -= self.quantidade
-        
-        # Atualiza custo unitário se for entrada e tiver custo informado
-        if self.tipo == 'ENTRADA' and self.custo_unitario > 0:
-            # Calcula média ponderada do custo
-            total_atual = self.produto.quantidade_estoque - self.quantidade
-            custo_atual = self.produto.custo_unitario
-            if total_atual > 0:
-                novo_custo = (
-                    (total_atual * custo_atual) + (self.quantidade * self.custo_unitario)
-                ) / self.produto.quantidade_estoque
-            else:
-                novo_custo = self.custo_unitario
-            self.produto.custo_unitario = novo_custo
-        
-        self.produto.save()
-        
+        """Atualiza o estoque automaticamente ao registrar a movimentação"""
+        if not self._state.adding:
+            # Edição de uma movimentação já registrada não reaplica o efeito no estoque
+            super().save(*args, **kwargs)
+            return
+
+        from .utils.avaliacao import invalidar_snapshots
+        from .utils.fechamento import verificar_periodo_aberto
+        from .utils.movimentacoes import aplicar_no_estoque, registrar_historico_custo
+
+        self.definir_data_movimento()
+        verificar_periodo_aberto([self.data_movimento])
+
+        # UPDATE condicional + insert na mesma transação: uma saída sem estoque
+        # suficiente levanta EstoqueInsuficienteError e nada é gravado
+        with transaction.atomic():
+            estado = aplicar_no_estoque([self])
+            super().save(*args, **kwargs)
+            registrar_historico_custo([self])
+            # Snapshots a partir do dia da movimentação deixam de valer
+            invalidar_snapshots(self.data_movimento)
+
+        # Mantém a instância do produto em memória sincronizada com o banco
+        if self._meta.get_field('produto').is_cached(self):
+            (self.produto.quantidade_estoque, self.produto.custo_unitario, self.produto.status,
+             self.produto.ultima_entrada_em, self.produto.ultima_saida_em) = estado[self.produto_id]
+
         # Invalida o cache do dashboard após movimentação
         cache.delete('dashboard_stats')
 
 
+class ArchivedStockMovement(models.Model):
+    """
+    Movimentação de um período fechado, movida de StockMovement pelo
+    arquivamento (ver utils/arquivamento.py). Mantém o id original.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    # Ano do movimento: o arquivo é lido e mantido por ano
+    ano = models.PositiveSmallIntegerField(db_index=True)
+    tipo = models.CharField(max_length=7, choices=StockMovement.MOVEMENT_TYPE_CHOICES)
+    # Sem constraints: o arquivo não trava exclusões de cadastros
+    produto = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='movimentacoes_arquivadas'
+    )
+    quantidade = models.DecimalField(max_digits=10, decimal_places=2)
+    custo_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+    fornecedor = models.ForeignKey(
+        Supplier, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    observacao = models.TextField(blank=True, null=True)
+    usuario = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+'
+    )
+    created_at = models.DateTimeField()
+    data_movimento = models.DateField(verbose_name='Data do Movimento')
+    saldo_apos = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Saldo Após')
+    custo_medio_apos = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Custo Médio Após')
+    chave_idempotencia = models.CharField(
+        max_length=64, null=True, blank=True, db_index=True, verbose_name='Chave de Idempotência'
+    )
+
+    class Meta:
+        verbose_name = 'Movimentação Arquivada'
+        verbose_name_plural = 'Movimentações Arquivadas'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['produto', 'data_movimento'], name='arquivo_produto_data_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} arquivada - {self.produto_id} - {self.quantidade}"
+
+
+class SupplierProductAlias(models.Model):
+    """
+    Código do produto no cadastro do fornecedor (cProd da NF-e).
+
+    Aprendido a cada entrada por XML confirmada com fornecedor; nas notas
+    seguintes do mesmo fornecedor o item é resolvido por aqui antes de
+    código, EAN e NCM.
+    """
+    fornecedor = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='codigos_produtos')
+    codigo_fornecedor = models.CharField(max_length=60, verbose_name='Código no Fornecedor')
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='codigos_fornecedores')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Código de Produto no Fornecedor'
+        verbose_name_plural = 'Códigos de Produtos nos Fornecedores'
+        unique_together = [('fornecedor', 'codigo_fornecedor')]
+
+    def __str__(self):
+        return f"{self.fornecedor} - {self.codigo_fornecedor} -> {self.produto_id}"
+
+
+class ImportedInvoice(models.Model):
+    """
+    NF-e importada pela entrada por XML.
+
+    A chave de acesso e o hash do XML têm índice único: a mesma nota não
+    entra duas vezes no estoque. O XML original fica comprimido no arquivo
+    (utils/arquivo_nfe.py) e pode ser relido para auditoria.
+    """
+    chave = models.CharField(max_length=44, unique=True, blank=True, null=True, verbose_name='Chave de Acesso')
+    hash_conteudo = models.CharField(max_length=64, unique=True, verbose_name='SHA-256 do XML')
+    arquivo = models.CharField(max_length=120, help_text='XML comprimido, relativo a MEDIA_ROOT')
+    tamanho = models.PositiveIntegerField(default=0, help_text='Tamanho do XML original em bytes')
+    fornecedor = models.ForeignKey(
+        Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='notas_importadas'
+    )
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='notas_importadas')
+    itens = models.PositiveIntegerField(default=0, help_text='Entradas registradas')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'NF-e Importada'
+        verbose_name_plural = 'NF-e Importadas'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.chave or self.hash_conteudo[:12]
+
+
+class ProductCostHistory(models.Model):
+    """Histórico do custo médio de um produto (somente inclusão)"""
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='historico_custos')
+    # Entrada que alterou o custo (fica nula se a movimentação for removida)
+    movimentacao = models.ForeignKey(
+        StockMovement, on_delete=models.SET_NULL, null=True, blank=True, related_name='historico_custos'
+    )
+    # Copiados da entrada para comparar preços sem ler as movimentações
+    fornecedor = models.ForeignKey(
+        Supplier, on_delete=models.SET_NULL, null=True, blank=True, related_name='historico_custos'
+    )
+    quantidade = models.DecimalField(max_digits=10, decimal_places=2)
+    custo_entrada = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Custo da Entrada')
+    custo_anterior = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Custo Médio Anterior')
+    custo_novo = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Custo Médio Novo')
+    # Instante da entrada (não da gravação do histórico)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        verbose_name = 'Histórico de Custo'
+        verbose_name_plural = 'Históricos de Custo'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['produto', 'created_at'], name='historico_custo_produto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produto_id}: {self.custo_anterior} -> {self.custo_novo}"
+
+    def save(self, *args, **kwargs):
+        """O histórico só recebe inclusões"""
+        if not self._state.adding:
+            raise ValueError('O histórico de custo não pode ser alterado.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('O histórico de custo não pode ser alterado.')
+
+
 class WhatsAppOrder(models.Model):
     """Pedido gerado para WhatsApp"""
     usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='pedidos_whatsapp')
@@ -266,3 +592,336 @@ class WhatsAppOrder(models.Model):
 
     def __str__(self):
         return f"Pedido - R$ {self.valor_total} - {self.created_at.strftime('%d/%m/%Y %H:%M')}"
+
+
+class ScanSession(models.Model):
+    """
+    Sessão de leitura de código de barras (coletor de dados).
+
+    As leituras ficam acumuladas por produto em ScanSessionItem (no banco,
+    visíveis para todos os workers) e são gravadas como um único lote de
+    movimentações ao confirmar a sessão.
+    """
+    STATUS_CHOICES = [
+        ('ABERTA', 'Aberta'),
+        ('CONFIRMADA', 'Confirmada'),
+        ('CANCELADA', 'Cancelada'),
+    ]
+
+    tipo = models.CharField(max_length=7, choices=StockMovement.MOVEMENT_TYPE_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ABERTA')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessoes_leitura')
+    observacao = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    confirmada_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Sessão de Leitura'
+        verbose_name_plural = 'Sessões de Leitura'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Sessão #{self.pk} - {self.get_tipo_display()} ({self.get_status_display()})"
+
+    def obter_itens(self):
+        """Retorna as leituras acumuladas: dicionário produto_id -> quantidade"""
+        return dict(self.itens.values_list('produto_id', 'quantidade'))
+
+    def adicionar_leituras(self, leituras):
+        """
+        Acumula leituras na sessão.
+
+        Args:
+            leituras: lista de pares (produto_id, quantidade)
+
+        Returns:
+            Dicionário produto_id -> quantidade acumulada
+
+        Raises:
+            ValueError: se a sessão não está aberta
+        """
+        somas = {}
+        for produto_id, quantidade in leituras:
+            somas[produto_id] = somas.get(produto_id, Decimal('0')) + quantidade
+
+        with transaction.atomic():
+            # Trava a sessão: uma confirmação simultânea espera as leituras deste lote
+            if not ScanSession.objects.select_for_update().filter(pk=self.pk, status='ABERTA').exists():
+                raise ValueError('A sessão não está aberta.')
+            if somas:
+                # Cria zerados os itens novos: daí em diante é tudo UPDATE (somas concorrentes não se perdem)
+                ScanSessionItem.objects.bulk_create(
+                    [ScanSessionItem(sessao=self, produto_id=produto_id) for produto_id in somas],
+                    ignore_conflicts=True,
+                )
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.executemany(
+                        f'UPDATE {quote(ScanSessionItem._meta.db_table)} '
+                        f'SET {quote("quantidade")} = {quote("quantidade")} + %s '
+                        f'WHERE {quote("sessao_id")} = %s AND {quote("produto_id")} = %s',
+                        [(quantidade, self.pk, produto_id) for produto_id, quantidade in somas.items()],
+                    )
+            return self.obter_itens()
+
+    def confirmar(self):
+        """
+        Grava as leituras como um lote de movimentações (uma por produto).
+
+        Raises:
+            ValueError: se a sessão não está aberta ou não tem leituras
+            EstoqueInsuficienteError: se alguma saída não tem estoque suficiente
+        """
+        from .utils.movimentacoes import registrar_movimentacoes
+
+        agora = timezone.now()
+        with transaction.atomic():
+            # Transição condicional: duas confirmações simultâneas não gravam o lote duas vezes
+            if not ScanSession.objects.filter(pk=self.pk, status='ABERTA').update(
+                status='CONFIRMADA', confirmada_em=agora
+            ):
+                raise ValueError('A sessão não está aberta.')
+            # Lidas depois da transição: leituras em andamento já foram gravadas
+            itens = self.obter_itens()
+            if not itens:
+                raise ValueError('A sessão não possui leituras.')
+
+            movimentacoes = [
+                StockMovement(
+                    tipo=self.tipo,
+                    produto_id=produto_id,
+                    quantidade=quantidade,
+                    usuario=self.usuario,
+                    observacao=f'Sessão de leitura #{self.pk}',
+                )
+                for produto_id, quantidade in sorted(itens.items())
+            ]
+            registrar_movimentacoes(movimentacoes)
+
+        self.status = 'CONFIRMADA'
+        self.confirmada_em = agora
+        return movimentacoes
+
+    def cancelar(self):
+        """Descarta as leituras da sessão"""
+        with transaction.atomic():
+            if ScanSession.objects.filter(pk=self.pk, status='ABERTA').update(status='CANCELADA'):
+                self.itens.all().delete()
+        self.status = 'CANCELADA'
+
+
+class ScanSessionItem(models.Model):
+    """Quantidade acumulada de um produto em uma sessão de leitura"""
+    sessao = models.ForeignKey(ScanSession, on_delete=models.CASCADE, related_name='itens')
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='leituras')
+    quantidade = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name = 'Item de Sessão de Leitura'
+        verbose_name_plural = 'Itens de Sessão de Leitura'
+        unique_together = [('sessao', 'produto')]
+
+    def __str__(self):
+        return f"{self.sessao} - {self.produto_id}: {self.quantidade}"
+
+
+class StockCount(models.Model):
+    """
+    Contagem de inventário (geral ou de uma categoria).
+
+    Ao abrir, o saldo de cada produto do escopo é copiado para os itens;
+    no fechamento, a diferença entre o contado e esse saldo vira uma
+    movimentação de ajuste aplicada sobre o estoque atual, preservando as
+    movimentações feitas durante a contagem.
+    """
+    STATUS_CHOICES = [
+        ('ABERTA', 'Aberta'),
+        ('FECHADA', 'Fechada'),
+        ('CANCELADA', 'Cancelada'),
+    ]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ABERTA')
+    categoria = models.ForeignKey(
+        Category, on_delete=models.PROTECT, null=True, blank=True, related_name='contagens',
+        help_text='Vazio para contar todos os produtos'
+    )
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='contagens')
+    observacao = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    fechada_em = models.DateTimeField(null=True, blank=True)
+    total_itens = models.PositiveIntegerField(default=0, verbose_name='Produtos no Escopo')
+    total_ajustes = models.PositiveIntegerField(default=0, verbose_name='Ajustes Gerados')
+
+    class Meta:
+        verbose_name = 'Contagem de Inventário'
+        verbose_name_plural = 'Contagens de Inventário'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Contagem #{self.pk} ({self.get_status_display()})"
+
+
+class StockCountItem(models.Model):
+    """Saldo na abertura e quantidade contada de um produto em uma contagem"""
+    contagem = models.ForeignKey(StockCount, on_delete=models.CASCADE, related_name='itens')
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='contagens')
+    quantidade_sistema = models.DecimalField(max_digits=10, decimal_places=2)
+    # Quanto o estoque andou entre a abertura e a leitura do produto
+    movimentado = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    # Vazio até a primeira leitura do produto
+    quantidade_contada = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Gravada no fechamento (contada - sistema - movimentado)
+    diferenca = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Item de Contagem'
+        verbose_name_plural = 'Itens de Contagem'
+        unique_together = [('contagem', 'produto')]
+
+    def __str__(self):
+        return f"{self.contagem} - {self.produto_id}: {self.quantidade_contada}"
+
+
+class ApiToken(models.Model):
+    """
+    Token de acesso às APIs de sincronização (coletores de dados).
+    Apenas o hash SHA-256 do token é armazenado.
+    """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tokens_api')
+    nome = models.CharField(max_length=100, verbose_name='Dispositivo')
+    chave_hash = models.CharField(max_length=64, unique=True, editable=False)
+    ativo = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ultimo_uso = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = 'Token de API'
+        verbose_name_plural = 'Tokens de API'
+        ordering = ['nome']
+
+    def __str__(self):
+        return f"{self.nome} ({self.usuario.username})"
+
+    @staticmethod
+    def calcular_hash(chave):
+        return hashlib.sha256(chave.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def criar(cls, usuario, nome):
+        """
+        Cria um token e retorna (token, chave). A chave em texto só está
+        disponível neste momento.
+        """
+        chave = secrets.token_urlsafe(32)
+        token = cls.objects.create(usuario=usuario, nome=nome, chave_hash=cls.calcular_hash(chave))
+        return token, chave
+
+
+class CacheVersion(models.Model):
+    """
+    Versão de um cache mantido em memória em cada processo (ex.: índice de
+    códigos). Quem altera os dados incrementa a versão; cada worker compara
+    com a versão com que montou o seu cache.
+    """
+    nome = models.CharField(max_length=50, primary_key=True)
+    versao = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão de Cache'
+        verbose_name_plural = 'Versões de Cache'
+
+    def __str__(self):
+        return f"{self.nome} v{self.versao}"
+
+
+class StockSnapshot(models.Model):
+    """Posição do estoque ao final de um dia (base para avaliações em data passada)"""
+    data = models.DateField(unique=True, verbose_name='Data')
+    total_produtos = models.PositiveIntegerField(default=0, verbose_name='Produtos com Saldo')
+    valor_total = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name='Valor Total'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Snapshot de Estoque'
+        verbose_name_plural = 'Snapshots de Estoque'
+        ordering = ['-data']
+
+    def __str__(self):
+        return f"Snapshot {self.data.strftime('%d/%m/%Y')}"
+
+
+class StockSnapshotItem(models.Model):
+    """Saldo e custo médio de um produto em um snapshot"""
+    snapshot = models.ForeignKey(StockSnapshot, on_delete=models.CASCADE, related_name='itens')
+    produto = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    quantidade = models.DecimalField(max_digits=10, decimal_places=2)
+    custo_medio = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Item de Snapshot'
+        verbose_name_plural = 'Itens de Snapshot'
+        unique_together = [('snapshot', 'produto')]
+
+    def __str__(self):
+        return f"{self.snapshot} - {self.produto_id}: {self.quantidade}"
+
+
+class MonthlyClosing(models.Model):
+    """Fechamento mensal do estoque (imutável depois de gravado)"""
+    mes = models.DateField(unique=True, verbose_name='Mês', help_text='Primeiro dia do mês fechado')
+    total_entradas = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    total_saidas = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    valor_final = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal('0.00'), verbose_name='Valor Final'
+    )
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='fechamentos'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Fechamento Mensal'
+        verbose_name_plural = 'Fechamentos Mensais'
+        ordering = ['-mes']
+
+    def __str__(self):
+        return f"Fechamento {self.mes.strftime('%m/%Y')}"
+
+    def save(self, *args, **kwargs):
+        """Fechamentos só podem ser criados, nunca alterados"""
+        if not self._state.adding:
+            raise ValueError('Fechamentos mensais são imutáveis.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Fechamentos mensais são imutáveis.')
+
+
+class MonthlyClosingItem(models.Model):
+    """Posição de um produto em um fechamento mensal"""
+    fechamento = models.ForeignKey(MonthlyClosing, on_delete=models.CASCADE, related_name='itens')
+    # O nome é copiado para que o fechamento continue legível se o produto for removido
+    produto = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, related_name='fechamentos'
+    )
+    produto_nome = models.CharField(max_length=200)
+    saldo_inicial = models.DecimalField(max_digits=10, decimal_places=2)
+    entradas = models.DecimalField(max_digits=10, decimal_places=2)
+    saidas = models.DecimalField(max_digits=10, decimal_places=2)
+    # Saídas a custo médio (custo_medio_apos de cada saída), base da curva ABC
+    valor_saidas = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    saldo_final = models.DecimalField(max_digits=10, decimal_places=2)
+    custo_medio_final = models.DecimalField(max_digits=10, decimal_places=2)
+    valor_final = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        verbose_name = 'Item de Fechamento'
+        verbose_name_plural = 'Itens de Fechamento'
+
+    def __str__(self):
+        return f"{self.fechamento} - {self.produto_nome}"
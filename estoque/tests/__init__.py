@@ -5,3 +5,4 @@ from .test_models import *
 from .test_forms import *
 from .test_views import *
 from .test_integration import *
+from .test_commands import *
@@ -0,0 +1,474 @@
+"""
+Testes para os comandos de gerenciamento do app estoque
+"""
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from estoque.models import Category, Supplier, Product, StockMovement
+from estoque.utils.dados_sinteticos import gerar_nfe_xml
+from estoque.utils.razao import verificar_razao
+from estoque.utils.xml_parser import parse_nfe_xml
+
+
+class SeedBenchCommandTest(TestCase):
+    """Testes para o comando seed_bench"""
+
+    def test_seed_bench_gera_volumes(self):
+        """Testa que o comando cria as quantidades pedidas"""
+        call_command(
+            'seed_bench', categorias=3, fornecedores=4, produtos=25,
+            movimentacoes=400, seed=7, stdout=StringIO()
+        )
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Supplier.objects.count(), 4)
+        self.assertEqual(Product.objects.count(), 25)
+        self.assertEqual(StockMovement.objects.count(), 400)
+
+    def test_seed_bench_estoque_consistente(self):
+        """Testa que o estoque de cada produto é a soma das suas movimentações"""
+        call_command('seed_bench', produtos=15, movimentacoes=300, seed=3, stdout=StringIO())
+
+        for produto in Product.objects.all():
+            entradas = produto.movimentacoes.filter(tipo='ENTRADA').aggregate(
+                total=Sum('quantidade'))['total'] or Decimal('0.00')
+            saidas = produto.movimentacoes.filter(tipo='SAIDA').aggregate(
+                total=Sum('quantidade'))['total'] or Decimal('0.00')
+            self.assertEqual(produto.quantidade_estoque, entradas - saidas)
+            self.assertGreaterEqual(produto.quantidade_estoque, 0)
+
+        # O razão gerado confere com o custo médio e o estoque finais
+        self.assertEqual(verificar_razao()['total_divergencias'], 0)
+
+    def test_seed_bench_deterministico(self):
+        """Testa que a mesma semente gera os mesmos dados"""
+        call_command('seed_bench', produtos=10, movimentacoes=100, seed=11, limpar=True, stdout=StringIO())
+        primeiro = list(StockMovement.objects.order_by('created_at').values_list('tipo', 'quantidade'))
+
+        call_command('seed_bench', produtos=10, movimentacoes=100, seed=11, limpar=True, stdout=StringIO())
+        segundo = list(StockMovement.objects.order_by('created_at').values_list('tipo', 'quantidade'))
+
+        self.assertEqual(primeiro, segundo)
+
+    def test_nfe_sintetica_parseavel(self):
+        """Testa que o XML de NF-e sintético é lido pelo parser"""
+        produtos = parse_nfe_xml(BytesIO(gerar_nfe_xml(itens=12, seed=1)))
+        self.assertEqual(len(produtos), 12)
+
+
+class BenchCommandTest(TestCase):
+    """Testes para o comando bench"""
+
+    def test_bench_gera_relatorio_json(self):
+        """Testa que o benchmark cobre todas as views e gera JSON válido"""
+        from estoque import urls as estoque_urls
+
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'bench.json')
+            call_command(
+                'bench', escalas='150', produtos=10, categorias=2, fornecedores=2,
+                repeticoes=1, banco_atual=True, saida=caminho,
+                stdout=StringIO(), stderr=StringIO()
+            )
+            with open(caminho, encoding='utf-8') as arquivo:
+                relatorio = json.load(arquivo)
+
+        self.assertEqual(len(relatorio['escalas']), 1)
+        casos = {caso['caso'] for caso in relatorio['escalas'][0]['casos']}
+        for padrao in estoque_urls.urlpatterns:
+            self.assertIn(f'view:{padrao.name}', casos)
+        self.assertIn('xlsx:produtos', casos)
+        self.assertIn('nfe:parse_100_itens', casos)
+
+    def test_bench_falha_com_rota_sem_url(self):
+        """Testa que uma rota com parâmetro desconhecido não é omitida em silêncio"""
+        from unittest.mock import patch
+        from django.urls import path
+        from estoque import urls as estoque_urls
+
+        rotas = estoque_urls.urlpatterns + [path('lotes/<int:lote_id>/', lambda request, lote_id: None, name='lote_detalhar')]
+        with patch.object(estoque_urls, 'urlpatterns', rotas):
+            with self.assertRaisesMessage(CommandError, 'lote_detalhar'):
+                call_command(
+                    'bench', escalas='50', produtos=5, categorias=1, fornecedores=1,
+                    repeticoes=1, banco_atual=True, saida='-', stdout=StringIO(), stderr=StringIO()
+                )
+
+
+class RecalcularStatusCommandTest(TestCase):
+    """Testes para o comando recalcular_status"""
+
+    def test_recalcula_status(self):
+        categoria = Category.objects.create(nome='Teste')
+        produto = Product.objects.create(nome='Produto', categoria=categoria, quantidade_estoque=Decimal('50.00'))
+        Product.objects.filter(pk=produto.pk).update(quantidade_estoque=Decimal('1.00'))
+
+        saida = StringIO()
+        call_command('recalcular_status', stdout=saida)
+
+        self.assertIn('1 produto(s) com status alterado', saida.getvalue())
+        self.assertEqual(Product.objects.get(pk=produto.pk).status, 'CRITICO')
+
+
+class VerificarRazaoCommandTest(TestCase):
+    """Testes para o comando verificar_razao"""
+
+    def test_relata_divergencias(self):
+        categoria = Category.objects.create(nome='Teste')
+        produto = Product.objects.create(nome='Produto', categoria=categoria, quantidade_estoque=Decimal('10.00'))
+        StockMovement.objects.create(tipo='SAIDA', produto=produto, quantidade=Decimal('1.00'))
+
+        saida = StringIO()
+        call_command('verificar_razao', stdout=saida)
+        self.assertIn('Nenhuma divergência', saida.getvalue())
+
+        Product.objects.filter(pk=produto.pk).update(quantidade_estoque=Decimal('8.00'))
+        saida = StringIO()
+        call_command('verificar_razao', '--produto', str(produto.pk), stdout=saida)
+        self.assertIn('1 divergência(s)', saida.getvalue())
+        self.assertIn('quantidade_estoque esperado 9.00, gravado 8.00', saida.getvalue())
+
+
+
+class FecharMesCommandTest(TestCase):
+    """Testes para o comando fechar_mes"""
+
+    def test_fecha_meses_pendentes(self):
+        from datetime import datetime, timezone as dt_timezone
+        from estoque.models import MonthlyClosing
+
+        categoria = Category.objects.create(nome='Teste')
+        produto = Product.objects.create(nome='Produto', categoria=categoria)
+        for mes in (1, 3):
+            StockMovement.objects.create(
+                tipo='ENTRADA', produto=produto, quantidade=Decimal('5.00'), custo_unitario=Decimal('2.00'),
+                created_at=datetime(2025, mes, 10, 15, 0, tzinfo=dt_timezone.utc)
+            )
+
+        call_command('fechar_mes', '--mes', '2025-01', stdout=StringIO())
+        self.assertEqual(MonthlyClosing.objects.get().valor_final, Decimal('10.00'))
+
+        saida = StringIO()
+        call_command('fechar_mes', stdout=saida)
+        self.assertIn('02/2025', saida.getvalue())
+        self.assertEqual(MonthlyClosing.objects.get(mes='2025-03-01').valor_final, Decimal('20.00'))
+
+
+class ReconciliarEstoqueCommandTest(TestCase):
+    """Testes para o comando reconciliar_estoque"""
+
+    def setUp(self):
+        categoria = Category.objects.create(nome='Teste')
+        # O estoque digitado no cadastro é a abertura: não diverge
+        Product.objects.create(nome='Com abertura', categoria=categoria, quantidade_estoque=Decimal('4.00'))
+        # Edições diretas do saldo, sem movimentação
+        self.sem_historico = Product.objects.create(nome='Sem histórico', categoria=categoria)
+        Product.objects.filter(pk=self.sem_historico.pk).update(quantidade_estoque=Decimal('10.00'))
+        self.editado = Product.objects.create(nome='Editado', categoria=categoria)
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.editado, quantidade=Decimal('8.00'), custo_unitario=Decimal('5.00')
+        )
+        Product.objects.filter(pk=self.editado.pk).update(quantidade_estoque=Decimal('6.00'))
+        self.ok = Product.objects.create(nome='Ok', categoria=categoria)
+        StockMovement.objects.create(tipo='ENTRADA', produto=self.ok, quantidade=Decimal('3.00'))
+
+    def test_relatorio_e_correcao(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'divergencias.csv')
+            saida = StringIO()
+            call_command('reconciliar_estoque', '--lote', '2', '--relatorio', caminho, stdout=saida)
+            with open(caminho, encoding='utf-8') as arquivo:
+                linhas = arquivo.read().splitlines()
+
+        self.assertIn('4 produto(s) conferido(s)', saida.getvalue())
+        self.assertIn('2 produto(s) divergente(s), diferença total 8.00', saida.getvalue())
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[2], f'{self.editado.pk},{self.editado.codigo},Editado,6.00,8.00,-2.00')
+        self.assertFalse(StockMovement.objects.filter(observacao__startswith='Ajuste').exists())
+
+        call_command('reconciliar_estoque', '--corrigir', stdout=StringIO())
+        ajuste = StockMovement.objects.get(produto=self.editado, observacao__startswith='Ajuste')
+        self.assertEqual((ajuste.tipo, ajuste.quantidade, ajuste.saldo_apos), ('SAIDA', Decimal('2.00'), Decimal('6.00')))
+        self.editado.refresh_from_db()
+        self.assertEqual(self.editado.quantidade_estoque, Decimal('6.00'))
+
+        saida = StringIO()
+        call_command('reconciliar_estoque', stdout=saida)
+        self.assertIn('Nenhuma divergência', saida.getvalue())
+        self.assertEqual(verificar_razao()['total_divergencias'], 0)
+
+
+class RecalcularCustosCommandTest(TestCase):
+    """Testes para o comando recalcular_custos"""
+
+    def setUp(self):
+        categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(
+            nome='Produto', categoria=categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('10.00')
+        )
+        self.outro = Product.objects.create(nome='Outro', categoria=categoria)
+        self.entrada = StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('10.00'), custo_unitario=Decimal('20.00')
+        )
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('5.00'))
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('5.00'), custo_unitario=Decimal('30.00')
+        )
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.outro, quantidade=Decimal('3.00'), custo_unitario=Decimal('7.00')
+        )
+
+    def test_recalcula_apos_correcao(self):
+        """Testa que corrigir movimentações já gravadas propaga para as linhas seguintes e o produto"""
+        from estoque.utils.recalculo import recalcular_custos
+
+        self.assertEqual(recalcular_custos()['movimentacoes_corrigidas'], 0)
+
+        # Correções diretas (admin) não reaplicam o efeito: o razão fica divergente
+        StockMovement.objects.filter(tipo='SAIDA').update(quantidade=Decimal('6.00'))
+        StockMovement.objects.filter(custo_unitario=Decimal('30.00')).update(custo_unitario=Decimal('40.00'))
+        self.assertGreater(verificar_razao()['total_divergencias'], 0)
+
+        saida = StringIO()
+        call_command('recalcular_custos', '--lote', '1', stdout=saida)
+        self.assertIn('4 movimentação(ões) de 2 produto(s)', saida.getvalue())
+        self.assertIn('2 linha(s) do razão e 1 produto(s) corrigido(s)', saida.getvalue())
+        self.assertEqual(verificar_razao()['total_divergencias'], 0)
+
+        # Abertura 10 a 10,00; +10 a 20,00 = 20 a 15,00; -6; +5 a 40,00
+        self.assertEqual(
+            list(self.produto.movimentacoes.order_by('pk').values_list('saldo_apos', 'custo_medio_apos')),
+            [(Decimal('20.00'), Decimal('15.00')), (Decimal('14.00'), Decimal('15.00')),
+             (Decimal('19.00'), Decimal('21.58'))]
+        )
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, Decimal('19.00'))
+        self.assertEqual(self.produto.custo_unitario, Decimal('21.58'))
+
+    def test_recalcula_estoque_a_partir_da_abertura(self):
+        """Testa que uma quantidade corrigida chega ao estoque do produto, a partir da abertura do cadastro"""
+        from estoque.utils.recalculo import recalcular_custos
+
+        produto = Product.objects.create(nome='Corrigido', categoria=self.produto.categoria)
+        entrada = StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('10.00'), custo_unitario=Decimal('4.00')
+        )
+        StockMovement.objects.filter(pk=entrada.pk).update(quantidade=Decimal('8.00'))
+        StockMovement.objects.create(tipo='SAIDA', produto=produto, quantidade=Decimal('3.00'))
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_estoque, Decimal('7.00'))
+
+        recalcular_custos(Product.objects.filter(pk=produto.pk))
+
+        produto.refresh_from_db()
+        self.assertEqual(produto.quantidade_estoque, Decimal('5.00'))
+        self.assertEqual(
+            list(produto.movimentacoes.order_by('pk').values_list('saldo_apos', flat=True)),
+            [Decimal('8.00'), Decimal('5.00')]
+        )
+        self.assertEqual(verificar_razao(Product.objects.filter(pk=produto.pk))['total_divergencias'], 0)
+
+    def test_recalcula_correcao_da_primeira_entrada(self):
+        """Testa que a primeira movimentação também é recalculada, a partir do saldo de abertura"""
+        from estoque.utils.recalculo import recalcular_custos
+
+        StockMovement.objects.filter(pk=self.entrada.pk).update(custo_unitario=Decimal('30.00'))
+        self.assertEqual(recalcular_custos()['movimentacoes_corrigidas'], 3)
+
+        # Abertura 10 a 10,00; +10 a 30,00 = 20 a 20,00; -5; +5 a 30,00
+        self.assertEqual(
+            list(self.produto.movimentacoes.order_by('pk').values_list('saldo_apos', 'custo_medio_apos')),
+            [(Decimal('20.00'), Decimal('20.00')), (Decimal('15.00'), Decimal('20.00')),
+             (Decimal('20.00'), Decimal('22.50'))]
+        )
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.custo_unitario, Decimal('22.50'))
+        self.assertEqual(verificar_razao()['total_divergencias'], 0)
+
+    def test_recalcula_na_ordem_das_datas(self):
+        """Testa que uma entrada retroativa entra no razão na posição da sua data"""
+        from estoque.utils.recalculo import recalcular_custos
+
+        agora = timezone.now()
+        produto = Product.objects.create(nome='Retroativo', categoria=self.produto.categoria)
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('10.00'), custo_unitario=Decimal('10.00'),
+            created_at=agora - timedelta(days=2)
+        )
+        StockMovement.objects.create(
+            tipo='SAIDA', produto=produto, quantidade=Decimal('5.00'), created_at=agora - timedelta(hours=1)
+        )
+        # Sincronizada depois, com a data de antes da saída
+        retroativa = StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('10.00'), custo_unitario=Decimal('40.00'),
+            created_at=agora - timedelta(days=1)
+        )
+        retroativa.refresh_from_db()
+        self.assertEqual(retroativa.custo_medio_apos, Decimal('30.00'))
+
+        recalcular_custos(Product.objects.filter(pk=produto.pk))
+
+        # 10 a 10,00; +10 a 40,00 = 20 a 25,00; -5
+        self.assertEqual(
+            list(produto.movimentacoes.order_by('created_at').values_list('saldo_apos', 'custo_medio_apos')),
+            [(Decimal('10.00'), Decimal('10.00')), (Decimal('20.00'), Decimal('25.00')),
+             (Decimal('15.00'), Decimal('25.00'))]
+        )
+        produto.refresh_from_db()
+        self.assertEqual((produto.quantidade_estoque, produto.custo_unitario), (Decimal('15.00'), Decimal('25.00')))
+        self.assertEqual(verificar_razao(Product.objects.filter(pk=produto.pk))['total_divergencias'], 0)
+
+    def test_descarta_faixa_movimentada_durante_o_calculo(self):
+        """Testa que uma faixa com movimentações posteriores ao cálculo não é gravada"""
+        from estoque.utils.recalculo import _gravar_faixa, _recalcular_faixa
+
+        StockMovement.objects.filter(tipo='SAIDA').update(quantidade=Decimal('6.00'))
+        calculo = _recalcular_faixa(Product.objects.all(), (self.produto.pk, self.produto.pk), 100)
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('1.00'))
+
+        self.assertTrue(_gravar_faixa(calculo, 100)['descartada'])
+        self.assertEqual(
+            self.produto.movimentacoes.order_by('pk').values_list('saldo_apos', flat=True)[1], Decimal('15.00')
+        )
+
+
+class ImportarCatalogoCommandTest(TestCase):
+    """Testes para o comando importar_catalogo"""
+
+    def setUp(self):
+        self.categoria = Category.objects.create(nome='Ferragens')
+        self.existente = Product.objects.create(
+            codigo='FER-001', nome='Parafuso', categoria=self.categoria,
+            quantidade_estoque=Decimal('3.00'), custo_unitario=Decimal('7.00'), estoque_minimo=Decimal('2.00')
+        )
+        self.com_ean = Product.objects.create(nome='Arruela', categoria=self.categoria, ean='7891234567895')
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+
+    def _importar(self, nome, conteudo, *args):
+        caminho = os.path.join(self.pasta.name, nome)
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        saida = StringIO()
+        call_command('importar_catalogo', caminho, *args, stdout=saida)
+        return saida.getvalue()
+
+    def test_importar_csv_com_upsert(self):
+        conteudo = (
+            'Código;Nome;Categoria;Unidade;EAN;Custo Unitário\n'
+            'FER-001;Parafuso 6mm;ferragens;cx;;9,50\n'
+            ';Arruela lisa;Ferragens;UN;7891234567895;1,00\n'
+            ';Tinta branca;Tintas;LT;;1.234,50\n'
+            ';Sem unidade válida;Tintas;XX;;1\n'
+        ).encode('utf-8')
+        saida = self._importar('catalogo.csv', conteudo, '--lote', '2')
+
+        self.assertIn('Linha 5: Unidade "XX" inválida', saida)
+        self.assertIn('1 produto(s) criado(s), 2 atualizado(s), 1 linha(s) com erro', saida)
+
+        # Atualizado pelo código: custo e estoque mínimo (coluna ausente) são mantidos
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nome, self.existente.unidade), ('Parafuso 6mm', 'CX'))
+        self.assertEqual(self.existente.custo_unitario, Decimal('7.00'))
+        self.assertEqual(self.existente.estoque_minimo, Decimal('2.00'))
+        self.assertEqual(self.existente.quantidade_estoque, Decimal('3.00'))
+        # Vinculado pelo EAN
+        self.com_ean.refresh_from_db()
+        self.assertEqual(self.com_ean.nome, 'Arruela lisa')
+        # Novo, com SKU da faixa reservada e categoria criada
+        tinta = Product.objects.get(nome='Tinta branca')
+        self.assertEqual(tinta.codigo, 'PROD-0002')
+        self.assertEqual(tinta.categoria.nome, 'Tintas')
+        self.assertEqual(tinta.custo_unitario, Decimal('1234.50'))
+        self.assertEqual(tinta.status, 'CRITICO')
+
+        # Reimportar não duplica
+        self._importar('catalogo.csv', conteudo)
+        self.assertEqual(Product.objects.count(), 4)
+
+    def test_importar_xlsx(self):
+        from openpyxl import Workbook
+
+        livro = Workbook()
+        livro.active.append(['SKU', 'Descrição', 'Categoria', 'GTIN'])
+        for numero in range(5):
+            livro.active.append([None, f'Produto {numero}', 'Ferragens', 7890000000000 + numero])
+        conteudo = BytesIO()
+        livro.save(conteudo)
+
+        saida = self._importar('catalogo.xlsx', conteudo.getvalue(), '--lote', '2', '--sem-criar-categorias')
+        self.assertIn('5 produto(s) criado(s)', saida)
+        codigos = list(Product.objects.filter(nome__startswith='Produto ').order_by('codigo').values_list('codigo', 'ean'))
+        self.assertEqual(codigos[0], ('PROD-0002', '7890000000000'))
+        self.assertEqual(codigos[-1], ('PROD-0006', '7890000000004'))
+
+    def test_colunas_obrigatorias(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaisesMessage(CommandError, 'Colunas obrigatórias ausentes: categoria.'):
+            self._importar('catalogo.csv', 'codigo,nome\nA1,Produto\n'.encode('utf-8'))
+
+
+class AuditarNFeCommandTest(TestCase):
+    """Testes para o comando auditar_nfe"""
+
+    def setUp(self):
+        from django.test import override_settings
+
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        media = override_settings(MEDIA_ROOT=pasta.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.pasta = pasta.name
+
+    def test_rele_xml_arquivado_e_detecta_arquivo_alterado(self):
+        """Testa a releitura das notas e a conferência do hash do arquivo"""
+        import gzip
+        from estoque.models import ImportedInvoice
+        from estoque.utils.arquivo_nfe import arquivar_xml, extrair_chave, hash_xml
+
+        xml = gerar_nfe_xml(itens=3, seed=2)
+        caminho = arquivar_xml(xml)
+        self.assertEqual(arquivar_xml(xml), caminho)
+        nota = ImportedInvoice.objects.create(
+            chave=extrair_chave(xml), hash_conteudo=hash_xml(xml), arquivo=caminho, tamanho=len(xml), itens=3
+        )
+
+        saida = StringIO()
+        call_command('auditar_nfe', '--chave', nota.chave, stdout=saida)
+        self.assertEqual(saida.getvalue().count('FORN-2-'), 3)
+        self.assertIn('1 nota(s) conferida(s), 0 com problema', saida.getvalue())
+
+        with open(os.path.join(self.pasta, caminho), 'wb') as arquivo:
+            arquivo.write(gzip.compress(xml.replace(b'FORN-2-00001', b'FORN-2-99999')))
+        saida = StringIO()
+        call_command('auditar_nfe', stdout=saida)
+        self.assertIn('não confere com o hash', saida.getvalue())
+        self.assertIn('0 nota(s) conferida(s), 1 com problema', saida.getvalue())
+
+
+class ReconciliarEstoqueParaleloTest(TransactionTestCase):
+    """Testa a conferência em paralelo (cada thread com sua conexão)"""
+
+    def test_workers(self):
+        from estoque.utils.reconciliacao import reconciliar_estoque
+
+        categoria = Category.objects.create(nome='Teste')
+        for indice in range(7):
+            produto = Product.objects.create(nome=f'Produto {indice}', categoria=categoria)
+            # Edição direta do saldo, sem movimentação
+            Product.objects.filter(pk=produto.pk).update(quantidade_estoque=Decimal(indice % 2))
+
+        resultado = reconciliar_estoque(lote=2, workers=3)
+        self.assertEqual(resultado['produtos'], 7)
+        self.assertEqual(resultado['total_divergencias'], 3)
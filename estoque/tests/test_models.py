@@ -65,6 +65,32 @@ class SupplierModelTest(TestCase):
                 nome='Outro Fornecedor',
                 cnpj='12.345.678/0001-90'
             )
+    
+    def test_resolver_fornecedor_pelo_cnpj_normalizado(self):
+        """Testa a busca pelo CNPJ só com dígitos e o cadastro de um emitente novo"""
+        from django.db import IntegrityError, transaction
+        from estoque.utils.fornecedores import resolver_fornecedor
+        
+        self.assertEqual(self.fornecedor.cnpj_digitos, '12345678000190')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Supplier.objects.create(nome='Mesmo CNPJ', cnpj='12345678000190')
+        
+        # Uma consulta pelo índice único, sem cache
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver_fornecedor('12345678000190'), self.fornecedor)
+        
+        self.fornecedor.cnpj = '11.222.333/0001-81'
+        self.fornecedor.save()
+        self.assertEqual(resolver_fornecedor('11222333000181', criar=False), self.fornecedor)
+        self.assertIsNone(resolver_fornecedor('12345678000190', criar=False))
+        
+        novo = resolver_fornecedor('12345678000190', 'Emitente Novo Ltda')
+        self.assertEqual((novo.nome, novo.cnpj), ('Emitente Novo Ltda', '12.345.678/0001-90'))
+        self.assertIsNone(resolver_fornecedor('123'))
+        
+        # Excluído sem passar por Supplier.delete (outro processo, exclusão em massa)
+        Supplier.objects.filter(pk=novo.pk).delete()
+        self.assertIsNone(resolver_fornecedor('12345678000190', criar=False))
 
 
 class ProductModelTest(TestCase):
@@ -310,3 +336,1171 @@ class StockMovementModelTest(TestCase):
         # Estoque esperado: 100 + 50 - 20 + 30 = 160
         self.assertEqual(self.produto.quantidade_estoque, Decimal('160.00'))
 
+    
+    def test_saida_sem_estoque_nao_grava(self):
+        """Testa que uma saída acima do estoque é rejeitada sem alterar nada"""
+        from estoque.utils.movimentacoes import EstoqueInsuficienteError
+        
+        with self.assertRaises(EstoqueInsuficienteError):
+            StockMovement.objects.create(
+                tipo='SAIDA',
+                produto=self.produto,
+                quantidade=Decimal('100.01'),
+                usuario=self.user
+            )
+        
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, Decimal('100.00'))
+        self.assertFalse(StockMovement.objects.exists())
+    
+    def test_registrar_movimentacoes_custo_medio(self):
+        """Testa lote misto: custo médio igual ao de movimentações individuais"""
+        from estoque.utils.movimentacoes import registrar_movimentacoes
+        
+        registrar_movimentacoes([
+            StockMovement(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('100.00'),
+                          custo_unitario=Decimal('60.00')),
+            StockMovement(tipo='SAIDA', produto=self.produto, quantidade=Decimal('150.00')),
+            StockMovement(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('50.00'),
+                          custo_unitario=Decimal('40.00')),
+        ])
+        
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade_estoque, Decimal('100.00'))
+        # (100*50 + 100*60)/200 = 55.00; depois (50*55 + 50*40)/100 = 47.50
+        self.assertEqual(self.produto.custo_unitario, Decimal('47.50'))
+        self.assertEqual(StockMovement.objects.count(), 3)
+
+    
+    def test_data_movimento_no_fuso_local(self):
+        """Testa que data_movimento guarda o dia local de created_at"""
+        from datetime import date, datetime, timezone as dt_timezone
+        
+        movimentacao = StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('1.00'),
+            created_at=datetime(2025, 3, 2, 1, 30, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual(movimentacao.data_movimento, date(2025, 3, 1))
+
+
+class IndiceCodigosTest(TestCase):
+    """Testes para o índice em memória de EAN/SKU"""
+    
+    def setUp(self):
+        """Prepara dados para os testes"""
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(
+            codigo='PROD-0001',
+            nome='Produto Teste',
+            categoria=self.categoria,
+            ean='7891234567895'
+        )
+    
+    def test_busca_sem_consultar_produtos(self):
+        """Testa que, com o índice montado, um lote de buscas só confere a versão"""
+        from estoque.utils.indice_codigos import buscar_produtos_por_codigos, obter_indice
+        
+        obter_indice()
+        with self.assertNumQueries(1):
+            encontrados = buscar_produtos_por_codigos(['7891234567895', 'PROD-0001', 'NAO-EXISTE'])
+        self.assertEqual([p and p.id for p in encontrados], [self.produto.pk, self.produto.pk, None])
+    
+    def test_invalidado_por_outro_processo(self):
+        """Testa que a versão no banco (alterada por outro worker) remonta o índice"""
+        from django.db.models import F
+        from estoque.models import CacheVersion
+        from estoque.utils.indice_codigos import NOME_VERSAO, buscar_produto_por_codigo
+        
+        self.assertIsNotNone(buscar_produto_por_codigo('7891234567895'))
+        # Outro worker grava o produto: este processo só vê a versão nova no banco
+        Product.objects.filter(pk=self.produto.pk).update(ean='7890000000000')
+        CacheVersion.objects.filter(nome=NOME_VERSAO).update(versao=F('versao') + 1)
+        
+        self.assertIsNone(buscar_produto_por_codigo('7891234567895'))
+        self.assertEqual(buscar_produto_por_codigo('7890000000000').id, self.produto.pk)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            versao = CacheVersion.objects.get(nome=NOME_VERSAO).versao
+            self.produto.save()
+        self.assertEqual(CacheVersion.objects.get(nome=NOME_VERSAO).versao, versao + 1)
+    
+    def test_invalidado_ao_salvar_produto(self):
+        """Testa que Product.save() invalida o índice"""
+        from estoque.utils.indice_codigos import buscar_produto_por_codigo
+        
+        self.assertIsNotNone(buscar_produto_por_codigo('7891234567895'))
+        self.produto.ean = '7890000000000'
+        self.produto.save()
+        
+        self.assertIsNone(buscar_produto_por_codigo('7891234567895'))
+        self.assertEqual(buscar_produto_por_codigo('7890000000000').id, self.produto.pk)
+
+
+class StatusEstoqueTest(TestCase):
+    """Testes para o status de estoque persistido no produto"""
+    
+    def setUp(self):
+        """Prepara dados para os testes"""
+        self.categoria = Category.objects.create(nome='Teste', estoque_critico=Decimal('3.00'))
+        self.produto = Product.objects.create(
+            nome='Produto Teste',
+            categoria=self.categoria,
+            quantidade_estoque=Decimal('20.00'),
+            estoque_minimo=Decimal('10.00')
+        )
+    
+    def test_status_calculado_ao_salvar(self):
+        """Testa o status calculado com o limite crítico da categoria"""
+        self.assertEqual(self.produto.status, 'OK')
+        
+        self.produto.quantidade_estoque = Decimal('8.00')
+        self.produto.save()
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'BAIXO')
+        
+        self.produto.quantidade_estoque = Decimal('3.00')
+        self.produto.save()
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.status, 'CRITICO')
+        self.assertTrue(self.produto.estoque_critico)
+    
+    def test_status_atualizado_pela_movimentacao(self):
+        """Testa que entradas e saídas mantêm o status atualizado"""
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('18.00'))
+        self.assertEqual(self.produto.status, 'CRITICO')
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'CRITICO')
+        
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('50.00'),
+            custo_unitario=Decimal('1.00')
+        )
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'OK')
+
+    def test_gravacao_parcial_so_recalcula_com_campos_do_status(self):
+        """Testa que arquivar uma instância desatualizada não sobrescreve o status"""
+        # Outra requisição levou o estoque a crítico depois que esta instância foi lida
+        Product.objects.filter(pk=self.produto.pk).update(quantidade_estoque=Decimal('2.00'), status='CRITICO')
+
+        self.produto.arquivar()
+        produto = Product.objects.get(pk=self.produto.pk)
+        self.assertTrue(produto.arquivado)
+        self.assertEqual((produto.quantidade_estoque, produto.status), (Decimal('2.00'), 'CRITICO'))
+
+        produto.estoque_minimo = Decimal('1.00')
+        produto.quantidade_estoque = Decimal('5.00')
+        produto.save(update_fields=['quantidade_estoque'])
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'OK')
+
+    def test_alterar_limite_da_categoria_recalcula_produtos(self):
+        """Testa que mudar o limite crítico da categoria recalcula o status"""
+        self.categoria.estoque_critico = Decimal('25.00')
+        self.categoria.save()
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'CRITICO')
+    
+    def test_recalcular_status_em_lote(self):
+        """Testa o recálculo após alteração direta no banco"""
+        from estoque.utils.status_estoque import recalcular_status
+        
+        Product.objects.filter(pk=self.produto.pk).update(quantidade_estoque=Decimal('5.00'))
+        self.assertEqual(recalcular_status(), 1)
+        self.assertEqual(Product.objects.get(pk=self.produto.pk).status, 'BAIXO')
+        self.assertEqual(recalcular_status(), 0)
+
+
+class RazaoEstoqueTest(TestCase):
+    """Testes para o razão (saldo_apos/custo_medio_apos) das movimentações"""
+    
+    def setUp(self):
+        """Prepara dados para os testes"""
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(
+            nome='Produto Teste',
+            categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'),
+            custo_unitario=Decimal('40.00')
+        )
+    
+    def test_saldo_gravado_na_movimentacao(self):
+        """Testa que cada movimentação guarda o saldo e o custo após aplicada"""
+        from estoque.utils.movimentacoes import registrar_movimentacoes
+        
+        entrada = StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('10.00'),
+            custo_unitario=Decimal('60.00')
+        )
+        self.assertEqual(entrada.saldo_apos, Decimal('20.00'))
+        self.assertEqual(entrada.custo_medio_apos, Decimal('50.00'))
+        
+        saida, segunda_saida = registrar_movimentacoes([
+            StockMovement(tipo='SAIDA', produto=self.produto, quantidade=Decimal('5.00')),
+            StockMovement(tipo='SAIDA', produto=self.produto, quantidade=Decimal('3.00')),
+        ])
+        self.assertEqual(
+            list(StockMovement.objects.filter(pk__in=[saida.pk, segunda_saida.pk]).order_by('pk').values_list(
+                'saldo_apos', 'custo_medio_apos'
+            )),
+            [(Decimal('15.00'), Decimal('50.00')), (Decimal('12.00'), Decimal('50.00'))]
+        )
+    
+    def test_saldo_em(self):
+        """Testa a consulta de saldo em uma data passada"""
+        from datetime import date, datetime, timezone as dt_timezone
+        from estoque.utils.razao import saldo_em
+        
+        StockMovement.objects.create(
+            tipo='SAIDA', produto=self.produto, quantidade=Decimal('4.00'),
+            created_at=datetime(2025, 1, 10, 15, 0, tzinfo=dt_timezone.utc)
+        )
+        StockMovement.objects.create(
+            tipo='SAIDA', produto=self.produto, quantidade=Decimal('1.00'),
+            created_at=datetime(2025, 1, 20, 15, 0, tzinfo=dt_timezone.utc)
+        )
+        
+        self.assertIsNone(saldo_em(self.produto.pk, date(2025, 1, 9)))
+        self.assertEqual(saldo_em(self.produto.pk, date(2025, 1, 15))[0], Decimal('6.00'))
+        self.assertEqual(saldo_em(self.produto.pk, date(2025, 1, 20))[0], Decimal('5.00'))
+    
+    def test_verificar_razao_detecta_divergencia(self):
+        """Testa que a verificação aponta linhas e produtos divergentes"""
+        from estoque.utils.razao import verificar_razao
+        
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('2.00'))
+        segunda = StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('2.00'))
+        self.assertEqual(verificar_razao()['total_divergencias'], 0)
+        
+        StockMovement.objects.filter(pk=segunda.pk).update(saldo_apos=Decimal('7.00'))
+        resultado = verificar_razao(lote=1)
+        self.assertEqual(resultado['movimentacoes'], 2)
+        self.assertEqual(
+            [(d['campo'], d['esperado'], d['gravado']) for d in resultado['divergencias']],
+            [('saldo_apos', Decimal('6.00'), Decimal('7.00')),
+             ('quantidade_estoque', Decimal('7.00'), Decimal('6.00'))]
+        )
+
+
+class AvaliacaoEstoqueTest(TestCase):
+    """Testes para a avaliação do estoque em data passada"""
+    
+    def setUp(self):
+        """Prepara movimentações em dias diferentes"""
+        from datetime import datetime, timezone as dt_timezone
+        
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(nome='Produto Teste', categoria=self.categoria)
+        
+        def movimentar(tipo, quantidade, custo, dia):
+            StockMovement.objects.create(
+                tipo=tipo, produto=self.produto, quantidade=Decimal(quantidade),
+                custo_unitario=Decimal(custo),
+                created_at=datetime(2025, 1, dia, 15, 0, tzinfo=dt_timezone.utc)
+            )
+        
+        movimentar('ENTRADA', '10.00', '10.00', 5)
+        movimentar('SAIDA', '4.00', '0.00', 10)
+        movimentar('ENTRADA', '6.00', '20.00', 20)
+        self.movimentar = movimentar
+    
+    def test_avaliacao_em_data(self):
+        """Testa quantidade, custo médio e valor ao final de cada dia"""
+        from datetime import date
+        from estoque.utils.avaliacao import avaliar_estoque
+        
+        self.assertNotIn(self.produto.pk, avaliar_estoque(date(2025, 1, 4)))
+        
+        posicao = avaliar_estoque(date(2025, 1, 15))[self.produto.pk]
+        self.assertEqual(posicao.quantidade, Decimal('6.00'))
+        self.assertEqual(posicao.custo_medio, Decimal('10.00'))
+        
+        posicao = avaliar_estoque(date(2025, 1, 31))[self.produto.pk]
+        self.assertEqual(posicao.quantidade, Decimal('12.00'))
+        self.assertEqual(posicao.custo_medio, Decimal('15.00'))
+        self.assertEqual(posicao.valor, Decimal('180.00'))
+    
+    def test_snapshot_mais_deltas(self):
+        """Testa que a avaliação parte do snapshot e só lê as movimentações posteriores"""
+        from datetime import date
+        from estoque.utils.avaliacao import avaliar_estoque, criar_snapshot
+        
+        snapshot = criar_snapshot(date(2025, 1, 15))
+        self.assertEqual(snapshot.total_produtos, 1)
+        self.assertEqual(snapshot.valor_total, Decimal('60.00'))
+        
+        # Altera o snapshot para provar que ele é usado como ponto de partida
+        snapshot.itens.update(quantidade=Decimal('100.00'))
+        posicao = avaliar_estoque(date(2025, 1, 31))[self.produto.pk]
+        self.assertEqual(posicao.quantidade, Decimal('106.00'))
+    
+    def test_movimentacao_retroativa_invalida_snapshot(self):
+        """Testa que lançamentos anteriores a um snapshot o removem"""
+        from datetime import date
+        from estoque.models import StockSnapshot
+        from estoque.utils.avaliacao import avaliar_estoque, criar_snapshot
+        
+        criar_snapshot(date(2025, 1, 15))
+        self.movimentar('SAIDA', '1.00', '0.00', 12)
+        
+        self.assertFalse(StockSnapshot.objects.exists())
+        self.assertEqual(avaliar_estoque(date(2025, 1, 15))[self.produto.pk].quantidade, Decimal('5.00'))
+    
+    def test_estoque_anterior_a_primeira_movimentacao(self):
+        """Testa que o estoque digitado no cadastro entra na avaliação (com e sem snapshot)"""
+        from datetime import date, datetime, timezone as dt_timezone
+        from estoque.utils.avaliacao import avaliar_estoque, criar_snapshot
+        
+        produto = Product.objects.create(
+            nome='Com Estoque Inicial', categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('2.00')
+        )
+        Product.objects.filter(pk=produto.pk).update(created_at=datetime(2025, 2, 1, 12, 0, tzinfo=dt_timezone.utc))
+        entrada = StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('5.00'), custo_unitario=Decimal('4.00'),
+            created_at=datetime(2025, 2, 10, 15, 0, tzinfo=dt_timezone.utc)
+        )
+        self.assertEqual((entrada.saldo_apos, entrada.custo_medio_apos), (Decimal('15.00'), Decimal('2.67')))
+        
+        self.assertNotIn(produto.pk, avaliar_estoque(date(2025, 1, 31)))
+        self.assertEqual(avaliar_estoque(date(2025, 2, 5))[produto.pk], (Decimal('10.00'), Decimal('2.00')))
+        self.assertEqual(avaliar_estoque(date(2025, 2, 28))[produto.pk], (Decimal('15.00'), Decimal('2.67')))
+        
+        # Cadastrado depois do snapshot: também parte do estoque do cadastro
+        criar_snapshot(date(2025, 1, 31))
+        self.assertEqual(avaliar_estoque(date(2025, 2, 28))[produto.pk], (Decimal('15.00'), Decimal('2.67')))
+        criar_snapshot(date(2025, 2, 5))
+        self.assertEqual(avaliar_estoque(date(2025, 2, 28))[produto.pk], (Decimal('15.00'), Decimal('2.67')))
+
+
+
+class FechamentoMensalTest(TestCase):
+    """Testes para o fechamento mensal do estoque"""
+    
+    def setUp(self):
+        """Prepara movimentações em janeiro e fevereiro de 2025"""
+        from datetime import datetime, timezone as dt_timezone
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(nome='Produto Teste', categoria=self.categoria)
+        
+        def movimentar(tipo, quantidade, custo, mes, dia):
+            return StockMovement.objects.create(
+                tipo=tipo, produto=self.produto, quantidade=Decimal(quantidade),
+                custo_unitario=Decimal(custo),
+                created_at=datetime(2025, mes, dia, 15, 0, tzinfo=dt_timezone.utc)
+            )
+        
+        movimentar('ENTRADA', '10.00', '10.00', 1, 5)
+        movimentar('SAIDA', '4.00', '0.00', 1, 10)
+        movimentar('ENTRADA', '6.00', '20.00', 2, 3)
+        movimentar('SAIDA', '2.00', '0.00', 2, 20)
+        self.movimentar = movimentar
+    
+    def test_fechar_mes(self):
+        """Testa totais e saldos do fechamento e o encadeamento entre meses"""
+        from datetime import date
+        from estoque.utils.fechamento import fechar_mes
+        
+        janeiro = fechar_mes(date(2025, 1, 1))
+        self.assertEqual(janeiro.total_entradas, Decimal('10.00'))
+        self.assertEqual(janeiro.total_saidas, Decimal('4.00'))
+        self.assertEqual(janeiro.valor_final, Decimal('60.00'))
+        
+        fevereiro = fechar_mes(date(2025, 2, 1))
+        item = fevereiro.itens.get(produto=self.produto)
+        self.assertEqual(item.saldo_inicial, Decimal('6.00'))
+        self.assertEqual(item.saldo_inicial + item.entradas - item.saidas, item.saldo_final)
+        self.assertEqual(item.saldo_final, Decimal('10.00'))
+        self.assertEqual(item.custo_medio_final, Decimal('15.00'))
+        
+        with self.assertRaises(ValueError):
+            fechar_mes(date(2025, 1, 1))
+    
+    def test_meses_fechados_em_ordem_a_partir_do_anterior(self):
+        """Testa que não se pula mês e que o saldo inicial vem do fechamento anterior"""
+        from datetime import date
+        from estoque.models import MonthlyClosingItem
+        from estoque.utils.fechamento import fechar_mes
+        
+        fechar_mes(date(2025, 1, 1))
+        with self.assertRaisesMessage(ValueError, 'feche antes 02/2025'):
+            fechar_mes(date(2025, 3, 1))
+        
+        # O fechamento anterior é o ponto de partida (não uma nova avaliação)
+        MonthlyClosingItem.objects.filter(produto=self.produto).update(saldo_final=Decimal('100.00'))
+        item = fechar_mes(date(2025, 2, 1)).itens.get(produto=self.produto)
+        self.assertEqual(item.saldo_inicial, Decimal('100.00'))
+        self.assertEqual(item.saldo_final, Decimal('104.00'))
+        fechar_mes(date(2025, 3, 1))
+    
+    def test_primeiro_fechamento_com_estoque_do_cadastro(self):
+        """Testa que o estoque digitado no cadastro entra no primeiro fechamento"""
+        from datetime import date, datetime, timezone as dt_timezone
+        from estoque.utils.fechamento import fechar_mes
+        
+        produto = Product.objects.create(
+            nome='Com Estoque Inicial', categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('2.00')
+        )
+        Product.objects.filter(pk=produto.pk).update(created_at=datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+        StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('5.00'), custo_unitario=Decimal('4.00'),
+            created_at=datetime(2025, 1, 20, 15, 0, tzinfo=dt_timezone.utc)
+        )
+        
+        item = fechar_mes(date(2025, 1, 1)).itens.get(produto=produto)
+        self.assertEqual(item.saldo_inicial, Decimal('10.00'))
+        self.assertEqual((item.saldo_final, item.custo_medio_final), (Decimal('15.00'), Decimal('2.67')))
+    
+    def test_periodo_fechado_recusa_movimentacao(self):
+        """Testa que um mês fechado não aceita movimentações retroativas"""
+        from datetime import date
+        from estoque.utils.fechamento import fechar_mes
+        from estoque.utils.movimentacoes import PeriodoFechadoError
+        
+        fechar_mes(date(2025, 1, 1))
+        with self.assertRaises(PeriodoFechadoError) as contexto:
+            self.movimentar('ENTRADA', '1.00', '10.00', 1, 20)
+        self.assertEqual(contexto.exception.fechado_ate, date(2025, 1, 31))
+        self.assertEqual(StockMovement.objects.count(), 4)
+        
+        # Fevereiro continua aberto
+        self.movimentar('ENTRADA', '1.00', '10.00', 2, 25)
+    
+    def test_fechamento_imutavel(self):
+        """Testa que o fechamento não pode ser alterado nem excluído"""
+        from datetime import date
+        from estoque.utils.fechamento import fechar_mes
+        
+        fechamento = fechar_mes(date(2025, 1, 1))
+        with self.assertRaises(ValueError):
+            fechamento.save()
+        with self.assertRaises(ValueError):
+            fechamento.delete()
+    
+    def test_resumo_periodo_usa_fechamento(self):
+        """Testa que meses fechados vêm do fechamento e o restante das movimentações"""
+        from datetime import date
+        from estoque.utils.fechamento import fechar_mes, resumo_periodo
+        
+        antes = resumo_periodo(date(2025, 1, 1), date(2025, 2, 28))
+        fechar_mes(date(2025, 1, 1))
+        depois = resumo_periodo(date(2025, 1, 1), date(2025, 2, 28))
+        self.assertEqual(antes, depois)
+        self.assertEqual(depois['entradas'], Decimal('16.00'))
+        self.assertEqual(depois['saidas'], Decimal('6.00'))
+        self.assertEqual(depois['saidas_por_mes'], {
+            '2025-01': {'Produto Teste': Decimal('4.00')},
+            '2025-02': {'Produto Teste': Decimal('2.00')},
+        })
+        
+        # Apaga as movimentações de janeiro por fora: o resumo do mês fechado não muda
+        StockMovement.objects.filter(data_movimento__month=1).delete()
+        self.assertEqual(resumo_periodo(date(2025, 1, 1), date(2025, 1, 31))['saidas'], Decimal('4.00'))
+        # Um mês coberto parcialmente é calculado das movimentações
+        self.assertEqual(resumo_periodo(date(2025, 1, 2), date(2025, 1, 31))['saidas'], Decimal('0.00'))
+
+
+class ConsumoReposicaoTest(TestCase):
+    """Testes para a análise de consumo e sugestão de reposição"""
+    
+    def setUp(self):
+        """Prepara saídas diárias nos últimos 10 dias"""
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        self.categoria = Category.objects.create(nome='Teste')
+        agora = timezone.now()
+        
+        def produto_com_saidas(nome, saidas_por_dia):
+            produto = Product.objects.create(nome=nome, categoria=self.categoria)
+            StockMovement.objects.create(
+                tipo='ENTRADA', produto=produto, quantidade=Decimal('40.00'),
+                created_at=agora - timedelta(days=30)
+            )
+            for dias_atras, quantidade in enumerate(saidas_por_dia):
+                if quantidade:
+                    StockMovement.objects.create(
+                        tipo='SAIDA', produto=produto, quantidade=Decimal(quantidade),
+                        created_at=agora - timedelta(days=dias_atras)
+                    )
+            return produto
+        
+        self.estavel = produto_com_saidas('Estável', [3] * 10)
+        self.irregular = produto_com_saidas('Irregular', [6, 0] * 5)
+        self.parado = Product.objects.create(nome='Parado', categoria=self.categoria)
+    
+    def test_analise_consumo(self):
+        """Testa demanda, variabilidade, cobertura, ponto de pedido e sugestão"""
+        from estoque.utils.consumo import analisar_consumo
+        
+        analises = analisar_consumo(dias=10, prazo_entrega=4, cobertura_alvo=10)
+        self.assertNotIn(self.parado.pk, analises)
+        
+        estavel = analises[self.estavel.pk]
+        self.assertEqual(estavel.demanda_diaria, Decimal('3.00'))
+        self.assertEqual(estavel.desvio_diario, Decimal('0.00'))
+        self.assertEqual(estavel.cobertura_dias, Decimal('3.3'))
+        self.assertEqual(estavel.ponto_pedido, Decimal('12.00'))
+        # Estoque 10 <= ponto de pedido 12: repõe até 12 + 3 * 10
+        self.assertEqual(estavel.quantidade_sugerida, Decimal('32.00'))
+        
+        irregular = analises[self.irregular.pk]
+        self.assertEqual(irregular.desvio_diario, Decimal('3.00'))
+        # 3 * 4 + 1.65 * 3 * √4 = 21.9, arredondado para cima em unidades
+        self.assertEqual(irregular.ponto_pedido, Decimal('22.00'))
+    
+    def test_sem_sugestao_acima_do_ponto_de_pedido(self):
+        """Testa que produtos com estoque acima do ponto de pedido não têm sugestão"""
+        from estoque.utils.consumo import analisar_consumo
+        
+        StockMovement.objects.create(tipo='ENTRADA', produto=self.estavel, quantidade=Decimal('20.00'))
+        analise = analisar_consumo(dias=10, prazo_entrega=4, cobertura_alvo=10)[self.estavel.pk]
+        self.assertEqual(analise.quantidade_sugerida, Decimal('0.00'))
+
+
+class CurvaABCTest(TestCase):
+    """Testes para a curva ABC pelo valor das saídas"""
+    
+    def setUp(self):
+        """Prepara saídas de R$ 80, R$ 15 e R$ 5 em janeiro de 2025"""
+        from datetime import datetime, timezone as dt_timezone
+        
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produtos = []
+        for nome, saida in (('Maior', '80.00'), ('Médio', '15.00'), ('Menor', '5.00'), ('Parado', None)):
+            produto = Product.objects.create(nome=nome, categoria=self.categoria)
+            StockMovement.objects.create(
+                tipo='ENTRADA', produto=produto, quantidade=Decimal('100.00'), custo_unitario=Decimal('1.00'),
+                created_at=datetime(2025, 1, 2, 15, 0, tzinfo=dt_timezone.utc)
+            )
+            if saida:
+                StockMovement.objects.create(
+                    tipo='SAIDA', produto=produto, quantidade=Decimal(saida),
+                    created_at=datetime(2025, 1, 20, 15, 0, tzinfo=dt_timezone.utc)
+                )
+            self.produtos.append(produto)
+    
+    def test_curva_abc(self):
+        """Testa ranking, participação acumulada e classes"""
+        from datetime import date
+        from estoque.utils.curva_abc import curva_abc
+        
+        linhas = list(curva_abc(date(2025, 1, 1), date(2025, 2, 28)))
+        self.assertEqual([linha.nome for linha in linhas], ['Maior', 'Médio', 'Menor'])
+        self.assertEqual([linha.valor for linha in linhas], [Decimal('80.00'), Decimal('15.00'), Decimal('5.00')])
+        self.assertEqual([linha.acumulado for linha in linhas], [Decimal('0.8'), Decimal('0.95'), Decimal('1')])
+        self.assertEqual([linha.classe for linha in linhas], ['A', 'B', 'C'])
+        
+        self.assertEqual(list(curva_abc(date(2025, 2, 1), date(2025, 2, 28))), [])
+    
+    def test_mes_fechado_usa_fechamento(self):
+        """Testa que meses fechados vêm do valor das saídas gravado no fechamento"""
+        from datetime import date
+        from estoque.models import MonthlyClosingItem
+        from estoque.utils.curva_abc import curva_abc
+        from estoque.utils.fechamento import fechar_mes
+        
+        antes = list(curva_abc(date(2025, 1, 1), date(2025, 2, 28)))
+        fechar_mes(date(2025, 1, 1))
+        self.assertEqual(list(curva_abc(date(2025, 1, 1), date(2025, 2, 28))), antes)
+        
+        MonthlyClosingItem.objects.filter(produto=self.produtos[2]).update(valor_saidas=Decimal('500.00'))
+        self.assertEqual(next(curva_abc(date(2025, 1, 1), date(2025, 2, 28))).nome, 'Menor')
+    
+    def test_classificar_abc(self):
+        """Testa que a classe é gravada nos produtos e atualizada a cada classificação"""
+        from datetime import date
+        from estoque.utils.curva_abc import classificar_abc
+        
+        contagem = classificar_abc(date(2025, 1, 1), date(2025, 1, 31))
+        self.assertEqual(contagem, {'A': 1, 'B': 1, 'C': 2})
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('classe_abc', flat=True)), ['A', 'B', 'C', 'C']
+        )
+        
+        # Sem saídas no período, todos voltam para C
+        self.assertEqual(classificar_abc(date(2025, 3, 1), date(2025, 3, 31)), {'A': 0, 'B': 0, 'C': 4})
+
+
+class EnvelhecimentoEstoqueTest(TestCase):
+    """Testes para as datas da última movimentação e o envelhecimento do estoque"""
+    
+    def setUp(self):
+        """Prepara dados para os testes"""
+        self.categoria = Category.objects.create(nome='Teste')
+    
+    def _produto(self, nome, dias_entrada=None, dias_saida=None):
+        """Cria um produto com 10 unidades a R$ 2,00 e as datas de movimentação informadas"""
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        agora = timezone.now()
+        produto = Product.objects.create(
+            nome=nome, categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('2.00'),
+        )
+        Product.objects.filter(pk=produto.pk).update(
+            created_at=agora - timedelta(days=400),
+            ultima_entrada_em=agora - timedelta(days=dias_entrada) if dias_entrada is not None else None,
+            ultima_saida_em=agora - timedelta(days=dias_saida) if dias_saida is not None else None,
+        )
+        return produto
+    
+    def test_datas_mantidas_pelas_movimentacoes(self):
+        """Testa que as datas acompanham as movimentações e não voltam com datas retroativas"""
+        from datetime import datetime, timezone as dt_timezone
+        from estoque.utils.movimentacoes import registrar_movimentacoes
+        
+        produto = Product.objects.create(nome='Produto', categoria=self.categoria)
+        self.assertIsNone(produto.ultima_entrada_em)
+        
+        entrada = StockMovement.objects.create(
+            tipo='ENTRADA', produto=produto, quantidade=Decimal('10.00'), custo_unitario=Decimal('2.00')
+        )
+        produto.refresh_from_db()
+        self.assertEqual(produto.ultima_entrada_em, entrada.created_at)
+        self.assertIsNone(produto.ultima_saida_em)
+        
+        saida, = registrar_movimentacoes([
+            StockMovement(tipo='SAIDA', produto=produto, quantidade=Decimal('1.00'))
+        ])
+        produto.refresh_from_db()
+        self.assertEqual(produto.ultima_saida_em, saida.created_at)
+        
+        # Movimentação retroativa (sincronização offline) não recua a data
+        registrar_movimentacoes([
+            StockMovement(tipo='SAIDA', produto=produto, quantidade=Decimal('1.00'),
+                          created_at=datetime(2025, 1, 10, 12, 0, tzinfo=dt_timezone.utc))
+        ])
+        produto.refresh_from_db()
+        self.assertEqual(produto.ultima_saida_em, saida.created_at)
+        self.assertEqual(produto.ultima_entrada_em, entrada.created_at)
+    
+    def test_envelhecimento_por_faixa(self):
+        """Testa a contagem e o valor em estoque de cada faixa de idade"""
+        from estoque.utils.envelhecimento import envelhecimento_estoque
+        
+        self._produto('Recente', dias_entrada=5)
+        self._produto('Saída recente', dias_entrada=200, dias_saida=10)
+        self._produto('Dois meses', dias_saida=60)
+        self._produto('Seis meses', dias_entrada=120)
+        self._produto('Nunca movimentado')
+        sem_saldo = self._produto('Sem saldo', dias_entrada=300)
+        Product.objects.filter(pk=sem_saldo.pk).update(quantidade_estoque=Decimal('0.00'))
+        
+        faixas = envelhecimento_estoque()
+        self.assertEqual([faixa['produtos'] for faixa in faixas], [2, 1, 1, 1])
+        self.assertEqual(
+            [faixa['valor'] for faixa in faixas],
+            [Decimal('40.00'), Decimal('20.00'), Decimal('20.00'), Decimal('20.00')]
+        )
+    
+    def test_estoque_parado(self):
+        """Testa a lista de produtos sem movimentação há pelo menos N dias"""
+        from estoque.utils.envelhecimento import estoque_parado
+        
+        self._produto('Recente', dias_entrada=5, dias_saida=100)
+        self._produto('Parado', dias_entrada=100, dias_saida=95)
+        self._produto('Nunca movimentado')
+        
+        self.assertEqual([produto.nome for produto in estoque_parado(90)], ['Nunca movimentado', 'Parado'])
+        self.assertEqual([produto.nome for produto in estoque_parado(98)], ['Nunca movimentado'])
+
+
+class HistoricoCustoTest(TestCase):
+    """Testes para o histórico de custo médio"""
+    
+    def setUp(self):
+        """Prepara dados para os testes"""
+        self.categoria = Category.objects.create(nome='Teste')
+        self.barato = Supplier.objects.create(nome='Barato')
+        self.caro = Supplier.objects.create(nome='Caro')
+        self.produto = Product.objects.create(nome='Produto', categoria=self.categoria)
+    
+    def test_historico_gravado_com_as_entradas(self):
+        """Testa que cada entrada grava o custo médio anterior e o novo"""
+        from estoque.models import ProductCostHistory
+        from estoque.utils.movimentacoes import registrar_movimentacoes
+        
+        primeira = StockMovement.objects.create(
+            tipo='ENTRADA', produto=self.produto, quantidade=Decimal('10.00'),
+            custo_unitario=Decimal('10.00'), fornecedor=self.barato
+        )
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('5.00'))
+        registrar_movimentacoes([
+            StockMovement(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('5.00'),
+                          custo_unitario=Decimal('20.00'), fornecedor=self.caro),
+            StockMovement(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('10.00'),
+                          custo_unitario=Decimal('15.00'), fornecedor=self.barato),
+        ])
+        
+        historico = list(ProductCostHistory.objects.order_by('pk').values_list(
+            'movimentacao__fornecedor__nome', 'custo_entrada', 'custo_anterior', 'custo_novo'
+        ))
+        self.assertEqual(historico, [
+            ('Barato', Decimal('10.00'), Decimal('0.00'), Decimal('10.00')),
+            ('Caro', Decimal('20.00'), Decimal('10.00'), Decimal('15.00')),
+            ('Barato', Decimal('15.00'), Decimal('15.00'), Decimal('15.00')),
+        ])
+        self.assertEqual(ProductCostHistory.objects.order_by('pk').first().movimentacao, primeira)
+        
+        # Somente inclusão
+        with self.assertRaises(ValueError):
+            ProductCostHistory.objects.first().save()
+        with self.assertRaises(ValueError):
+            ProductCostHistory.objects.first().delete()
+    
+    def test_migracao_reproduz_o_historico_gravado(self):
+        """Testa que o preenchimento da migração gera o mesmo histórico das entradas"""
+        from importlib import import_module
+        from django.apps import apps
+        from estoque.models import ProductCostHistory
+        
+        migracao = import_module('estoque.migrations.0014_productcosthistory')
+        com_estoque = Product.objects.create(
+            nome='Com Estoque Inicial', categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('2.00')
+        )
+        StockMovement.objects.create(tipo='ENTRADA', produto=com_estoque, quantidade=Decimal('5.00'),
+                                     custo_unitario=Decimal('4.00'))
+        StockMovement.objects.create(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('10.00'),
+                                     custo_unitario=Decimal('10.00'))
+        # Custo alterado no cadastro entre duas entradas: a saída seguinte grava o custo novo
+        Product.objects.filter(pk=self.produto.pk).update(custo_unitario=Decimal('12.00'))
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto, quantidade=Decimal('5.00'))
+        StockMovement.objects.create(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('5.00'),
+                                     custo_unitario=Decimal('20.00'))
+        
+        campos = ('movimentacao_id', 'custo_entrada', 'custo_anterior', 'custo_novo')
+        gravado = list(ProductCostHistory.objects.order_by('movimentacao_id').values_list(*campos))
+        self.assertEqual([linha[2] for linha in gravado], [Decimal('2.00'), Decimal('0.00'), Decimal('12.00')])
+        
+        ProductCostHistory.objects.all().delete()
+        migracao.preencher_historico_custo(apps, None)
+        self.assertEqual(list(ProductCostHistory.objects.order_by('movimentacao_id').values_list(*campos)), gravado)
+    
+    def test_saida_sem_estoque_nao_grava_historico(self):
+        """Testa que um lote rejeitado não deixa histórico"""
+        from estoque.models import ProductCostHistory
+        from estoque.utils.movimentacoes import registrar_movimentacoes, EstoqueInsuficienteError
+        
+        with self.assertRaises(EstoqueInsuficienteError):
+            registrar_movimentacoes([
+                StockMovement(tipo='ENTRADA', produto=self.produto, quantidade=Decimal('1.00'),
+                              custo_unitario=Decimal('10.00')),
+                StockMovement(tipo='SAIDA', produto=self.produto, quantidade=Decimal('5.00')),
+            ])
+        self.assertFalse(ProductCostHistory.objects.exists())
+    
+    def test_comparar_fornecedores(self):
+        """Testa o preço médio ponderado de cada fornecedor"""
+        from estoque.utils.custos import comparar_fornecedores
+        
+        for fornecedor, quantidade, custo in (
+            (self.caro, '10.00', '20.00'), (self.barato, '30.00', '10.00'),
+            (self.barato, '10.00', '14.00'), (None, '5.00', '0.00'),
+        ):
+            StockMovement.objects.create(
+                tipo='ENTRADA', produto=self.produto, quantidade=Decimal(quantidade),
+                custo_unitario=Decimal(custo), fornecedor=fornecedor
+            )
+        
+        comparacao = comparar_fornecedores(self.produto.pk)
+        self.assertEqual([item['fornecedor'] for item in comparacao], ['Barato', 'Caro'])
+        self.assertEqual(comparacao[0]['preco_medio'], Decimal('11.00'))
+        self.assertEqual(comparacao[0]['entradas'], 2)
+        self.assertEqual(
+            (comparacao[0]['menor_preco'], comparacao[0]['maior_preco']), (Decimal('10.00'), Decimal('14.00'))
+        )
+        self.assertEqual(comparacao[1]['preco_medio'], Decimal('20.00'))
+
+
+class ArquivamentoMovimentacoesTest(TestCase):
+    """Testes para o arquivamento de movimentações de meses fechados"""
+    
+    def setUp(self):
+        """Prepara movimentações em janeiro e fevereiro de 2025, com janeiro fechado"""
+        from datetime import date, datetime, timezone as dt_timezone
+        from estoque.utils.fechamento import fechar_mes
+        
+        self.categoria = Category.objects.create(nome='Teste')
+        self.produto = Product.objects.create(nome='Produto Teste', categoria=self.categoria)
+        
+        def movimentar(tipo, quantidade, custo, mes, dia):
+            return StockMovement.objects.create(
+                tipo=tipo, produto=self.produto, quantidade=Decimal(quantidade),
+                custo_unitario=Decimal(custo),
+                created_at=datetime(2025, mes, dia, 15, 0, tzinfo=dt_timezone.utc)
+            )
+        
+        self.janeiro = [
+            movimentar('ENTRADA', '10.00', '10.00', 1, 5),
+            movimentar('SAIDA', '4.00', '0.00', 1, 10),
+        ]
+        movimentar('ENTRADA', '6.00', '20.00', 2, 3)
+        movimentar('SAIDA', '2.00', '0.00', 2, 20)
+        fechar_mes(date(2025, 1, 1))
+    
+    def test_arquivar_periodo_fechado(self):
+        """Testa que as movimentações saem da tabela ativa mantendo id e razão"""
+        from datetime import date
+        from estoque.models import ArchivedStockMovement, ProductCostHistory
+        from estoque.utils.arquivamento import arquivar_movimentacoes
+        
+        self.assertEqual(arquivar_movimentacoes(date(2025, 1, 31)), {2025: 2})
+        self.assertEqual(StockMovement.objects.count(), 2)
+        arquivadas = ArchivedStockMovement.objects.order_by('pk')
+        self.assertEqual([m.pk for m in arquivadas], [m.pk for m in self.janeiro])
+        self.assertEqual([m.saldo_apos for m in arquivadas], [Decimal('10.00'), Decimal('6.00')])
+        self.assertEqual(arquivadas[0].ano, 2025)
+        
+        # O histórico de custo continua, sem o vínculo com a movimentação arquivada
+        historico = ProductCostHistory.objects.order_by('pk').first()
+        self.assertIsNone(historico.movimentacao_id)
+        self.assertEqual(historico.custo_novo, Decimal('10.00'))
+        
+        # Nada mais a arquivar
+        self.assertEqual(arquivar_movimentacoes(date(2025, 1, 31)), {})
+    
+    def test_recusa_mes_aberto(self):
+        """Testa que só meses fechados podem ser arquivados"""
+        from datetime import date
+        from estoque.utils.arquivamento import arquivar_movimentacoes
+        
+        with self.assertRaises(ValueError):
+            arquivar_movimentacoes(date(2025, 2, 28))
+        self.assertEqual(StockMovement.objects.count(), 4)
+        
+        # Por padrão, os últimos 12 meses fechados ficam na tabela ativa
+        self.assertEqual(arquivar_movimentacoes(), {})
+        self.assertEqual(arquivar_movimentacoes(manter_meses=0), {2025: 2})
+    
+    def test_leituras_incluem_arquivo(self):
+        """Testa avaliação, reconciliação e histórico depois do arquivamento"""
+        from datetime import date
+        from django.db.models import Q
+        from estoque.models import StockSnapshot
+        from estoque.utils.arquivamento import arquivar_movimentacoes, movimentacoes_historicas, totais_por_tipo
+        from estoque.utils.avaliacao import avaliar_estoque
+        from estoque.utils.reconciliacao import reconciliar_estoque
+        
+        arquivar_movimentacoes(date(2025, 1, 31))
+        
+        # Antes do primeiro snapshot, a avaliação lê o arquivo
+        StockSnapshot.objects.all().delete()
+        self.assertEqual(avaliar_estoque(date(2025, 1, 15))[self.produto.pk].quantidade, Decimal('6.00'))
+        posicao = avaliar_estoque(date(2025, 2, 28))[self.produto.pk]
+        self.assertEqual(posicao.quantidade, Decimal('10.00'))
+        self.assertEqual(posicao.custo_medio, Decimal('15.00'))
+        
+        self.assertEqual(reconciliar_estoque()['total_divergencias'], 0)
+        self.assertEqual(totais_por_tipo(Q(produto=self.produto)), {
+            'ENTRADA': Decimal('16.00'), 'SAIDA': Decimal('6.00'),
+        })
+        
+        historico = movimentacoes_historicas(Q(produto=self.produto))
+        self.assertEqual(historico.count(), 4)
+        movimentacoes = list(historico)
+        self.assertEqual([m.arquivada for m in movimentacoes], [False, False, True, True])
+        self.assertEqual(movimentacoes[-1].pk, self.janeiro[0].pk)
+        self.assertEqual(movimentacoes[-1].produto, self.produto)
+        
+        # Períodos depois do arquivo não leem o arquivo
+        recentes = movimentacoes_historicas(Q(produto=self.produto), date(2025, 2, 1))
+        self.assertEqual(recentes.model, StockMovement)
+        self.assertEqual(recentes.count(), 2)
+    
+    def test_resumo_e_curva_abc_de_mes_arquivado_em_parte(self):
+        """Testa que faixas que cobrem parte de um mês fechado leem o arquivo"""
+        from datetime import date
+        from estoque.utils.arquivamento import arquivar_movimentacoes
+        from estoque.utils.curva_abc import curva_abc
+        from estoque.utils.fechamento import resumo_periodo
+        
+        # Arquivado até o meio de janeiro (mês fechado): a saída do dia 10 sai da tabela ativa
+        arquivar_movimentacoes(date(2025, 1, 15))
+        self.assertFalse(StockMovement.objects.filter(data_movimento__lt=date(2025, 1, 16)).exists())
+        
+        resumo = resumo_periodo(date(2025, 1, 8), date(2025, 1, 31))
+        self.assertEqual((resumo['entradas'], resumo['saidas']), (Decimal('0.00'), Decimal('4.00')))
+        self.assertEqual(resumo['saidas_por_mes'], {'2025-01': {'Produto Teste': Decimal('4.00')}})
+        
+        linhas = list(curva_abc(date(2025, 1, 8), date(2025, 2, 28)))
+        self.assertEqual([(linha.produto_id, linha.valor) for linha in linhas], [(self.produto.pk, Decimal('70.00'))])
+
+
+class ContagemInventarioTest(TestCase):
+    """Testes para as contagens de inventário"""
+    
+    def setUp(self):
+        """Prepara dois produtos em uma categoria e um em outra"""
+        self.categoria = Category.objects.create(nome='Teste')
+        self.outra = Category.objects.create(nome='Outra')
+        self.produto_a = Product.objects.create(
+            nome='Produto A', categoria=self.categoria,
+            quantidade_estoque=Decimal('10.00'), custo_unitario=Decimal('5.00')
+        )
+        self.produto_b = Product.objects.create(
+            nome='Produto B', categoria=self.categoria, quantidade_estoque=Decimal('8.00')
+        )
+        self.produto_c = Product.objects.create(
+            nome='Produto C', categoria=self.outra, quantidade_estoque=Decimal('3.00')
+        )
+    
+    def test_ajustes_consideram_movimentacoes_durante_a_contagem(self):
+        """Testa que vendas antes e depois da leitura não viram divergência"""
+        from estoque.utils.contagem import abrir_contagem, registrar_contagens, divergencias, fechar_contagem
+        
+        contagem = abrir_contagem(categoria=self.categoria)
+        self.assertEqual(contagem.total_itens, 2)
+        
+        # Venda antes da leitura: o contado (6) já reflete a saída de 3, faltam 1
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto_a, quantidade=Decimal('3.00'))
+        registrar_contagens(contagem, [(self.produto_a.pk, Decimal('4.00')), (self.produto_a.pk, Decimal('2.00'))])
+        # Venda depois da leitura: continua valendo após o ajuste
+        StockMovement.objects.create(tipo='SAIDA', produto=self.produto_a, quantidade=Decimal('2.00'))
+        contadas, fora = registrar_contagens(contagem, [(self.produto_b.pk, Decimal('9.50'))])
+        self.assertEqual((contadas, fora), ({self.produto_b.pk: Decimal('9.50')}, []))
+        
+        self.assertEqual(
+            [(item.produto_id, item.diferenca_prevista) for item in divergencias(contagem)],
+            [(self.produto_a.pk, Decimal('-1.00')), (self.produto_b.pk, Decimal('1.50'))]
+        )
+        
+        ajustes = fechar_contagem(contagem)
+        self.assertEqual(
+            [(m.tipo, m.quantidade) for m in ajustes],
+            [('SAIDA', Decimal('1.00')), ('ENTRADA', Decimal('1.50'))]
+        )
+        self.produto_a.refresh_from_db()
+        self.produto_b.refresh_from_db()
+        self.assertEqual(self.produto_a.quantidade_estoque, Decimal('4.00'))
+        self.assertEqual(self.produto_b.quantidade_estoque, Decimal('9.50'))
+        # O ajuste de entrada não tem custo e não altera o custo médio
+        self.assertEqual(self.produto_a.custo_unitario, Decimal('5.00'))
+        self.assertEqual(contagem.status, 'FECHADA')
+        self.assertEqual(contagem.total_ajustes, 2)
+        
+        with self.assertRaises(ValueError):
+            fechar_contagem(contagem)
+        with self.assertRaises(ValueError):
+            registrar_contagens(contagem, [(self.produto_a.pk, Decimal('1.00'))])
+    
+    def test_escopo_recontagem_e_nao_contados(self):
+        """Testa produtos fora do escopo, recontagem e zerar os não contados"""
+        from estoque.models import StockCountItem
+        from estoque.utils.contagem import abrir_contagem, registrar_contagens, fechar_contagem, cancelar_contagem
+        
+        contagem = abrir_contagem(categoria=self.categoria)
+        leituras = [(self.produto_a.pk, Decimal('1.00')), (self.produto_c.pk, Decimal('1.00'))]
+        self.assertEqual(registrar_contagens(contagem, leituras), ({}, [self.produto_c.pk]))
+        self.assertFalse(contagem.itens.filter(quantidade_contada__isnull=False).exists())
+        
+        registrar_contagens(contagem, [(self.produto_a.pk, Decimal('7.00'))])
+        contadas, _ = registrar_contagens(contagem, [(self.produto_a.pk, Decimal('10.00'))], substituir=True)
+        self.assertEqual(contadas, {self.produto_a.pk: Decimal('10.00')})
+        
+        ajustes = fechar_contagem(contagem, zerar_nao_contados=True)
+        self.assertEqual([(m.produto_id, m.tipo, m.quantidade) for m in ajustes], [
+            (self.produto_b.pk, 'SAIDA', Decimal('8.00')),
+        ])
+        self.produto_b.refresh_from_db()
+        self.assertEqual(self.produto_b.quantidade_estoque, Decimal('0.00'))
+        
+        # Cancelar descarta os itens sem tocar no estoque
+        contagem = abrir_contagem()
+        self.assertEqual(contagem.total_itens, 3)
+        cancelar_contagem(contagem)
+        self.assertFalse(StockCountItem.objects.filter(contagem=contagem).exists())
+        with self.assertRaises(ValueError):
+            cancelar_contagem(contagem)
+
+
+class BuscaNomesTest(TestCase):
+    """Testes para a busca aproximada de produtos pelo nome"""
+    
+    def setUp(self):
+        """Prepara produtos de nomes parecidos"""
+        self.categoria = Category.objects.create(nome='Teste')
+        self.parafuso = Product.objects.create(nome='Parafuso Sextavado 10mm', categoria=self.categoria)
+        self.porca = Product.objects.create(nome='Porca Sextavada 10mm', categoria=self.categoria)
+        Product.objects.create(nome='Tinta Acrílica Branca', categoria=self.categoria)
+    
+    def test_indice_acompanha_renomear_e_arquivar(self):
+        """Testa que renomear e arquivar atualizam o índice sem reindexar tudo"""
+        from estoque.utils.busca_nomes import sugerir_produtos, reindexar_nomes
+        from estoque.models import ProductNameTrigram
+        
+        sugestoes = sugerir_produtos(['PARAFUSO SEXTAV. 10 MM', 'Lâmpada LED'])
+        self.assertEqual(sugestoes[0][0].produto_id, self.parafuso.pk)
+        self.assertGreater(sugestoes[0][0].similaridade, 0.5)
+        self.assertEqual(sugestoes[1], [])
+        
+        self.parafuso.nome = 'Lâmpada LED 9W'
+        self.parafuso.save()
+        self.assertNotIn(
+            self.parafuso.pk, [s.produto_id for s in sugerir_produtos(['PARAFUSO SEXTAV. 10 MM'])[0]]
+        )
+        self.assertEqual(sugerir_produtos(['Lampada LED'])[0][0].produto_id, self.parafuso.pk)
+        
+        self.parafuso.arquivar()
+        self.assertEqual(sugerir_produtos(['Lampada LED']), [[]])
+        
+        # O índice incremental é igual ao refeito do zero
+        incremental = dict(ProductNameTrigram.objects.filter(produtos__gt=0).values_list('trigrama', 'ids'))
+        self.assertEqual(reindexar_nomes(), 2)
+        refeito = dict(ProductNameTrigram.objects.values_list('trigrama', 'ids'))
+        self.assertEqual({t: bytes(ids) for t, ids in incremental.items()}, {t: bytes(ids) for t, ids in refeito.items()})
+
+
+class CacheNFeTest(TestCase):
+    """Testes para o cache do parsing de NF-e"""
+    
+    def setUp(self):
+        from estoque.utils.cache_nfe import limpar_cache_nfe
+        
+        limpar_cache_nfe()
+        self.addCleanup(limpar_cache_nfe)
+    
+    def test_reenvio_nao_refaz_o_parsing_e_lru_respeita_limite(self):
+        """Testa acertos, a versão do parser na chave e o descarte dos menos usados"""
+        from io import BytesIO
+        from unittest.mock import patch
+        from estoque.utils import cache_nfe
+        from estoque.utils.dados_sinteticos import gerar_nfe_xml
+        from estoque.utils.xml_parser import ler_nfe
+        
+        xmls = [gerar_nfe_xml(itens=3, seed=seed) for seed in range(3)]
+        esperado = ler_nfe(BytesIO(xmls[0]))
+        self.assertEqual(cache_nfe.ler_nfe_com_cache(xmls[0]), esperado)
+        
+        with patch('estoque.utils.cache_nfe.ler_nfe') as ler:
+            nota = cache_nfe.ler_nfe_com_cache(xmls[0])
+            ler.assert_not_called()
+        self.assertEqual(nota, esperado)
+        # Cada acerto devolve dicionários novos
+        nota['produtos'][0]['sugestoes'] = []
+        self.assertNotIn('sugestoes', cache_nfe.ler_nfe_com_cache(xmls[0])['produtos'][0])
+        
+        with patch('estoque.utils.cache_nfe.VERSAO_PARSER', 999):
+            cache_nfe.ler_nfe_com_cache(xmls[0])
+        
+        estatisticas = cache_nfe.estatisticas_cache_nfe()
+        self.assertEqual((estatisticas['acertos'], estatisticas['faltas']), (2, 2))
+        self.assertEqual(estatisticas['taxa_acerto'], 0.5)
+        
+        cache_nfe.limpar_cache_nfe()
+        with patch.object(cache_nfe, 'LIMITE_NOTAS', 2):
+            for xml in (xmls[0], xmls[1], xmls[0], xmls[2]):
+                cache_nfe.ler_nfe_com_cache(xml)
+            # O segundo XML era o menos usado recentemente
+            cache_nfe.ler_nfe_com_cache(xmls[0])
+            cache_nfe.ler_nfe_com_cache(xmls[1])
+        estatisticas = cache_nfe.estatisticas_cache_nfe()
+        self.assertEqual(
+            (estatisticas['acertos'], estatisticas['faltas'], estatisticas['descartes'], estatisticas['notas']),
+            (2, 4, 2, 2)
+        )
+
+
+class DownloadNFeTest(TestCase):
+    """Testes para o download assíncrono de XMLs de NF-e (servidor HTTP local)"""
+    
+    def setUp(self):
+        import threading
+        import time
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from estoque.utils.dados_sinteticos import gerar_nfe_xml
+        
+        self.xml = gerar_nfe_xml(itens=2, seed=5)
+        xml = self.xml
+        conexoes = self.conexoes = []
+        
+        class Servidor(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def setup(self):
+                super().setup()
+                conexoes.append(self.client_address)
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_GET(self):
+                if self.path == '/nota.xml':
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(xml)))
+                    self.end_headers()
+                    self.wfile.write(xml)
+                elif self.path == '/redireciona':
+                    self.send_response(302)
+                    self.send_header('Location', '/nota.xml')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                elif self.path == '/lenta.xml':
+                    time.sleep(1)
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(xml)))
+                    self.end_headers()
+                    self.wfile.write(xml)
+                elif self.path == '/grande.xml':
+                    # Sem tamanho: o limite vale durante a leitura
+                    self.send_response(200)
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    self.wfile.write(b'<a>' + b'x' * 20000 + b'</a>')
+                    self.close_connection = True
+                elif self.path == '/invalido.xml':
+                    self.send_response(200)
+                    self.send_header('Content-Length', '6')
+                    self.end_headers()
+                    self.wfile.write(b'<nada>')
+                else:
+                    self.send_error(404)
+        
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', 0), Servidor)
+        self.servidor.daemon_threads = True
+        # A resposta lenta chega depois do timeout, com a conexão já fechada
+        self.servidor.handle_error = lambda *args: None
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.addCleanup(self.servidor.server_close)
+        self.addCleanup(self.servidor.shutdown)
+        self.base = f'http://127.0.0.1:{self.servidor.server_address[1]}'
+    
+    def _baixar(self, caminhos, **kwargs):
+        import asyncio
+        from estoque.utils.download_nfe import baixar_xmls
+        
+        return asyncio.run(baixar_xmls([self.base + caminho for caminho in caminhos], **kwargs))
+    
+    def test_baixa_em_paralelo_com_erros_por_url(self):
+        """Testa a resposta 200, redirecionamento não seguido, 404, limite e timeout"""
+        resultados = self._baixar(
+            ['/nota.xml', '/redireciona', '/nao-existe.xml', '/grande.xml', '/lenta.xml'],
+            timeout=0.5, limite_bytes=10000,
+        )
+        self.assertEqual(resultados[0].conteudo, self.xml)
+        self.assertEqual(resultados[1].erro, 'Erro ao baixar XML: Status HTTP 302')
+        self.assertEqual(resultados[2].erro, 'Erro ao baixar XML: Status HTTP 404')
+        self.assertIn('muito grande', resultados[3].erro)
+        self.assertIn('Tempo esgotado', resultados[4].erro)
+        self.assertTrue(all(r.conteudo is None for r in resultados[1:]))
+    
+    def test_conexao_por_url_e_entrega_ao_parser(self):
+        """Testa uma conexão por URL (sem keep-alive) e o resultado do parsing"""
+        from estoque.models import ImportedInvoice
+        from estoque.utils.arquivo_nfe import extrair_chave, hash_xml
+        from estoque.utils.download_nfe import ler_xmls_baixados
+        
+        resultados = self._baixar(['/nota.xml', '/nota.xml', '/invalido.xml'], concorrencia=1)
+        self.assertEqual(len(self.conexoes), 3)
+        
+        ImportedInvoice.objects.create(
+            chave=extrair_chave(self.xml), hash_conteudo=hash_xml(self.xml), arquivo='x', tamanho=len(self.xml)
+        )
+        notas = ler_xmls_baixados(resultados)
+        self.assertEqual([nota['sucesso'] for nota in notas], [True, True, False])
+        self.assertTrue(notas[0]['ja_importada'])
+        self.assertEqual(notas[0]['chave'], extrair_chave(self.xml))
+        self.assertEqual(len(notas[0]['produtos']), 2)
+        self.assertIsInstance(notas[0]['produtos'][0]['quantidade'], str)
+        self.assertTrue(notas[2]['erro'])
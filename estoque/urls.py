@@ -26,6 +26,7 @@ urlpatterns = [
     # Produtos
     path('produtos/', views.produto_lista, name='produto_lista'),
     path('produtos/novo/', views.produto_criar, name='produto_criar'),
+    path('produtos/importar/', views.produto_importar, name='produto_importar'),
     path('produtos/<int:pk>/', views.produto_detalhar, name='produto_detalhar'),
     path('produtos/<int:pk>/editar/', views.produto_editar, name='produto_editar'),
     path('produtos/<int:pk>/historico/', views.produto_historico, name='produto_historico'),
@@ -38,9 +39,14 @@ urlpatterns = [
     
     # Saídas
     path('saida/', views.saida_criar, name='saida_criar'),
+    path('saida/lote/', views.saida_lote, name='saida_lote'),
     
     # Relatórios
     path('relatorios/', views.relatorio_index, name='relatorio_index'),
+    path('relatorios/avaliacao/', views.relatorio_avaliacao, name='relatorio_avaliacao'),
+    path('relatorios/abc/', views.relatorio_abc, name='relatorio_abc'),
+    path('relatorios/estoque-parado/', views.relatorio_estoque_parado, name='relatorio_estoque_parado'),
+    path('relatorios/fechamentos/', views.relatorio_fechamentos, name='relatorio_fechamentos'),
     
     # Pedidos WhatsApp
     path('pedidos/whatsapp/', views.pedido_whatsapp, name='pedido_whatsapp'),
@@ -48,5 +54,20 @@ urlpatterns = [
     # API
     path('api/produto/<int:produto_id>/estoque/', views.api_produto_estoque, name='api_produto_estoque'),
     path('api/sku/verificar/', views.api_verificar_sku, name='api_verificar_sku'),
+    path('api/nfe/cache/', views.api_nfe_cache, name='api_nfe_cache'),
+    path('api/nfe/baixar/', views.api_nfe_baixar, name='api_nfe_baixar'),
+    path('api/saida/lote/', views.api_saida_lote, name='api_saida_lote'),
+    path('api/produtos/lote/', views.api_produtos_editar_lote, name='api_produtos_editar_lote'),
+    path('api/leitura/sessoes/', views.api_leitura_sessao_criar, name='api_leitura_sessao_criar'),
+    path('api/leitura/sessoes/<int:pk>/', views.api_leitura_sessao, name='api_leitura_sessao'),
+    path('api/leitura/sessoes/<int:pk>/ler/', views.api_leitura_registrar, name='api_leitura_registrar'),
+    path('api/leitura/sessoes/<int:pk>/confirmar/', views.api_leitura_confirmar, name='api_leitura_confirmar'),
+    path('api/leitura/sessoes/<int:pk>/cancelar/', views.api_leitura_cancelar, name='api_leitura_cancelar'),
+    path('api/contagens/', views.api_contagem_criar, name='api_contagem_criar'),
+    path('api/contagens/<int:pk>/', views.api_contagem, name='api_contagem'),
+    path('api/contagens/<int:pk>/contar/', views.api_contagem_contar, name='api_contagem_contar'),
+    path('api/contagens/<int:pk>/fechar/', views.api_contagem_fechar, name='api_contagem_fechar'),
+    path('api/contagens/<int:pk>/cancelar/', views.api_contagem_cancelar, name='api_contagem_cancelar'),
+    path('api/sync/movimentacoes/', views.api_sync_movimentacoes, name='api_sync_movimentacoes'),
 ]
 
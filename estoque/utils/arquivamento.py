@@ -0,0 +1,238 @@
+"""
+Utilitário para o arquivamento de movimentações de períodos fechados.
+
+Movimentações de meses fechados (imutáveis) saem de StockMovement para
+ArchivedStockMovement em lotes, cada lote em uma transação, mantendo o id
+original. A tabela ativa fica só com o período recente.
+
+As leituras históricas (histórico do produto, relatório de movimentações,
+avaliação sem snapshot anterior, reconciliação) passam por
+linhas_com_arquivo/HistoricoMovimentacoes, que só incluem o arquivo
+(UNION ALL) quando o período pedido alcança a data arquivada. Resumos e a
+curva ABC leem os meses fechados inteiros dos fechamentos; as faixas
+restantes (mês aberto e meses cobertos em parte, que podem estar
+arquivados até um dia no meio do mês) passam por modelos_do_periodo.
+"""
+from collections import Counter
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.db.models import Max, Q, Sum, Value
+
+from .fechamento import primeiro_dia, ultimo_dia_fechado
+
+
+# Colunas comuns às duas tabelas (o arquivo acrescenta só `ano`)
+CAMPOS = (
+    'id', 'tipo', 'produto_id', 'quantidade', 'custo_unitario', 'fornecedor_id', 'observacao',
+    'usuario_id', 'created_at', 'data_movimento', 'saldo_apos', 'custo_medio_apos', 'chave_idempotencia',
+)
+
+
+def arquivado_ate() -> Optional[date]:
+    """Dia da movimentação arquivada mais recente (None se o arquivo está vazio)"""
+    from estoque.models import ArchivedStockMovement
+
+    return ArchivedStockMovement.objects.aggregate(ultimo=Max('data_movimento'))['ultimo']
+
+
+def _alcanca_arquivo(data_inicio: Optional[date]) -> bool:
+    limite = arquivado_ate()
+    return limite is not None and (data_inicio is None or data_inicio <= limite)
+
+
+def modelos_do_periodo(data_inicio: Optional[date] = None):
+    """
+    Modelos com as movimentações de um período a partir de `data_inicio`:
+    StockMovement e, se o período alcança o arquivo, ArchivedStockMovement
+    """
+    from estoque.models import ArchivedStockMovement, StockMovement
+
+    if _alcanca_arquivo(data_inicio):
+        return (StockMovement, ArchivedStockMovement)
+    return (StockMovement,)
+
+
+def linhas_com_arquivo(filtro: Q, campos, ordem, data_inicio: Optional[date] = None):
+    """
+    values_list das movimentações que atendem ao filtro, incluindo as
+    arquivadas (UNION ALL) só se o período, a partir de `data_inicio`,
+    alcança o arquivo. Os campos de `ordem` precisam estar em `campos`.
+    """
+    from estoque.models import ArchivedStockMovement, StockMovement
+
+    ativas = StockMovement.objects.filter(filtro).values_list(*campos)
+    if not _alcanca_arquivo(data_inicio):
+        return ativas.order_by(*ordem)
+    arquivadas = ArchivedStockMovement.objects.filter(filtro).values_list(*campos)
+    return ativas.order_by().union(arquivadas.order_by(), all=True).order_by(*ordem)
+
+
+def _montar(linhas):
+    """Instâncias (não salvas) das movimentações, com produto, fornecedor e usuário carregados"""
+    from django.contrib.auth.models import User
+    from estoque.models import ArchivedStockMovement, Product, StockMovement, Supplier
+
+    movimentacoes = []
+    for *valores, arquivada in linhas:
+        dados = dict(zip(CAMPOS, valores))
+        if arquivada:
+            movimentacao = ArchivedStockMovement(ano=dados['data_movimento'].year, **dados)
+        else:
+            movimentacao = StockMovement(**dados)
+        movimentacao._state.adding = False
+        movimentacao.arquivada = arquivada
+        movimentacoes.append(movimentacao)
+
+    relacionados = {
+        'produto': Product.objects.in_bulk({m.produto_id for m in movimentacoes}),
+        'fornecedor': Supplier.objects.in_bulk({m.fornecedor_id for m in movimentacoes} - {None}),
+        'usuario': User.objects.in_bulk({m.usuario_id for m in movimentacoes} - {None}),
+    }
+    for movimentacao in movimentacoes:
+        for campo, objetos in relacionados.items():
+            field = movimentacao._meta.get_field(campo)
+            field.set_cached_value(movimentacao, objetos.get(getattr(movimentacao, field.attname)))
+    return movimentacoes
+
+
+class HistoricoMovimentacoes:
+    """
+    Movimentações ativas e arquivadas que atendem a um filtro, da mais
+    recente para a mais antiga. Aceita count(), fatias e iteração, então
+    serve ao Paginator e às exportações como um queryset.
+    """
+
+    LOTE = 2000
+
+    def __init__(self, filtro: Q, data_inicio: Optional[date] = None):
+        self.filtro = filtro
+        self.data_inicio = data_inicio
+
+    def _linhas(self):
+        from estoque.models import ArchivedStockMovement, StockMovement
+
+        ativas = StockMovement.objects.filter(self.filtro).annotate(arquivada=Value(False))
+        arquivadas = ArchivedStockMovement.objects.filter(self.filtro).annotate(arquivada=Value(True))
+        return ativas.values_list(*CAMPOS, 'arquivada').order_by().union(
+            arquivadas.values_list(*CAMPOS, 'arquivada').order_by(), all=True
+        ).order_by('-created_at', '-id')
+
+    def count(self) -> int:
+        from estoque.models import ArchivedStockMovement, StockMovement
+
+        return (
+            StockMovement.objects.filter(self.filtro).count()
+            + ArchivedStockMovement.objects.filter(self.filtro).count()
+        )
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return _montar(self._linhas()[indice])
+        return _montar(self._linhas()[indice:indice + 1])[0]
+
+    def __iter__(self):
+        linhas = self._linhas().iterator(chunk_size=self.LOTE)
+        while True:
+            lote = list(islice(linhas, self.LOTE))
+            if not lote:
+                return
+            yield from _montar(lote)
+
+
+def movimentacoes_historicas(filtro: Q, data_inicio: Optional[date] = None):
+    """
+    Movimentações que atendem ao filtro, da mais recente para a mais
+    antiga: um queryset de StockMovement se o período não alcança o
+    arquivo, ou um HistoricoMovimentacoes com as duas tabelas.
+    """
+    from estoque.models import StockMovement
+
+    if not _alcanca_arquivo(data_inicio):
+        return StockMovement.objects.filter(filtro).select_related(
+            'produto', 'usuario', 'fornecedor'
+        ).order_by('-created_at')
+    return HistoricoMovimentacoes(filtro, data_inicio)
+
+
+def totais_por_tipo(filtro: Q) -> Dict[str, Decimal]:
+    """Soma das quantidades por tipo (ENTRADA/SAIDA), incluindo o arquivo"""
+    from estoque.models import ArchivedStockMovement, StockMovement
+
+    totais = {'ENTRADA': Decimal('0.00'), 'SAIDA': Decimal('0.00')}
+    for modelo in (StockMovement, ArchivedStockMovement):
+        for tipo, total in modelo.objects.filter(filtro).values('tipo').annotate(
+            total=Sum('quantidade')
+        ).order_by().values_list('tipo', 'total'):
+            totais[tipo] += total
+    return totais
+
+
+def arquivar_movimentacoes(ate: Optional[date] = None, manter_meses: int = 12, lote: int = 5000) -> Dict[int, int]:
+    """
+    Move para o arquivo as movimentações até `ate` (inclusive), em lotes
+    de `lote` linhas, cada lote em uma transação.
+
+    Antes de mover, grava o snapshot do estoque em `ate` (se ainda não
+    existe), para que avaliações posteriores não precisem ler o arquivo.
+
+    Args:
+        ate: último dia arquivado; precisa estar em um mês fechado. Por
+            padrão, o fim do mês `manter_meses` meses antes do último mês
+            fechado
+        manter_meses: meses fechados mantidos na tabela ativa quando `ate`
+            não é informado
+        lote: linhas movidas por transação
+
+    Returns:
+        Dicionário {ano: movimentações arquivadas}
+
+    Raises:
+        ValueError: se `ate` cai em um mês não fechado
+    """
+    from estoque.models import ArchivedStockMovement, StockMovement, StockSnapshot
+    from .avaliacao import criar_snapshot
+
+    fechado_ate = ultimo_dia_fechado()
+    if fechado_ate is None:
+        if ate is not None:
+            raise ValueError('Só movimentações de meses fechados podem ser arquivadas.')
+        return {}
+    if ate is None:
+        # Primeiro mês aberto, recuando os meses fechados mantidos na tabela ativa
+        mes = fechado_ate + timedelta(days=1)
+        for _ in range(manter_meses):
+            mes = primeiro_dia(mes - timedelta(days=1))
+        ate = mes - timedelta(days=1)
+    elif ate > fechado_ate:
+        raise ValueError(
+            f"Só movimentações de meses fechados podem ser arquivadas (fechado até {fechado_ate.strftime('%d/%m/%Y')})."
+        )
+
+    pendentes = StockMovement.objects.filter(data_movimento__lte=ate)
+    if not pendentes.exists():
+        return {}
+
+    # Posição no limite do arquivo: avaliações a partir dela não leem o arquivo
+    if not StockSnapshot.objects.filter(data=ate).exists():
+        criar_snapshot(ate)
+
+    arquivadas = Counter()
+    while True:
+        with transaction.atomic():
+            linhas = list(pendentes.order_by('pk').values(*CAMPOS)[:lote])
+            if not linhas:
+                break
+            ArchivedStockMovement.objects.bulk_create([
+                ArchivedStockMovement(ano=linha['data_movimento'].year, **linha) for linha in linhas
+            ])
+            StockMovement.objects.filter(pk__in=[linha['id'] for linha in linhas]).delete()
+        arquivadas.update(linha['data_movimento'].year for linha in linhas)
+
+    return dict(sorted(arquivadas.items()))
@@ -0,0 +1,115 @@
+"""
+Utilitário para o registro das NF-e importadas e o arquivo dos XMLs.
+
+Cada nota confirmada fica em ImportedInvoice com a chave de acesso
+(chNFe) e o SHA-256 do XML, ambos com índice único. O XML original é
+guardado comprimido (gzip) em MEDIA_ROOT/nfe/, com o hash no nome do
+arquivo: o mesmo conteúdo é gravado uma vez só e o arquivo confere com o
+hash na releitura. O arquivo é gravado na confirmação, na transação que
+registra a nota; até lá o XML fica comprimido na sessão, e uma importação
+desfeita não deixa arquivo para trás.
+
+Antes do parsing, o upload é conferido com uma consulta por índice
+(hash ou chave): a chave sai de uma busca por expressão regular nos bytes
+(atributo Id do infNFe ou chNFe do protocolo), sem montar a árvore XML.
+"""
+import base64
+import gzip
+import hashlib
+import re
+from io import BytesIO
+from typing import Dict, Optional
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+
+
+DIRETORIO_ARQUIVO = 'nfe'
+
+_CHAVE = re.compile(rb'Id\s*=\s*["\']NFe(\d{44})["\']|<(?:\w+:)?chNFe>\s*(\d{44})\s*<')
+
+
+def hash_xml(conteudo: bytes) -> str:
+    """SHA-256 (hexadecimal) do XML"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+def extrair_chave(conteudo: bytes) -> Optional[str]:
+    """Chave de acesso (44 dígitos) da NF-e, sem fazer o parsing do XML"""
+    encontrada = _CHAVE.search(conteudo)
+    if encontrada is None:
+        return None
+    return (encontrada.group(1) or encontrada.group(2)).decode('ascii')
+
+
+def nota_ja_importada(hash_conteudo: str, chave: Optional[str] = None):
+    """Registro da NF-e já importada com o mesmo conteúdo ou a mesma chave (ou None)"""
+    from estoque.models import ImportedInvoice
+
+    filtro = Q(hash_conteudo=hash_conteudo)
+    if chave:
+        filtro |= Q(chave=chave)
+    return ImportedInvoice.objects.filter(filtro).first()
+
+
+def caminho_arquivo(hash_conteudo: str) -> str:
+    """Caminho do XML no arquivo, relativo a MEDIA_ROOT"""
+    return f'{DIRETORIO_ARQUIVO}/{hash_conteudo[:2]}/{hash_conteudo[2:4]}/{hash_conteudo}.xml.gz'
+
+
+def arquivar_xml(conteudo: bytes, hash_conteudo: Optional[str] = None) -> str:
+    """
+    Guarda o XML comprimido no arquivo (se ainda não está lá).
+
+    Returns:
+        Caminho do arquivo, relativo a MEDIA_ROOT
+    """
+    caminho = caminho_arquivo(hash_conteudo or hash_xml(conteudo))
+    if not default_storage.exists(caminho):
+        # mtime=0: o mesmo XML gera sempre os mesmos bytes comprimidos
+        default_storage.save(caminho, ContentFile(gzip.compress(conteudo, mtime=0)))
+    return caminho
+
+
+def descartar_xml_sem_nota(hash_conteudo: str):
+    """
+    Remove o XML do arquivo se nenhuma ImportedInvoice o registra (a
+    transação da confirmação foi desfeita). Chamada depois da transação.
+    """
+    from estoque.models import ImportedInvoice
+
+    caminho = caminho_arquivo(hash_conteudo)
+    if not ImportedInvoice.objects.filter(hash_conteudo=hash_conteudo).exists() and default_storage.exists(caminho):
+        default_storage.delete(caminho)
+
+
+def xml_para_sessao(conteudo: bytes) -> str:
+    """XML comprimido em base64, guardado na sessão entre a prévia e a confirmação"""
+    return base64.b64encode(gzip.compress(conteudo, mtime=0)).decode('ascii')
+
+
+def xml_da_sessao(texto: str) -> bytes:
+    """XML original a partir de xml_para_sessao"""
+    return gzip.decompress(base64.b64decode(texto))
+
+
+def ler_xml_arquivado(nota) -> bytes:
+    """
+    XML original de uma ImportedInvoice.
+
+    Raises:
+        ValueError: se o arquivo não confere com o hash registrado
+    """
+    with default_storage.open(nota.arquivo, 'rb') as arquivo:
+        conteudo = gzip.decompress(arquivo.read())
+    if hash_xml(conteudo) != nota.hash_conteudo:
+        raise ValueError(f'O XML arquivado da nota {nota.chave or nota.pk} não confere com o hash registrado.')
+    return conteudo
+
+
+def reler_nota(nota) -> Dict:
+    """Refaz o parsing do XML arquivado (auditoria), no formato de ler_nfe"""
+    from .xml_parser import ler_nfe
+
+    return ler_nfe(BytesIO(ler_xml_arquivado(nota)))
@@ -0,0 +1,41 @@
+"""
+Autenticação por token para as APIs usadas por coletores de dados.
+
+O cliente envia o cabeçalho ``Authorization: Token <chave>``.
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+
+
+def token_required(view_func):
+    """
+    Decorator que autentica a requisição pelo token de API e define
+    request.user com o usuário dono do token. Dispensa CSRF e sessão.
+    """
+    @csrf_exempt
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        from estoque.models import ApiToken
+
+        cabecalho = request.headers.get('Authorization', '')
+        tipo, _, chave = cabecalho.partition(' ')
+        if tipo != 'Token' or not chave.strip():
+            return JsonResponse({'sucesso': False, 'erro': 'Token não informado'}, status=401)
+
+        token = ApiToken.objects.select_related('usuario').filter(
+            chave_hash=ApiToken.calcular_hash(chave.strip()),
+            ativo=True,
+            usuario__is_active=True,
+        ).first()
+        if token is None:
+            return JsonResponse({'sucesso': False, 'erro': 'Token inválido'}, status=401)
+
+        ApiToken.objects.filter(pk=token.pk).update(ultimo_uso=timezone.now())
+        request.user = token.usuario
+        request.api_token = token
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped
@@ -0,0 +1,167 @@
+"""
+Utilitário para avaliação do estoque em uma data passada ("estoque em X").
+
+A posição de cada produto é reconstruída a partir do snapshot diário mais
+recente anterior à data (StockSnapshot) mais as movimentações posteriores
+a ele, sem percorrer todo o histórico. As movimentações são aplicadas na
+ordem de created_at, então lançamentos retroativos entram na data certa.
+
+Produtos que não estão no snapshot (ou todos, sem snapshot) partem do
+saldo de abertura (estoque digitado no cadastro, ver
+razao.saldos_de_abertura), e não de zero: a avaliação na data de hoje
+confere com quantidade_estoque e com o razão.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .movimentacoes import custo_medio_ponderado
+
+
+LOTE = 5000
+
+
+class PosicaoEstoque(NamedTuple):
+    quantidade: Decimal
+    custo_medio: Decimal
+
+    @property
+    def valor(self) -> Decimal:
+        return self.quantidade * self.custo_medio
+
+
+def inicio_do_dia(dia: date) -> datetime:
+    """Primeiro instante do dia no fuso local (TIME_ZONE)"""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def _limite(momento) -> datetime:
+    """Limite exclusivo de created_at: fim do dia para datas, o próprio instante para datetimes"""
+    if isinstance(momento, datetime):
+        return momento + timedelta(microseconds=1)
+    return inicio_do_dia(momento + timedelta(days=1))
+
+
+def avaliar_estoque(momento) -> Dict[int, PosicaoEstoque]:
+    """
+    Calcula quantidade e custo médio de todos os produtos em `momento`.
+
+    Args:
+        momento: date (posição ao final do dia local) ou datetime
+            (posição incluindo as movimentações até o instante)
+
+    Returns:
+        Dicionário produto_id -> PosicaoEstoque, para os produtos que
+        tiveram movimentação ou tinham saldo de abertura até o momento
+    """
+    from estoque.models import StockSnapshot
+
+    ate = _limite(momento)
+
+    # Snapshot do dia D vale se o fim de D <= ate, ou seja, D < data local de `ate`
+    snapshot = StockSnapshot.objects.filter(
+        data__lt=timezone.localdate(ate)
+    ).order_by('-data').first()
+
+    posicoes = {}
+    desde = None
+    if snapshot is not None:
+        for produto_id, quantidade, custo in snapshot.itens.values_list(
+            'produto_id', 'quantidade', 'custo_medio'
+        ).iterator(chunk_size=LOTE):
+            posicoes[produto_id] = PosicaoEstoque(quantidade, custo)
+        desde = snapshot.data + timedelta(days=1)
+
+    return avancar_posicoes(posicoes, desde, ate)
+
+
+def avancar_posicoes(posicoes: Dict[int, PosicaoEstoque], desde: Optional[date], ate: datetime) -> Dict[int, PosicaoEstoque]:
+    """
+    Leva as posições do início do dia `desde` (ou do início do histórico,
+    com desde=None e posições vazias) até o instante `ate` (exclusivo):
+    soma o estoque de abertura dos produtos cadastrados no intervalo e
+    aplica as movimentações dele em ordem de created_at.
+
+    Args:
+        posicoes: posições no início de `desde` (alterado e devolvido)
+    """
+    from estoque.models import Product
+    from .arquivamento import linhas_com_arquivo
+    from .razao import saldos_de_abertura
+
+    filtro = Q(created_at__lt=ate)
+    cadastrados = Product.objects.filter(created_at__lt=ate)
+    if desde is not None:
+        filtro &= Q(created_at__gte=inicio_do_dia(desde))
+        # Os cadastrados antes de `desde` já estão nas posições
+        cadastrados = cadastrados.filter(created_at__gte=inicio_do_dia(desde))
+
+    # Estoque digitado no cadastro, que não tem movimentação
+    for produto_id, (quantidade, custo) in saldos_de_abertura(cadastrados).items():
+        if quantidade != 0:
+            posicoes.setdefault(produto_id, PosicaoEstoque(quantidade, custo))
+
+    # Desde o início do histórico, inclui as movimentações arquivadas
+    movimentacoes = linhas_com_arquivo(
+        filtro,
+        ('produto_id', 'tipo', 'quantidade', 'custo_unitario', 'created_at', 'id'),
+        ('produto_id', 'created_at', 'id'),
+        data_inicio=desde,
+    )
+
+    vazio = PosicaoEstoque(Decimal('0.00'), Decimal('0.00'))
+    for produto_id, tipo, quantidade, custo_unitario, _, _ in movimentacoes.iterator(chunk_size=LOTE):
+        saldo, custo = posicoes.get(produto_id, vazio)
+        if tipo == 'ENTRADA':
+            custo = custo_medio_ponderado(saldo, custo, quantidade, custo_unitario)
+            saldo += quantidade
+        else:
+            saldo -= quantidade
+        posicoes[produto_id] = PosicaoEstoque(saldo, custo)
+
+    return posicoes
+
+
+def criar_snapshot(dia: date, posicoes: Optional[Dict[int, PosicaoEstoque]] = None):
+    """
+    Grava (ou regrava) o snapshot do estoque ao final de `dia`.
+    Só os produtos com saldo diferente de zero são gravados.
+
+    Args:
+        posicoes: resultado de avaliar_estoque(dia), se já calculado
+    """
+    from estoque.models import StockSnapshot, StockSnapshotItem
+
+    if posicoes is None:
+        posicoes = avaliar_estoque(dia)
+    with transaction.atomic():
+        StockSnapshot.objects.filter(data=dia).delete()
+        itens = [
+            (produto_id, posicao) for produto_id, posicao in posicoes.items()
+            if posicao.quantidade != 0
+        ]
+        snapshot = StockSnapshot.objects.create(
+            data=dia,
+            total_produtos=len(itens),
+            valor_total=sum((posicao.valor for _, posicao in itens), Decimal('0.00')),
+        )
+        StockSnapshotItem.objects.bulk_create([
+            StockSnapshotItem(
+                snapshot=snapshot, produto_id=produto_id,
+                quantidade=posicao.quantidade, custo_medio=posicao.custo_medio,
+            )
+            for produto_id, posicao in itens
+        ], batch_size=LOTE)
+    return snapshot
+
+
+def invalidar_snapshots(desde: Optional[date]):
+    """Remove os snapshots afetados por movimentações lançadas em `desde` ou depois"""
+    from estoque.models import StockSnapshot
+
+    if desde is not None:
+        StockSnapshot.objects.filter(data__gte=desde).delete()
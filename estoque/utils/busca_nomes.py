@@ -0,0 +1,275 @@
+"""
+Busca aproximada de produtos pelo nome, usada para sugerir o produto dos
+itens de NF-e sem correspondência no cadastro.
+
+O índice fica no banco com uma linha por trigrama do nome normalizado
+(ProductNameTrigram): os ids dos produtos ativos que têm o trigrama,
+ordenados e empacotados como inteiros de 32 bits, e a quantidade deles.
+Com ~30 mil trigramas para 200 mil produtos, ler as listas de uma nota
+é desempacotar alguns blobs (em C), em vez de trazer uma linha por par
+(trigrama, produto). Product.save e as gravações em lote atualizam só as
+listas dos trigramas que entraram ou saíram dos nomes alterados.
+
+Para cada item são consultados os trigramas mais raros do nome (filtro
+por prefixo: um produto com similaridade acima do mínimo precisa ter ao
+menos um deles), até um orçamento de ids lidos por item. Os produtos que
+mais aparecem nessas listas são reordenados pelo coeficiente de Dice
+calculado sobre os nomes.
+"""
+import math
+import re
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.db import connection, transaction
+
+
+# Similaridade (Dice) mínima de uma sugestão
+SIMILARIDADE_MINIMA = 0.4
+
+# Candidatos por item reordenados pelo Dice (os de mais trigramas em comum)
+CANDIDATOS_POR_ITEM = 10
+
+# Ids lidos das listas por item: os trigramas mais raros são consultados
+# até este total (o mais raro sempre entra)
+ORCAMENTO_POR_ITEM = 5000
+
+# Acima de tantas inclusões/remoções em uma lista, ela é refeita em vez de
+# alterada id a id
+ALTERACOES_PONTUAIS = 64
+
+LOTE = 5000
+
+
+class Sugestao(NamedTuple):
+    """Produto sugerido para um item e a similaridade (0 a 1) dos nomes"""
+    produto_id: int
+    codigo: str
+    nome: str
+    similaridade: float
+
+
+def normalizar_nome(nome: str) -> str:
+    """Minúsculas, sem acentos e só letras/dígitos separados por um espaço"""
+    nome = unicodedata.normalize('NFKD', nome or '').encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.findall(r'[a-z0-9]+', nome.lower()))
+
+
+def trigramas(nome: str) -> FrozenSet[str]:
+    """Trigramas do nome normalizado, com um espaço antes e depois de cada palavra"""
+    normalizado = normalizar_nome(nome)
+    if not normalizado:
+        return frozenset()
+    texto = f' {normalizado} '
+    return frozenset(texto[i:i + 3] for i in range(len(texto) - 2))
+
+
+def similaridade(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Coeficiente de Dice entre dois conjuntos de trigramas"""
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def empacotar(ids: Iterable[int]) -> bytes:
+    """Lista ordenada de ids -> bytes (inteiros sem sinal de 32 bits, little-endian)"""
+    valores = array('I', ids)
+    if sys.byteorder != 'little':
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def desempacotar(dados) -> array:
+    """Inverso de empacotar"""
+    valores = array('I')
+    valores.frombytes(bytes(dados))
+    if sys.byteorder != 'little':
+        valores.byteswap()
+    return valores
+
+
+def montar_indice(produtos: Iterable[Tuple[int, str]]) -> Dict[str, List[int]]:
+    """
+    Listas invertidas de (produto_id, nome): trigrama -> ids ordenados.
+    Também usada pela migração que cria o índice.
+    """
+    listas = defaultdict(list)
+    for produto_id, nome in sorted(produtos):
+        for trigrama in trigramas(nome):
+            listas[trigrama].append(produto_id)
+    return listas
+
+
+def _aplicar(ids: array, incluir: set, remover: set) -> array:
+    """Inclui e remove ids de uma lista ordenada"""
+    if len(incluir) + len(remover) > ALTERACOES_PONTUAIS:
+        return array('I', sorted(set(ids) - remover | incluir))
+    for produto_id in remover:
+        posicao = bisect_left(ids, produto_id)
+        if posicao < len(ids) and ids[posicao] == produto_id:
+            ids.pop(posicao)
+    for produto_id in incluir:
+        posicao = bisect_left(ids, produto_id)
+        if posicao == len(ids) or ids[posicao] != produto_id:
+            ids.insert(posicao, produto_id)
+    return ids
+
+
+def indexar_nomes(alteracoes: Iterable[Tuple[int, Optional[str], Optional[str]]], lote: int = LOTE):
+    """
+    Atualiza o índice com nomes alterados.
+
+    Args:
+        alteracoes: tuplas (produto_id, nome indexado até agora, nome novo);
+            None como nome anterior é um produto fora do índice (novo ou
+            arquivado) e como nome novo tira o produto do índice
+    """
+    from estoque.models import ProductNameTrigram
+
+    incluir = defaultdict(set)
+    remover = defaultdict(set)
+    for produto_id, anterior, novo in alteracoes:
+        antes = trigramas(anterior) if anterior else frozenset()
+        depois = trigramas(novo) if novo else frozenset()
+        for trigrama in depois - antes:
+            incluir[trigrama].add(produto_id)
+        for trigrama in antes - depois:
+            remover[trigrama].add(produto_id)
+
+    afetados = list(incluir.keys() | remover.keys())
+    if not afetados:
+        return
+
+    with transaction.atomic():
+        # Cria vazias as listas de trigramas novos: daí em diante é tudo UPDATE
+        ProductNameTrigram.objects.bulk_create(
+            [ProductNameTrigram(trigrama=trigrama) for trigrama in incluir],
+            batch_size=lote, ignore_conflicts=True,
+        )
+        alteradas = []
+        for inicio in range(0, len(afetados), lote):
+            for trigrama, dados in ProductNameTrigram.objects.select_for_update().filter(
+                trigrama__in=afetados[inicio:inicio + lote]
+            ).values_list('trigrama', 'ids'):
+                ids = _aplicar(desempacotar(dados), incluir[trigrama], remover[trigrama])
+                alteradas.append((empacotar(ids), len(ids), trigrama))
+
+        # Um UPDATE parametrizado (executemany): bulk_update montaria um CASE com todos os blobs
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {quote(ProductNameTrigram._meta.db_table)} '
+                f'SET {quote("ids")} = %s, {quote("produtos")} = %s WHERE {quote("trigrama")} = %s',
+                alteradas,
+            )
+
+
+def reindexar_nomes(lote: int = LOTE) -> int:
+    """
+    Refaz o índice de todos os produtos ativos (depois de cargas que não
+    passam por Product.save nem pelas gravações em lote do app).
+
+    Returns:
+        Quantidade de produtos indexados
+    """
+    from estoque.models import Product, ProductNameTrigram
+
+    produtos = list(Product.objects.filter(arquivado=False).order_by().values_list('pk', 'nome'))
+    listas = montar_indice(produtos)
+    with transaction.atomic():
+        ProductNameTrigram.objects.all().delete()
+        ProductNameTrigram.objects.bulk_create(
+            [
+                ProductNameTrigram(trigrama=trigrama, produtos=len(ids), ids=empacotar(ids))
+                for trigrama, ids in listas.items()
+            ],
+            batch_size=lote,
+        )
+    return len(produtos)
+
+
+def _trigramas_consultados(conjunto: FrozenSet[str], frequencias: Dict[str, int]) -> List[str]:
+    """
+    Trigramas mais raros do item que bastam para achar todo produto com
+    Dice >= SIMILARIDADE_MINIMA: com |A∩B| >= t, ao menos um dos
+    |A| - t + 1 mais raros está em B. A consulta para antes disso se o
+    total de ids passar de ORCAMENTO_POR_ITEM (os trigramas frequentes
+    são pouco seletivos e as listas deles são as maiores).
+    """
+    # Dice >= s com |B| >= |A∩B| implica |A∩B| >= s|A| / (2 - s)
+    minimo_comum = max(1, math.ceil(SIMILARIDADE_MINIMA * len(conjunto) / (2 - SIMILARIDADE_MINIMA)))
+    # Os trigramas que nenhum nome tem são os mais raros e entram na conta sem consulta
+    presentes = sorted((frequencias[t], t) for t in conjunto if t in frequencias)
+    consultados = []
+    lidos = 0
+    for frequencia, trigrama in presentes[:len(presentes) - minimo_comum + 1]:
+        if consultados and lidos + frequencia > ORCAMENTO_POR_ITEM:
+            break
+        consultados.append(trigrama)
+        lidos += frequencia
+    return consultados
+
+
+def sugerir_produtos(nomes: List[str], k: int = 3, lote: int = LOTE) -> List[List[Sugestao]]:
+    """
+    Sugere, para cada nome (ex.: xProd dos itens de uma NF-e), até `k`
+    produtos ativos de nome parecido, do mais ao menos similar.
+
+    Returns:
+        Uma lista de sugestões por nome, na mesma ordem
+    """
+    from estoque.models import Product, ProductNameTrigram
+
+    conjuntos = [trigramas(nome) for nome in nomes]
+    todos = list(set().union(*conjuntos))
+    if not todos:
+        return [[] for _ in nomes]
+
+    # Primeiro só o tamanho das listas, para escolher as que serão lidas
+    frequencias = {}
+    for inicio in range(0, len(todos), lote):
+        frequencias.update(ProductNameTrigram.objects.filter(
+            trigrama__in=todos[inicio:inicio + lote], produtos__gt=0
+        ).values_list('trigrama', 'produtos'))
+    consultados = [_trigramas_consultados(conjunto, frequencias) for conjunto in conjuntos]
+
+    lidos = list(set().union(*consultados))
+    listas = {}
+    for inicio in range(0, len(lidos), lote):
+        for trigrama, ids in ProductNameTrigram.objects.filter(
+            trigrama__in=lidos[inicio:inicio + lote]
+        ).values_list('trigrama', 'ids'):
+            listas[trigrama] = desempacotar(ids)
+
+    candidatos = []
+    for trigramas_item in consultados:
+        contagem = Counter()
+        for trigrama in trigramas_item:
+            contagem.update(listas.get(trigrama, ()))
+        candidatos.append([produto_id for produto_id, _ in contagem.most_common(CANDIDATOS_POR_ITEM)])
+
+    ids_candidatos = list(set().union(*candidatos))
+    produtos = {}
+    for inicio in range(0, len(ids_candidatos), lote):
+        for pk, codigo, nome in Product.objects.filter(
+            pk__in=ids_candidatos[inicio:inicio + lote], arquivado=False
+        ).values_list('pk', 'codigo', 'nome'):
+            produtos[pk] = (codigo, nome, trigramas(nome))
+
+    sugestoes = []
+    for conjunto, ids in zip(conjuntos, candidatos):
+        item = []
+        for produto_id in ids:
+            if produto_id not in produtos:
+                continue
+            codigo, nome, conjunto_produto = produtos[produto_id]
+            valor = similaridade(conjunto, conjunto_produto)
+            if valor >= SIMILARIDADE_MINIMA:
+                item.append(Sugestao(produto_id, codigo or '', nome, round(valor, 3)))
+        item.sort(key=lambda sugestao: (-sugestao.similaridade, sugestao.nome))
+        sugestoes.append(item[:k])
+    return sugestoes
@@ -0,0 +1,107 @@
+"""
+Cache em memória do resultado do parsing de NF-e, na frente de ler_nfe.
+
+A chave é o SHA-256 do XML mais a versão do parser (VERSAO_PARSER): o
+mesmo arquivo enviado de novo (prévia refeita para acertar categorias ou
+fornecedor) não passa pelo parsing, e uma mudança no parser invalida o
+que foi guardado antes dela. Cada nota fica como JSON compacto (chave,
+emitente e itens em listas), de modo que o tamanho guardado é exato; ao
+passar do limite de bytes ou de notas, saem as menos usadas recentemente
+(LRU). O cache é de cada processo, como o índice de códigos, e conta
+acertos, faltas e descartes.
+"""
+import json
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from io import BytesIO
+from typing import Dict, Optional
+
+from .arquivo_nfe import hash_xml
+from .xml_parser import VERSAO_PARSER, ler_nfe
+
+
+# Limites do cache (por processo)
+LIMITE_BYTES = 32 * 1024 * 1024
+LIMITE_NOTAS = 1000
+
+CAMPOS_ITEM = ('codigo', 'nome', 'ncm', 'ean', 'quantidade', 'valor_unitario', 'unidade')
+
+
+_lock = threading.Lock()
+_notas: 'OrderedDict[str, bytes]' = OrderedDict()
+_contadores = {'acertos': 0, 'faltas': 0, 'descartes': 0, 'bytes': 0}
+
+
+def _compactar(nota: Dict) -> bytes:
+    itens = [
+        [str(produto[campo]) if campo in ('quantidade', 'valor_unitario') else produto[campo] for campo in CAMPOS_ITEM]
+        for produto in nota['produtos']
+    ]
+    return json.dumps(
+        [nota['chave'], nota['emitente'], itens], ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _expandir(compacto: bytes) -> Dict:
+    chave, emitente, itens = json.loads(compacto)
+    produtos = []
+    for item in itens:
+        produto = dict(zip(CAMPOS_ITEM, item))
+        produto['quantidade'] = Decimal(produto['quantidade'])
+        produto['valor_unitario'] = Decimal(produto['valor_unitario'])
+        produtos.append(produto)
+    return {'chave': chave, 'emitente': emitente, 'produtos': produtos}
+
+
+def ler_nfe_com_cache(conteudo: bytes, hash_conteudo: Optional[str] = None) -> Dict:
+    """
+    ler_nfe com cache pelo conteúdo do XML.
+
+    Args:
+        conteudo: bytes do XML
+        hash_conteudo: SHA-256 já calculado do conteúdo (opcional)
+
+    Returns:
+        Resultado no formato de ler_nfe (dicionários novos a cada chamada,
+        que podem ser alterados por quem chamou)
+    """
+    chave = f'{hash_conteudo or hash_xml(conteudo)}:{VERSAO_PARSER}'
+    with _lock:
+        compacto = _notas.get(chave)
+        if compacto is not None:
+            _notas.move_to_end(chave)
+            _contadores['acertos'] += 1
+        else:
+            _contadores['faltas'] += 1
+    if compacto is not None:
+        return _expandir(compacto)
+
+    nota = ler_nfe(BytesIO(conteudo))
+    compacto = _compactar(nota)
+    if len(compacto) <= LIMITE_BYTES:
+        with _lock:
+            if chave not in _notas:
+                _notas[chave] = compacto
+                _contadores['bytes'] += len(compacto)
+                while _contadores['bytes'] > LIMITE_BYTES or len(_notas) > LIMITE_NOTAS:
+                    _, descartado = _notas.popitem(last=False)
+                    _contadores['bytes'] -= len(descartado)
+                    _contadores['descartes'] += 1
+    return nota
+
+
+def estatisticas_cache_nfe() -> Dict:
+    """Contadores do cache deste processo, com a taxa de acerto (0 a 1)"""
+    with _lock:
+        estatisticas = dict(_contadores, notas=len(_notas), limite_bytes=LIMITE_BYTES, limite_notas=LIMITE_NOTAS)
+    consultas = estatisticas['acertos'] + estatisticas['faltas']
+    estatisticas['taxa_acerto'] = round(estatisticas['acertos'] / consultas, 4) if consultas else 0.0
+    return estatisticas
+
+
+def limpar_cache_nfe():
+    """Esvazia o cache e zera os contadores"""
+    with _lock:
+        _notas.clear()
+        _contadores.update(acertos=0, faltas=0, descartes=0, bytes=0)
@@ -0,0 +1,121 @@
+"""
+Utilitário para análise de consumo e sugestão de reposição.
+
+As saídas diárias de todos os produtos são agregadas no banco em uma
+única consulta (soma e soma dos quadrados dos totais diários por
+produto), então o catálogo inteiro é analisado sem uma consulta por
+produto nem transferência da série diária completa.
+
+Modelo de reposição (demanda diária d com desvio σ, prazo de entrega L):
+    estoque de segurança = z · σ · √L
+    ponto de pedido      = d · L + estoque de segurança
+    pedido sugerido      = ponto de pedido + d · cobertura alvo - estoque
+"""
+import math
+from datetime import timedelta
+from decimal import Decimal, ROUND_CEILING
+from typing import Dict, NamedTuple, Optional
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .movimentacoes import CENTAVO
+
+
+# z da distribuição normal para ~95% de nível de serviço
+NIVEL_SERVICO_95 = 1.65
+
+# Unidades que só fazem sentido em quantidades inteiras
+UNIDADES_INTEIRAS = {'UN', 'CX', 'PC'}
+
+
+class AnaliseConsumo(NamedTuple):
+    demanda_diaria: Decimal
+    desvio_diario: Decimal
+    cobertura_dias: Optional[Decimal]  # None se não há consumo
+    ponto_pedido: Decimal
+    quantidade_sugerida: Decimal
+
+
+def _series_agregadas(inicio, fim) -> Dict[int, tuple]:
+    """
+    Soma e soma dos quadrados das saídas diárias por produto no período.
+    A série diária é agrupada em uma subconsulta e reagrupada por produto
+    no próprio banco.
+    """
+    from estoque.models import StockMovement
+
+    diario = StockMovement.objects.filter(
+        tipo='SAIDA', data_movimento__range=(inicio, fim)
+    ).values('produto_id', 'data_movimento').annotate(total=Sum('quantidade')).order_by()
+    sql, params = diario.query.sql_with_params()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT diario.produto_id, SUM(diario.total), SUM(diario.total * diario.total) '
+            f'FROM ({sql}) diario GROUP BY diario.produto_id',
+            params,
+        )
+        return {produto_id: (float(soma), float(soma_quadrados)) for produto_id, soma, soma_quadrados in cursor}
+
+
+def _arredondar(valor: float, unidade: str) -> Decimal:
+    """Arredonda para cima (unidades inteiras ou centavos)"""
+    quantum = Decimal('1') if unidade in UNIDADES_INTEIRAS else CENTAVO
+    # Arredonda antes para não transformar ruído de ponto flutuante (2.0000001) em uma unidade a mais
+    return Decimal(valor).quantize(Decimal('0.0001')).quantize(quantum, rounding=ROUND_CEILING).quantize(CENTAVO)
+
+
+def analisar_consumo(dias: int = 90, prazo_entrega: int = 7, cobertura_alvo: int = 30,
+                     nivel_servico: float = NIVEL_SERVICO_95, produtos=None) -> Dict[int, AnaliseConsumo]:
+    """
+    Calcula demanda diária média, variabilidade, dias de cobertura, ponto
+    de pedido e quantidade sugerida de compra dos produtos com saídas nos
+    últimos `dias` dias (dias sem saída contam como demanda zero).
+
+    Args:
+        dias: janela de histórico, em dias locais, terminando hoje
+        prazo_entrega: dias entre o pedido e a chegada da mercadoria
+        cobertura_alvo: dias de consumo que o pedido deve cobrir além do ponto de pedido
+        nivel_servico: fator z do estoque de segurança
+        produtos: queryset de produtos a analisar (todos, por padrão)
+
+    Returns:
+        Dicionário {produto_id: AnaliseConsumo}; produtos sem saídas no
+        período ficam de fora
+    """
+    from estoque.models import Product
+
+    fim = timezone.localdate()
+    series = _series_agregadas(fim - timedelta(days=dias - 1), fim)
+    if not series:
+        return {}
+
+    if produtos is None:
+        produtos = Product.objects.all()
+
+    fator_seguranca = nivel_servico * math.sqrt(prazo_entrega)
+    analises = {}
+    for pk, quantidade, unidade in produtos.values_list(
+        'pk', 'quantidade_estoque', 'unidade'
+    ).iterator(chunk_size=5000):
+        serie = series.get(pk)
+        if serie is None:
+            continue
+        soma, soma_quadrados = serie
+        demanda = soma / dias
+        desvio = math.sqrt(max(soma_quadrados / dias - demanda * demanda, 0.0))
+        estoque = float(quantidade)
+
+        ponto_pedido = demanda * prazo_entrega + fator_seguranca * desvio
+        # Só sugere compra quando o estoque chegou ao ponto de pedido
+        sugerida = ponto_pedido + demanda * cobertura_alvo - estoque if estoque <= ponto_pedido else 0.0
+        analises[pk] = AnaliseConsumo(
+            demanda_diaria=Decimal(demanda).quantize(CENTAVO),
+            desvio_diario=Decimal(desvio).quantize(CENTAVO),
+            cobertura_dias=Decimal(estoque / demanda).quantize(Decimal('0.1')) if demanda else None,
+            ponto_pedido=_arredondar(ponto_pedido, unidade),
+            quantidade_sugerida=_arredondar(sugerida, unidade),
+        )
+    return analises
@@ -0,0 +1,204 @@
+"""
+Utilitário para as contagens de inventário.
+
+Ao abrir a contagem, o saldo dos produtos do escopo é copiado para os
+itens com um único INSERT ... SELECT (sem carregar os produtos em Python).
+Na primeira leitura de cada produto, o quanto o estoque andou desde a
+abertura (movimentações feitas durante a contagem) fica guardado no item;
+no fechamento, a diferença entre o contado e o saldo esperado naquele
+momento vira uma movimentação de ajuste, e todos os ajustes são gravados
+em um único lote tudo-ou-nada (registrar_movimentacoes).
+"""
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Subquery
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .movimentacoes import registrar_movimentacoes
+
+
+OBSERVACAO_AJUSTE = 'Ajuste de inventário (contagem #{})'
+
+
+def _movimentado_desde_abertura():
+    """Expressão do quanto o estoque do produto andou desde a abertura da contagem"""
+    from estoque.models import Product
+
+    estoque_atual = Subquery(Product.objects.filter(pk=OuterRef('produto_id')).values('quantidade_estoque')[:1])
+    return estoque_atual - F('quantidade_sistema')
+
+
+def abrir_contagem(usuario=None, categoria=None, observacao=None):
+    """
+    Abre uma contagem com o saldo atual dos produtos ativos (todos ou de
+    uma categoria).
+
+    Returns:
+        A StockCount criada
+    """
+    from estoque.models import Product, StockCount, StockCountItem
+
+    produtos = Product.objects.filter(arquivado=False)
+    if categoria is not None:
+        produtos = produtos.filter(categoria=categoria)
+    sql, params = produtos.order_by().values_list('pk', 'quantidade_estoque').query.sql_with_params()
+    tabela = connection.ops.quote_name(StockCountItem._meta.db_table)
+
+    with transaction.atomic():
+        contagem = StockCount.objects.create(usuario=usuario, categoria=categoria, observacao=observacao)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {tabela} (contagem_id, produto_id, quantidade_sistema, movimentado) '
+                f'SELECT %s, produtos.id, produtos.quantidade_estoque, 0 FROM ({sql}) produtos',
+                (contagem.pk, *params),
+            )
+            contagem.total_itens = cursor.rowcount
+        contagem.save(update_fields=['total_itens'])
+    return contagem
+
+
+def registrar_contagens(contagem, leituras, substituir: bool = False) -> Tuple[Dict[int, Decimal], List[int]]:
+    """
+    Acumula leituras nos itens de uma contagem aberta.
+
+    Args:
+        contagem: StockCount aberta
+        leituras: lista de pares (produto_id, quantidade)
+        substituir: se True, a quantidade lida substitui a contada até
+            agora (recontagem) em vez de somar a ela
+
+    Returns:
+        (dicionário produto_id -> quantidade contada, produtos fora do
+        escopo da contagem). Se algum produto está fora do escopo, nenhuma
+        leitura é gravada.
+
+    Raises:
+        ValueError: se a contagem não está aberta
+    """
+    from estoque.models import StockCount, StockCountItem
+
+    quantidades = {}
+    for produto_id, quantidade in leituras:
+        quantidades[produto_id] = quantidades.get(produto_id, Decimal('0')) + quantidade
+
+    with transaction.atomic():
+        # Trava a contagem: uma leitura não entra depois do fechamento
+        if not StockCount.objects.select_for_update().filter(pk=contagem.pk, status='ABERTA').exists():
+            raise ValueError('A contagem não está aberta.')
+
+        itens = StockCountItem.objects.filter(contagem_id=contagem.pk, produto_id__in=quantidades)
+        fora_do_escopo = sorted(set(quantidades) - set(itens.values_list('produto_id', flat=True)))
+        if fora_do_escopo:
+            return {}, fora_do_escopo
+
+        # Primeira leitura (ou recontagem): o saldo esperado passa a incluir
+        # as movimentações feitas desde a abertura
+        primeiras = itens if substituir else itens.filter(quantidade_contada__isnull=True)
+        primeiras.update(movimentado=_movimentado_desde_abertura(), quantidade_contada=Decimal('0.00'))
+        # Um UPDATE por quantidade distinta (numa rajada de leituras, quase sempre 1)
+        por_quantidade = {}
+        for produto_id, quantidade in quantidades.items():
+            por_quantidade.setdefault(quantidade, []).append(produto_id)
+        for quantidade, produto_ids in por_quantidade.items():
+            itens.filter(produto_id__in=produto_ids).update(quantidade_contada=F('quantidade_contada') + quantidade)
+
+        return dict(itens.values_list('produto_id', 'quantidade_contada')), []
+
+
+def _diferenca():
+    """contado - sistema - movimentado, arredondada (no SQLite a conta é feita em ponto flutuante)"""
+    return Round(
+        F('quantidade_contada') - F('quantidade_sistema') - F('movimentado'), 2,
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+def divergencias(contagem):
+    """Itens contados cujo contado difere do saldo esperado, com a diferença anotada"""
+    from estoque.models import StockCountItem
+
+    return StockCountItem.objects.filter(
+        contagem_id=contagem.pk, quantidade_contada__isnull=False
+    ).annotate(
+        diferenca_prevista=_diferenca()
+    ).exclude(diferenca_prevista=0).select_related('produto').order_by('produto__nome')
+
+
+def fechar_contagem(contagem, usuario=None, zerar_nao_contados: bool = False):
+    """
+    Fecha a contagem, gravando um ajuste (ENTRADA ou SAIDA, sem custo)
+    por produto com diferença, em um único lote.
+
+    Args:
+        usuario: responsável pelos ajustes (padrão: quem abriu a contagem)
+        zerar_nao_contados: se True, os produtos do escopo sem leitura são
+            considerados com quantidade zero; senão ficam como estão
+
+    Returns:
+        Lista das movimentações de ajuste gravadas
+
+    Raises:
+        ValueError: se a contagem não está aberta
+        EstoqueInsuficienteError: se um ajuste de saída deixaria o estoque
+            negativo (nada é gravado e a contagem continua aberta)
+    """
+    from estoque.models import StockCount, StockCountItem, StockMovement
+
+    agora = timezone.now()
+    with transaction.atomic():
+        # Transição condicional: dois fechamentos simultâneos não gravam os ajustes duas vezes
+        if not StockCount.objects.filter(pk=contagem.pk, status='ABERTA').update(
+            status='FECHADA', fechada_em=agora
+        ):
+            raise ValueError('A contagem não está aberta.')
+
+        itens = StockCountItem.objects.filter(contagem_id=contagem.pk)
+        if zerar_nao_contados:
+            itens.filter(quantidade_contada__isnull=True).update(
+                movimentado=_movimentado_desde_abertura(), quantidade_contada=Decimal('0.00')
+            )
+        contados = itens.filter(quantidade_contada__isnull=False)
+        contados.update(diferenca=_diferenca())
+
+        observacao = OBSERVACAO_AJUSTE.format(contagem.pk)
+        ajustes = [
+            StockMovement(
+                tipo='ENTRADA' if diferenca > 0 else 'SAIDA',
+                produto_id=produto_id,
+                quantidade=abs(diferenca),
+                # Sem custo: o ajuste não altera o custo médio
+                custo_unitario=Decimal('0.00'),
+                usuario=usuario or contagem.usuario,
+                observacao=observacao,
+                created_at=agora,
+            )
+            for produto_id, diferenca in contados.exclude(diferenca=0).order_by('produto_id').values_list(
+                'produto_id', 'diferenca'
+            )
+        ]
+        registrar_movimentacoes(ajustes)
+        StockCount.objects.filter(pk=contagem.pk).update(total_ajustes=len(ajustes))
+
+    contagem.status = 'FECHADA'
+    contagem.fechada_em = agora
+    contagem.total_ajustes = len(ajustes)
+    return ajustes
+
+
+def cancelar_contagem(contagem):
+    """
+    Cancela a contagem e descarta os itens, sem gerar ajustes.
+
+    Raises:
+        ValueError: se a contagem não está aberta
+    """
+    from estoque.models import StockCount, StockCountItem
+
+    with transaction.atomic():
+        if not StockCount.objects.filter(pk=contagem.pk, status='ABERTA').update(status='CANCELADA'):
+            raise ValueError('A contagem não está aberta.')
+        StockCountItem.objects.filter(contagem_id=contagem.pk).delete()
+    contagem.status = 'CANCELADA'
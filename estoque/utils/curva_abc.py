@@ -0,0 +1,146 @@
+"""
+Utilitário para a curva ABC (Pareto) pelo valor das saídas.
+
+O valor consumido de cada produto no período é a soma das saídas a custo
+médio (custo_medio_apos). Meses fechados vêm de MonthlyClosingItem.valor_saidas
+e só o restante do período lê movimentações (também as arquivadas, se o
+período alcança o arquivo). O ranking e a participação
+acumulada são calculados no banco com funções de janela; só chega ao
+Python uma linha por produto com consumo.
+
+Classes: A até 80% do valor acumulado, B até 95%, C o restante (inclusive
+produtos sem saídas no período).
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterator, NamedTuple
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+
+from .fechamento import dividir_periodo
+from .movimentacoes import CENTAVO
+
+
+LIMITE_A = Decimal('0.80')
+LIMITE_B = Decimal('0.95')
+
+LOTE = 900
+
+
+class LinhaABC(NamedTuple):
+    produto_id: int
+    codigo: str
+    nome: str
+    valor: Decimal
+    participacao: Decimal  # fração do valor total
+    acumulado: Decimal  # fração acumulada até este produto, inclusive
+    classe: str
+
+
+def _consumo_sql(data_inicio: date, data_fim: date):
+    """SQL (e parâmetros) do valor consumido por produto, unindo fechamentos e movimentações"""
+    from estoque.models import MonthlyClosingItem
+    from .arquivamento import modelos_do_periodo
+
+    fechados, periodos_abertos = dividir_periodo(data_inicio, data_fim)
+    partes = []
+    if fechados:
+        partes.append(
+            MonthlyClosingItem.objects.filter(
+                fechamento_id__in=[pk for pk, _ in fechados.values()],
+                produto__isnull=False, valor_saidas__gt=0,
+            ).values(id_produto=F('produto_id')).annotate(valor=Sum('valor_saidas')).order_by()
+        )
+    if periodos_abertos is not None:
+        for modelo in modelos_do_periodo(data_inicio):
+            partes.append(
+                modelo.objects.filter(periodos_abertos, tipo='SAIDA').values(id_produto=F('produto_id')).annotate(
+                    valor=Sum(F('quantidade') * F('custo_medio_apos'), output_field=DecimalField())
+                ).order_by()
+            )
+    if not partes:
+        return None
+    consulta = partes[0] if len(partes) == 1 else partes[0].union(*partes[1:], all=True)
+    return consulta.query.sql_with_params()
+
+
+def curva_abc(data_inicio: date, data_fim: date) -> Iterator[LinhaABC]:
+    """
+    Produtos com consumo no período, do maior para o menor valor, com a
+    participação acumulada e a classe.
+    """
+    from estoque.models import Product
+
+    consumo = _consumo_sql(data_inicio, data_fim)
+    if consumo is None:
+        return
+    sql, params = consumo
+
+    tabela = connection.ops.quote_name(Product._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            SELECT ranking.produto_id, produto.codigo, produto.nome, ranking.valor,
+                   ranking.acumulado, ranking.total
+            FROM (
+                SELECT produto_id, valor,
+                       SUM(valor) OVER (ORDER BY valor DESC, produto_id) AS acumulado,
+                       SUM(valor) OVER () AS total
+                FROM (
+                    SELECT partes.id_produto AS produto_id, SUM(partes.valor) AS valor
+                    FROM ({sql}) partes
+                    GROUP BY partes.id_produto
+                ) consumo
+                WHERE valor > 0
+            ) ranking
+            INNER JOIN {tabela} produto ON produto.id = ranking.produto_id
+            ORDER BY ranking.valor DESC, ranking.produto_id
+            ''',
+            params,
+        )
+        for produto_id, codigo, nome, valor, acumulado, total in cursor:
+            valor, acumulado, total = (Decimal(str(v)) for v in (valor, acumulado, total))
+            # A classe vem da participação acumulada *antes* do produto: o
+            # produto que cruza os 80% ainda é A
+            anterior = (acumulado - valor) / total
+            classe = 'A' if anterior < LIMITE_A else 'B' if anterior < LIMITE_B else 'C'
+            yield LinhaABC(
+                produto_id=produto_id,
+                codigo=codigo,
+                nome=nome,
+                valor=valor.quantize(CENTAVO),
+                participacao=valor / total,
+                acumulado=acumulado / total,
+                classe=classe,
+            )
+
+
+def classificar_abc(data_inicio: date, data_fim: date) -> Dict[str, int]:
+    """
+    Grava em Product.classe_abc a classe de cada produto no período.
+    Só os produtos que mudaram de classe são atualizados.
+
+    Returns:
+        Dicionário {classe: quantidade de produtos} após a classificação
+    """
+    from estoque.models import Product
+
+    novas = {linha.produto_id: linha.classe for linha in curva_abc(data_inicio, data_fim) if linha.classe != 'C'}
+    atuais = dict(Product.objects.exclude(classe_abc='C').values_list('pk', 'classe_abc'))
+
+    mudancas = {'A': [], 'B': [], 'C': []}
+    for pk in novas.keys() | atuais.keys():
+        classe = novas.get(pk, 'C')
+        if atuais.get(pk, 'C') != classe:
+            mudancas[classe].append(pk)
+
+    with transaction.atomic():
+        for classe, pks in mudancas.items():
+            for inicio in range(0, len(pks), LOTE):
+                Product.objects.filter(pk__in=pks[inicio:inicio + LOTE]).update(classe_abc=classe)
+
+    contagem = {'A': 0, 'B': 0, 'C': 0}
+    for classe, total in Product.objects.values_list('classe_abc').annotate(total=Count('pk')).order_by():
+        contagem[classe] = total
+    return contagem
@@ -0,0 +1,64 @@
+"""
+Utilitário para a evolução do custo e a comparação de preços por fornecedor.
+
+As consultas leem o histórico de custo (ProductCostHistory, uma linha por
+entrada, gravada junto com a movimentação) pelo índice produto + data, sem
+refazer o custo médio a partir das movimentações.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, List
+
+from django.db.models import Count, DecimalField, F, Max, Min, Sum
+from django.utils import timezone
+
+from .avaliacao import inicio_do_dia
+from .movimentacoes import CENTAVO
+
+
+def evolucao_custo(produto_id: int, dias: int = 365):
+    """
+    Entradas do produto nos últimos `dias` dias, em ordem cronológica, com
+    o preço pago e o custo médio resultante.
+    """
+    from estoque.models import ProductCostHistory
+
+    inicio = inicio_do_dia(timezone.localdate() - timedelta(days=dias - 1))
+    return ProductCostHistory.objects.filter(
+        produto_id=produto_id, created_at__gte=inicio
+    ).order_by('created_at', 'pk')
+
+
+def comparar_fornecedores(produto_id: int, dias: int = 365) -> List[Dict]:
+    """
+    Preço de compra do produto por fornecedor nos últimos `dias` dias, do
+    menor para o maior preço médio.
+
+    Returns:
+        Lista de dicionários com 'fornecedor_id', 'fornecedor', 'entradas',
+        'quantidade', 'preco_medio' (ponderado pela quantidade),
+        'menor_preco', 'maior_preco' e 'ultima_compra'
+    """
+    comparacao = []
+    for linha in evolucao_custo(produto_id, dias).filter(custo_entrada__gt=0).values(
+        'fornecedor_id', fornecedor_nome=F('fornecedor__nome')
+    ).annotate(
+        entradas=Count('pk'),
+        quantidade_total=Sum('quantidade'),
+        valor=Sum(F('quantidade') * F('custo_entrada'), output_field=DecimalField()),
+        menor_preco=Min('custo_entrada'),
+        maior_preco=Max('custo_entrada'),
+        ultima_compra=Max('created_at'),
+    ).order_by():
+        comparacao.append({
+            'fornecedor_id': linha['fornecedor_id'],
+            'fornecedor': linha['fornecedor_nome'] or 'Sem fornecedor',
+            'entradas': linha['entradas'],
+            'quantidade': linha['quantidade_total'].quantize(CENTAVO),
+            'preco_medio': (Decimal(linha['valor']) / linha['quantidade_total']).quantize(CENTAVO),
+            'menor_preco': linha['menor_preco'],
+            'maior_preco': linha['maior_preco'],
+            'ultima_compra': linha['ultima_compra'],
+        })
+    comparacao.sort(key=lambda item: item['preco_medio'])
+    return comparacao
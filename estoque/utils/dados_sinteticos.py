@@ -0,0 +1,306 @@
+"""
+Utilitário para geração de dados sintéticos (categorias, fornecedores, produtos,
+movimentações e XMLs de NF-e) usados nos benchmarks de desempenho.
+
+Todos os geradores são determinísticos a partir de uma semente.
+"""
+import itertools
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from .busca_nomes import indexar_nomes
+from .fornecedores import formatar_cnpj
+from .indice_codigos import invalidar_indice_codigos
+from .avaliacao import invalidar_snapshots
+from .movimentacoes import custo_medio_ponderado, registrar_historico_custo
+from .status_estoque import recalcular_status
+
+
+NFE_NAMESPACE = 'http://www.portalfiscal.inf.br/nfe'
+
+UNIDADES = ['UN', 'UN', 'UN', 'CX', 'KG', 'LT', 'MT', 'PC']
+
+PALAVRAS_PRODUTO = [
+    'Parafuso', 'Porca', 'Arruela', 'Cabo', 'Fio', 'Tomada', 'Disjuntor',
+    'Lâmpada', 'Tinta', 'Pincel', 'Rolo', 'Lixa', 'Cola', 'Fita', 'Tubo',
+    'Joelho', 'Registro', 'Torneira', 'Chave', 'Broca', 'Serra', 'Martelo',
+    'Luva', 'Óculos', 'Capacete', 'Mangueira', 'Conector', 'Abraçadeira',
+]
+
+COMPLEMENTOS_PRODUTO = [
+    'Inox', 'Galvanizado', 'Branco', 'Preto', 'Reforçado', 'Industrial',
+    'PVC', 'Cobre', 'Alumínio', 'Premium', 'Econômico', 'Profissional',
+]
+
+
+def _digito_cnpj(numeros, pesos):
+    soma = sum(int(n) * p for n, p in zip(numeros, pesos))
+    resto = soma % 11
+    return '0' if resto < 2 else str(11 - resto)
+
+
+def gerar_cnpj(rng: random.Random, formatado: bool = True) -> str:
+    """Gera um CNPJ válido (dígitos verificadores corretos)"""
+    base = ''.join(str(rng.randint(0, 9)) for _ in range(8)) + '0001'
+    base += _digito_cnpj(base, [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    base += _digito_cnpj(base, [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return formatar_cnpj(base) if formatado else base
+
+
+def gerar_ean13(rng: random.Random) -> str:
+    """Gera um EAN-13 válido com prefixo brasileiro (789)"""
+    corpo = '789' + ''.join(str(rng.randint(0, 9)) for _ in range(9))
+    soma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(corpo))
+    return corpo + str((10 - soma % 10) % 10)
+
+
+def gerar_dados_sinteticos(
+    categorias: int = 20,
+    fornecedores: int = 50,
+    produtos: int = 2000,
+    movimentacoes: int = 10000,
+    anos: int = 3,
+    seed: int = 42,
+    lote: int = 5000,
+    usuario=None,
+) -> Dict:
+    """
+    Popula o banco com volumes realistas de dados para benchmark.
+
+    As movimentações são geradas em ordem cronológica ao longo de `anos` anos,
+    em horário comercial, com popularidade dos produtos seguindo uma
+    distribuição de Zipf (poucos produtos concentram a maior parte das saídas).
+    O saldo de cada produto é simulado durante a geração: quando uma saída
+    excederia o estoque, é gerada uma entrada de reposição no lugar, de modo
+    que o estoque final de cada produto é exatamente a soma das movimentações.
+
+    Os registros são gravados com bulk_create em lotes de `lote` linhas,
+    sem passar por StockMovement.save().
+
+    Returns:
+        Dicionário com as quantidades criadas de cada entidade
+    """
+    from estoque.models import Category, Supplier, Product, StockMovement
+
+    rng = random.Random(seed)
+
+    with transaction.atomic():
+        categorias_db = Category.objects.bulk_create([
+            Category(nome=f'Categoria {seed}-{i:03d}', descricao='Gerada para benchmark')
+            for i in range(1, categorias + 1)
+        ], batch_size=lote)
+
+        cnpjs = [gerar_cnpj(rng, formatado=False) for _ in range(fornecedores)]
+        # bulk_create não passa por Supplier.save(): o CNPJ normalizado vai junto
+        fornecedores_db = Supplier.objects.bulk_create([
+            Supplier(
+                nome=f'Fornecedor {i:04d} Ltda',
+                cnpj=formatar_cnpj(cnpjs[i - 1]),
+                cnpj_digitos=cnpjs[i - 1],
+                telefone=f'(11) 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+                email=f'contato{i}@fornecedor{i}.com.br',
+            )
+            for i in range(1, fornecedores + 1)
+        ], batch_size=lote)
+
+        ultimo_sku = int(Product.generate_sku().split('-')[1]) - 1
+        ncms = [f'{rng.randint(10000000, 99999999)}' for _ in range(max(1, produtos // 20))]
+        produtos_novos = []
+        for i in range(1, produtos + 1):
+            produtos_novos.append(Product(
+                codigo=f'PROD-{ultimo_sku + i:06d}',
+                nome=f'{rng.choice(PALAVRAS_PRODUTO)} {rng.choice(COMPLEMENTOS_PRODUTO)} {i}',
+                categoria=rng.choice(categorias_db),
+                unidade=rng.choice(UNIDADES),
+                quantidade_estoque=Decimal('0.00'),
+                estoque_minimo=Decimal(rng.choice([0, 0, 5, 10, 20, 50])),
+                custo_unitario=Decimal('0.00'),
+                ncm=rng.choice(ncms),
+                ean=gerar_ean13(rng),
+            ))
+        produtos_db = Product.objects.bulk_create(produtos_novos, batch_size=lote)
+        indexar_nomes((produto.pk, None, produto.nome) for produto in produtos_db)
+
+    # Popularidade de Zipf (s ~ 1.1) sobre uma ordem aleatória dos produtos
+    ordem = list(range(len(produtos_db)))
+    rng.shuffle(ordem)
+    pesos = [0.0] * len(produtos_db)
+    for rank, idx in enumerate(ordem, 1):
+        pesos[idx] = 1.0 / (rank ** 1.1)
+    pesos_acumulados = list(itertools.accumulate(pesos))
+    indices = range(len(produtos_db))
+
+    custo_base = [
+        Decimal(str(round(rng.lognormvariate(3.0, 1.0), 2))) + Decimal('0.01')
+        for _ in produtos_db
+    ]
+    saldo = [Decimal('0.00')] * len(produtos_db)
+    custo_medio = [Decimal('0.00')] * len(produtos_db)
+
+    # Instantes em ordem crescente via intervalos exponenciais, contados em
+    # "segundos comerciais" (8h às 18h) a partir do primeiro dia
+    primeiro_dia = timezone.localdate() - timedelta(days=365 * anos)
+    segundos_por_dia = 10 * 3600
+    intervalo_medio = 365 * anos * segundos_por_dia / max(1, movimentacoes)
+    decorrido = 0.0
+
+    total_entradas = 0
+    total_saidas = 0
+    ultimas = {'ENTRADA': {}, 'SAIDA': {}}
+    buffer = []
+
+    def _gravar():
+        StockMovement.objects.bulk_create(buffer, batch_size=lote)
+        registrar_historico_custo(buffer)
+        buffer.clear()
+
+    for _ in range(movimentacoes):
+        decorrido += rng.expovariate(1.0 / intervalo_medio)
+        dia, segundos = divmod(int(decorrido), segundos_por_dia)
+        momento = timezone.make_aware(
+            datetime.combine(primeiro_dia + timedelta(days=dia), time(8)) + timedelta(seconds=segundos)
+        )
+
+        idx = rng.choices(indices, cum_weights=pesos_acumulados)[0]
+        produto = produtos_db[idx]
+
+        if rng.random() < 0.3:
+            tipo = 'ENTRADA'
+            quantidade = Decimal(rng.randint(10, 200))
+        else:
+            tipo = 'SAIDA'
+            quantidade = Decimal(max(1, int(rng.expovariate(1 / 5.0))))
+            if quantidade > saldo[idx]:
+                # Falta de estoque: gera uma reposição no lugar da saída
+                tipo = 'ENTRADA'
+                quantidade = Decimal(rng.randint(20, 200))
+
+        custo_anterior = custo_medio[idx]
+        if tipo == 'ENTRADA':
+            custo = (custo_base[idx] * Decimal(str(rng.uniform(0.9, 1.15)))).quantize(Decimal('0.01'))
+            custo_medio[idx] = custo_medio_ponderado(saldo[idx], custo_medio[idx], quantidade, custo)
+            saldo[idx] += quantidade
+            total_entradas += 1
+            fornecedor = rng.choice(fornecedores_db) if fornecedores_db else None
+        else:
+            custo = Decimal('0.00')
+            saldo[idx] -= quantidade
+            total_saidas += 1
+            fornecedor = None
+
+        movimentacao = StockMovement(
+            tipo=tipo,
+            produto=produto,
+            quantidade=quantidade,
+            custo_unitario=custo,
+            fornecedor=fornecedor,
+            usuario=usuario,
+            observacao='Movimentação sintética',
+            created_at=momento,
+            data_movimento=momento.date(),
+            saldo_apos=saldo[idx],
+            custo_medio_apos=custo_medio[idx],
+        )
+        movimentacao.custo_medio_antes = custo_anterior
+        buffer.append(movimentacao)
+        ultimas[tipo][idx] = momento
+        if len(buffer) >= lote:
+            _gravar()
+
+    if buffer:
+        _gravar()
+
+    for idx, produto in enumerate(produtos_db):
+        produto.quantidade_estoque = saldo[idx]
+        produto.custo_unitario = custo_medio[idx]
+        # Instantes em ordem crescente: o último gravado é o mais recente
+        produto.ultima_entrada_em = ultimas['ENTRADA'].get(idx, produto.ultima_entrada_em)
+        produto.ultima_saida_em = ultimas['SAIDA'].get(idx, produto.ultima_saida_em)
+    Product.objects.bulk_update(
+        produtos_db, ['quantidade_estoque', 'custo_unitario', 'ultima_entrada_em', 'ultima_saida_em'],
+        batch_size=lote
+    )
+    # bulk_create/bulk_update não passam por Product.save() nem StockMovement.save()
+    recalcular_status()
+    invalidar_snapshots(primeiro_dia)
+    invalidar_indice_codigos()
+
+    return {
+        'categorias': len(categorias_db),
+        'fornecedores': len(fornecedores_db),
+        'produtos': len(produtos_db),
+        'movimentacoes': movimentacoes,
+        'entradas': total_entradas,
+        'saidas': total_saidas,
+    }
+
+
+def limpar_dados():
+    """Remove todos os dados do app estoque (movimentações, produtos, cadastros)"""
+    from estoque.models import (
+        ArchivedStockMovement, Category, ImportedInvoice, Supplier, Product, StockMovement, StockSnapshot,
+        MonthlyClosing, ProductNameTrigram, StockCount, WhatsAppOrder,
+    )
+
+    with transaction.atomic():
+        MonthlyClosing.objects.all().delete()
+        StockSnapshot.objects.all().delete()
+        StockMovement.objects.all().delete()
+        ArchivedStockMovement.objects.all().delete()
+        StockCount.objects.all().delete()
+        ImportedInvoice.objects.all().delete()
+        WhatsAppOrder.objects.all().delete()
+        Product.objects.all().delete()
+        ProductNameTrigram.objects.all().delete()
+        Supplier.objects.all().delete()
+        Category.objects.all().delete()
+    invalidar_indice_codigos()
+
+
+def gerar_nfe_xml(itens: int = 50, seed: int = 0, cnpj_emitente: Optional[str] = None) -> bytes:
+    """
+    Gera o XML de uma NF-e (layout 4.00, nfeProc) com `itens` produtos.
+
+    Returns:
+        Conteúdo do XML em bytes (UTF-8)
+    """
+    rng = random.Random(seed)
+    cnpj = cnpj_emitente or gerar_cnpj(rng, formatado=False)
+    chave = '35' + timezone.now().strftime('%y%m') + cnpj + '55001' + \
+        ''.join(str(rng.randint(0, 9)) for _ in range(19))
+
+    dets = []
+    for n in range(1, itens + 1):
+        quantidade = Decimal(rng.randint(1, 100))
+        valor_unitario = Decimal(str(round(rng.lognormvariate(3.0, 1.0), 2))) + Decimal('0.01')
+        dets.append(
+            f'<det nItem="{n}"><prod>'
+            f'<cProd>FORN-{seed}-{n:05d}</cProd>'
+            f'<cEAN>{gerar_ean13(rng)}</cEAN>'
+            f'<xProd>{rng.choice(PALAVRAS_PRODUTO)} {rng.choice(COMPLEMENTOS_PRODUTO)} {n}</xProd>'
+            f'<NCM>{rng.randint(10000000, 99999999)}</NCM>'
+            f'<CFOP>5102</CFOP>'
+            f'<uCom>{rng.choice(UNIDADES)}</uCom>'
+            f'<qCom>{quantidade:.4f}</qCom>'
+            f'<vUnCom>{valor_unitario:.10f}</vUnCom>'
+            f'<vProd>{quantidade * valor_unitario:.2f}</vProd>'
+            f'</prod></det>'
+        )
+
+    xml = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NFE_NAMESPACE}" versao="4.00">'
+        f'<NFe><infNFe Id="NFe{chave}" versao="4.00">'
+        f'<ide><cUF>35</cUF><nNF>{rng.randint(1, 999999)}</nNF></ide>'
+        f'<emit><CNPJ>{cnpj}</CNPJ><xNome>Fornecedor Sintético {seed}</xNome></emit>'
+        + ''.join(dets) +
+        '</infNFe></NFe>'
+        f'<protNFe versao="4.00"><infProt><chNFe>{chave}</chNFe></infProt></protNFe>'
+        '</nfeProc>'
+    )
+    return xml.encode('utf-8')
@@ -0,0 +1,150 @@
+"""
+Download assíncrono de XMLs de NF-e por URL, várias URLs ao mesmo tempo.
+
+baixar_xml_de_url (xml_parser.py) usa urllib e prende o worker enquanto
+o portal responde; aqui as URLs são baixadas no event loop (asyncio, sem
+dependências novas), servido pelo stockbit/asgi.py. O cliente é o mínimo:
+
+- um GET HTTP/1.0 por URL, com conexão própria fechada ao fim (sem
+  keep-alive, chunked nem redirecionamentos: só a resposta 200 vale);
+- corpo lido até o fim da conexão, abortando assim que passa do limite;
+- no máximo `concorrencia` downloads simultâneos (semáforo);
+- timeout por URL, contado a partir da vez dela no semáforo.
+
+O resultado de cada URL (conteúdo ou erro) não interrompe as demais; o
+parsing fica com quem chamou (ver views.api_nfe_baixar).
+"""
+import asyncio
+import ssl
+from typing import Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+
+LIMITE_BYTES = 10 * 1024 * 1024
+TIMEOUT_POR_URL = 30
+CONCORRENCIA = 8
+# URLs por requisição da API
+MAXIMO_URLS = 50
+TAMANHO_BLOCO = 64 * 1024
+USER_AGENT = 'Mozilla/5.0 (compatible; StockBit/1.0)'
+
+
+class ResultadoDownload(NamedTuple):
+    """Conteúdo baixado de uma URL, ou o erro"""
+    url: str
+    conteudo: Optional[bytes]
+    erro: Optional[str]
+
+
+async def _baixar(url: str, limite: int) -> bytes:
+    """Um GET; retorna o corpo da resposta 200"""
+    partes = urlsplit(url)
+    if partes.scheme not in ('http', 'https') or not partes.hostname:
+        raise ValueError(f'URL inválida: {url}')
+    porta = partes.port or (443 if partes.scheme == 'https' else 80)
+    contexto = ssl.create_default_context() if partes.scheme == 'https' else None
+    caminho = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+    host = partes.hostname if partes.port is None else f'{partes.hostname}:{partes.port}'
+
+    reader, writer = await asyncio.open_connection(partes.hostname, porta, ssl=contexto, limit=TAMANHO_BLOCO)
+    try:
+        writer.write((
+            f'GET {caminho} HTTP/1.0\r\nHost: {host}\r\nUser-Agent: {USER_AGENT}\r\n'
+            f'Accept: application/xml, text/xml, */*\r\nConnection: close\r\n\r\n'
+        ).encode('latin-1'))
+        await writer.drain()
+
+        cabecalho = await reader.readuntil(b'\r\n\r\n')
+        status = cabecalho.split(None, 2)[1:2]
+        if status != [b'200']:
+            codigo = status[0].decode('latin-1') if status else '?'
+            raise ValueError(f'Erro ao baixar XML: Status HTTP {codigo}')
+
+        # HTTP/1.0 com Connection: close: o corpo vai até o servidor fechar
+        partes_corpo = []
+        total = 0
+        while bloco := await reader.read(TAMANHO_BLOCO):
+            total += len(bloco)
+            if total > limite:
+                raise ValueError(f'O arquivo XML é muito grande. Tamanho máximo: {limite // (1024 * 1024)}MB')
+            partes_corpo.append(bloco)
+    finally:
+        writer.close()
+
+    corpo = b''.join(partes_corpo)
+    if not corpo.strip():
+        raise ValueError('O servidor retornou um arquivo vazio')
+    return corpo
+
+
+async def baixar_xmls(
+    urls: List[str],
+    concorrencia: int = CONCORRENCIA,
+    timeout: float = TIMEOUT_POR_URL,
+    limite_bytes: int = LIMITE_BYTES,
+) -> List[ResultadoDownload]:
+    """
+    Baixa várias URLs ao mesmo tempo.
+
+    Args:
+        concorrencia: downloads simultâneos
+        timeout: segundos por URL (conexão e corpo)
+        limite_bytes: tamanho máximo de cada arquivo
+
+    Returns:
+        Um ResultadoDownload por URL, na mesma ordem
+    """
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def baixar(url):
+        async with semaforo:
+            try:
+                conteudo = await asyncio.wait_for(_baixar(url, limite_bytes), timeout)
+            except asyncio.TimeoutError:
+                return ResultadoDownload(url, None, f'Tempo esgotado ao baixar o XML ({timeout:g}s)')
+            except ValueError as e:
+                return ResultadoDownload(url, None, str(e))
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                return ResultadoDownload(url, None, f'Erro de conexão: {e}')
+            return ResultadoDownload(url, conteudo, None)
+
+    return await asyncio.gather(*(baixar(url) for url in urls))
+
+
+def ler_xmls_baixados(resultados: List[ResultadoDownload]) -> List[Dict]:
+    """
+    Passa os XMLs baixados pelo parser (com o cache de notas) e confere se
+    cada nota já foi importada. Síncrona: chamar via sync_to_async.
+
+    Returns:
+        Um dicionário por URL, na mesma ordem: 'url', 'sucesso', 'erro' e,
+        nas notas lidas, 'hash', 'chave', 'emitente', 'ja_importada' e
+        'produtos' (quantidade e valor unitário como texto)
+    """
+    from .arquivo_nfe import hash_xml, nota_ja_importada
+    from .cache_nfe import ler_nfe_com_cache
+
+    notas = []
+    for resultado in resultados:
+        nota = {'url': resultado.url, 'sucesso': False, 'erro': resultado.erro}
+        if resultado.conteudo is not None:
+            hash_conteudo = hash_xml(resultado.conteudo)
+            try:
+                dados = ler_nfe_com_cache(resultado.conteudo, hash_conteudo)
+            except ValueError as e:
+                nota['erro'] = str(e)
+            else:
+                nota.update(
+                    sucesso=True,
+                    hash=hash_conteudo,
+                    chave=dados['chave'],
+                    emitente=dados['emitente'],
+                    ja_importada=nota_ja_importada(hash_conteudo, dados['chave']) is not None,
+                    produtos=[
+                        dict(produto, quantidade=str(produto['quantidade']),
+                             valor_unitario=str(produto['valor_unitario']))
+                        for produto in dados['produtos']
+                    ],
+                )
+        notas.append(nota)
+    return notas
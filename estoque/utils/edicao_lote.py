@@ -0,0 +1,152 @@
+"""
+Utilitário para a edição em lote (grade) de estoque mínimo e categoria
+dos produtos.
+
+Cada linha traz o updated_at que o cliente leu: se o produto foi alterado
+depois disso, a linha volta como conflito (concorrência otimista) e as
+demais seguem. As linhas aceitas são gravadas com um único bulk_update,
+com o status de estoque recalculado em memória e o cache do dashboard
+invalidado uma vez, em vez de um ProductForm/Product.save por produto.
+Os campos editáveis não fazem parte do índice de códigos. O custo médio
+não é editável na grade: ele vem das entradas (razão e histórico de custo)
+e uma alteração direta ficaria fora do histórico.
+"""
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .status_estoque import calcular_status
+
+
+# Máximo de linhas aceitas por requisição
+LIMITE_LINHAS = 10000
+
+CAMPOS_EDITAVEIS = ('estoque_minimo', 'categoria')
+
+MAXIMO_DECIMAL = Decimal('99999999.99')
+
+
+def _validar_linha(linha, categorias):
+    """Valida uma linha e retorna (dados, erro)"""
+    if not isinstance(linha, dict):
+        return None, 'Linha inválida'
+
+    try:
+        produto_id = int(linha.get('id'))
+    except (TypeError, ValueError):
+        return None, 'Produto inválido'
+
+    updated_at = parse_datetime(str(linha.get('updated_at') or ''))
+    if updated_at is None:
+        return None, 'updated_at ausente ou inválido (use ISO 8601)'
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at)
+
+    if 'custo_unitario' in linha:
+        return None, 'custo_unitario não é editável em lote (o custo médio vem das entradas)'
+
+    alteracoes = {}
+    if 'estoque_minimo' in linha:
+        try:
+            valor = Decimal(str(linha['estoque_minimo']))
+        except InvalidOperation:
+            return None, 'estoque_minimo inválido'
+        if not valor.is_finite() or valor < 0 or valor > MAXIMO_DECIMAL:
+            return None, f'estoque_minimo deve estar entre 0 e {MAXIMO_DECIMAL}'
+        alteracoes['estoque_minimo'] = valor.quantize(Decimal('0.01'))
+    if 'categoria' in linha:
+        try:
+            categoria_id = int(linha['categoria'])
+        except (TypeError, ValueError):
+            return None, 'Categoria inválida'
+        if categoria_id not in categorias:
+            return None, 'Categoria não encontrada'
+        alteracoes['categoria_id'] = categoria_id
+
+    if not alteracoes:
+        return None, f"Informe ao menos um campo: {', '.join(CAMPOS_EDITAVEIS)}"
+
+    return {'id': produto_id, 'updated_at': updated_at, 'alteracoes': alteracoes}, None
+
+
+def editar_produtos_em_lote(linhas: List[Dict], lote: int = 1000) -> List[Dict]:
+    """
+    Aplica um lote de alterações de produtos.
+
+    Args:
+        linhas: dicts com 'id', 'updated_at' (ISO 8601, como lido pelo
+            cliente) e ao menos um de 'estoque_minimo' e 'categoria' (id)
+        lote: produtos por UPDATE do bulk_update
+
+    Returns:
+        Lista de resultados na mesma ordem das linhas, cada um com 'id',
+        'status' ('atualizado', 'conflito' ou 'rejeitado'), 'updated_at'
+        (o novo, ou o atual em caso de conflito) e 'erro'
+    """
+    from estoque.models import Category, Product
+
+    categorias = dict(Category.objects.values_list('pk', 'estoque_critico'))
+
+    resultados = []
+    validas = []
+    vistos = set()
+    for linha in linhas:
+        dados, erro = _validar_linha(linha, categorias)
+        if dados and dados['id'] in vistos:
+            dados, erro = None, 'Produto repetido no lote'
+        resultado = {
+            'id': dados['id'] if dados else (linha.get('id') if isinstance(linha, dict) else None),
+            'status': 'rejeitado', 'updated_at': None, 'erro': erro,
+        }
+        resultados.append(resultado)
+        if dados:
+            vistos.add(dados['id'])
+            validas.append((resultado, dados))
+
+    if not validas:
+        return resultados
+
+    agora = timezone.now()
+    with transaction.atomic():
+        # Trava os produtos: a conferência do updated_at e a gravação são atômicas
+        atuais = {
+            pk: (updated_at, quantidade, estoque_minimo, categoria_id)
+            for pk, updated_at, quantidade, estoque_minimo, categoria_id in Product.objects.select_for_update().filter(
+                pk__in=vistos, arquivado=False
+            ).values_list('pk', 'updated_at', 'quantidade_estoque', 'estoque_minimo', 'categoria_id')
+        }
+
+        alterados = []
+        for resultado, dados in validas:
+            atual = atuais.get(dados['id'])
+            if atual is None:
+                resultado['erro'] = 'Produto não encontrado'
+                continue
+            updated_at, quantidade, estoque_minimo, categoria_id = atual
+            if updated_at != dados['updated_at']:
+                resultado.update(status='conflito', updated_at=updated_at.isoformat(),
+                                 erro='Produto alterado depois da leitura')
+                continue
+
+            produto = Product(pk=dados['id'], estoque_minimo=estoque_minimo, categoria_id=categoria_id)
+            for campo, valor in dados['alteracoes'].items():
+                setattr(produto, campo, valor)
+            produto.status = calcular_status(
+                quantidade, produto.estoque_minimo, categorias[produto.categoria_id]
+            )
+            alterados.append(produto)
+            resultado.update(status='atualizado', updated_at=agora.isoformat())
+
+        # bulk_update monta um CASE por linha e campo: só os campos enviados entram
+        # nele, e o updated_at (igual em todas as linhas) vai em um UPDATE simples
+        campos = sorted({campo for _, dados in validas for campo in dados['alteracoes']})
+        Product.objects.bulk_update(alterados, campos + ['status'], batch_size=lote)
+        Product.objects.filter(pk__in=[produto.pk for produto in alterados]).update(updated_at=agora)
+
+    if alterados:
+        cache.delete('dashboard_stats')
+    return resultados
@@ -0,0 +1,101 @@
+"""
+Utilitário para o envelhecimento (aging) do estoque e o estoque parado.
+
+A idade de um produto é contada a partir da sua última movimentação
+(Product.ultima_entrada_em/ultima_saida_em, mantidas a cada movimentação),
+ou do cadastro se ele nunca foi movimentado. Nenhuma consulta lê
+StockMovement.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .avaliacao import inicio_do_dia
+
+
+# (rótulo, idade mínima em dias, idade máxima em dias ou None)
+FAIXAS = [
+    ('0–30 dias', 0, 30),
+    ('31–90 dias', 31, 90),
+    ('91–180 dias', 91, 180),
+    ('Mais de 180 dias', 181, None),
+]
+
+
+def _ultima_movimentacao():
+    """Última entrada ou saída do produto (cadastro, se nunca foi movimentado)"""
+    return Greatest(
+        Coalesce('ultima_entrada_em', 'ultima_saida_em', 'created_at'),
+        Coalesce('ultima_saida_em', 'ultima_entrada_em', 'created_at'),
+    )
+
+
+def _valor_estoque():
+    return ExpressionWrapper(
+        F('quantidade_estoque') * F('custo_unitario'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def envelhecimento_estoque(hoje: Optional[date] = None) -> List[Dict]:
+    """
+    Produtos com saldo e valor em estoque por faixa de idade, em uma única
+    consulta agregada sobre os produtos.
+
+    Returns:
+        Lista de dicionários com 'faixa', 'dias_min', 'dias_max',
+        'produtos' e 'valor', na ordem de FAIXAS
+    """
+    from estoque.models import Product
+
+    hoje = hoje or timezone.localdate()
+    agregados = {}
+    for indice, (_, dias_min, dias_max) in enumerate(FAIXAS):
+        # Idade em dias locais: movimentado a partir do início do dia (hoje - dias)
+        filtro = Q(ultima__lt=inicio_do_dia(hoje - timedelta(days=dias_min - 1))) if dias_min else Q()
+        if dias_max is not None:
+            filtro &= Q(ultima__gte=inicio_do_dia(hoje - timedelta(days=dias_max)))
+        agregados[f'produtos_{indice}'] = Count('pk', filter=filtro)
+        agregados[f'valor_{indice}'] = Sum(_valor_estoque(), filter=filtro)
+
+    totais = Product.objects.filter(quantidade_estoque__gt=0, arquivado=False).annotate(
+        ultima=_ultima_movimentacao()
+    ).aggregate(**agregados)
+
+    return [
+        {
+            'faixa': rotulo,
+            'dias_min': dias_min,
+            'dias_max': dias_max,
+            'produtos': totais[f'produtos_{indice}'],
+            'valor': (totais[f'valor_{indice}'] or Decimal('0.00')),
+        }
+        for indice, (rotulo, dias_min, dias_max) in enumerate(FAIXAS)
+    ]
+
+
+def estoque_parado(dias: int = 90, hoje: Optional[date] = None):
+    """
+    Produtos com saldo e sem nenhuma movimentação há pelo menos `dias`
+    dias, do maior para o menor valor em estoque.
+
+    O filtro usa diretamente os índices de ultima_entrada_em e
+    ultima_saida_em (sem movimentações também conta como parado).
+    """
+    from estoque.models import Product
+
+    hoje = hoje or timezone.localdate()
+    limite = inicio_do_dia(hoje - timedelta(days=dias - 1))
+    return Product.objects.filter(
+        Q(ultima_saida_em__lt=limite) | Q(ultima_saida_em__isnull=True),
+        Q(ultima_entrada_em__lt=limite) | Q(ultima_entrada_em__isnull=True),
+        quantidade_estoque__gt=0,
+        arquivado=False,
+        created_at__lt=limite,
+    ).annotate(
+        ultima=_ultima_movimentacao(), valor_estoque=_valor_estoque()
+    ).order_by('-valor_estoque', 'nome')
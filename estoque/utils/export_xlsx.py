@@ -5,6 +5,7 @@ from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill
 from openpyxl.utils import get_column_letter
 from django.http import HttpResponse
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -100,7 +101,7 @@ def exportar_relatorio_para_xlsx(movimentacoes, resumo, nome_arquivo='relatorio_
     
     # Dados
     for row, mov in enumerate(movimentacoes, 2):
-        ws.cell(row=row, column=1).value = mov.created_at.strftime('%d/%m/%Y %H:%M')
+        ws.cell(row=row, column=1).value = timezone.localtime(mov.created_at).strftime('%d/%m/%Y %H:%M')
         ws.cell(row=row, column=2).value = mov.get_tipo_display()
         ws.cell(row=row, column=3).value = mov.produto.nome
         ws.cell(row=row, column=4).value = float(mov.quantidade)
@@ -153,3 +154,147 @@ def exportar_relatorio_para_xlsx(movimentacoes, resumo, nome_arquivo='relatorio_
     wb.save(response)
     return response
 
+
+
+def exportar_avaliacao_para_xlsx(linhas, data, nome_arquivo='avaliacao_estoque.xlsx'):
+    """
+    Exporta a avaliação do estoque em uma data para arquivo XLSX.
+    
+    Args:
+        linhas: Iterável de tuplas (produto, PosicaoEstoque)
+        data: Data da avaliação
+        nome_arquivo: Nome do arquivo a ser gerado
+        
+    Returns:
+        HttpResponse com o arquivo XLSX
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Avaliação"
+    
+    headers = ['Código', 'Nome', 'Categoria', 'Unidade', 'Quantidade', 'Custo Médio', 'Valor Total']
+    
+    # Cabeçalho
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.value = header
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    
+    # Dados
+    valor_total = Decimal('0.00')
+    row = 1
+    for row, (produto, posicao) in enumerate(linhas, 2):
+        ws.cell(row=row, column=1).value = produto.codigo
+        ws.cell(row=row, column=2).value = produto.nome
+        ws.cell(row=row, column=3).value = produto.categoria.nome if produto.categoria else ''
+        ws.cell(row=row, column=4).value = produto.get_unidade_display()
+        ws.cell(row=row, column=5).value = float(posicao.quantidade)
+        ws.cell(row=row, column=6).value = float(posicao.custo_medio)
+        ws.cell(row=row, column=7).value = float(posicao.valor)
+        valor_total += posicao.valor
+        
+        # Formatação numérica
+        ws.cell(row=row, column=5).number_format = '#,##0.00'
+        ws.cell(row=row, column=6).number_format = 'R$ #,##0.00'
+        ws.cell(row=row, column=7).number_format = 'R$ #,##0.00'
+    
+    # Total
+    ws.cell(row=row + 1, column=6).value = 'Total'
+    ws.cell(row=row + 1, column=6).font = Font(bold=True)
+    ws.cell(row=row + 1, column=7).value = float(valor_total)
+    ws.cell(row=row + 1, column=7).number_format = 'R$ #,##0.00'
+    ws.cell(row=row + 1, column=7).font = Font(bold=True)
+    
+    # Ajusta largura das colunas
+    column_widths = [15, 40, 20, 12, 12, 15, 15]
+    for col, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    
+    # Planilha de parâmetros
+    ws_info = wb.create_sheet("Parâmetros")
+    ws_info.cell(row=1, column=1).value = 'Posição ao final de'
+    ws_info.cell(row=1, column=2).value = data.strftime('%d/%m/%Y')
+    ws_info.column_dimensions['A'].width = 20
+    ws_info.column_dimensions['B'].width = 15
+    
+    # Resposta HTTP
+    response = HttpResponse(
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    
+    wb.save(response)
+    return response
+
+
+def exportar_curva_abc_para_xlsx(linhas, data_inicio, data_fim, nome_arquivo='curva_abc.xlsx'):
+    """
+    Exporta a curva ABC de um período para arquivo XLSX.
+    
+    Args:
+        linhas: Iterável de LinhaABC, do maior para o menor valor
+        data_inicio: Data inicial do período
+        data_fim: Data final do período
+        nome_arquivo: Nome do arquivo a ser gerado
+        
+    Returns:
+        HttpResponse com o arquivo XLSX
+    """
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Curva ABC"
+    
+    headers = ['Posição', 'Código', 'Nome', 'Valor das Saídas', 'Participação', 'Acumulado', 'Classe']
+    
+    # Cabeçalho
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col)
+        cell.value = header
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+    
+    # Dados
+    for posicao, linha in enumerate(linhas, 1):
+        row = posicao + 1
+        ws.cell(row=row, column=1).value = posicao
+        ws.cell(row=row, column=2).value = linha.codigo
+        ws.cell(row=row, column=3).value = linha.nome
+        ws.cell(row=row, column=4).value = float(linha.valor)
+        ws.cell(row=row, column=5).value = float(linha.participacao)
+        ws.cell(row=row, column=6).value = float(linha.acumulado)
+        ws.cell(row=row, column=7).value = linha.classe
+        
+        # Formatação numérica
+        ws.cell(row=row, column=4).number_format = 'R$ #,##0.00'
+        ws.cell(row=row, column=5).number_format = '0.00%'
+        ws.cell(row=row, column=6).number_format = '0.00%'
+    
+    # Ajusta largura das colunas
+    column_widths = [10, 15, 40, 18, 14, 14, 8]
+    for col, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    
+    # Planilha de parâmetros
+    ws_info = wb.create_sheet("Parâmetros")
+    ws_info.cell(row=1, column=1).value = 'Período'
+    ws_info.cell(row=1, column=2).value = f"{data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}"
+    ws_info.column_dimensions['A'].width = 20
+    ws_info.column_dimensions['B'].width = 25
+    
+    # Resposta HTTP
+    response = HttpResponse(
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    
+    wb.save(response)
+    return response
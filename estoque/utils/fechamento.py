@@ -0,0 +1,262 @@
+"""
+Utilitário para o fechamento mensal do estoque.
+
+Um fechamento congela, por produto, o saldo inicial e final, as entradas,
+as saídas e o valor do mês. Depois de fechado, o mês não aceita novas
+movimentações, então os resumos de meses fechados nunca mudam e ficam em
+cache sem expiração.
+
+Os meses são fechados em ordem, sem pular nenhum: o saldo inicial de um
+fechamento é o saldo final (quantidade e custo médio) do anterior, e o
+final é esse saldo mais as movimentações do mês. Só o primeiro
+fechamento avalia o estoque a partir do histórico.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .avaliacao import PosicaoEstoque, avaliar_estoque, avancar_posicoes, criar_snapshot, inicio_do_dia
+from .movimentacoes import CENTAVO
+
+
+def primeiro_dia(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def ultimo_dia(dia: date) -> date:
+    return (dia.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def ultimo_dia_fechado() -> Optional[date]:
+    """Último dia do mês fechado mais recente (None se não há fechamentos)"""
+    from estoque.models import MonthlyClosing
+
+    mes = MonthlyClosing.objects.order_by('-mes').values_list('mes', flat=True).first()
+    return ultimo_dia(mes) if mes else None
+
+
+def verificar_periodo_aberto(dias):
+    """
+    Levanta PeriodoFechadoError se algum dos dias pertence a um mês fechado.
+    Movimentações do mês corrente não consultam o banco: só meses já
+    encerrados podem estar fechados.
+    """
+    from .movimentacoes import PeriodoFechadoError
+
+    mais_antigo = min(dias, default=None)
+    if mais_antigo is None or mais_antigo >= primeiro_dia(timezone.localdate()):
+        return
+    fechado_ate = ultimo_dia_fechado()
+    if fechado_ate and mais_antigo <= fechado_ate:
+        raise PeriodoFechadoError(fechado_ate)
+
+
+def fechar_mes(mes: date, usuario=None):
+    """
+    Grava o fechamento do mês de `mes`. Também grava o snapshot do último
+    dia do mês, usado pelas avaliações de datas posteriores.
+
+    Raises:
+        ValueError: se o mês ainda não terminou ou não é o mês seguinte ao
+            último fechamento
+    """
+    from estoque.models import MonthlyClosing, MonthlyClosingItem, Product, StockMovement
+
+    inicio, fim = primeiro_dia(mes), ultimo_dia(mes)
+    if inicio >= primeiro_dia(timezone.localdate()):
+        raise ValueError('Só é possível fechar meses já encerrados.')
+
+    with transaction.atomic():
+        anterior = MonthlyClosing.objects.select_for_update().order_by('-mes').first()
+        if anterior is not None:
+            if inicio <= anterior.mes:
+                raise ValueError(f'O estoque já está fechado até {ultimo_dia(anterior.mes):%d/%m/%Y}.')
+            proximo = ultimo_dia(anterior.mes) + timedelta(days=1)
+            if inicio != proximo:
+                raise ValueError(f'Os meses são fechados em ordem: feche antes {proximo:%m/%Y}.')
+            # Parte do fechamento anterior (imutável), sem avaliar o estoque de novo
+            posicoes = {
+                produto_id: PosicaoEstoque(saldo, custo)
+                for produto_id, saldo, custo in anterior.itens.exclude(produto=None).values_list(
+                    'produto_id', 'saldo_final', 'custo_medio_final'
+                ).iterator(chunk_size=5000)
+                if saldo
+            }
+        else:
+            posicoes = avaliar_estoque(inicio - timedelta(days=1))
+        iniciais = {produto_id: posicao.quantidade for produto_id, posicao in posicoes.items()}
+
+        finais = avancar_posicoes(posicoes, inicio, inicio_do_dia(fim + timedelta(days=1)))
+        criar_snapshot(fim, finais)
+
+        zero = Value(Decimal('0.00'), output_field=DecimalField())
+        totais = {
+            linha['produto_id']: (linha['entradas'], linha['saidas'], linha['valor_saidas'])
+            for linha in StockMovement.objects.filter(
+                data_movimento__range=(inicio, fim)
+            ).values('produto_id').annotate(
+                entradas=Sum(Case(When(tipo='ENTRADA', then='quantidade'), default=zero)),
+                saidas=Sum(Case(When(tipo='SAIDA', then='quantidade'), default=zero)),
+                valor_saidas=Sum(Case(
+                    When(tipo='SAIDA', then=F('quantidade') * F('custo_medio_apos')),
+                    default=zero, output_field=DecimalField(),
+                )),
+            ).order_by()
+        }
+
+        vazio = (Decimal('0.00'), Decimal('0.00'), Decimal('0.00'))
+        itens = []
+        for produto_id, nome in Product.objects.values_list('pk', 'nome').iterator(chunk_size=5000):
+            saldo_inicial = iniciais.get(produto_id, Decimal('0.00'))
+            entradas, saidas, valor_saidas = totais.get(produto_id, vazio)
+            posicao = finais.get(produto_id)
+            if not (saldo_inicial or entradas or saidas or (posicao and posicao.quantidade)):
+                continue
+            saldo_final = posicao.quantidade if posicao else Decimal('0.00')
+            custo = posicao.custo_medio if posicao else Decimal('0.00')
+            itens.append(MonthlyClosingItem(
+                produto_id=produto_id,
+                produto_nome=nome,
+                saldo_inicial=saldo_inicial,
+                entradas=entradas,
+                saidas=saidas,
+                valor_saidas=Decimal(valor_saidas).quantize(CENTAVO),
+                saldo_final=saldo_final,
+                custo_medio_final=custo,
+                valor_final=saldo_final * custo,
+            ))
+
+        fechamento = MonthlyClosing.objects.create(
+            mes=inicio,
+            usuario=usuario,
+            total_entradas=sum((item.entradas for item in itens), Decimal('0.00')),
+            total_saidas=sum((item.saidas for item in itens), Decimal('0.00')),
+            valor_final=sum((item.valor_final for item in itens), Decimal('0.00')),
+        )
+        for item in itens:
+            item.fechamento = fechamento
+        MonthlyClosingItem.objects.bulk_create(itens, batch_size=5000)
+
+    return fechamento
+
+
+def meses_a_fechar(ate: Optional[date] = None) -> List[date]:
+    """Meses encerrados ainda não fechados, do mais antigo ao mais recente"""
+    from estoque.models import StockMovement
+
+    ate = primeiro_dia(ate or (primeiro_dia(timezone.localdate()) - timedelta(days=1)))
+    fechado_ate = ultimo_dia_fechado()
+    if fechado_ate:
+        mes = fechado_ate + timedelta(days=1)
+    else:
+        primeira = StockMovement.objects.order_by('data_movimento').values_list(
+            'data_movimento', flat=True
+        ).first()
+        if primeira is None:
+            return []
+        mes = primeiro_dia(primeira)
+
+    meses = []
+    while mes <= ate:
+        meses.append(mes)
+        mes = ultimo_dia(mes) + timedelta(days=1)
+    return meses
+
+
+def _resumo_fechamento(fechamento_id: int) -> Dict:
+    """Resumo de um mês fechado lido dos itens do fechamento"""
+    from estoque.models import MonthlyClosing
+
+    fechamento = MonthlyClosing.objects.get(pk=fechamento_id)
+    saidas_por_produto = {}
+    for nome, saidas in fechamento.itens.filter(saidas__gt=0).values_list('produto_nome', 'saidas'):
+        saidas_por_produto[nome] = saidas_por_produto.get(nome, Decimal('0.00')) + saidas
+    return {
+        'entradas': fechamento.total_entradas,
+        'saidas': fechamento.total_saidas,
+        'saidas_por_produto': saidas_por_produto,
+    }
+
+
+def dividir_periodo(data_inicio: date, data_fim: date) -> Tuple[Dict[date, Tuple[int, datetime]], Optional[Q]]:
+    """
+    Separa o período em meses fechados inteiramente cobertos (lidos dos
+    fechamentos) e o restante (mês aberto e meses cobertos parcialmente),
+    devolvido como filtro de data_movimento.
+
+    Returns:
+        Tupla ({primeiro dia do mês: (pk, created_at) do fechamento},
+        Q com as faixas abertas ou None se não há faixa aberta)
+    """
+    from estoque.models import MonthlyClosing
+
+    fechamentos = {
+        mes: (pk, criado_em)
+        for mes, pk, criado_em in MonthlyClosing.objects.filter(
+            mes__range=(primeiro_dia(data_inicio), data_fim)
+        ).values_list('mes', 'pk', 'created_at')
+    }
+
+    fechados = {}
+    periodos_abertos = None
+    mes = primeiro_dia(data_inicio)
+    while mes <= data_fim:
+        inicio, fim = max(mes, data_inicio), min(ultimo_dia(mes), data_fim)
+        if mes in fechamentos and (inicio, fim) == (mes, ultimo_dia(mes)):
+            fechados[mes] = fechamentos[mes]
+        else:
+            faixa = Q(data_movimento__range=(inicio, fim))
+            periodos_abertos = faixa if periodos_abertos is None else periodos_abertos | faixa
+        mes = ultimo_dia(mes) + timedelta(days=1)
+    return fechados, periodos_abertos
+
+
+def resumo_periodo(data_inicio: date, data_fim: date) -> Dict:
+    """
+    Totais de entradas e saídas e saídas por mês/produto de um período.
+
+    Meses fechados vêm dos fechamentos (em cache sem expiração, pois são
+    imutáveis); o restante é calculado em uma consulta agrupada sobre
+    data_movimento, também no arquivo se o período o alcança.
+
+    Returns:
+        Dicionário com 'entradas', 'saidas' e 'saidas_por_mes'
+        ({'AAAA-MM': {nome do produto: quantidade}})
+    """
+    from .arquivamento import modelos_do_periodo
+
+    fechados, periodos_abertos = dividir_periodo(data_inicio, data_fim)
+
+    resumo = {'entradas': Decimal('0.00'), 'saidas': Decimal('0.00'), 'saidas_por_mes': {}}
+    for mes, (pk, criado_em) in sorted(fechados.items()):
+        # created_at na chave evita colisão se um pk for reaproveitado (banco recriado)
+        chave = f'fechamento_resumo_{pk}_{criado_em.timestamp()}'
+        dados = cache.get(chave)
+        if dados is None:
+            dados = _resumo_fechamento(pk)
+            cache.set(chave, dados, None)
+        resumo['entradas'] += dados['entradas']
+        resumo['saidas'] += dados['saidas']
+        if dados['saidas_por_produto']:
+            resumo['saidas_por_mes'][mes.strftime('%Y-%m')] = dict(dados['saidas_por_produto'])
+
+    if periodos_abertos is not None:
+        for modelo in modelos_do_periodo(data_inicio):
+            for linha in modelo.objects.filter(periodos_abertos).values(
+                'tipo', 'produto__nome', mes=TruncMonth('data_movimento')
+            ).annotate(total=Sum('quantidade')).order_by():
+                if linha['tipo'] == 'ENTRADA':
+                    resumo['entradas'] += linha['total']
+                    continue
+                resumo['saidas'] += linha['total']
+                por_produto = resumo['saidas_por_mes'].setdefault(linha['mes'].strftime('%Y-%m'), {})
+                nome = linha['produto__nome']
+                por_produto[nome] = por_produto.get(nome, Decimal('0.00')) + linha['total']
+
+    return resumo
@@ -0,0 +1,57 @@
+"""
+Utilitário para identificar o fornecedor de uma NF-e pelo CNPJ do emitente.
+
+O CNPJ do cadastro é guardado como digitado (com ou sem pontuação); a
+busca usa a coluna cnpj_digitos (só os 14 dígitos, com índice único),
+mantida por Supplier.save(). Não há cache: a consulta pelo índice único
+custa o mesmo que confirmar uma entrada em cache, e um fornecedor guardado
+em cache local de um processo ficaria desatualizado (ou já excluído) para
+os demais.
+"""
+import re
+from typing import Optional
+
+from django.db import IntegrityError, transaction
+
+
+def normalizar_cnpj(cnpj: Optional[str]) -> Optional[str]:
+    """Só os dígitos do CNPJ, ou None se não forem 14"""
+    digitos = re.sub(r'\D', '', cnpj or '')
+    return digitos if len(digitos) == 14 else None
+
+
+def formatar_cnpj(digitos: str) -> str:
+    """00.000.000/0000-00"""
+    return f'{digitos[:2]}.{digitos[2:5]}.{digitos[5:8]}/{digitos[8:12]}-{digitos[12:]}'
+
+
+def resolver_fornecedor(cnpj: Optional[str], nome: Optional[str] = None, criar: bool = True):
+    """
+    Fornecedor com o CNPJ informado (com ou sem pontuação).
+
+    Args:
+        nome: nome usado se o fornecedor precisar ser criado (xNome do emitente)
+        criar: cria o fornecedor se o CNPJ não está cadastrado
+
+    Returns:
+        O Supplier, ou None se o CNPJ é inválido (ou não cadastrado, com criar=False)
+    """
+    from estoque.models import Supplier
+
+    digitos = normalizar_cnpj(cnpj)
+    if digitos is None:
+        return None
+
+    fornecedor = Supplier.objects.filter(cnpj_digitos=digitos).first()
+    if fornecedor is None:
+        if not criar:
+            return None
+        try:
+            # Savepoint: duas notas do mesmo emitente novo ao mesmo tempo criam um só fornecedor
+            with transaction.atomic():
+                fornecedor = Supplier.objects.create(
+                    nome=(nome or '').strip()[:200] or formatar_cnpj(digitos), cnpj=formatar_cnpj(digitos)
+                )
+        except IntegrityError:
+            fornecedor = Supplier.objects.get(cnpj_digitos=digitos)
+    return fornecedor
@@ -0,0 +1,332 @@
+"""
+Utilitário para importar o catálogo de produtos de uma planilha (CSV ou XLSX).
+
+As linhas são lidas em streaming (openpyxl em modo somente leitura, csv
+linha a linha) e gravadas em lotes, cada lote em uma transação:
+
+- linhas com código (SKU) fazem upsert pelo código em um único INSERT ...
+  ON CONFLICT (bulk_create com update_conflicts);
+- linhas sem código são vinculadas pelo EAN a um produto existente ou
+  recebem um SKU de uma faixa reservada uma única vez (Product.reservar_skus),
+  em vez de uma chamada a generate_sku por produto;
+- categorias são resolvidas pelo nome em um mapa em memória, carregado uma vez.
+
+Só as colunas presentes na planilha são atualizadas em produtos existentes.
+O custo unitário é usado só no cadastro de produtos novos: o custo médio de
+um produto existente é mantido pelas movimentações. A importação não altera
+quantidades em estoque.
+"""
+import csv
+import io
+import time
+import unicodedata
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .busca_nomes import indexar_nomes
+from .indice_codigos import invalidar_indice_codigos
+from .status_estoque import calcular_status
+
+
+# Nomes de coluna aceitos (sem acento, minúsculos) para cada campo do produto.
+# Os cabeçalhos da exportação da lista de produtos são aceitos.
+COLUNAS = {
+    'codigo': 'codigo', 'sku': 'codigo', 'codigo_sku': 'codigo',
+    'nome': 'nome', 'descricao': 'nome', 'produto': 'nome',
+    'categoria': 'categoria',
+    'unidade': 'unidade',
+    'ean': 'ean', 'gtin': 'ean', 'codigo_de_barras': 'ean',
+    'ncm': 'ncm',
+    'custo_unitario': 'custo_unitario', 'custo': 'custo_unitario', 'custo_medio': 'custo_unitario',
+    'estoque_minimo': 'estoque_minimo', 'minimo': 'estoque_minimo',
+}
+COLUNAS_OBRIGATORIAS = ('nome', 'categoria')
+
+# Máximo de erros detalhados no resultado
+LIMITE_ERROS = 1000
+
+MAXIMO_DECIMAL = Decimal('99999999.99')
+
+
+class _CsvPontoEVirgula(csv.excel):
+    """Padrão das planilhas exportadas em português quando o separador não é detectado"""
+    delimiter = ';'
+
+
+def _normalizar_cabecalho(valor) -> str:
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(''.join(c if c.isalnum() else ' ' for c in texto.lower()).split())
+
+
+def _texto(valor) -> str:
+    """Texto da célula; números inteiros lidos como float (EAN, NCM) perdem o '.0'"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _decimal(valor) -> Decimal:
+    """Decimal de uma célula: número ou texto nos formatos 1234.56 e 1.234,56"""
+    if isinstance(valor, (int, float, Decimal)):
+        numero = Decimal(str(valor))
+    else:
+        texto = _texto(valor)
+        if ',' in texto:
+            texto = texto.replace('.', '').replace(',', '.')
+        numero = Decimal(texto or '0')
+    if not numero.is_finite() or numero < 0 or numero > MAXIMO_DECIMAL:
+        raise InvalidOperation
+    return numero.quantize(Decimal('0.01'))
+
+
+def ler_planilha(arquivo, nome_arquivo: str) -> Tuple[Tuple[str, ...], Iterator[Tuple[int, Dict]]]:
+    """
+    Abre uma planilha CSV (UTF-8, separada por ';', ',' ou tabulação) ou
+    XLSX (primeira aba) para leitura em streaming.
+
+    Returns:
+        (campos reconhecidos no cabeçalho, gerador de (número da linha,
+        {campo: valor})) — linhas vazias são puladas
+
+    Raises:
+        ValueError: formato não suportado ou colunas obrigatórias ausentes
+    """
+    nome = nome_arquivo.lower()
+    if nome.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        livro = load_workbook(arquivo, read_only=True, data_only=True)
+        linhas = livro.active.iter_rows(values_only=True)
+        fechar = livro.close
+    elif nome.endswith('.csv'):
+        texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+        amostra = texto.read(8192)
+        texto.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=';,\t')
+        except csv.Error:
+            dialeto = _CsvPontoEVirgula
+        linhas = csv.reader(texto, dialeto)
+        fechar = texto.detach
+    else:
+        raise ValueError('Formato não suportado: envie um arquivo .csv ou .xlsx.')
+
+    cabecalho = next(linhas, None) or ()
+    posicoes = {}
+    for posicao, coluna in enumerate(cabecalho):
+        campo = COLUNAS.get(_normalizar_cabecalho(coluna))
+        if campo and campo not in posicoes:
+            posicoes[campo] = posicao
+    ausentes = [campo for campo in COLUNAS_OBRIGATORIAS if campo not in posicoes]
+    if ausentes:
+        fechar()
+        raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(ausentes)}.")
+
+    def gerar():
+        try:
+            for numero, linha in enumerate(linhas, 2):
+                if not any(_texto(valor) for valor in linha):
+                    continue
+                yield numero, {
+                    campo: linha[posicao] if posicao < len(linha) else None
+                    for campo, posicao in posicoes.items()
+                }
+        finally:
+            fechar()
+
+    return tuple(posicoes), gerar()
+
+
+def _validar_linha(dados: Dict, categorias: Dict, criar_categorias: bool) -> Tuple[Optional[Dict], Optional[str]]:
+    """Valida uma linha e retorna (valores do produto, erro)"""
+    from estoque.models import Category, Product
+
+    valores = {}
+    valores['codigo'] = _texto(dados.get('codigo'))
+    if len(valores['codigo']) > 50:
+        return None, 'Código maior que 50 caracteres'
+
+    valores['nome'] = _texto(dados.get('nome'))
+    if not valores['nome'] or len(valores['nome']) > 200:
+        return None, 'Nome ausente ou maior que 200 caracteres'
+
+    nome_categoria = _texto(dados.get('categoria'))
+    if not nome_categoria or len(nome_categoria) > 100:
+        return None, 'Categoria ausente ou maior que 100 caracteres'
+    chave = nome_categoria.casefold()
+    if chave not in categorias:
+        if not criar_categorias:
+            return None, f'Categoria "{nome_categoria}" não encontrada'
+        categoria = Category.objects.create(nome=nome_categoria)
+        categorias[chave] = (categoria.pk, categoria.estoque_critico)
+    valores['categoria_id'], valores['limite_critico'] = categorias[chave]
+
+    if 'unidade' in dados:
+        unidade = _texto(dados['unidade']).upper() or 'UN'
+        if unidade not in dict(Product.UNIDADE_CHOICES):
+            return None, f'Unidade "{unidade}" inválida'
+        valores['unidade'] = unidade
+
+    for campo, tamanho in (('ean', 13), ('ncm', 10)):
+        if campo in dados:
+            valor = _texto(dados[campo])
+            if len(valor) > tamanho:
+                return None, f'{campo.upper()} maior que {tamanho} caracteres'
+            valores[campo] = valor or None
+
+    for campo in ('custo_unitario', 'estoque_minimo'):
+        if campo in dados:
+            try:
+                valores[campo] = _decimal(dados[campo])
+            except InvalidOperation:
+                return None, f"{'Custo unitário' if campo == 'custo_unitario' else 'Estoque mínimo'} inválido"
+
+    return valores, None
+
+
+def _gravar_lote(validas, campos, skus) -> Tuple[int, int]:
+    """
+    Grava um lote de linhas válidas em uma transação.
+
+    Returns:
+        (produtos criados, produtos atualizados)
+    """
+    from estoque.models import Product
+
+    # Linhas sem código: vínculo pelo EAN com um produto ativo
+    eans = {valores['ean'] for valores in validas if not valores['codigo'] and valores.get('ean')}
+    por_ean = {}
+    for ean, codigo in Product.objects.filter(ean__in=eans, arquivado=False).order_by('-pk').values_list(
+        'ean', 'codigo'
+    ):
+        por_ean[ean] = codigo
+    for valores in validas:
+        if not valores['codigo'] and valores.get('ean') in por_ean:
+            valores['codigo'] = por_ean[valores['ean']]
+
+    # Repetições do mesmo código ou EAN no lote: vale a última linha
+    por_codigo, sem_codigo = {}, {}
+    for valores in validas:
+        if valores['codigo']:
+            por_codigo[valores['codigo']] = valores
+        else:
+            sem_codigo[valores.get('ean') or id(valores)] = valores
+
+    existentes = {}
+    # Nomes hoje no índice da busca por nome (produtos ativos), para a atualização incremental
+    nomes_indexados = {}
+    for codigo, quantidade, estoque_minimo, nome, arquivado in Product.objects.filter(
+        codigo__in=por_codigo
+    ).values_list('codigo', 'quantidade_estoque', 'estoque_minimo', 'nome', 'arquivado'):
+        existentes[codigo] = (quantidade, estoque_minimo)
+        if not arquivado:
+            nomes_indexados[codigo] = nome
+
+    def montar(valores, quantidade=Decimal('0.00'), estoque_minimo=Decimal('0.00')):
+        produto = Product(**{
+            campo: valor for campo, valor in valores.items() if campo != 'limite_critico'
+        })
+        if 'estoque_minimo' not in valores:
+            produto.estoque_minimo = estoque_minimo
+        # bulk_create não passa por Product.save(): a abertura de um produto novo é o custo da planilha
+        produto.custo_abertura = produto.custo_unitario
+        produto.status = calcular_status(quantidade, produto.estoque_minimo, valores['limite_critico'])
+        return produto
+
+    upsert = [montar(valores, *existentes.get(codigo, ())) for codigo, valores in por_codigo.items()]
+    novos = []
+    for valores in sem_codigo.values():
+        valores['codigo'] = next(skus)
+        novos.append(montar(valores))
+
+    # Só as colunas da planilha (exceto o custo, mantido pelas movimentações);
+    # um código arquivado volta ao cadastro ativo
+    atualizar = [
+        campo for campo in ('nome', 'categoria', 'unidade', 'ean', 'ncm', 'estoque_minimo')
+        if campo in campos
+    ] + ['status', 'arquivado', 'arquivado_em', 'updated_at']
+
+    with transaction.atomic():
+        if upsert:
+            Product.objects.bulk_create(
+                upsert, update_conflicts=True, unique_fields=['codigo'], update_fields=atualizar
+            )
+        if novos:
+            # Sem update_conflicts: um SKU reservado que já exista falha em vez de sobrescrever
+            Product.objects.bulk_create(novos)
+        # bulk_create não passa por Product.save(): atualiza o índice da busca por nome
+        indexar_nomes(
+            (pk, nomes_indexados.get(codigo), nome)
+            for pk, codigo, nome in Product.objects.filter(
+                codigo__in=[produto.codigo for produto in upsert + novos]
+            ).values_list('pk', 'codigo', 'nome')
+        )
+
+    atualizados = len(existentes)
+    return len(upsert) + len(novos) - atualizados, atualizados
+
+
+def importar_catalogo(arquivo, nome_arquivo: str, lote: int = 1000, criar_categorias: bool = True) -> Dict:
+    """
+    Importa produtos de uma planilha CSV ou XLSX, com upsert pelo código
+    (ou pelo EAN, em linhas sem código).
+
+    Args:
+        arquivo: arquivo binário aberto (ou UploadedFile)
+        nome_arquivo: nome do arquivo (a extensão define o formato)
+        lote: linhas validadas e gravadas por transação
+        criar_categorias: cria as categorias ausentes (ou rejeita a linha)
+
+    Returns:
+        Dicionário com 'linhas', 'criados', 'atualizados', 'total_erros',
+        'erros' (lista de dicts com linha e erro), 'segundos' e
+        'linhas_por_segundo'
+
+    Raises:
+        ValueError: formato não suportado ou colunas obrigatórias ausentes
+    """
+    from estoque.models import Category, Product
+
+    inicio = time.perf_counter()
+    campos, linhas = ler_planilha(arquivo, nome_arquivo)
+
+    categorias = {}
+    for pk, nome, limite in Category.objects.order_by('-pk').values_list('pk', 'nome', 'estoque_critico'):
+        categorias[nome.strip().casefold()] = (pk, limite)
+    skus = Product.reservar_skus()
+
+    resultado = {'linhas': 0, 'criados': 0, 'atualizados': 0, 'total_erros': 0, 'erros': []}
+
+    def gravar(validas):
+        criados, atualizados = _gravar_lote(validas, campos, skus)
+        resultado['criados'] += criados
+        resultado['atualizados'] += atualizados
+
+    validas = []
+    for numero, dados in linhas:
+        resultado['linhas'] += 1
+        valores, erro = _validar_linha(dados, categorias, criar_categorias)
+        if erro:
+            resultado['total_erros'] += 1
+            if len(resultado['erros']) < LIMITE_ERROS:
+                resultado['erros'].append({'linha': numero, 'erro': erro})
+            continue
+        validas.append(valores)
+        if len(validas) >= lote:
+            gravar(validas)
+            validas = []
+    if validas:
+        gravar(validas)
+
+    if resultado['criados'] or resultado['atualizados']:
+        cache.delete('dashboard_stats')
+        invalidar_indice_codigos()
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    resultado['linhas_por_segundo'] = resultado['linhas'] / resultado['segundos'] if resultado['segundos'] else 0
+    return resultado
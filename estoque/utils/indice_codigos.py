@@ -0,0 +1,97 @@
+"""
+Índice em memória de códigos (EAN e SKU) -> produto, usado pela leitura
+de código de barras.
+
+O índice é montado uma vez por processo com uma única consulta e depois
+as buscas são consultas a um dicionário. Cada processo guarda a versão com
+que montou o índice; Product.save()/delete() incrementam a versão no banco
+(CacheVersion, visível para todos os workers, ao contrário do cache local
+de cada processo) e o índice é remontado na próxima busca de qualquer
+processo. Conferir a versão é uma consulta pela chave primária por busca
+(ou por lote de códigos, com buscar_produtos_por_codigos).
+"""
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from django.db import transaction
+from django.db.models import F
+
+
+NOME_VERSAO = 'indice_codigos'
+
+
+class ProdutoIndexado(NamedTuple):
+    """Dados mínimos do produto mantidos no índice"""
+    id: int
+    codigo: str
+    nome: str
+    unidade: str
+
+
+_lock = threading.Lock()
+_indice: Optional[Dict[str, ProdutoIndexado]] = None
+_versao_indice: Optional[int] = None
+
+
+def _versao_atual() -> int:
+    from estoque.models import CacheVersion
+
+    return CacheVersion.objects.filter(nome=NOME_VERSAO).values_list('versao', flat=True).first() or 0
+
+
+def _incrementar_versao():
+    from estoque.models import CacheVersion
+
+    if not CacheVersion.objects.filter(nome=NOME_VERSAO).update(versao=F('versao') + 1):
+        CacheVersion.objects.get_or_create(nome=NOME_VERSAO, defaults={'versao': 1})
+
+
+def _montar_indice() -> Dict[str, ProdutoIndexado]:
+    from estoque.models import Product
+
+    indice = {}
+    produtos = Product.objects.filter(arquivado=False).values_list('pk', 'codigo', 'ean', 'nome', 'unidade')
+    for pk, codigo, ean, nome, unidade in produtos.iterator(chunk_size=5000):
+        produto = ProdutoIndexado(pk, codigo or '', nome, unidade)
+        if ean:
+            indice.setdefault(ean, produto)
+        if codigo:
+            # SKU tem prioridade sobre EAN em caso de colisão
+            indice[codigo] = produto
+    return indice
+
+
+def obter_indice() -> Dict[str, ProdutoIndexado]:
+    """Retorna o índice atual, remontando-o se foi invalidado"""
+    global _indice, _versao_indice
+
+    versao = _versao_atual()
+    if _indice is None or _versao_indice != versao:
+        with _lock:
+            if _indice is None or _versao_indice != versao:
+                _indice = _montar_indice()
+                _versao_indice = versao
+    return _indice
+
+
+def buscar_produto_por_codigo(codigo: str) -> Optional[ProdutoIndexado]:
+    """Busca um produto pelo EAN ou SKU (no banco, só a versão do índice)"""
+    if not codigo:
+        return None
+    return obter_indice().get(codigo.strip())
+
+
+def buscar_produtos_por_codigos(codigos: Iterable[str]) -> List[Optional[ProdutoIndexado]]:
+    """Busca vários códigos conferindo a versão do índice uma vez só"""
+    indice = obter_indice()
+    return [indice.get(codigo.strip()) if codigo else None for codigo in codigos]
+
+
+def invalidar_indice_codigos():
+    """Invalida o índice em todos os processos (chamado ao salvar/excluir produtos)"""
+    global _indice
+
+    _indice = None
+    # Depois do commit: os outros workers remontam já vendo a alteração, e uma
+    # transação desfeita não invalida nada
+    transaction.on_commit(_incrementar_versao)
@@ -0,0 +1,280 @@
+"""
+Utilitário para aplicar movimentações de estoque (individuais ou em lote).
+
+O estoque é atualizado com UPDATE condicional no banco
+(``UPDATE ... SET quantidade_estoque = quantidade_estoque - x
+WHERE quantidade_estoque >= x``), então duas saídas concorrentes nunca
+deixam o estoque negativo, mesmo que ambas tenham passado pela validação
+do formulário.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+from typing import Dict, List
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .status_estoque import calcular_status
+
+
+CENTAVO = Decimal('0.01')
+
+CAMPO_ULTIMA_MOVIMENTACAO = {'ENTRADA': 'ultima_entrada_em', 'SAIDA': 'ultima_saida_em'}
+
+
+class EstoqueInsuficienteError(ValueError):
+    """
+    Levantada quando uma ou mais linhas não têm estoque suficiente.
+    Nenhuma movimentação do lote é gravada.
+
+    Attributes:
+        faltas: lista de dicionários com 'produto_id', 'produto',
+            'solicitado' e 'disponivel'
+    """
+
+    def __init__(self, faltas: List[Dict]):
+        self.faltas = faltas
+        detalhes = '; '.join(
+            f"{falta['produto']}: solicitado {falta['solicitado']}, disponível {falta['disponivel']}"
+            for falta in faltas
+        )
+        super().__init__(f'Estoque insuficiente ({detalhes})')
+
+
+class PeriodoFechadoError(ValueError):
+    """
+    Levantada quando uma movimentação cai em um mês com fechamento gravado.
+
+    Attributes:
+        fechado_ate: último dia do período fechado
+    """
+
+    def __init__(self, fechado_ate):
+        self.fechado_ate = fechado_ate
+        super().__init__(f"O estoque está fechado até {fechado_ate.strftime('%d/%m/%Y')}")
+
+
+def custo_medio_ponderado(quantidade_atual: Decimal, custo_atual: Decimal,
+                          quantidade_entrada: Decimal, custo_entrada: Decimal) -> Decimal:
+    """
+    Calcula o novo custo médio ponderado após uma entrada.
+
+    Entradas sem custo não alteram o custo médio. Se o estoque atual não é
+    positivo, o custo da entrada passa a ser o custo médio. O resultado é
+    arredondado para centavos como o banco grava (ROUND_HALF_EVEN).
+    """
+    if custo_entrada <= 0:
+        return custo_atual
+    if quantidade_atual > 0:
+        novo_custo = (
+            (quantidade_atual * custo_atual) + (quantidade_entrada * custo_entrada)
+        ) / (quantidade_atual + quantidade_entrada)
+    else:
+        novo_custo = custo_entrada
+    return Decimal(novo_custo).quantize(CENTAVO, rounding=ROUND_HALF_EVEN)
+
+
+def validar_quantidade(valor, minimo: Decimal = CENTAVO) -> Decimal:
+    """
+    Quantidade recebida do cliente (texto ou número) com as regras do campo
+    StockMovement.quantidade: número finito, com até 10 dígitos e 2 casas
+    decimais, e ao menos `minimo` (0,01; contagens aceitam zero).
+
+    Raises:
+        ValidationError: com as mensagens do campo
+    """
+    from django.core.exceptions import ValidationError
+    from django.core.validators import DecimalValidator
+    from estoque.models import StockMovement
+
+    campo = StockMovement._meta.get_field('quantidade')
+    quantidade = campo.to_python(valor)
+    if quantidade is None:
+        raise ValidationError('Informe a quantidade.')
+    DecimalValidator(campo.max_digits, campo.decimal_places)(quantidade)
+    if quantidade < minimo:
+        raise ValidationError(f'A quantidade deve ser maior ou igual a {minimo}.')
+    return quantidade
+
+
+def _efeito(movimentacao) -> Decimal:
+    return movimentacao.quantidade if movimentacao.tipo == 'ENTRADA' else -movimentacao.quantidade
+
+
+def aplicar_no_estoque(movimentacoes) -> Dict[int, tuple]:
+    """
+    Aplica no estoque dos produtos o efeito de movimentações ainda não gravadas.
+
+    Para cada produto é feito um único UPDATE com o efeito líquido das suas
+    linhas, condicionado a que o estoque cubra a maior "descida" acumulada
+    do lote; o mesmo UPDATE avança ultima_entrada_em/ultima_saida_em. Os
+    produtos são atualizados em ordem de pk para evitar deadlocks entre
+    lotes concorrentes. Em seguida o custo médio e o status do estoque
+    são recalculados a partir do estado já travado pelo UPDATE, e cada
+    movimentação recebe saldo_apos/custo_medio_apos (razão do produto);
+    as entradas guardam também o custo médio anterior (custo_medio_antes,
+    não gravado) para registrar_historico_custo.
+
+    Deve ser chamada dentro de transaction.atomic().
+
+    Returns:
+        Dicionário produto_id -> (quantidade_estoque, custo_unitario, status,
+        ultima_entrada_em, ultima_saida_em) finais
+
+    Raises:
+        EstoqueInsuficienteError: se algum produto não tem estoque suficiente
+    """
+    from estoque.models import Product
+
+    por_produto = {}
+    for movimentacao in movimentacoes:
+        por_produto.setdefault(movimentacao.produto_id, []).append(movimentacao)
+
+    quote = connection.ops.quote_name
+    tabela = quote(Product._meta.db_table)
+    coluna_quantidade = quote('quantidade_estoque')
+
+    liquido = {}
+    sem_estoque = []
+    with connection.cursor() as cursor:
+        for produto_id in sorted(por_produto):
+            saldo = Decimal('0.00')
+            menor_saldo = Decimal('0.00')
+            ultimas = {}
+            for movimentacao in por_produto[produto_id]:
+                saldo += _efeito(movimentacao)
+                menor_saldo = min(menor_saldo, saldo)
+                campo = CAMPO_ULTIMA_MOVIMENTACAO[movimentacao.tipo]
+                ultimas[campo] = max(ultimas.get(campo, movimentacao.created_at), movimentacao.created_at)
+            liquido[produto_id] = saldo
+
+            # SQL direto: em lotes grandes (contagens, sincronização) compilar um
+            # QuerySet.update por produto custava mais que executar o UPDATE
+            atribuicoes = [f'{coluna_quantidade} = {coluna_quantidade} + %s']
+            params = [saldo]
+            for campo, momento in sorted(ultimas.items()):
+                # Movimentações retroativas (sincronização) não recuam a data
+                coluna = quote(campo)
+                atribuicoes.append(
+                    f'{coluna} = CASE WHEN {coluna} IS NULL OR {coluna} < %s THEN %s ELSE {coluna} END'
+                )
+                momento = connection.ops.adapt_datetimefield_value(momento)
+                params += [momento, momento]
+            sql = f'UPDATE {tabela} SET {", ".join(atribuicoes)} WHERE {quote("id")} = %s'
+            params.append(produto_id)
+            if menor_saldo < 0:
+                sql += f' AND {coluna_quantidade} >= %s'
+                params.append(-menor_saldo)
+            cursor.execute(sql, params)
+            if not cursor.rowcount:
+                sem_estoque.append(produto_id)
+
+    if sem_estoque:
+        faltas = []
+        for produto in Product.objects.filter(pk__in=sem_estoque).only('nome', 'quantidade_estoque'):
+            faltas.append({
+                'produto_id': produto.pk,
+                'produto': produto.nome,
+                'solicitado': sum(
+                    (m.quantidade for m in por_produto[produto.pk] if m.tipo == 'SAIDA'),
+                    Decimal('0.00'),
+                ),
+                'disponivel': produto.quantidade_estoque,
+            })
+        raise EstoqueInsuficienteError(faltas)
+
+    estado = {}
+    atuais = Product.objects.filter(pk__in=por_produto).values_list(
+        'pk', 'quantidade_estoque', 'custo_unitario', 'estoque_minimo',
+        'categoria__estoque_critico', 'status', 'ultima_entrada_em', 'ultima_saida_em',
+    )
+    alterados = []
+    for (produto_id, quantidade_final, custo, estoque_minimo, limite_critico, status,
+         ultima_entrada_em, ultima_saida_em) in atuais:
+        quantidade = quantidade_final - liquido[produto_id]
+        custo_inicial, status_inicial = custo, status
+        for movimentacao in por_produto[produto_id]:
+            if movimentacao.tipo == 'ENTRADA':
+                movimentacao.custo_medio_antes = custo
+                custo = custo_medio_ponderado(
+                    quantidade, custo, movimentacao.quantidade, movimentacao.custo_unitario
+                )
+            quantidade += _efeito(movimentacao)
+            movimentacao.saldo_apos = quantidade
+            movimentacao.custo_medio_apos = custo
+        status = calcular_status(quantidade_final, estoque_minimo, limite_critico)
+        if custo != custo_inicial or status != status_inicial:
+            alterados.append((custo, status, produto_id))
+        estado[produto_id] = (quantidade_final, custo, status, ultima_entrada_em, ultima_saida_em)
+
+    if alterados:
+        # executemany: bulk_update monta um CASE por linha e fica lento em lotes grandes
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {tabela} SET {quote("custo_unitario")} = %s, {quote("status")} = %s '
+                f'WHERE {quote("id")} = %s',
+                alterados,
+            )
+
+    return estado
+
+
+def registrar_historico_custo(movimentacoes):
+    """
+    Grava no histórico de custo uma linha por entrada já gravada, com o
+    custo médio antes e depois dela. Deve ser chamada na mesma transação
+    que gravou as movimentações (depois de aplicar_no_estoque).
+    """
+    from estoque.models import ProductCostHistory
+
+    ProductCostHistory.objects.bulk_create([
+        ProductCostHistory(
+            produto_id=movimentacao.produto_id,
+            movimentacao_id=movimentacao.pk,
+            fornecedor_id=movimentacao.fornecedor_id,
+            quantidade=movimentacao.quantidade,
+            custo_entrada=movimentacao.custo_unitario,
+            custo_anterior=movimentacao.custo_medio_antes,
+            custo_novo=movimentacao.custo_medio_apos,
+            created_at=movimentacao.created_at,
+        )
+        for movimentacao in movimentacoes
+        if movimentacao.tipo == 'ENTRADA'
+    ], batch_size=5000)
+
+
+def registrar_movimentacoes(movimentacoes):
+    """
+    Grava um lote de movimentações (ENTRADA e/ou SAIDA) com semântica
+    tudo-ou-nada: ou todas as linhas são aplicadas, ou nenhuma.
+
+    Args:
+        movimentacoes: instâncias de StockMovement ainda não salvas
+
+    Returns:
+        Lista das movimentações gravadas
+
+    Raises:
+        EstoqueInsuficienteError: se alguma linha não tem estoque suficiente
+        PeriodoFechadoError: se alguma linha cai em um mês fechado
+    """
+    from estoque.models import StockMovement
+    from .avaliacao import invalidar_snapshots
+    from .fechamento import verificar_periodo_aberto
+
+    movimentacoes = list(movimentacoes)
+    if not movimentacoes:
+        return []
+
+    # bulk_create não passa por StockMovement.save()
+    for movimentacao in movimentacoes:
+        movimentacao.definir_data_movimento()
+    verificar_periodo_aberto(m.data_movimento for m in movimentacoes)
+
+    with transaction.atomic():
+        aplicar_no_estoque(movimentacoes)
+        StockMovement.objects.bulk_create(movimentacoes)
+        registrar_historico_custo(movimentacoes)
+        invalidar_snapshots(min(m.data_movimento for m in movimentacoes))
+
+    cache.delete('dashboard_stats')
+    return movimentacoes
@@ -0,0 +1,142 @@
+"""
+Utilitário para o razão (ledger) de estoque: cada StockMovement guarda
+saldo_apos e custo_medio_apos, o estado do produto logo após aplicá-la.
+
+Cada movimentação é gravada no razão no momento em que é aplicada. A
+ordem de referência, conferida por verificar_razao, é a das datas
+(created_at, pk): uma movimentação retroativa (sincronização offline)
+aparece como divergência até que recalcular_custos a coloque na posição da
+sua data.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Optional, Tuple
+
+from .movimentacoes import custo_medio_ponderado
+
+
+def saldo_em(produto_id: int, dia: date) -> Optional[Tuple[Decimal, Decimal]]:
+    """
+    Retorna (saldo, custo médio) do produto ao final do dia local `dia`,
+    com uma única consulta no índice (produto, data_movimento).
+
+    Returns:
+        Tupla (saldo, custo médio) ou None se não há movimentações até o dia
+    """
+    from estoque.models import StockMovement
+
+    return StockMovement.objects.filter(
+        produto_id=produto_id, data_movimento__lte=dia
+    ).order_by('-data_movimento', '-pk').values_list(
+        'saldo_apos', 'custo_medio_apos'
+    ).first()
+
+
+def saldos_de_abertura(produtos) -> Dict[int, Tuple[Decimal, Decimal]]:
+    """
+    (saldo, custo médio) de cada produto antes da primeira movimentação: o
+    estoque digitado no cadastro, que não tem movimentação, gravado na
+    inclusão do produto (estoque_abertura/custo_abertura).
+
+    Não depende de quantidade_estoque nem do razão: o recálculo parte daqui
+    e refaz também o estoque.
+
+    Args:
+        produtos: queryset de produtos
+    """
+    return {
+        pk: (quantidade, custo)
+        for pk, quantidade, custo in produtos.order_by().values_list(
+            'pk', 'estoque_abertura', 'custo_abertura'
+        ).iterator(chunk_size=5000)
+    }
+
+
+def verificar_razao(produtos=None, lote: int = 5000, limite_divergencias: int = 1000) -> Dict:
+    """
+    Percorre o razão em lotes (uma leitura sequencial ordenada por produto
+    e data) e confere cada linha contra a anterior e o último saldo contra
+    o produto.
+
+    Uma divergência não se propaga: a conferência segue a partir do valor
+    gravado na linha divergente.
+
+    Args:
+        produtos: queryset de produtos a verificar (todos, por padrão)
+        lote: linhas lidas por vez do banco
+        limite_divergencias: máximo de divergências detalhadas no resultado
+
+    Returns:
+        Dicionário com 'produtos', 'movimentacoes', 'total_divergencias'
+        e 'divergencias' (lista de dicts com produto_id, movimentacao_id,
+        campo, esperado e gravado)
+    """
+    from estoque.models import Product, StockMovement
+
+    movimentacoes = StockMovement.objects.all()
+    if produtos is not None:
+        movimentacoes = movimentacoes.filter(produto__in=produtos)
+
+    resultado = {'produtos': 0, 'movimentacoes': 0, 'total_divergencias': 0, 'divergencias': []}
+
+    def divergencia(produto_id, movimentacao_id, campo, esperado, gravado):
+        resultado['total_divergencias'] += 1
+        if len(resultado['divergencias']) < limite_divergencias:
+            resultado['divergencias'].append({
+                'produto_id': produto_id,
+                'movimentacao_id': movimentacao_id,
+                'campo': campo,
+                'esperado': esperado,
+                'gravado': gravado,
+            })
+
+    finais = {}
+
+    def conferir_finais():
+        for pk, quantidade, custo in Product.objects.filter(pk__in=finais).values_list(
+            'pk', 'quantidade_estoque', 'custo_unitario'
+        ):
+            movimentacao_id, saldo, custo_medio = finais[pk]
+            if saldo != quantidade:
+                divergencia(pk, movimentacao_id, 'quantidade_estoque', saldo, quantidade)
+            if custo_medio != custo:
+                divergencia(pk, movimentacao_id, 'custo_unitario', custo_medio, custo)
+        finais.clear()
+
+    produto_atual = None
+    anterior = None
+    linhas = movimentacoes.order_by('produto_id', 'created_at', 'pk').values_list(
+        'pk', 'produto_id', 'tipo', 'quantidade', 'custo_unitario', 'saldo_apos', 'custo_medio_apos'
+    ).iterator(chunk_size=lote)
+
+    for pk, produto_id, tipo, quantidade, custo_unitario, saldo_apos, custo_medio_apos in linhas:
+        resultado['movimentacoes'] += 1
+        if produto_id != produto_atual:
+            produto_atual = produto_id
+            resultado['produtos'] += 1
+            anterior = None
+
+        if anterior is not None:
+            saldo_anterior, custo_anterior = anterior
+            efeito = quantidade if tipo == 'ENTRADA' else -quantidade
+            saldo_esperado = saldo_anterior + efeito
+            custo_esperado = custo_anterior
+            if tipo == 'ENTRADA':
+                custo_esperado = custo_medio_ponderado(
+                    saldo_anterior, custo_anterior, quantidade, custo_unitario
+                )
+            if saldo_apos != saldo_esperado:
+                divergencia(produto_id, pk, 'saldo_apos', saldo_esperado, saldo_apos)
+            if custo_medio_apos != custo_esperado:
+                divergencia(produto_id, pk, 'custo_medio_apos', custo_esperado, custo_medio_apos)
+
+        anterior = (saldo_apos, custo_medio_apos)
+        finais[produto_id] = (pk, saldo_apos, custo_medio_apos)
+        if len(finais) >= lote:
+            # O produto atual pode ter mais linhas no próximo lote: confere só os anteriores
+            ultimo = finais.pop(produto_id)
+            conferir_finais()
+            finais[produto_id] = ultimo
+
+    conferir_finais()
+    return resultado
@@ -0,0 +1,246 @@
+"""
+Utilitário para recalcular o razão e o custo médio ponderado a partir do
+histórico completo de movimentações.
+
+StockMovement.save aplica a fórmula incremental só na inclusão: corrigir
+a quantidade ou o custo de uma entrada já gravada deixa errados o
+saldo_apos/custo_medio_apos das linhas seguintes e o custo do produto.
+O recálculo refaz o razão de cada produto na ordem das datas (created_at,
+pk, a mesma de verificar_razao), com Decimal e custo_medio_ponderado, e
+grava em lote só o que mudou: uma movimentação retroativa passa para a sua
+posição na data.
+
+O ponto de partida é o saldo de abertura gravado na inclusão do produto
+(razao.saldos_de_abertura), independente do estoque atual e dos valores
+gravados na primeira linha: uma correção de quantidade ou custo em
+qualquer movimentação, inclusive a primeira, é refeita até o estoque do
+produto. As movimentações arquivadas entram no cálculo, mas não são
+regravadas. Uma edição direta de quantidade_estoque (sem movimentação) é
+desfeita; registre-a antes com reconciliar_estoque --corrigir.
+
+Os produtos são divididos em faixas de pk; cada faixa é calculada (só
+leitura, movimentações em streaming) em um processo do pool e gravada pelo
+processo principal em uma transação com os produtos travados. Faixas com
+movimentações novas durante o cálculo ficam de fora e são relatadas.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Max, Value
+
+from .arquivamento import arquivado_ate
+from .movimentacoes import custo_medio_ponderado
+from .razao import saldos_de_abertura
+from .reconciliacao import faixas_de_pk
+from .status_estoque import calcular_status
+
+
+def _inicializar_processo():
+    """Prepara o Django em cada processo do pool (necessário com spawn)"""
+    import django
+    django.setup()
+
+
+def _linhas_do_razao(produtos, lote: int):
+    """
+    Movimentações ativas e arquivadas dos produtos na ordem do razão
+    (produto, created_at, pk), marcadas com `arquivada`
+    """
+    from estoque.models import ArchivedStockMovement, StockMovement
+
+    campos = (
+        'pk', 'produto_id', 'tipo', 'quantidade', 'custo_unitario',
+        'saldo_apos', 'custo_medio_apos', 'data_movimento', 'created_at', 'arquivada',
+    )
+    ordem = ('produto_id', 'created_at', 'pk')
+    ativas = StockMovement.objects.filter(produto__in=produtos).annotate(arquivada=Value(False))
+    if arquivado_ate() is None:
+        linhas = ativas.values_list(*campos).order_by(*ordem)
+    else:
+        arquivadas = ArchivedStockMovement.objects.filter(produto__in=produtos).annotate(arquivada=Value(True))
+        linhas = ativas.values_list(*campos).order_by().union(
+            arquivadas.values_list(*campos).order_by(), all=True
+        ).order_by(*ordem)
+    return linhas.iterator(chunk_size=lote)
+
+
+def _recalcular_faixa(produtos, faixa: Tuple[int, int], lote: int) -> Dict:
+    """
+    Refaz o razão dos produtos de uma faixa de pk, sem gravar nada.
+
+    Returns:
+        Dicionário com 'faixa', 'produtos', 'movimentacoes', 'ultimas'
+        ({produto_id: maior pk das movimentações ativas lidas}), 'linhas'
+        (pk, saldo_apos, custo_medio_apos e data das linhas ativas que
+        mudaram) e 'finais' ({produto_id: (saldo, custo)})
+    """
+    resultado = {
+        'faixa': faixa, 'produtos': 0, 'movimentacoes': 0, 'ultimas': {}, 'linhas': [], 'finais': {},
+    }
+    produtos = produtos.filter(pk__range=faixa)
+    aberturas = saldos_de_abertura(produtos)
+
+    produto_atual = None
+    saldo = custo = None
+    for (pk, produto_id, tipo, quantidade, custo_unitario,
+         saldo_apos, custo_medio_apos, dia, _, arquivada) in _linhas_do_razao(produtos, lote):
+        resultado['movimentacoes'] += 1
+        if produto_id != produto_atual:
+            produto_atual = produto_id
+            resultado['produtos'] += 1
+            saldo, custo = aberturas[produto_id]
+        if tipo == 'ENTRADA':
+            custo = custo_medio_ponderado(saldo, custo, quantidade, custo_unitario)
+            saldo += quantidade
+        else:
+            saldo -= quantidade
+        resultado['finais'][produto_id] = (saldo, custo)
+        if arquivada:
+            # O arquivo (meses fechados) não é regravado
+            continue
+        if saldo != saldo_apos or custo != custo_medio_apos:
+            resultado['linhas'].append((pk, saldo, custo, dia))
+        resultado['ultimas'][produto_id] = max(pk, resultado['ultimas'].get(produto_id, pk))
+
+    return resultado
+
+
+def _recalcular_faixa_em_processo(consulta, faixa: Tuple[int, int], lote: int) -> Dict:
+    from estoque.models import Product
+
+    # O queryset vai para o processo como Query: serializar o queryset o avaliaria
+    produtos = Product.objects.all()
+    produtos.query = consulta
+    try:
+        return _recalcular_faixa(produtos, faixa, lote)
+    finally:
+        connections.close_all()
+
+
+def _gravar_razao(linhas, lote: int):
+    """
+    Grava saldo_apos/custo_medio_apos das linhas recalculadas com um UPDATE
+    parametrizado por lote (executemany). bulk_update monta um CASE por
+    linha e fica ~20x mais lento com centenas de milhares de linhas.
+    """
+    from estoque.models import StockMovement
+
+    quote = connection.ops.quote_name
+    sql = (
+        f'UPDATE {quote(StockMovement._meta.db_table)} '
+        f'SET {quote("saldo_apos")} = %s, {quote("custo_medio_apos")} = %s WHERE {quote("id")} = %s'
+    )
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(linhas), lote):
+            cursor.executemany(sql, [(saldo, custo, pk) for pk, saldo, custo, _ in linhas[inicio:inicio + lote]])
+
+
+def _gravar_faixa(calculo: Dict, lote: int) -> Dict:
+    """
+    Grava o razão e os produtos recalculados de uma faixa, com os produtos
+    travados. Se algum produto da faixa recebeu movimentações depois do
+    cálculo, a faixa inteira é descartada.
+    """
+    from estoque.models import Product, StockMovement
+    from .avaliacao import invalidar_snapshots
+
+    gravado = {'movimentacoes': 0, 'produtos': 0, 'descartada': False}
+    ultimas = calculo['ultimas']
+    if not ultimas:
+        return gravado
+
+    with transaction.atomic():
+        atuais = list(
+            Product.objects.select_for_update().filter(pk__in=ultimas).order_by('pk').values_list(
+                'pk', 'quantidade_estoque', 'custo_unitario', 'status',
+                'estoque_minimo', 'categoria__estoque_critico',
+            )
+        )
+        recentes = StockMovement.objects.filter(produto_id__in=ultimas).values('produto_id').annotate(
+            ultima=Max('pk')
+        ).order_by().values_list('produto_id', 'ultima')
+        if any(ultima != ultimas[produto_id] for produto_id, ultima in recentes):
+            gravado['descartada'] = True
+            return gravado
+
+        if calculo['linhas']:
+            _gravar_razao(calculo['linhas'], lote)
+            # Avaliações a partir do primeiro dia alterado deixam de valer
+            invalidar_snapshots(min(dia for _, _, _, dia in calculo['linhas']))
+            gravado['movimentacoes'] = len(calculo['linhas'])
+
+        alterados = []
+        for pk, quantidade, custo, status, estoque_minimo, limite_critico in atuais:
+            saldo_final, custo_final = calculo['finais'][pk]
+            status_final = calcular_status(saldo_final, estoque_minimo, limite_critico)
+            if (saldo_final, custo_final, status_final) != (quantidade, custo, status):
+                alterados.append(Product(
+                    pk=pk, quantidade_estoque=saldo_final, custo_unitario=custo_final, status=status_final
+                ))
+        Product.objects.bulk_update(
+            alterados, ['quantidade_estoque', 'custo_unitario', 'status'], batch_size=lote
+        )
+        gravado['produtos'] = len(alterados)
+
+    return gravado
+
+
+def recalcular_custos(produtos=None, lote: int = 1000, workers: int = 1) -> Dict:
+    """
+    Recalcula saldo_apos/custo_medio_apos de todas as movimentações e o
+    estoque, o custo médio e o status dos produtos.
+
+    Args:
+        produtos: queryset de produtos a recalcular (todos, por padrão)
+        lote: produtos por faixa (também o tamanho dos lotes de leitura e gravação)
+        workers: processos que calculam faixas em paralelo
+
+    Returns:
+        Dicionário com 'produtos', 'movimentacoes' (lidas),
+        'movimentacoes_corrigidas', 'produtos_corrigidos' e
+        'faixas_descartadas' (faixas de pk a recalcular de novo)
+    """
+    from estoque.models import Product
+
+    if produtos is None:
+        produtos = Product.objects.all()
+
+    resultado = {
+        'produtos': 0,
+        'movimentacoes': 0,
+        'movimentacoes_corrigidas': 0,
+        'produtos_corrigidos': 0,
+        'faixas_descartadas': [],
+    }
+
+    def registrar(calculo: Dict):
+        resultado['produtos'] += calculo['produtos']
+        resultado['movimentacoes'] += calculo['movimentacoes']
+        gravado = _gravar_faixa(calculo, lote)
+        if gravado['descartada']:
+            resultado['faixas_descartadas'].append(calculo['faixa'])
+        resultado['movimentacoes_corrigidas'] += gravado['movimentacoes']
+        resultado['produtos_corrigidos'] += gravado['produtos']
+
+    if workers > 1:
+        faixas = list(faixas_de_pk(produtos, lote))
+        # Processos filhos não podem herdar conexões abertas do processo principal
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_processo) as executor:
+            pendentes = []
+            for faixa in faixas:
+                pendentes.append(executor.submit(_recalcular_faixa_em_processo, produtos.query, faixa, lote))
+                # Limita as faixas em andamento para não acumular resultados na memória
+                if len(pendentes) >= workers * 2:
+                    registrar(pendentes.pop(0).result())
+            for futuro in pendentes:
+                registrar(futuro.result())
+    else:
+        for faixa in faixas_de_pk(produtos, lote):
+            registrar(_recalcular_faixa(produtos, faixa, lote))
+
+    if resultado['movimentacoes_corrigidas'] or resultado['produtos_corrigidos']:
+        cache.delete('dashboard_stats')
+    return resultado
@@ -0,0 +1,205 @@
+"""
+Utilitário para reconciliar o estoque gravado nos produtos com o histórico
+de movimentações (estoque de abertura do cadastro mais a soma das entradas
+menos a soma das saídas).
+
+Edições diretas de quantidade_estoque (formulário de produto, admin,
+scripts) não geram movimentação, então o saldo gravado pode divergir do
+histórico sem que ninguém perceba. A correção grava movimentações de
+ajuste que levam o histórico ao saldo gravado, sem alterar o produto.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Iterator, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, When
+from django.utils import timezone
+
+from .movimentacoes import CENTAVO
+
+
+OBSERVACAO_AJUSTE = 'Ajuste de reconciliação do estoque'
+
+COLUNAS_RELATORIO = ['produto_id', 'codigo', 'nome', 'saldo_gravado', 'saldo_movimentacoes', 'diferenca']
+
+
+def _saldos_movimentacoes(produto_ids) -> Dict[int, Decimal]:
+    """
+    Saldo pelo histórico (entradas - saídas) por produto, em uma consulta
+    agrupada na tabela ativa e outra no arquivo
+    """
+    from estoque.models import ArchivedStockMovement, StockMovement
+
+    saldos = {}
+    for modelo in (StockMovement, ArchivedStockMovement):
+        for produto_id, saldo in modelo.objects.filter(produto_id__in=produto_ids).values('produto_id').annotate(
+            saldo=Sum(Case(
+                When(tipo='ENTRADA', then=F('quantidade')),
+                default=-F('quantidade'),
+            ), output_field=DecimalField())
+        ).order_by().values_list('produto_id', 'saldo'):
+            saldos[produto_id] = saldos.get(produto_id, Decimal('0.00')) + saldo
+    return saldos
+
+
+def faixas_de_pk(produtos, lote: int) -> Iterator[Tuple[int, int]]:
+    """Faixas de pk (inclusivas) com até `lote` produtos cada, lidas em streaming"""
+    primeiro = ultimo = None
+    contagem = 0
+    for pk in produtos.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=lote):
+        if primeiro is None:
+            primeiro = pk
+        ultimo = pk
+        contagem += 1
+        if contagem == lote:
+            yield primeiro, ultimo
+            primeiro, contagem = None, 0
+    if primeiro is not None:
+        yield primeiro, ultimo
+
+
+def _divergencias_na_faixa(produtos, faixa: Tuple[int, int]) -> Tuple[int, List[Dict]]:
+    """Compara saldo gravado e saldo do histórico dos produtos de uma faixa de pk"""
+    gravados = list(
+        produtos.filter(pk__range=faixa).order_by('pk').values_list(
+            'pk', 'codigo', 'nome', 'quantidade_estoque', 'estoque_abertura'
+        )
+    )
+    saldos = _saldos_movimentacoes([pk for pk, *_ in gravados])
+    divergencias = []
+    for pk, codigo, nome, quantidade, abertura in gravados:
+        # O SQLite devolve a soma sem as casas decimais
+        saldo = (abertura + saldos.get(pk, Decimal('0.00'))).quantize(CENTAVO)
+        if saldo != quantidade:
+            divergencias.append({
+                'produto_id': pk,
+                'codigo': codigo,
+                'nome': nome,
+                'saldo_gravado': quantidade,
+                'saldo_movimentacoes': saldo,
+                'diferenca': quantidade - saldo,
+            })
+    return len(gravados), divergencias
+
+
+def _divergencias_na_faixa_em_thread(produtos, faixa: Tuple[int, int]) -> Tuple[int, List[Dict]]:
+    try:
+        return _divergencias_na_faixa(produtos, faixa)
+    finally:
+        # Cada thread abre sua própria conexão com o banco
+        connection.close()
+
+
+def corrigir_divergencias(produto_ids, usuario=None) -> int:
+    """
+    Grava, em lote, uma movimentação de ajuste por produto divergente.
+
+    A diferença é recalculada com os produtos travados, para não ajustar
+    com base em uma leitura anterior a movimentações concorrentes. O ajuste
+    leva o razão ao saldo gravado sem alterar o produto (nem o custo médio).
+
+    Returns:
+        Quantidade de movimentações de ajuste gravadas
+    """
+    from estoque.models import Product, StockMovement
+    from .avaliacao import invalidar_snapshots
+
+    agora = timezone.now()
+    with transaction.atomic():
+        produtos = list(
+            Product.objects.select_for_update().filter(pk__in=produto_ids).order_by('pk').values_list(
+                'pk', 'quantidade_estoque', 'custo_unitario', 'estoque_abertura'
+            )
+        )
+        saldos = _saldos_movimentacoes([pk for pk, *_ in produtos])
+        ajustes = []
+        for pk, quantidade, custo, abertura in produtos:
+            diferenca = quantidade - abertura - saldos.get(pk, Decimal('0.00'))
+            if not diferenca:
+                continue
+            ajuste = StockMovement(
+                tipo='ENTRADA' if diferenca > 0 else 'SAIDA',
+                produto_id=pk,
+                quantidade=abs(diferenca),
+                custo_unitario=Decimal('0.00'),
+                observacao=OBSERVACAO_AJUSTE,
+                usuario=usuario,
+                created_at=agora,
+                saldo_apos=quantidade,
+                custo_medio_apos=custo,
+            )
+            ajuste.definir_data_movimento()
+            ajustes.append(ajuste)
+        StockMovement.objects.bulk_create(ajustes, batch_size=5000)
+        if ajustes:
+            invalidar_snapshots(ajustes[0].data_movimento)
+    return len(ajustes)
+
+
+def reconciliar_estoque(produtos=None, lote: int = 5000, workers: int = 1, corrigir: bool = False,
+                        relatorio=None, limite_divergencias: int = 1000, usuario=None) -> Dict:
+    """
+    Confere o saldo gravado de cada produto contra o histórico de
+    movimentações, lendo os produtos em faixas de pk de `lote` produtos
+    (uma consulta agrupada por faixa), opcionalmente em paralelo.
+
+    A memória usada é limitada pelo tamanho do lote: as divergências vão
+    para o relatório à medida que são encontradas e só as primeiras
+    `limite_divergencias` ficam no resultado.
+
+    Args:
+        produtos: queryset de produtos a conferir (todos, por padrão)
+        lote: produtos por faixa
+        workers: faixas conferidas em paralelo (threads, uma conexão cada)
+        corrigir: grava movimentações de ajuste para as divergências
+        relatorio: csv.writer que recebe uma linha por divergência
+        limite_divergencias: máximo de divergências detalhadas no resultado
+        usuario: usuário registrado nos ajustes
+
+    Returns:
+        Dicionário com 'produtos', 'total_divergencias', 'diferenca_total',
+        'ajustes' e 'divergencias'
+    """
+    from estoque.models import Product
+
+    if produtos is None:
+        produtos = Product.objects.all()
+
+    resultado = {
+        'produtos': 0,
+        'total_divergencias': 0,
+        'diferenca_total': Decimal('0.00'),
+        'ajustes': 0,
+        'divergencias': [],
+    }
+
+    def registrar(conferidos: int, divergencias: List[Dict]):
+        resultado['produtos'] += conferidos
+        for item in divergencias:
+            resultado['total_divergencias'] += 1
+            resultado['diferenca_total'] += item['diferenca']
+            if relatorio is not None:
+                relatorio.writerow([item[coluna] for coluna in COLUNAS_RELATORIO])
+            if len(resultado['divergencias']) < limite_divergencias:
+                resultado['divergencias'].append(item)
+        if corrigir and divergencias:
+            resultado['ajustes'] += corrigir_divergencias(
+                [item['produto_id'] for item in divergencias], usuario=usuario
+            )
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pendentes = []
+            for faixa in faixas_de_pk(produtos, lote):
+                pendentes.append(executor.submit(_divergencias_na_faixa_em_thread, produtos, faixa))
+                # Limita as faixas em andamento para não acumular resultados na memória
+                if len(pendentes) >= workers * 2:
+                    registrar(*pendentes.pop(0).result())
+            for futuro in pendentes:
+                registrar(*futuro.result())
+    else:
+        for faixa in faixas_de_pk(produtos, lote):
+            registrar(*_divergencias_na_faixa(produtos, faixa))
+
+    return resultado
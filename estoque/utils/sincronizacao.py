@@ -0,0 +1,223 @@
+"""
+Utilitário para sincronização em lote de movimentações enviadas por
+coletores offline.
+
+Cada linha traz uma chave de idempotência gerada pelo cliente. Reenvios da
+mesma chave não geram nova movimentação (índice único em
+StockMovement.chave_idempotencia), então o coletor pode repetir o envio com
+segurança depois de uma queda de conexão.
+"""
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .indice_codigos import obter_indice
+from .fechamento import ultimo_dia_fechado
+from .movimentacoes import CENTAVO, registrar_movimentacoes, EstoqueInsuficienteError
+
+
+# Máximo de linhas aceitas por requisição
+LIMITE_LINHAS = 10000
+
+# Tentativas quando outro envio concorrente grava a mesma chave
+TENTATIVAS_CONFLITO = 3
+
+# Diferença aceita entre o relógio do coletor e o do servidor
+TOLERANCIA_RELOGIO = timedelta(minutes=5)
+
+# Maior valor dos campos decimais (max_digits=10, decimal_places=2)
+MAXIMO_DECIMAL = Decimal('99999999.99')
+
+
+def _validar_linha(linha, produtos_existentes, fornecedores_existentes, indice):
+    """Valida uma linha e retorna (dados, erro)"""
+    if not isinstance(linha, dict):
+        return None, 'Linha inválida'
+
+    chave = str(linha.get('chave') or '').strip()
+    if not chave or len(chave) > 64:
+        return None, 'Chave de idempotência ausente ou maior que 64 caracteres'
+
+    tipo = linha.get('tipo')
+    if tipo not in ('ENTRADA', 'SAIDA'):
+        return None, 'Tipo deve ser ENTRADA ou SAIDA'
+
+    try:
+        quantidade = Decimal(str(linha.get('quantidade')))
+        custo = Decimal(str(linha.get('custo_unitario') or '0'))
+    except InvalidOperation:
+        return None, 'Quantidade ou custo inválido'
+    if not quantidade.is_finite() or not custo.is_finite() or quantidade > MAXIMO_DECIMAL or custo > MAXIMO_DECIMAL:
+        return None, 'Quantidade ou custo inválido'
+    # Mesmas 2 casas dos campos: o valor gravado é o que a conta do estoque usa
+    quantidade = quantidade.quantize(CENTAVO)
+    custo = custo.quantize(CENTAVO)
+    if quantidade <= 0 or custo < 0:
+        return None, 'Quantidade deve ser maior que zero e custo não negativo'
+
+    if linha.get('produto') is not None:
+        try:
+            produto_id = int(linha['produto'])
+        except (TypeError, ValueError):
+            return None, 'Produto inválido'
+        if produto_id not in produtos_existentes:
+            return None, 'Produto não encontrado'
+    else:
+        produto = indice.get(str(linha.get('codigo') or '').strip())
+        if produto is None:
+            return None, 'Produto não encontrado'
+        produto_id = produto.id
+
+    fornecedor_id = linha.get('fornecedor')
+    if fornecedor_id is not None:
+        try:
+            fornecedor_id = int(fornecedor_id)
+        except (TypeError, ValueError):
+            return None, 'Fornecedor inválido'
+        if fornecedor_id not in fornecedores_existentes:
+            return None, 'Fornecedor não encontrado'
+
+    data = timezone.now()
+    if linha.get('data'):
+        data = parse_datetime(str(linha['data']))
+        if data is None:
+            return None, 'Data inválida (use ISO 8601)'
+        if timezone.is_naive(data):
+            data = timezone.make_aware(data)
+        # Movimentação no futuro entraria em fechamentos, avaliação e idade do estoque
+        if data > timezone.now() + TOLERANCIA_RELOGIO:
+            return None, 'Data no futuro'
+
+    return {
+        'chave': chave,
+        'tipo': tipo,
+        'produto_id': produto_id,
+        'quantidade': quantidade,
+        'custo_unitario': custo if tipo == 'ENTRADA' else Decimal('0.00'),
+        'fornecedor_id': fornecedor_id if tipo == 'ENTRADA' else None,
+        'observacao': linha.get('observacao') or None,
+        'created_at': data,
+    }, None
+
+
+def sincronizar_movimentacoes(linhas: List[Dict], usuario=None) -> List[Dict]:
+    """
+    Aplica um lote de movimentações vindas de um coletor.
+
+    Linhas inválidas, já sincronizadas (mesma chave) ou sem estoque suficiente
+    são reportadas individualmente; as demais são gravadas em uma única
+    transação (um UPDATE por produto e um bulk_create).
+
+    Returns:
+        Lista de resultados na mesma ordem das linhas, cada um com 'chave',
+        'status' ('criada', 'duplicada' ou 'rejeitada'), 'movimentacao' e 'erro'
+    """
+    for tentativa in range(1, TENTATIVAS_CONFLITO + 1):
+        try:
+            return _sincronizar(linhas, usuario)
+        except IntegrityError:
+            # Outro envio concorrente gravou alguma das chaves: revalida tudo
+            if tentativa == TENTATIVAS_CONFLITO:
+                raise
+
+
+def _sincronizar(linhas, usuario):
+    from estoque.models import ArchivedStockMovement, Product, Supplier, StockMovement
+
+    def _ids(campo):
+        valores = set()
+        for linha in linhas:
+            if isinstance(linha, dict) and linha.get(campo) is not None:
+                try:
+                    valores.add(int(linha[campo]))
+                except (TypeError, ValueError):
+                    pass
+        return valores
+
+    produtos_existentes = set(
+        Product.objects.filter(pk__in=_ids('produto'), arquivado=False).values_list('pk', flat=True)
+    )
+    fornecedores_existentes = set(
+        Supplier.objects.filter(pk__in=_ids('fornecedor')).values_list('pk', flat=True)
+    )
+
+    # Versão do índice de códigos conferida uma vez para o lote
+    indice = obter_indice()
+
+    resultados = []
+    validas = []
+    for linha in linhas:
+        dados, erro = _validar_linha(linha, produtos_existentes, fornecedores_existentes, indice)
+        chave = dados['chave'] if dados else (linha.get('chave') if isinstance(linha, dict) else None)
+        resultado = {'chave': chave, 'status': 'rejeitada', 'movimentacao': None, 'erro': erro}
+        resultados.append(resultado)
+        if dados:
+            validas.append((resultado, dados))
+
+    chaves = [dados['chave'] for _, dados in validas]
+    existentes = dict(
+        StockMovement.objects.filter(chave_idempotencia__in=chaves).values_list('chave_idempotencia', 'pk')
+    )
+    # Reenvios de movimentações já arquivadas também são duplicadas
+    existentes.update(
+        ArchivedStockMovement.objects.filter(chave_idempotencia__in=chaves).values_list('chave_idempotencia', 'pk')
+    )
+
+    # Linhas de meses fechados são recusadas (reenvios já gravados seguem como duplicadas)
+    fechado_ate = ultimo_dia_fechado()
+
+    pendentes = []
+    vistas = set()
+    for resultado, dados in validas:
+        if dados['chave'] in existentes or dados['chave'] in vistas:
+            resultado['status'] = 'duplicada'
+            resultado['movimentacao'] = existentes.get(dados['chave'])
+            continue
+        vistas.add(dados['chave'])
+        if fechado_ate and timezone.localdate(dados['created_at']) <= fechado_ate:
+            resultado['erro'] = f"Período fechado até {fechado_ate.strftime('%d/%m/%Y')}"
+            continue
+        pendentes.append((resultado, dados))
+
+    with transaction.atomic():
+        while pendentes:
+            movimentacoes = [
+                StockMovement(
+                    tipo=dados['tipo'],
+                    produto_id=dados['produto_id'],
+                    quantidade=dados['quantidade'],
+                    custo_unitario=dados['custo_unitario'],
+                    fornecedor_id=dados['fornecedor_id'],
+                    observacao=dados['observacao'],
+                    created_at=dados['created_at'],
+                    usuario=usuario,
+                    chave_idempotencia=dados['chave'],
+                )
+                for _, dados in pendentes
+            ]
+            try:
+                with transaction.atomic():
+                    registrar_movimentacoes(movimentacoes)
+            except EstoqueInsuficienteError as e:
+                # Rejeita as linhas dos produtos sem estoque e tenta o restante
+                sem_estoque = {falta['produto_id'] for falta in e.faltas}
+                restantes = []
+                for resultado, dados in pendentes:
+                    if dados['produto_id'] in sem_estoque:
+                        resultado['erro'] = 'Estoque insuficiente'
+                    else:
+                        restantes.append((resultado, dados))
+                pendentes = restantes
+                continue
+
+            for (resultado, _), movimentacao in zip(pendentes, movimentacoes):
+                resultado['status'] = 'criada'
+                resultado['movimentacao'] = movimentacao.pk
+                resultado['erro'] = None
+            break
+
+    return resultados
@@ -0,0 +1,59 @@
+"""
+Utilitário para o status de estoque persistido em Product.status.
+
+O status é calculado no momento da escrita (cadastro, movimentação,
+alteração do limite crítico da categoria) para que o dashboard e a
+listagem de alertas consultem um índice em vez de comparar colunas.
+"""
+from decimal import Decimal
+
+from django.db.models import F, Q
+
+
+# Campos de Product dos quais o status depende (nome e attname da FK)
+CAMPOS_DO_STATUS = frozenset({'quantidade_estoque', 'estoque_minimo', 'categoria', 'categoria_id'})
+
+
+def calcular_status(quantidade: Decimal, estoque_minimo: Decimal, limite_critico: Decimal) -> str:
+    """
+    Retorna o status do produto: CRITICO (quantidade <= limite da categoria),
+    BAIXO (quantidade <= estoque mínimo configurado) ou OK.
+    """
+    if quantidade <= limite_critico:
+        return 'CRITICO'
+    if estoque_minimo > 0 and quantidade <= estoque_minimo:
+        return 'BAIXO'
+    return 'OK'
+
+
+def recalcular_status(produtos=None) -> int:
+    """
+    Recalcula o status de um queryset de produtos (todos, por padrão)
+    com UPDATEs por categoria, sem carregar os produtos em memória.
+    Só as linhas cujo status muda são escritas.
+
+    Returns:
+        Número de produtos cujo status mudou
+    """
+    from estoque.models import Category, Product
+
+    if produtos is None:
+        produtos = Product.objects.all()
+
+    abaixo_minimo = Q(estoque_minimo__gt=0, quantidade_estoque__lte=F('estoque_minimo'))
+    alterados = 0
+    limites = Category.objects.filter(
+        pk__in=produtos.values('categoria_id')
+    ).values_list('pk', 'estoque_critico')
+    for categoria_id, limite in limites:
+        da_categoria = produtos.filter(categoria_id=categoria_id)
+        alterados += da_categoria.filter(
+            quantidade_estoque__lte=limite
+        ).exclude(status='CRITICO').update(status='CRITICO')
+        alterados += da_categoria.filter(
+            abaixo_minimo, quantidade_estoque__gt=limite
+        ).exclude(status='BAIXO').update(status='BAIXO')
+        alterados += da_categoria.filter(
+            quantidade_estoque__gt=limite
+        ).exclude(abaixo_minimo).exclude(status='OK').update(status='OK')
+    return alterados
@@ -9,6 +9,13 @@ from io import BytesIO
 import urllib.request
 import urllib.error
 
+from .fornecedores import normalizar_cnpj
+
+
+# Versão do resultado de ler_nfe: trocar quando o parsing mudar invalida o
+# cache de notas (utils/cache_nfe.py)
+VERSAO_PARSER = 2
+
 
 def parse_nfe_xml(xml_file) -> List[Dict]:
     """
@@ -29,6 +36,22 @@ def parse_nfe_xml(xml_file) -> List[Dict]:
             'unidade': str
         }, ...]
     """
+    return ler_nfe(xml_file)['produtos']
+
+
+def ler_nfe(xml_file) -> Dict:
+    """
+    Faz o parsing de um arquivo XML de NF-e: emitente e produtos, em uma
+    única leitura do XML.
+    
+    Returns:
+        {
+            'chave': str (chave de acesso, 44 dígitos) ou None,
+            'emitente': {'cnpj': str (só dígitos), 'nome': str} ou None
+                (nota sem emit/CNPJ, ex.: emitente pessoa física),
+            'produtos': lista no formato de parse_nfe_xml,
+        }
+    """
     produtos = []
     
     try:
@@ -72,6 +95,9 @@ def parse_nfe_xml(xml_file) -> List[Dict]:
             '',  # Sem namespace
         ]
         
+        chave = _ler_chave(root, namespaces_tentativas)
+        emitente = _ler_emitente(root, namespaces_tentativas)
+        
         # Tenta encontrar os itens da nota fiscal
         # Versão 3.10 e 4.00 do schema
         itens = []
@@ -229,7 +255,7 @@ def parse_nfe_xml(xml_file) -> List[Dict]:
                 print(f"Erro ao processar item: {e}")
                 continue
         
-        return produtos
+        return {'chave': chave, 'emitente': emitente, 'produtos': produtos}
         
     except ET.ParseError as e:
         raise ValueError(f"Erro ao fazer parse do XML. Verifique se o arquivo é um XML válido de NF-e: {str(e)}")
@@ -239,6 +265,33 @@ def parse_nfe_xml(xml_file) -> List[Dict]:
         raise ValueError(f"Erro ao processar arquivo XML: {str(e)}")
 
 
+def _ler_chave(root, namespaces_tentativas) -> Optional[str]:
+    """Chave de acesso: Id do infNFe (sem o prefixo NFe) ou chNFe do protocolo"""
+    for ns_url in namespaces_tentativas:
+        prefixo = f'{{{ns_url}}}' if ns_url else ''
+        inf_nfe = root if root.tag == f'{prefixo}infNFe' else root.find(f'.//{prefixo}infNFe')
+        chave = (inf_nfe.get('Id') or '')[3:] if inf_nfe is not None else ''
+        if not chave:
+            chave = (root.findtext(f'.//{prefixo}chNFe') or '').strip()
+        if len(chave) == 44 and chave.isdigit():
+            return chave
+    return None
+
+
+def _ler_emitente(root, namespaces_tentativas) -> Optional[Dict]:
+    """CNPJ (só dígitos) e nome do emitente (emit/CNPJ e emit/xNome)"""
+    for ns_url in namespaces_tentativas:
+        prefixo = f'{{{ns_url}}}' if ns_url else ''
+        emit = root.find(f'.//{prefixo}emit')
+        if emit is None:
+            continue
+        cnpj = normalizar_cnpj(emit.findtext(f'{prefixo}CNPJ'))
+        if cnpj is None:
+            return None
+        return {'cnpj': cnpj, 'nome': (emit.findtext(f'{prefixo}xNome') or '').strip()}
+    return None
+
+
 def baixar_xml_de_url(url: str) -> BytesIO:
     """
     Baixa um arquivo XML de uma URL e retorna um objeto BytesIO.
@@ -295,21 +348,78 @@ def encontrar_produto_por_codigo(codigo: str, ncm: str = '', ean: str = ''):
     from estoque.models import Product
     
     # Tenta por código
-    produto = Product.objects.filter(codigo=codigo).first()
+    produto = Product.objects.filter(codigo=codigo, arquivado=False).first()
     if produto:
         return produto
     
     # Tenta por EAN
     if ean:
-        produto = Product.objects.filter(ean=ean).first()
+        produto = Product.objects.filter(ean=ean, arquivado=False).first()
         if produto:
             return produto
     
     # Tenta por NCM
     if ncm:
-        produto = Product.objects.filter(ncm=ncm).first()
+        produto = Product.objects.filter(ncm=ncm, arquivado=False).first()
         if produto:
             return produto
     
     return None
 
+
+
+def encontrar_produtos_da_nota(produtos_xml: List[Dict], fornecedor=None) -> List:
+    """
+    Resolve os itens de uma NF-e, na ordem, para produtos do cadastro.
+
+    Com fornecedor, os códigos do fornecedor já aprendidos (cProd ->
+    produto) são buscados com uma única consulta para a nota inteira e têm
+    prioridade; os demais itens seguem por código, EAN e NCM.
+
+    Returns:
+        Lista com o produto (ou None) de cada item
+    """
+    from estoque.models import SupplierProductAlias
+
+    aliases = {}
+    if fornecedor is not None:
+        codigos = {produto_xml['codigo'] for produto_xml in produtos_xml if produto_xml['codigo']}
+        aliases = {
+            alias.codigo_fornecedor: alias.produto
+            for alias in SupplierProductAlias.objects.filter(
+                fornecedor=fornecedor, codigo_fornecedor__in=codigos, produto__arquivado=False
+            ).select_related('produto')
+        }
+
+    return [
+        aliases.get(produto_xml['codigo']) or encontrar_produto_por_codigo(
+            produto_xml['codigo'], produto_xml['ncm'], produto_xml['ean']
+        )
+        for produto_xml in produtos_xml
+    ]
+
+
+def aprender_codigos_fornecedor(fornecedor, pares) -> int:
+    """
+    Grava os códigos do fornecedor confirmados em uma entrada; um código já
+    conhecido passa a apontar para o produto confirmado.
+
+    Args:
+        pares: lista de (codigo_fornecedor, produto_id)
+
+    Returns:
+        Quantidade de códigos gravados
+    """
+    from estoque.models import SupplierProductAlias
+
+    produtos = {codigo: produto_id for codigo, produto_id in pares if codigo}
+    SupplierProductAlias.objects.bulk_create(
+        [
+            SupplierProductAlias(fornecedor=fornecedor, codigo_fornecedor=codigo, produto_id=produto_id)
+            for codigo, produto_id in produtos.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['fornecedor', 'codigo_fornecedor'],
+        update_fields=['produto', 'updated_at'],
+    )
+    return len(produtos)
@@ -1,24 +1,60 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.db.models import Q, Sum, Count, F
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse, HttpResponse
+from django.views.decorators.http import require_POST
 from django.utils import timezone
 from django.utils.safestring import mark_safe
+from asgiref.sync import sync_to_async
 import json
 import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 from decimal import Decimal
 
-from .models import Product, Category, Supplier, StockMovement, WhatsAppOrder
+from .models import (
+    Product, Category, Supplier, StockMovement, WhatsAppOrder, ScanSession, MonthlyClosing, StockCount,
+    ImportedInvoice
+)
 from .forms import (
     ProductForm, CategoryForm, SupplierForm,
-    EntradaManualForm, SaidaForm, XMLUploadForm
+    EntradaManualForm, SaidaForm, SaidaLoteForm, XMLUploadForm, ImportarCatalogoForm
+)
+from .utils.xml_parser import (
+    encontrar_produtos_da_nota, aprender_codigos_fornecedor, baixar_xml_de_url
+)
+from .utils.export_xlsx import (
+    exportar_produtos_para_xlsx, exportar_relatorio_para_xlsx, exportar_avaliacao_para_xlsx,
+    exportar_curva_abc_para_xlsx
+)
+from .utils.movimentacoes import registrar_movimentacoes, validar_quantidade, EstoqueInsuficienteError
+from .utils.indice_codigos import buscar_produtos_por_codigos
+from .utils.busca_nomes import sugerir_produtos
+from .utils.fornecedores import resolver_fornecedor
+from .utils.arquivo_nfe import (
+    hash_xml, extrair_chave, nota_ja_importada, arquivar_xml, descartar_xml_sem_nota, xml_para_sessao, xml_da_sessao
 )
-from .utils.xml_parser import parse_nfe_xml, encontrar_produto_por_codigo, baixar_xml_de_url
-from .utils.export_xlsx import exportar_produtos_para_xlsx, exportar_relatorio_para_xlsx
+from .utils.cache_nfe import ler_nfe_com_cache, estatisticas_cache_nfe
+from .utils.download_nfe import MAXIMO_URLS, baixar_xmls, ler_xmls_baixados
+from .utils.autenticacao import token_required
+from .utils.sincronizacao import sincronizar_movimentacoes, LIMITE_LINHAS
+from .utils.edicao_lote import editar_produtos_em_lote, LIMITE_LINHAS as LIMITE_EDICAO_LOTE
+from .utils.arquivamento import movimentacoes_historicas, totais_por_tipo
+from .utils.contagem import (
+    abrir_contagem, registrar_contagens, divergencias, fechar_contagem, cancelar_contagem
+)
+from .utils.avaliacao import avaliar_estoque
+from .utils.consumo import analisar_consumo
+from .utils.curva_abc import curva_abc, classificar_abc
+from .utils.custos import evolucao_custo, comparar_fornecedores
+from .utils.importacao_catalogo import importar_catalogo
+from .utils.envelhecimento import envelhecimento_estoque, estoque_parado
+from .utils.fechamento import fechar_mes, meses_a_fechar, resumo_periodo
 
 
 def login_view(request):
@@ -51,24 +87,23 @@ def index(request):
     """Página inicial com dashboard"""
     # Sem cache para garantir atualização imediata
     # Otimização: usa select_related e prefetch_related
-    total_produtos = Product.objects.count()
+    total_produtos = Product.objects.filter(arquivado=False).count()
     total_categorias = Category.objects.count()
     
-    # Produtos com estoque baixo (critico <= 5 ou abaixo do mínimo configurado)
-    produtos_baixo_estoque = Product.objects.filter(
-        Q(quantidade_estoque__lte=5) |
-        Q(quantidade_estoque__lte=F('estoque_minimo'), estoque_minimo__gt=0)
-    ).count()
+    # Produtos em alerta (crítico pelo limite da categoria ou abaixo do mínimo).
+    # O filtro é exatamente a condição do índice parcial produto_status_alerta_idx
+    produtos_em_alerta = Product.objects.exclude(status=Product.STATUS_OK).filter(arquivado=False)
+    produtos_baixo_estoque = produtos_em_alerta.count()
     
-    # Produtos com estoque abaixo do mínimo configurado
-    produtos_abaixo_minimo = Product.objects.filter(
+    # Produtos com estoque abaixo do mínimo configurado (sempre dentro do índice parcial)
+    produtos_abaixo_minimo = produtos_em_alerta.filter(
         quantidade_estoque__lte=F('estoque_minimo'),
         estoque_minimo__gt=0
     ).count()
     
     # Calcula valor total do estoque (otimizado)
     # Garante que retorna 0.00 quando não há produtos ou quando o resultado é None
-    resultado_agregacao = Product.objects.aggregate(
+    resultado_agregacao = Product.objects.filter(arquivado=False).aggregate(
         total=Sum(F('quantidade_estoque') * F('custo_unitario'))
     )
     valor_total_estoque = resultado_agregacao['total']
@@ -94,21 +129,26 @@ def index(request):
         'tipo', 'quantidade', 'created_at', 'produto__nome', 'produto__unidade', 'usuario__username'
     ).order_by('-created_at')[:10]
     
-    # Produtos com menor estoque (otimizado) - considera mínimo configurado ou <= 5
-    produtos_criticos = Product.objects.select_related('categoria').filter(
-        Q(quantidade_estoque__lte=5) |
-        Q(quantidade_estoque__lte=F('estoque_minimo'), estoque_minimo__gt=0)
-    ).only(
-        'nome', 'quantidade_estoque', 'estoque_minimo', 'unidade', 'categoria__nome'
+    # Produtos com menor estoque entre os que estão em alerta
+    produtos_criticos = produtos_em_alerta.select_related('categoria').only(
+        'nome', 'quantidade_estoque', 'estoque_minimo', 'unidade', 'status', 'categoria__nome'
     ).order_by('quantidade_estoque')[:10]
     
     # Dados para gráfico de movimentações (últimos 7 dias)
     from datetime import timedelta
     from django.utils import timezone
     
-    hoje = timezone.now().date()
+    hoje = timezone.localdate()
     sete_dias_atras = hoje - timedelta(days=7)
     
+    # Uma consulta agrupada por dia/tipo (faixa no índice de data_movimento)
+    totais_por_dia = {
+        (linha['data_movimento'], linha['tipo']): linha['total']
+        for linha in StockMovement.objects.filter(
+            data_movimento__range=(sete_dias_atras, sete_dias_atras + timedelta(days=6))
+        ).values('data_movimento', 'tipo').annotate(total=Sum('quantidade')).order_by()
+    }
+    
     # Prepara dados para o gráfico (últimos 7 dias)
     dias_labels = []
     entradas_data = []
@@ -117,20 +157,8 @@ def index(request):
     for dia in range(7):
         data_dia = sete_dias_atras + timedelta(days=dia)
         dias_labels.append(data_dia.strftime('%d/%m'))
-        
-        # Busca movimentações por dia específico
-        mov_entradas = StockMovement.objects.filter(
-            created_at__date=data_dia,
-            tipo='ENTRADA'
-        ).aggregate(total=Sum('quantidade'))['total'] or 0
-        
-        mov_saidas = StockMovement.objects.filter(
-            created_at__date=data_dia,
-            tipo='SAIDA'
-        ).aggregate(total=Sum('quantidade'))['total'] or 0
-        
-        entradas_data.append(float(mov_entradas))
-        saidas_data.append(float(mov_saidas))
+        entradas_data.append(float(totais_por_dia.get((data_dia, 'ENTRADA'), 0)))
+        saidas_data.append(float(totais_por_dia.get((data_dia, 'SAIDA'), 0)))
     
     context = {
         **stats,
@@ -304,19 +332,30 @@ def produto_lista(request):
     from django.core.paginator import Paginator
     
     # Query otimizada com select_related
-    produtos = Product.objects.select_related('categoria').only(
+    produtos = Product.objects.filter(arquivado=False).select_related('categoria').only(
         'codigo', 'nome', 'categoria__nome', 'unidade', 
-        'quantidade_estoque', 'custo_unitario', 'ncm'
+        'quantidade_estoque', 'custo_unitario', 'ncm', 'status', 'classe_abc'
     )
     
     # Filtros
     categoria_id = request.GET.get('categoria')
     busca = request.GET.get('busca')
+    status = request.GET.get('status')
+    classe = request.GET.get('classe')
     ordenar = request.GET.get('ordenar', 'nome')
     
     if categoria_id:
         produtos = produtos.filter(categoria_id=categoria_id)
     
+    # Filtros de status usam o índice parcial de produtos em alerta
+    if status == 'alerta':
+        produtos = produtos.exclude(status=Product.STATUS_OK)
+    elif status in (Product.STATUS_BAIXO, Product.STATUS_CRITICO):
+        produtos = produtos.exclude(status=Product.STATUS_OK).filter(status=status)
+    
+    if classe in ('A', 'B', 'C'):
+        produtos = produtos.filter(classe_abc=classe)
+    
     if busca:
         produtos = produtos.filter(
             Q(nome__icontains=busca) |
@@ -355,6 +394,8 @@ def produto_lista(request):
         'categorias': categorias,
         'categoria_selecionada': categoria_id,
         'busca': busca,
+        'status_selecionado': status,
+        'classe_selecionada': classe,
         'ordenar': ordenar,
     }
     
@@ -397,6 +438,36 @@ def produto_editar(request, pk):
     })
 
 
+@login_required
+def produto_importar(request):
+    """Importação do catálogo de produtos de uma planilha CSV/XLSX (cria ou atualiza pelo código)"""
+    resultado = None
+    
+    if request.method == 'POST':
+        form = ImportarCatalogoForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            try:
+                resultado = importar_catalogo(
+                    arquivo, arquivo.name, criar_categorias=form.cleaned_data['criar_categorias']
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                mensagem = (
+                    f"{resultado['criados']} produto(s) criado(s) e {resultado['atualizados']} atualizado(s) "
+                    f"em {resultado['segundos']:.1f}s ({resultado['linhas_por_segundo']:.0f} linhas/s)."
+                )
+                if resultado['total_erros']:
+                    messages.warning(request, f"{mensagem} {resultado['total_erros']} linha(s) com erro.")
+                else:
+                    messages.success(request, mensagem)
+    else:
+        form = ImportarCatalogoForm()
+    
+    return render(request, 'estoque/produtos/importar.html', {'form': form, 'resultado': resultado})
+
+
 @login_required
 def produto_detalhar(request, pk):
     """Visualização detalhada de produto"""
@@ -405,50 +476,29 @@ def produto_detalhar(request, pk):
     # Últimas movimentações (10 mais recentes)
     movimentacoes_recentes = produto.movimentacoes.select_related('usuario', 'fornecedor').order_by('-created_at')[:10]
     
-    # Estatísticas do produto
-    total_entradas = produto.movimentacoes.filter(tipo='ENTRADA').aggregate(
-        total=Sum('quantidade')
-    )['total'] or Decimal('0.00')
-    
-    total_saidas = produto.movimentacoes.filter(tipo='SAIDA').aggregate(
-        total=Sum('quantidade')
-    )['total'] or Decimal('0.00')
+    # Estatísticas do produto (todo o histórico, incluindo as movimentações arquivadas)
+    totais = totais_por_tipo(Q(produto=produto))
+    total_entradas = totais['ENTRADA']
+    total_saidas = totais['SAIDA']
     
     # Dados para gráfico de evolução do estoque (últimos 30 dias)
     from datetime import timedelta
-    hoje = timezone.now().date()
+    hoje = timezone.localdate()
     trinta_dias_atras = hoje - timedelta(days=30)
     
-    # Agrupa movimentações por dia para o gráfico
-    movimentacoes_grafico = produto.movimentacoes.filter(
-        created_at__date__gte=trinta_dias_atras
-    ).order_by('created_at')
-    
-    # Calcula estoque ao longo do tempo
-    estoque_historico = []
-    estoque_atual = Decimal('0.00')
-    labels = []
-    dados = []
-    
-    # Calcula estoque dia a dia
-    dias_unicos = set()
-    for mov in movimentacoes_grafico:
-        dias_unicos.add(mov.created_at.date())
-    
-    dias_unicos = sorted(dias_unicos)
-    
-    for dia in dias_unicos:
-        movs_dia = movimentacoes_grafico.filter(created_at__date=dia)
-        estoque_dia = estoque_atual
-        for mov in movs_dia:
-            if mov.tipo == 'ENTRADA':
-                estoque_dia += mov.quantidade
-            else:
-                estoque_dia -= mov.quantidade
-        
-        labels.append(dia.strftime('%d/%m'))
-        dados.append(float(estoque_dia))
-        estoque_atual = estoque_dia
+    # Saldo ao final de cada dia com movimentação, lido do razão
+    # (saldo_apos da última movimentação do dia; índice produto + data_movimento)
+    estoque_por_dia = dict(
+        produto.movimentacoes.filter(
+            data_movimento__gte=trinta_dias_atras
+        ).order_by('data_movimento', 'pk').values_list('data_movimento', 'saldo_apos')
+    )
+    
+    labels = [dia.strftime('%d/%m') for dia in estoque_por_dia]
+    dados = [float(estoque) for estoque in estoque_por_dia.values()]
+    
+    # Evolução do custo (últimos 12 meses), lida do histórico de custo
+    custos = list(evolucao_custo(produto.pk).values_list('created_at', 'custo_entrada', 'custo_novo'))
     
     context = {
         'produto': produto,
@@ -457,6 +507,13 @@ def produto_detalhar(request, pk):
         'total_saidas': total_saidas,
         'grafico_labels': mark_safe(json.dumps(labels)),
         'grafico_dados': mark_safe(json.dumps(dados)),
+        'custo_labels': mark_safe(json.dumps([
+            timezone.localtime(momento).strftime('%d/%m/%Y') for momento, _, _ in custos
+        ])),
+        'custo_pago': mark_safe(json.dumps([float(pago) for _, pago, _ in custos])),
+        'custo_medio': mark_safe(json.dumps([float(medio) for _, _, medio in custos])),
+        'tem_historico_custo': bool(custos),
+        'fornecedores_precos': comparar_fornecedores(produto.pk),
     }
     
     return render(request, 'estoque/produtos/detalhar.html', context)
@@ -472,44 +529,40 @@ def produto_historico(request, pk):
     data_fim_str = request.GET.get('data_fim')
     tipo_filter = request.GET.get('tipo')
     
-    movimentacoes = produto.movimentacoes.select_related('usuario', 'fornecedor').all()
+    filtro = Q(produto=produto)
+    data_inicio = None
     
-    # Aplica filtros
+    # Aplica filtros (dias locais, comparados direto com data_movimento)
     if data_inicio_str:
         try:
-            data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').replace(tzinfo=timezone.utc)
-            movimentacoes = movimentacoes.filter(created_at__gte=data_inicio)
+            data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
+            filtro &= Q(data_movimento__gte=data_inicio)
         except:
             pass
     
     if data_fim_str:
         try:
-            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').replace(
-                hour=23, minute=59, second=59, tzinfo=timezone.utc
-            )
-            movimentacoes = movimentacoes.filter(created_at__lte=data_fim)
+            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
+            filtro &= Q(data_movimento__lte=data_fim)
         except:
             pass
     
     if tipo_filter and tipo_filter in ['ENTRADA', 'SAIDA']:
-        movimentacoes = movimentacoes.filter(tipo=tipo_filter)
+        filtro &= Q(tipo=tipo_filter)
     
-    # Ordena por data mais recente
-    movimentacoes = movimentacoes.order_by('-created_at')
-    
-    # Adiciona valor total calculado para cada movimentação
-    movimentacoes_com_total = []
-    for mov in movimentacoes:
-        valor_total = mov.quantidade * mov.custo_unitario
-        mov.valor_total = valor_total
-        movimentacoes_com_total.append(mov)
+    # Da mais recente para a mais antiga, incluindo as arquivadas se o período alcança o arquivo
+    movimentacoes = movimentacoes_historicas(filtro, data_inicio)
     
     # Paginação
     from django.core.paginator import Paginator
-    paginator = Paginator(movimentacoes_com_total, 20)
+    paginator = Paginator(movimentacoes, 20)
     page_number = request.GET.get('page', 1)
     page_obj = paginator.get_page(page_number)
     
+    # Adiciona valor total calculado só para as movimentações da página
+    for mov in page_obj:
+        mov.valor_total = mov.quantidade * mov.custo_unitario
+    
     context = {
         'produto': produto,
         'movimentacoes': page_obj,
@@ -523,24 +576,21 @@ def produto_historico(request, pk):
 
 @login_required
 def produto_deletar(request, pk):
-    """Deletar produto"""
-    produto = get_object_or_404(Product, pk=pk)
+    """Arquivar produto (o histórico de movimentações é mantido)"""
+    produto = get_object_or_404(Product, pk=pk, arquivado=False)
     
     if request.method == 'POST':
-        nome_produto = produto.nome
         movimentacoes_count = produto.movimentacoes.count()
-        
-        # Deleta o produto (as movimentações serão deletadas automaticamente via CASCADE)
-        produto.delete()
+        produto.arquivar()
         
         if movimentacoes_count > 0:
             messages.success(
                 request, 
-                f'Produto "{nome_produto}" deletado com sucesso! '
-                f'({movimentacoes_count} movimentação(ões) também foram removida(s))'
+                f'Produto "{produto.nome}" arquivado com sucesso! '
+                f'(histórico de {movimentacoes_count} movimentação(ões) mantido)'
             )
         else:
-            messages.success(request, f'Produto "{nome_produto}" deletado com sucesso!')
+            messages.success(request, f'Produto "{produto.nome}" arquivado com sucesso!')
         
         return redirect('estoque:produto_lista')
     
@@ -590,28 +640,42 @@ def entrada_xml(request):
                     # Baixa o XML da URL
                     arquivo_xml = baixar_xml_de_url(url_xml)
                 
-                # Faz o parsing do XML
-                produtos_xml = parse_nfe_xml(arquivo_xml)
+                # Reimportação barrada antes do parsing: hash do conteúdo e chave (busca nos bytes)
+                conteudo = arquivo_xml.read()
+                hash_conteudo = hash_xml(conteudo)
+                chave = extrair_chave(conteudo)
+                importada = nota_ja_importada(hash_conteudo, chave)
+                if importada:
+                    messages.error(
+                        request,
+                        f'Esta NF-e já foi importada em {timezone.localtime(importada.created_at):%d/%m/%Y %H:%M}.'
+                    )
+                    return redirect('estoque:entrada_xml')
+                
+                # Faz o parsing do XML (ou reaproveita o de um envio anterior do mesmo arquivo)
+                nota = ler_nfe_com_cache(conteudo, hash_conteudo)
+                produtos_xml = nota['produtos']
                 
                 if not produtos_xml:
                     messages.warning(request, 'Nenhum produto encontrado no XML.')
                     return redirect('estoque:entrada_xml')
                 
+                # Sem fornecedor escolhido: identificado (ou cadastrado) pelo CNPJ do emitente
+                if fornecedor is None and nota['emitente']:
+                    fornecedor = resolver_fornecedor(nota['emitente']['cnpj'], nota['emitente']['nome'])
+                    messages.info(request, f'Fornecedor identificado pelo CNPJ do emitente: {fornecedor.nome}')
+                
                 # Prepara dados para exibição e criação
                 produtos_processados = []
                 produtos_nao_encontrados = []
                 
-                for produto_xml in produtos_xml:
+                # Tenta encontrar os produtos existentes (códigos já aprendidos do fornecedor primeiro)
+                produtos_db = encontrar_produtos_da_nota(produtos_xml, fornecedor)
+                
+                for produto_xml, produto_db in zip(produtos_xml, produtos_db):
                     # Calcula valor total do item
                     produto_xml['valor_total'] = produto_xml['quantidade'] * produto_xml['valor_unitario']
                     
-                    # Tenta encontrar produto existente
-                    produto_db = encontrar_produto_por_codigo(
-                        produto_xml['codigo'],
-                        produto_xml['ncm'],
-                        produto_xml['ean']
-                    )
-                    
                     if produto_db:
                         produto_xml['produto_db'] = produto_db
                         produto_xml['novo'] = False
@@ -619,6 +683,11 @@ def entrada_xml(request):
                     else:
                         produtos_nao_encontrados.append(produto_xml)
                 
+                # Produtos de nome parecido para vincular os itens sem correspondência
+                sugestoes = sugerir_produtos([produto_xml['nome'] for produto_xml in produtos_nao_encontrados])
+                for produto_xml, sugestoes_item in zip(produtos_nao_encontrados, sugestoes):
+                    produto_xml['sugestoes'] = [sugestao._asdict() for sugestao in sugestoes_item]
+                
                 # Converte Decimal para float antes de salvar na sessão (JSON não serializa Decimal)
                 produtos_xml_serializaveis = []
                 for produto in produtos_xml:
@@ -628,11 +697,19 @@ def entrada_xml(request):
                     produto_serial['valor_total'] = float(produto.get('valor_total', produto['quantidade'] * produto['valor_unitario']))
                     # Remove objetos que não podem ser serializados
                     produto_serial.pop('produto_db', None)
+                    produto_serial.pop('sugestoes', None)
                     produtos_xml_serializaveis.append(produto_serial)
                 
                 # Salva na sessão para processamento posterior
                 request.session['produtos_xml'] = produtos_xml_serializaveis
                 request.session['fornecedor_id'] = fornecedor.id if fornecedor else None
+                request.session['nfe_importada'] = {
+                    'chave': nota['chave'] or chave,
+                    'hash': hash_conteudo,
+                    # Arquivado só na confirmação: prévias abandonadas não deixam arquivo
+                    'xml': xml_para_sessao(conteudo),
+                    'tamanho': len(conteudo),
+                }
                 
                 # Calcula totais para exibição
                 total_produtos = len(produtos_xml)
@@ -646,6 +723,7 @@ def entrada_xml(request):
                 context = {
                     'produtos_processados': produtos_processados,
                     'produtos_nao_encontrados': produtos_nao_encontrados,
+                    'fornecedor': fornecedor,
                     'form': form,
                     'total_produtos': total_produtos,
                     'total_encontrados': total_encontrados,
@@ -703,55 +781,103 @@ def entrada_xml_confirmar(request):
         
         produtos_criados = []
         movimentacoes_criadas = 0
+        codigos_confirmados = []
+        
+        nfe = request.session.get('nfe_importada')
         
-        for produto_xml in produtos_xml:
-            # Verifica se deve criar novo produto
-            criar_novo = request.POST.get(f'criar_{produto_xml["codigo"]}') == 'on'
+        # Nota, produtos criados e entradas são gravados juntos (tudo ou nada);
+        # o XML só fica no arquivo se a nota for registrada
+        try:
+            with transaction.atomic():
+                nota = None
+                if nfe:
+                    try:
+                        # O índice único da chave/hash barra a mesma nota confirmada duas vezes
+                        with transaction.atomic():
+                            nota = ImportedInvoice.objects.create(
+                                chave=nfe['chave'], hash_conteudo=nfe['hash'],
+                                arquivo=arquivar_xml(xml_da_sessao(nfe['xml']), nfe['hash']),
+                                tamanho=nfe['tamanho'], fornecedor=fornecedor, usuario=request.user,
+                            )
+                    except IntegrityError:
+                        for chave_sessao in ('produtos_xml', 'fornecedor_id', 'nfe_importada'):
+                            request.session.pop(chave_sessao, None)
+                        messages.error(request, 'Esta NF-e já foi importada.')
+                        return redirect('estoque:entrada_xml')
             
-            # Busca ou cria produto
-            produto_db = encontrar_produto_por_codigo(
-                produto_xml['codigo'],
-                produto_xml['ncm'],
-                produto_xml['ean']
-            )
+                produtos_db = encontrar_produtos_da_nota(produtos_xml, fornecedor)
+        
+                for produto_xml, produto_db in zip(produtos_xml, produtos_db):
+                    # Verifica se deve criar novo produto
+                    criar_novo = request.POST.get(f'criar_{produto_xml["codigo"]}') == 'on'
             
-            if not produto_db:
-                if criar_novo:
-                    # Cria novo produto
-                    categoria_padrao = Category.objects.first()
-                    if not categoria_padrao:
-                        messages.error(request, 'É necessário criar pelo menos uma categoria primeiro!')
-                        return redirect('estoque:entrada_xml')
+                    if not produto_db:
+                        # Produto existente escolhido entre as sugestões por nome
+                        vincular = request.POST.get(f'vincular_{produto_xml["codigo"]}')
+                        if vincular and vincular.isdigit():
+                            produto_db = Product.objects.filter(pk=int(vincular), arquivado=False).first()
+            
+                    if not produto_db and criar_novo:
+                        # Um produto arquivado com o mesmo código volta ao cadastro em vez de ser duplicado
+                        produto_db = Product.objects.filter(codigo=produto_xml['codigo'], arquivado=True).first()
+                        if produto_db:
+                            produto_db.restaurar()
+            
+                    if not produto_db:
+                        if criar_novo:
+                            # Cria novo produto
+                            categoria_padrao = Category.objects.first()
+                            if not categoria_padrao:
+                                transaction.set_rollback(True)
+                                messages.error(request, 'É necessário criar pelo menos uma categoria primeiro!')
+                                return redirect('estoque:entrada_xml')
                     
-                    produto_db = Product.objects.create(
-                        codigo=produto_xml['codigo'],
-                        nome=produto_xml['nome'],
-                        categoria=categoria_padrao,
-                        unidade=produto_xml['unidade'],
-                        ncm=produto_xml['ncm'] or '',
-                        ean=produto_xml['ean'] or '',
-                        quantidade_estoque=0,
-                        custo_unitario=produto_xml['valor_unitario']
+                            produto_db = Product.objects.create(
+                                codigo=produto_xml['codigo'],
+                                nome=produto_xml['nome'],
+                                categoria=categoria_padrao,
+                                unidade=produto_xml['unidade'],
+                                ncm=produto_xml['ncm'] or '',
+                                ean=produto_xml['ean'] or '',
+                                quantidade_estoque=0,
+                                custo_unitario=produto_xml['valor_unitario']
+                            )
+                            produtos_criados.append(produto_db.nome)
+                        else:
+                            continue
+            
+                    # Cria movimentação de entrada
+                    StockMovement.objects.create(
+                        tipo='ENTRADA',
+                        produto=produto_db,
+                        quantidade=produto_xml['quantidade'],
+                        custo_unitario=produto_xml['valor_unitario'],
+                        fornecedor=fornecedor,
+                        usuario=request.user,
+                        observacao='Entrada via XML de NF-e'
                     )
-                    produtos_criados.append(produto_db.nome)
-                else:
-                    continue
+                    movimentacoes_criadas += 1
+                    codigos_confirmados.append((produto_xml['codigo'], produto_db.pk))
+        
+                if nota is not None:
+                    if not movimentacoes_criadas:
+                        # Nenhum item confirmado: a nota pode ser importada depois
+                        transaction.set_rollback(True)
+                    else:
+                        nota.itens = movimentacoes_criadas
+                        nota.save(update_fields=['itens'])
             
-            # Cria movimentação de entrada
-            StockMovement.objects.create(
-                tipo='ENTRADA',
-                produto=produto_db,
-                quantidade=produto_xml['quantidade'],
-                custo_unitario=produto_xml['valor_unitario'],
-                fornecedor=fornecedor,
-                usuario=request.user,
-                observacao='Entrada via XML de NF-e'
-            )
-            movimentacoes_criadas += 1
+                # As próximas notas do fornecedor resolvem estes itens pelo código dele
+                if fornecedor:
+                    aprender_codigos_fornecedor(fornecedor, codigos_confirmados)
+        finally:
+            if nfe:
+                descartar_xml_sem_nota(nfe['hash'])
         
         # Limpa sessão
         request.session.pop('produtos_xml', None)
         request.session.pop('fornecedor_id', None)
+        request.session.pop('nfe_importada', None)
         
         messages.success(
             request,
@@ -773,26 +899,71 @@ def saida_criar(request):
         form = SaidaForm(request.POST)
         if form.is_valid():
             movimentacao = form.save(commit=False, user=request.user)
-            movimentacao.save()
-            messages.success(
-                request,
-                f'Saída de {movimentacao.quantidade} {movimentacao.produto.unidade} '
-                f'de "{movimentacao.produto.nome}" registrada com sucesso!'
-            )
-            return redirect('estoque:saida_criar')
+            try:
+                movimentacao.save()
+            except EstoqueInsuficienteError:
+                # Outra saída consumiu o estoque entre a validação e a gravação
+                movimentacao.produto.refresh_from_db(fields=['quantidade_estoque'])
+                form.add_error(
+                    'quantidade',
+                    f'Estoque insuficiente. Disponível agora: '
+                    f'{movimentacao.produto.quantidade_estoque} {movimentacao.produto.unidade}'
+                )
+            else:
+                messages.success(
+                    request,
+                    f'Saída de {movimentacao.quantidade} {movimentacao.produto.unidade} '
+                    f'de "{movimentacao.produto.nome}" registrada com sucesso!'
+                )
+                return redirect('estoque:saida_criar')
     else:
         form = SaidaForm()
     
     return render(request, 'estoque/saidas/form.html', {'form': form})
 
 
+@login_required
+def saida_lote(request):
+    """Saída de vários produtos em uma única operação (lista de separação)"""
+    faltas = []
+    
+    if request.method == 'POST':
+        form = SaidaLoteForm(request.POST)
+        if form.is_valid():
+            movimentacoes = [
+                StockMovement(
+                    tipo='SAIDA',
+                    produto=produto,
+                    quantidade=quantidade,
+                    observacao=form.cleaned_data['observacao'] or None,
+                    usuario=request.user
+                )
+                for produto, quantidade in form.cleaned_data['itens']
+            ]
+            try:
+                registrar_movimentacoes(movimentacoes)
+            except EstoqueInsuficienteError as e:
+                faltas = e.faltas
+                messages.error(
+                    request,
+                    f'Nenhuma saída foi registrada: {len(faltas)} produto(s) sem estoque suficiente.'
+                )
+            else:
+                messages.success(request, f'{len(movimentacoes)} saída(s) registrada(s) com sucesso!')
+                return redirect('estoque:saida_lote')
+    else:
+        form = SaidaLoteForm()
+    
+    return render(request, 'estoque/saidas/lote.html', {'form': form, 'faltas': faltas})
+
+
 # ============ RELATÓRIOS ============
 
 @login_required
 def relatorio_index(request):
     """Página principal de relatórios"""
-    # Período padrão: últimos 30 dias
-    data_fim = timezone.now()
+    # Período padrão: últimos 30 dias (dias locais)
+    data_fim = timezone.localdate()
     data_inicio = data_fim - timedelta(days=30)
     
     # Filtros
@@ -801,59 +972,38 @@ def relatorio_index(request):
     
     if data_inicio_str:
         try:
-            data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            data_inicio = datetime.strptime(data_inicio_str, '%Y-%m-%d').date()
         except:
             pass
     
     if data_fim_str:
         try:
-            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').replace(
-                hour=23, minute=59, second=59, tzinfo=timezone.utc
-            )
+            data_fim = datetime.strptime(data_fim_str, '%Y-%m-%d').date()
         except:
             pass
     
-    # Movimentações no período
-    movimentacoes = StockMovement.objects.filter(
-        created_at__gte=data_inicio,
-        created_at__lte=data_fim
-    ).select_related('produto', 'usuario').order_by('-created_at')
-    
-    # Resumo
-    entradas_total = movimentacoes.filter(tipo='ENTRADA').aggregate(
-        total=Sum('quantidade')
-    )['total'] or Decimal('0.00')
-    
-    saidas_total = movimentacoes.filter(tipo='SAIDA').aggregate(
-        total=Sum('quantidade')
-    )['total'] or Decimal('0.00')
-    
-    # Dados para gráfico (saídas por mês)
-    movimentacoes_saidas = movimentacoes.filter(tipo='SAIDA')
-    dados_grafico = {}
-    
-    for mov in movimentacoes_saidas:
-        mes_ano = mov.created_at.strftime('%Y-%m')
-        if mes_ano not in dados_grafico:
-            dados_grafico[mes_ano] = {}
-        
-        produto_nome = mov.produto.nome
-        if produto_nome not in dados_grafico[mes_ano]:
-            dados_grafico[mes_ano][produto_nome] = Decimal('0.00')
-        
-        dados_grafico[mes_ano][produto_nome] += mov.quantidade
+    # Movimentações no período (inclui as arquivadas se o período alcança o arquivo)
+    movimentacoes = movimentacoes_historicas(Q(data_movimento__range=(data_inicio, data_fim)), data_inicio)
+    
+    # Resumo e gráfico (saídas por mês): meses fechados vêm dos fechamentos
+    resumo_mensal = resumo_periodo(data_inicio, data_fim)
+    entradas_total = resumo_mensal['entradas']
+    saidas_total = resumo_mensal['saidas']
+    dados_grafico = resumo_mensal['saidas_por_mes']
     
     # Prepara dados para Chart.js
     meses = sorted(dados_grafico.keys())
-    produtos_unicos = set()
+    saidas_por_produto = {}
     for mes_data in dados_grafico.values():
-        produtos_unicos.update(mes_data.keys())
-    produtos_unicos = sorted(produtos_unicos)
+        for produto, quantidade in mes_data.items():
+            saidas_por_produto[produto] = saidas_por_produto.get(produto, Decimal('0.00')) + quantidade
+    # Os 10 produtos com mais saídas no período (detalhe por valor em Relatórios > Curva ABC)
+    produtos_unicos = sorted(saidas_por_produto, key=lambda nome: (-saidas_por_produto[nome], nome))[:10]
     
     datasets = []
     cores = ['#36A2EB', '#4BC0C0', '#9966FF', '#FF9F40', '#FF6384', '#C9CBCF']
     
-    for idx, produto in enumerate(produtos_unicos[:10]):  # Limita a 10 produtos
+    for idx, produto in enumerate(produtos_unicos):
         dados = [float(dados_grafico.get(mes, {}).get(produto, 0)) for mes in meses]
         datasets.append({
             'label': produto[:30],  # Limita tamanho do nome
@@ -875,8 +1025,8 @@ def relatorio_index(request):
         'entradas_total': entradas_total,
         'saidas_total': saidas_total,
         'saldo_final': entradas_total - saidas_total,
-        'data_inicio': data_inicio.date(),
-        'data_fim': data_fim.date(),
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
         'meses': mark_safe(json.dumps(meses)),
         'datasets': mark_safe(json.dumps(datasets)),
     }
@@ -884,6 +1034,143 @@ def relatorio_index(request):
     return render(request, 'estoque/relatorios/index.html', context)
 
 
+@login_required
+def relatorio_avaliacao(request):
+    """Avaliação do estoque (quantidade, custo médio e valor) ao final de uma data"""
+    data = timezone.localdate()
+    data_str = request.GET.get('data')
+    if data_str:
+        try:
+            data = datetime.strptime(data_str, '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Data inválida.')
+    
+    posicoes = avaliar_estoque(data)
+    
+    # Junta os dados cadastrais em uma única leitura dos produtos
+    linhas = []
+    for produto in Product.objects.select_related('categoria').only(
+        'codigo', 'nome', 'unidade', 'categoria__nome'
+    ).order_by('nome').iterator(chunk_size=2000):
+        posicao = posicoes.get(produto.pk)
+        if posicao is not None and posicao.quantidade != 0:
+            linhas.append((produto, posicao))
+    
+    if request.GET.get('exportar') == 'xlsx':
+        return exportar_avaliacao_para_xlsx(linhas, data, f'avaliacao_estoque_{data:%Y%m%d}.xlsx')
+    
+    linhas.sort(key=lambda linha: linha[1].valor, reverse=True)
+    context = {
+        'data': data,
+        'linhas': linhas[:100],  # Limita exibição aos maiores valores
+        'total_produtos': len(linhas),
+        'valor_total': sum((posicao.valor for _, posicao in linhas), Decimal('0.00')),
+    }
+    
+    return render(request, 'estoque/relatorios/avaliacao.html', context)
+
+
+@login_required
+def relatorio_abc(request):
+    """Curva ABC pelo valor das saídas; POST grava a classe nos produtos"""
+    # Período padrão: últimos 12 meses (dias locais)
+    data_fim = timezone.localdate()
+    data_inicio = data_fim - timedelta(days=364)
+    
+    parametros = request.POST if request.method == 'POST' else request.GET
+    try:
+        if parametros.get('data_inicio'):
+            data_inicio = datetime.strptime(parametros['data_inicio'], '%Y-%m-%d').date()
+        if parametros.get('data_fim'):
+            data_fim = datetime.strptime(parametros['data_fim'], '%Y-%m-%d').date()
+    except ValueError:
+        messages.error(request, 'Data inválida. Use o formato AAAA-MM-DD.')
+    
+    if request.method == 'POST':
+        contagem = classificar_abc(data_inicio, data_fim)
+        messages.success(
+            request,
+            f"Classificação gravada: {contagem['A']} produto(s) A, {contagem['B']} B e {contagem['C']} C."
+        )
+        return redirect(
+            f"{reverse('estoque:relatorio_abc')}?data_inicio={data_inicio:%Y-%m-%d}&data_fim={data_fim:%Y-%m-%d}"
+        )
+    
+    linhas = list(curva_abc(data_inicio, data_fim))
+    
+    if request.GET.get('exportar') == 'xlsx':
+        return exportar_curva_abc_para_xlsx(
+            linhas, data_inicio, data_fim, f'curva_abc_{data_inicio:%Y%m%d}_{data_fim:%Y%m%d}.xlsx'
+        )
+    
+    valor_total = sum((linha.valor for linha in linhas), Decimal('0.00'))
+    classes = []
+    for classe in ('A', 'B', 'C'):
+        da_classe = [linha for linha in linhas if linha.classe == classe]
+        valor = sum((linha.valor for linha in da_classe), Decimal('0.00'))
+        classes.append({
+            'classe': classe,
+            'produtos': len(da_classe),
+            'valor': valor,
+            'participacao': valor / valor_total * 100 if valor_total else Decimal('0.00'),
+        })
+    
+    context = {
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'linhas': linhas[:100],  # Limita exibição aos maiores valores
+        'total_produtos': len(linhas),
+        'valor_total': valor_total,
+        'classes': classes,
+    }
+    
+    return render(request, 'estoque/relatorios/abc.html', context)
+
+
+@login_required
+def relatorio_estoque_parado(request):
+    """Envelhecimento do estoque por faixa de idade e produtos parados"""
+    try:
+        dias = max(int(request.GET.get('dias', 90)), 1)
+    except ValueError:
+        dias = 90
+    
+    faixas = envelhecimento_estoque()
+    parados = estoque_parado(dias)
+    
+    context = {
+        'dias': dias,
+        'faixas': faixas,
+        'valor_total': sum((faixa['valor'] for faixa in faixas), Decimal('0.00')),
+        'parados': parados[:100],  # Limita exibição aos maiores valores
+        'total_parados': parados.count(),
+    }
+    
+    return render(request, 'estoque/relatorios/estoque_parado.html', context)
+
+
+@login_required
+def relatorio_fechamentos(request):
+    """Fechamentos mensais do estoque; POST fecha os meses encerrados pendentes"""
+    if request.method == 'POST':
+        fechados = 0
+        for mes in meses_a_fechar():
+            fechar_mes(mes, usuario=request.user)
+            fechados += 1
+        if fechados:
+            messages.success(request, f'{fechados} mês(es) fechado(s) com sucesso!')
+        else:
+            messages.info(request, 'Não há meses pendentes de fechamento.')
+        return redirect('estoque:relatorio_fechamentos')
+    
+    context = {
+        'fechamentos': MonthlyClosing.objects.select_related('usuario').order_by('-mes'),
+        'pendentes': meses_a_fechar(),
+    }
+    
+    return render(request, 'estoque/relatorios/fechamentos.html', context)
+
+
 # ============ API para AJAX ============
 
 @login_required
@@ -893,9 +1180,48 @@ def api_produto_estoque(request, produto_id):
     return JsonResponse({
         'quantidade': float(produto.quantidade_estoque),
         'unidade': produto.get_unidade_display(),
+        # Com microssegundos: é o valor conferido pela edição em lote
+        'updated_at': produto.updated_at.isoformat(),
     })
 
 
+@login_required
+def api_nfe_cache(request):
+    """API com os contadores do cache de parsing de NF-e (deste processo)"""
+    return JsonResponse(estatisticas_cache_nfe())
+
+
+@require_POST
+async def api_nfe_baixar(request):
+    """
+    API assíncrona que baixa os XMLs de várias URLs de NF-e ao mesmo tempo
+    e devolve o parsing de cada um (servida sem prender worker pelo ASGI).
+    
+    Corpo JSON: {"urls": ["https://...", ...]} (até MAXIMO_URLS)
+    """
+    # login_required não aceita views assíncronas no Django 5.0
+    usuario = await request.auser()
+    if not usuario.is_authenticated:
+        return JsonResponse({'sucesso': False, 'erro': 'Autenticação necessária'}, status=401)
+    
+    try:
+        urls = json.loads(request.body)['urls']
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    urls = [url.strip() for url in urls if url.strip()]
+    if not urls or len(urls) > MAXIMO_URLS:
+        return JsonResponse(
+            {'sucesso': False, 'erro': f'Informe de 1 a {MAXIMO_URLS} URLs'}, status=400
+        )
+    
+    resultados = await baixar_xmls(urls)
+    notas = await sync_to_async(ler_xmls_baixados)(resultados)
+    return JsonResponse({'sucesso': True, 'notas': notas})
+
+
 @login_required
 def api_verificar_sku(request):
     """API para verificar se SKU já existe (validação em tempo real)"""
@@ -924,6 +1250,447 @@ def api_verificar_sku(request):
     })
 
 
+def _faltas_json(faltas):
+    """Serializa as faltas de EstoqueInsuficienteError para as APIs"""
+    return [
+        {
+            'produto': falta['produto_id'],
+            'nome': falta['produto'],
+            'solicitado': float(falta['solicitado']),
+            'disponivel': float(falta['disponivel']),
+        }
+        for falta in faltas
+    ]
+
+
+@login_required
+@require_POST
+def api_saida_lote(request):
+    """
+    API para saída em lote.
+    Espera JSON: {"itens": [{"produto": <id>, "quantidade": "2.00"}, ...], "observacao": "..."}
+    """
+    try:
+        dados = json.loads(request.body)
+        itens = [
+            (int(item['produto']), validar_quantidade(item['quantidade']))
+            for item in dados['itens']
+        ]
+    except ValidationError as e:
+        return JsonResponse({'sucesso': False, 'erro': f"Quantidade inválida: {' '.join(e.messages)}"}, status=400)
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    if not itens:
+        return JsonResponse({'sucesso': False, 'erro': 'Informe itens com quantidade maior que zero'}, status=400)
+    
+    existentes = set(Product.objects.filter(
+        pk__in={produto_id for produto_id, _ in itens}, arquivado=False
+    ).values_list('pk', flat=True))
+    nao_encontrados = sorted({produto_id for produto_id, _ in itens} - existentes)
+    if nao_encontrados:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Produto(s) não encontrado(s)',
+            'produtos': nao_encontrados,
+        }, status=400)
+    
+    movimentacoes = [
+        StockMovement(
+            tipo='SAIDA',
+            produto_id=produto_id,
+            quantidade=quantidade,
+            observacao=dados.get('observacao') or None,
+            usuario=request.user
+        )
+        for produto_id, quantidade in itens
+    ]
+    try:
+        registrar_movimentacoes(movimentacoes)
+    except EstoqueInsuficienteError as e:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Estoque insuficiente',
+            'faltas': _faltas_json(e.faltas),
+        }, status=409)
+    
+    return JsonResponse({'sucesso': True, 'movimentacoes': len(movimentacoes)})
+
+
+@login_required
+@require_POST
+def api_produtos_editar_lote(request):
+    """
+    API de edição em lote (grade) de produtos.
+    Espera JSON: {"produtos": [{"id": <id>, "updated_at": "<ISO 8601 lido>",
+    "estoque_minimo": "5.00", "categoria": <id>}, ...]}
+    O custo médio não é editável em lote.
+    Produtos alterados depois da leitura voltam como conflito, com o updated_at atual.
+    """
+    try:
+        linhas = json.loads(request.body)['produtos']
+        if not isinstance(linhas, list):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    if len(linhas) > LIMITE_EDICAO_LOTE:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': f'Máximo de {LIMITE_EDICAO_LOTE} produtos por requisição'
+        }, status=413)
+    
+    resultados = editar_produtos_em_lote(linhas)
+    
+    contagem = {'atualizado': 0, 'conflito': 0, 'rejeitado': 0}
+    for resultado in resultados:
+        contagem[resultado['status']] += 1
+    
+    return JsonResponse({
+        'sucesso': True,
+        'atualizados': contagem['atualizado'],
+        'conflitos': contagem['conflito'],
+        'rejeitados': contagem['rejeitado'],
+        'resultados': resultados,
+    })
+
+
+def _sessao_leitura_json(sessao, itens):
+    return {
+        'sessao': sessao.pk,
+        'tipo': sessao.tipo,
+        'status': sessao.status,
+        'itens': [
+            {'produto': produto_id, 'quantidade': float(quantidade)}
+            for produto_id, quantidade in sorted(itens.items())
+        ],
+    }
+
+
+@login_required
+@require_POST
+def api_leitura_sessao_criar(request):
+    """
+    API para abrir uma sessão de leitura de código de barras.
+    Espera JSON: {"tipo": "ENTRADA" | "SAIDA", "observacao": "..."}
+    """
+    try:
+        dados = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    tipo = dados.get('tipo')
+    if tipo not in ('ENTRADA', 'SAIDA'):
+        return JsonResponse({'sucesso': False, 'erro': 'Tipo deve ser ENTRADA ou SAIDA'}, status=400)
+    
+    sessao = ScanSession.objects.create(
+        tipo=tipo,
+        usuario=request.user,
+        observacao=dados.get('observacao') or None
+    )
+    return JsonResponse({'sucesso': True, **_sessao_leitura_json(sessao, {})}, status=201)
+
+
+@login_required
+def api_leitura_sessao(request, pk):
+    """API para consultar as leituras acumuladas de uma sessão"""
+    sessao = get_object_or_404(ScanSession, pk=pk)
+    return JsonResponse({'sucesso': True, **_sessao_leitura_json(sessao, sessao.obter_itens())})
+
+
+@login_required
+@require_POST
+def api_leitura_registrar(request, pk):
+    """
+    API para registrar leituras (EAN ou SKU) em uma sessão aberta.
+    Espera JSON: {"codigo": "789...", "quantidade": "1"} ou
+    {"leituras": [{"codigo": "...", "quantidade": "1"}, ...]} para rajadas.
+    Os códigos são resolvidos pelo índice em memória, sem consultar produtos no banco.
+    """
+    sessao = get_object_or_404(ScanSession, pk=pk)
+    if sessao.status != 'ABERTA':
+        return JsonResponse({'sucesso': False, 'erro': 'A sessão não está aberta'}, status=409)
+    
+    try:
+        dados = json.loads(request.body)
+        leituras_json = dados['leituras'] if 'leituras' in dados else [dados]
+        leituras = [
+            (str(leitura['codigo']), validar_quantidade(leitura.get('quantidade', '1')))
+            for leitura in leituras_json
+        ]
+    except ValidationError as e:
+        return JsonResponse({'sucesso': False, 'erro': f"Quantidade inválida: {' '.join(e.messages)}"}, status=400)
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    resolvidas = []
+    produtos = []
+    nao_encontrados = []
+    encontrados = buscar_produtos_por_codigos(codigo for codigo, _ in leituras)
+    for (codigo, quantidade), produto in zip(leituras, encontrados):
+        if produto is None:
+            nao_encontrados.append(codigo)
+        else:
+            resolvidas.append((produto.id, quantidade))
+            produtos.append(produto)
+    
+    if nao_encontrados:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Código(s) não encontrado(s)',
+            'codigos': nao_encontrados,
+        }, status=404)
+    
+    try:
+        itens = sessao.adicionar_leituras(resolvidas)
+    except ValueError as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=409)
+    return JsonResponse({
+        'sucesso': True,
+        'produtos': [
+            {
+                'produto': produto.id,
+                'codigo': produto.codigo,
+                'nome': produto.nome,
+                'unidade': produto.unidade,
+                'quantidade_sessao': float(itens[produto.id]),
+            }
+            for produto in produtos
+        ],
+        'total_itens': len(itens),
+    })
+
+
+@login_required
+@require_POST
+def api_leitura_confirmar(request, pk):
+    """API para confirmar a sessão, gravando todas as leituras em um único lote"""
+    sessao = get_object_or_404(ScanSession, pk=pk)
+    try:
+        movimentacoes = sessao.confirmar()
+    except EstoqueInsuficienteError as e:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Estoque insuficiente',
+            'faltas': _faltas_json(e.faltas),
+        }, status=409)
+    except ValueError as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=409)
+    
+    return JsonResponse({'sucesso': True, 'movimentacoes': len(movimentacoes)})
+
+
+@login_required
+@require_POST
+def api_leitura_cancelar(request, pk):
+    """API para cancelar a sessão e descartar as leituras"""
+    sessao = get_object_or_404(ScanSession, pk=pk)
+    if sessao.status != 'ABERTA':
+        return JsonResponse({'sucesso': False, 'erro': 'A sessão não está aberta'}, status=409)
+    sessao.cancelar()
+    return JsonResponse({'sucesso': True})
+
+
+def _contagem_json(contagem):
+    itens = contagem.itens.all()
+    return {
+        'contagem': contagem.pk,
+        'status': contagem.status,
+        'categoria': contagem.categoria_id,
+        'criada_em': contagem.created_at.isoformat(),
+        'total_itens': contagem.total_itens,
+        'contados': itens.filter(quantidade_contada__isnull=False).count(),
+        'total_ajustes': contagem.total_ajustes,
+    }
+
+
+@login_required
+@require_POST
+def api_contagem_criar(request):
+    """
+    API para abrir uma contagem de inventário com o saldo atual dos produtos.
+    Espera JSON: {"categoria": <id> (opcional, padrão todos os produtos), "observacao": "..."}
+    """
+    try:
+        dados = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    categoria = None
+    if dados.get('categoria') is not None:
+        try:
+            categoria = Category.objects.filter(pk=int(dados['categoria'])).first()
+        except (TypeError, ValueError):
+            pass
+        if categoria is None:
+            return JsonResponse({'sucesso': False, 'erro': 'Categoria não encontrada'}, status=400)
+    
+    contagem = abrir_contagem(usuario=request.user, categoria=categoria, observacao=dados.get('observacao') or None)
+    return JsonResponse({'sucesso': True, **_contagem_json(contagem)}, status=201)
+
+
+@login_required
+def api_contagem(request, pk):
+    """API para consultar o andamento de uma contagem e as divergências encontradas até agora"""
+    contagem = get_object_or_404(StockCount, pk=pk)
+    return JsonResponse({
+        'sucesso': True,
+        **_contagem_json(contagem),
+        'divergencias': [
+            {
+                'produto': item.produto_id,
+                'codigo': item.produto.codigo,
+                'nome': item.produto.nome,
+                'sistema': float(item.quantidade_sistema + item.movimentado),
+                'contado': float(item.quantidade_contada),
+                'diferenca': float(item.diferenca_prevista),
+            }
+            for item in divergencias(contagem)
+        ],
+    })
+
+
+@login_required
+@require_POST
+def api_contagem_contar(request, pk):
+    """
+    API para registrar leituras (EAN ou SKU) em uma contagem aberta.
+    Espera JSON: {"codigo": "789...", "quantidade": "1"} ou
+    {"leituras": [{"codigo": "...", "quantidade": "1"}, ...]} para rajadas;
+    com "substituir": true a quantidade lida substitui a contada (recontagem).
+    """
+    contagem = get_object_or_404(StockCount, pk=pk)
+    if contagem.status != 'ABERTA':
+        return JsonResponse({'sucesso': False, 'erro': 'A contagem não está aberta'}, status=409)
+    
+    try:
+        dados = json.loads(request.body)
+        leituras_json = dados['leituras'] if 'leituras' in dados else [dados]
+        leituras = [
+            (str(leitura['codigo']), validar_quantidade(leitura.get('quantidade', '1'), minimo=Decimal('0')))
+            for leitura in leituras_json
+        ]
+    except ValidationError as e:
+        return JsonResponse({'sucesso': False, 'erro': f"Quantidade inválida: {' '.join(e.messages)}"}, status=400)
+    except (ValueError, TypeError, KeyError, ArithmeticError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    resolvidas = []
+    nao_encontrados = []
+    encontrados = buscar_produtos_por_codigos(codigo for codigo, _ in leituras)
+    for (codigo, quantidade), produto in zip(leituras, encontrados):
+        if produto is None:
+            nao_encontrados.append(codigo)
+        else:
+            resolvidas.append((produto.id, quantidade))
+    
+    if nao_encontrados:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Código(s) não encontrado(s)',
+            'codigos': nao_encontrados,
+        }, status=404)
+    
+    try:
+        contadas, fora_do_escopo = registrar_contagens(contagem, resolvidas, substituir=bool(dados.get('substituir')))
+    except ValueError as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=409)
+    
+    if fora_do_escopo:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Produto(s) fora do escopo da contagem',
+            'produtos': fora_do_escopo,
+        }, status=400)
+    
+    return JsonResponse({
+        'sucesso': True,
+        'produtos': [
+            {'produto': produto_id, 'quantidade_contada': float(quantidade)}
+            for produto_id, quantidade in sorted(contadas.items())
+        ],
+    })
+
+
+@login_required
+@require_POST
+def api_contagem_fechar(request, pk):
+    """
+    API para fechar a contagem, gravando os ajustes de todas as diferenças em um único lote.
+    Aceita (opcional) JSON ou formulário com "zerar_nao_contados": true para zerar os
+    produtos sem leitura.
+    """
+    contagem = get_object_or_404(StockCount, pk=pk)
+    try:
+        dados = json.loads(request.body or '{}') if request.content_type == 'application/json' else request.POST
+    except ValueError:
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    zerar_nao_contados = str(dados.get('zerar_nao_contados', '')).lower() in ('1', 'true', 'on')
+    
+    try:
+        ajustes = fechar_contagem(contagem, usuario=request.user, zerar_nao_contados=zerar_nao_contados)
+    except EstoqueInsuficienteError as e:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': 'Estoque insuficiente',
+            'faltas': _faltas_json(e.faltas),
+        }, status=409)
+    except ValueError as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=409)
+    
+    return JsonResponse({'sucesso': True, 'ajustes': len(ajustes)})
+
+
+@login_required
+@require_POST
+def api_contagem_cancelar(request, pk):
+    """API para cancelar a contagem sem gerar ajustes"""
+    contagem = get_object_or_404(StockCount, pk=pk)
+    try:
+        cancelar_contagem(contagem)
+    except ValueError as e:
+        return JsonResponse({'sucesso': False, 'erro': str(e)}, status=409)
+    return JsonResponse({'sucesso': True})
+
+
+@require_POST
+@token_required
+def api_sync_movimentacoes(request):
+    """
+    API de sincronização em lote para coletores offline (autenticação por token).
+    Espera JSON: {"movimentacoes": [{"chave": "<uuid>", "tipo": "SAIDA", "produto": <id>
+    ou "codigo": "<EAN/SKU>", "quantidade": "2", "custo_unitario": "0.00",
+    "fornecedor": <id>, "observacao": "...", "data": "<ISO 8601>"}, ...]}
+    Retorna o resultado de cada linha; reenvios da mesma chave são ignorados.
+    """
+    try:
+        linhas = json.loads(request.body)['movimentacoes']
+        if not isinstance(linhas, list):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({'sucesso': False, 'erro': 'JSON inválido'}, status=400)
+    
+    if len(linhas) > LIMITE_LINHAS:
+        return JsonResponse({
+            'sucesso': False,
+            'erro': f'Máximo de {LIMITE_LINHAS} movimentações por requisição'
+        }, status=413)
+    
+    resultados = sincronizar_movimentacoes(linhas, usuario=request.user)
+    
+    contagem = {'criada': 0, 'duplicada': 0, 'rejeitada': 0}
+    for resultado in resultados:
+        contagem[resultado['status']] += 1
+    
+    return JsonResponse({
+        'sucesso': True,
+        'criadas': contagem['criada'],
+        'duplicadas': contagem['duplicada'],
+        'rejeitadas': contagem['rejeitada'],
+        'resultados': resultados,
+    })
+
+
 # ============ PEDIDOS WHATSAPP ============
 
 @login_required
@@ -931,7 +1698,7 @@ def pedido_whatsapp(request):
     """Geração de pedidos para WhatsApp"""
     # Mostra todos os produtos, não apenas os com estoque > 0
     # pois o objetivo é fazer pedidos para reposição de estoque
-    produtos = Product.objects.select_related('categoria').all().order_by('categoria__nome', 'nome')
+    produtos = Product.objects.filter(arquivado=False).select_related('categoria').order_by('categoria__nome', 'nome')
     
     if request.method == 'POST':
         # Coleta os produtos selecionados com quantidades
@@ -1007,9 +1774,16 @@ def pedido_whatsapp(request):
         else:
             messages.warning(request, 'Selecione pelo menos um produto com quantidade.')
     
+    # Sugestões de reposição pelo consumo dos últimos 90 dias
+    analises = analisar_consumo()
+    sugestoes = {}
+    
     # Agrupa produtos por categoria
     produtos_por_categoria = {}
     for produto in produtos:
+        produto.analise_consumo = analises.get(produto.pk)
+        if produto.analise_consumo and produto.analise_consumo.quantidade_sugerida:
+            sugestoes[produto.pk] = str(produto.analise_consumo.quantidade_sugerida)
         cat_nome = produto.categoria.nome if produto.categoria else 'Sem Categoria'
         if cat_nome not in produtos_por_categoria:
             produtos_por_categoria[cat_nome] = []
@@ -1020,5 +1794,6 @@ def pedido_whatsapp(request):
     
     return render(request, 'estoque/pedidos/whatsapp.html', {
         'produtos_por_categoria': produtos_por_categoria,
+        'sugestoes': sugestoes,
         'ultimos_pedidos': ultimos_pedidos,
     })
@@ -3,6 +3,11 @@ ASGI config for stockbit project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The NF-e download API (estoque.views.api_nfe_baixar) is an async view:
+under ASGI it runs on the event loop and many downloads share one worker,
+e.g. ``gunicorn -k uvicorn.workers.UvicornWorker stockbit.asgi:application``.
+Under WSGI Django still serves it, one request per thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """